@@ -0,0 +1,105 @@
+"""比较标注视图中大量矩形的绘制开销
+
+每个矩形一个 RectItem 时, 每帧对每个可见矩形调用一次 paint; 批量绘制时所有未选中的矩形由
+RectBatchItem 按类别在 drawRects 中一次绘制.
+
+PySide6 6.12 的无返回值的方法会少计 None 的引用计数, Python 3.11 及以前的解释器在减到 0 时崩溃;
+每个 RectItem 在创建和每帧绘制时都会少计几次, 所以每种情况在子进程中测量, 子进程在 None 的引用计数接近 0 之前停止,
+由下一个子进程继续; 创建矩形和绘制一帧就会用完引用计数的情况显示为 n/a.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_box_render.py
+"""
+import sys
+import time
+import logging
+import subprocess
+
+import numpy as np
+
+from qtpy.QtWidgets import QApplication, QGraphicsPixmapItem
+from qtpy.QtGui import QPixmap
+
+from deep_learning_tool import LOGGER
+from deep_learning_tool.data import AnnotationSet
+from deep_learning_tool.widgets.label_graphics import ImageView, LabelScene
+
+# 子进程在 None 的引用计数低于该值时停止测量
+NONE_REFS_RESERVE = 2000
+
+
+def randomAnnotations(count, image_size, class_count=20, seed=0):
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, image_size - 200, (count, 2))
+    wh = rng.uniform(10, 200, (count, 2))
+    annotations = AnnotationSet()
+    annotations.extend(np.hstack((xy, xy + wh)), rng.integers(0, class_count, count))
+    return annotations
+
+
+def buildView(annotations, batch_render, image_size):
+    scene = LabelScene()
+    view = ImageView(scene)
+    view.batch_render = batch_render
+    view.resize(1280, 960)
+    view.show()
+    label_image = QGraphicsPixmapItem(QPixmap(image_size, image_size))
+    scene.addItem(label_image)
+    view.setLabelImage(label_image)
+    start = time.perf_counter()
+    view.setAnnotations(annotations)
+    return scene, view, time.perf_counter() - start
+
+
+def child(count : int, batch_render : bool, repeat : int, image_size : int):
+    """创建视图并绘制最多 repeat 帧, 输出 (创建时间, 绘制总时间, 帧数)"""
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    LOGGER.setLevel(logging.INFO)
+    scene, view, setup = buildView(randomAnnotations(count, image_size), batch_render, image_size)
+    view.viewport().grab()
+    frames = 0
+    start = time.perf_counter()
+    while frames < repeat and sys.getrefcount(None) >= NONE_REFS_RESERVE:
+        view.viewport().grab()
+        frames += 1
+    print(setup, time.perf_counter() - start, frames, flush=True)
+    view.clearRectItems()
+    view.close()
+    scene.clear()
+
+
+def measure(count : int, batch_render : bool, repeat : int, image_size : int):
+    """(创建时间, 每帧时间), 没有测量到任何一帧时返回 None
+
+    子进程输出结果后在释放图形项时也可能因 None 的引用计数崩溃, 只检查输出.
+    """
+    setup, elapsed, frames = None, 0.0, 0
+    while frames < repeat:
+        result = subprocess.run([sys.executable, __file__, "--child", str(count), str(int(batch_render)),
+                                 str(repeat - frames), str(image_size)], capture_output=True, text=True)
+        output = result.stdout.split()
+        if len(output) < 3 or int(output[-1]) == 0:
+            return None
+        setup = float(output[-3]) if setup is None else setup
+        elapsed += float(output[-2])
+        frames += int(output[-1])
+    return setup, elapsed / frames
+
+
+def main(counts=(1000, 2000, 20000), image_size=8000, repeat=10):
+    for count in counts:
+        columns = []
+        for name, batch_render in (("RectItem", False), ("batch", True)):
+            result = measure(count, batch_render, repeat, image_size)
+            if result is None:
+                columns.append(f"{name}: {'n/a (None refcount exhausted)':>41s}")
+            else:
+                setup, frame = result
+                columns.append(f"{name}: setup {setup * 1000:8.1f} ms  frame {frame * 1000:8.2f} ms")
+        print(f"{count:>8} boxes  " + "  |  ".join(columns))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 6 and sys.argv[1] == "--child":
+        child(int(sys.argv[2]), sys.argv[3] == "1", int(sys.argv[4]), int(sys.argv[5]))
+    else:
+        main()
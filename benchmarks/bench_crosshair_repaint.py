@@ -0,0 +1,134 @@
+"""测量标注视图中每次鼠标移动的重绘时间
+
+原实现的十字线是场景中横跨整个视口的 CrossLineItem, 并且使用 FullViewportUpdate,
+每次移动鼠标都重绘整张图像和所有矩形; 现在十字线在 drawForeground 中绘制,
+SmartViewportUpdate 只重绘十字线经过的细长区域, 图像和批量绘制的矩形使用 DeviceCoordinateCache.
+
+PySide6 6.12 的部分无返回值的方法 (例如 QGraphicsRectItem.setRect, QGraphicsScene.removeItem) 会少计 None 的引用计数,
+Python 3.11 及以前的解释器在 None 的引用计数减到 0 时崩溃, 鼠标经过矩形时会提升和还原 RectItem, 每次移动少计几十次.
+所以测量在子进程中进行, 子进程在 None 的引用计数接近 0 之前停止并报告已测量的移动, 由下一个子进程继续.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_crosshair_repaint.py
+"""
+import sys
+import time
+import logging
+import subprocess
+
+import numpy as np
+
+from qtpy.QtCore import Qt, QLineF, QPointF
+from qtpy.QtWidgets import QApplication, QGraphicsView, QGraphicsItem, QGraphicsPixmapItem
+from qtpy.QtGui import QPixmap, QMouseEvent
+
+from deep_learning_tool import LOGGER
+from deep_learning_tool.data import AnnotationSet
+from deep_learning_tool.widgets.label_graphics import ImageView, LabelScene, CrossLineItem
+
+
+class LegacyImageView(ImageView):
+    """原来的十字线和视口更新方式"""
+    def __init__(self, scene, parent=None) -> None:
+        super().__init__(scene, parent)
+        self.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.FullViewportUpdate)
+        self.setCacheMode(QGraphicsView.CacheModeFlag.CacheNone)
+        self.cross_line = CrossLineItem(QLineF(), QLineF())
+        self.cross_line.setZValue(1000)
+        scene.addItem(self.cross_line)
+
+    def setLabelImage(self, label_image):
+        super().setLabelImage(label_image)
+        label_image.setCacheMode(QGraphicsItem.CacheMode.NoCache)
+
+    def setAnnotations(self, annotations):
+        super().setAnnotations(annotations)
+        if self.batch_item is not None:
+            self.batch_item.setCacheMode(QGraphicsItem.CacheMode.NoCache)
+
+    def drawCrossLine(self, pos):
+        rect = self.getCurrentViewRectOnScene()
+        self.cross_line.setCrossLine(QLineF(QPointF(rect.left(), pos.y()), QPointF(rect.right(), pos.y())),
+                                     QLineF(QPointF(pos.x(), rect.top()), QPointF(pos.x(), rect.bottom())))
+
+
+def buildView(view_class, box_count, image_size=4000, seed=0):
+    scene = LabelScene()
+    view = view_class(scene)
+    view.resize(1280, 960)
+    view.enable_cross_line(True)
+    view.show()
+    label_image = QGraphicsPixmapItem(QPixmap(image_size, image_size * 3 // 4))
+    scene.addItem(label_image)
+    view.setLabelImage(label_image)
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, image_size * 0.7, (box_count, 2))
+    annotations = AnnotationSet()
+    annotations.extend(np.hstack((xy, xy + rng.uniform(10, 200, (box_count, 2)))), rng.integers(0, 20, box_count))
+    view.setAnnotations(annotations)
+    return scene, view
+
+
+# 子进程在 None 的引用计数低于该值时停止测量
+NONE_REFS_RESERVE = 2000
+
+
+def measure(app, view, first, moves):
+    """测量第 first 到 moves 次移动, 返回 (总时间, 测量的次数)"""
+    viewport = view.viewport()
+    for _ in range(20):
+        app.processEvents()
+    count = 0
+    start = time.perf_counter()
+    for i in range(first, moves):
+        if sys.getrefcount(None) < NONE_REFS_RESERVE:
+            break
+        pos = QPointF(100 + (i * 7) % 1000, 100 + (i * 3) % 700)
+        event = QMouseEvent(QMouseEvent.Type.MouseMove, pos, viewport.mapToGlobal(pos),
+                            Qt.MouseButton.NoButton, Qt.MouseButton.NoButton, Qt.KeyboardModifier.NoModifier)
+        app.sendEvent(viewport, event)
+        # ImageView 合并鼠标移动 (configs.label_mouse_move_interval), 这里立即处理这次移动, 测量的是每次移动的重绘
+        view.flushMouseMove()
+        # 每次移动后立即处理重绘
+        app.processEvents()
+        count += 1
+    return time.perf_counter() - start, count
+
+
+VIEW_CLASSES = {"legacy": LegacyImageView, "current": ImageView}
+
+
+def child(view_name : str, box_count : int, first : int, moves : int):
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    LOGGER.setLevel(logging.INFO)
+    scene, view = buildView(VIEW_CLASSES[view_name], box_count)
+    elapsed, count = measure(app, view, first, moves)
+    print(elapsed, count, flush=True)
+    view.clearRectItems()
+    view.close()
+    scene.clear()
+
+
+def measureInSubprocesses(view_name : str, box_count : int, moves : int) -> float:
+    """每次移动的平均时间, 一个子进程没有测量完时由下一个子进程继续"""
+    elapsed, done = 0.0, 0
+    while done < moves:
+        output = subprocess.run([sys.executable, __file__, "--child", view_name, str(box_count), str(done), str(moves)],
+                                capture_output=True, text=True, check=True).stdout.split()
+        if int(output[-1]) == 0:
+            raise RuntimeError("no mouse move measured before running out of None references")
+        elapsed += float(output[-2])
+        done += int(output[-1])
+    return elapsed / moves
+
+
+def main(box_counts=(0, 2000, 20000), moves=200):
+    for box_count in box_counts:
+        legacy, current = (measureInSubprocesses(view_name, box_count, moves) for view_name in VIEW_CLASSES)
+        print(f"{box_count:>8} boxes  per mouse move: full viewport {legacy * 1000:8.2f} ms  partial {current * 1000:8.2f} ms  x{legacy / max(current, 1e-9):.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 6 and sys.argv[1] == "--child":
+        child(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5]))
+    else:
+        main()
@@ -0,0 +1,84 @@
+"""检测评估的耗时
+
+合成 N 张图像, 每张约 G 个真值框和 D 个检测框 (真值附近的抖动框加随机误检), 测量:
+    - 读取 csv 预测文件
+    - data.evaluation.evaluate 计算 mAP@[.5:.95]、PR 曲线和混淆矩阵 (单进程和进程池)
+    - 相同预测文件的缓存命中
+
+    python benchmarks/bench_evaluation.py --images 100000 --detections 50
+"""
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from deep_learning_tool.data.evaluation import Detections, EvaluationCache, evaluate, fileHash, loadPredictions
+
+
+def synthetic(image_count, gt_per_image, detections_per_image, class_count, seed=0):
+    rng = np.random.default_rng(seed)
+    gt_counts = rng.integers(max(gt_per_image // 2, 1), gt_per_image * 3 // 2 + 1, size=image_count)
+    gt_image = np.repeat(np.arange(image_count), gt_counts)
+    xy = rng.uniform(0, 1000, size=(len(gt_image), 2))
+    wh = rng.uniform(10, 200, size=(len(gt_image), 2))
+    gt_boxes = np.concatenate([xy, xy + wh], axis=1)
+    gt_classes = rng.integers(0, class_count, size=len(gt_image))
+    gt = Detections(gt_image, gt_classes, gt_boxes, None, np.zeros(len(gt_image), dtype=np.int64))
+
+    # 每张图像 detections_per_image 个检测框, 先从真值抖动得到, 不够的用随机框补齐
+    det_counts = np.full(image_count, detections_per_image)
+    det_image = np.repeat(np.arange(image_count), det_counts)
+    starts = np.cumsum(gt_counts) - gt_counts
+    rank = np.arange(len(det_image)) - np.repeat(np.cumsum(det_counts) - det_counts, det_counts)
+    from_gt = rank < 2 * gt_counts[det_image]
+    source = starts[det_image] + rank // 2
+    det_boxes = rng.uniform(0, 1000, size=(len(det_image), 4))
+    det_boxes[:, 2:] = det_boxes[:, :2] + rng.uniform(10, 200, size=(len(det_image), 2))
+    jitter = rng.normal(0, 6, size=(from_gt.sum(), 4))
+    det_boxes[from_gt] = gt_boxes[source[from_gt]] + jitter
+    det_classes = rng.integers(0, class_count, size=len(det_image))
+    det_classes[from_gt] = np.where(rng.random(from_gt.sum()) < 0.9, gt_classes[source[from_gt]], det_classes[from_gt])
+    scores = np.where(from_gt, rng.uniform(0.3, 1.0, size=len(det_image)), rng.uniform(0.0, 0.6, size=len(det_image)))
+    detections = Detections(det_image, det_classes, det_boxes, scores, np.zeros(len(det_image), dtype=np.int64))
+    return gt, detections, np.arange(image_count)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=100000)
+    parser.add_argument("--gt", type=int, default=10)
+    parser.add_argument("--detections", type=int, default=50)
+    parser.add_argument("--classes", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    gt, detections, image_ids = synthetic(args.images, args.gt, args.detections, args.classes)
+    print(f"{args.images} images, {len(gt.image_id)} ground truth boxes, {len(detections.image_id)} detections, {args.classes} classes")
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "predictions.csv")
+        data = np.column_stack([detections.image_id, detections.class_id, detections.boxes, detections.scores])
+        np.savetxt(path, data, fmt=["%d", "%d", "%.2f", "%.2f", "%.2f", "%.2f", "%.4f"], delimiter=",",
+                   header="image_id,class_id,x1,y1,x2,y2,score", comments="")
+        start = time.perf_counter()
+        loaded = loadPredictions(path)
+        print(f"load csv ({os.path.getsize(path) / 1024 / 1024:.0f} MB)  {time.perf_counter() - start:6.2f} s")
+
+        for workers in sorted({1, args.workers}):
+            start = time.perf_counter()
+            result = evaluate(gt, loaded, image_ids, workers=workers)
+            print(f"evaluate, {workers} process(es)  {time.perf_counter() - start:6.2f} s  "
+                  f"mAP {result.mAP():.4f}  mAP50 {result.mAP(0.5):.4f}  mAP75 {result.mAP(0.75):.4f}")
+
+        cache = EvaluationCache(os.path.join(root, "cache"))
+        start = time.perf_counter()
+        key = cache.key(fileHash(path), gt, image_ids, max_detections=100)
+        cache.save(key, result)
+        cached = cache.load(key)
+        print(f"hash + cache round trip  {time.perf_counter() - start:6.2f} s  same mAP {cached.mAP() == result.mAP()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""导出 COCO / YOLO / VOC 的吞吐量
+
+合成一个包含 N 张图像 (都是同一张小 png 的硬链接, 已记录尺寸) 和每张 3 个框的项目文件, 分别测量:
+    - 不导出图像时每种格式的速度, 即 Python 的开销上限
+    - 硬链接和复制图像时的速度, 以及同样线程数下只复制图像 (shutil.copyfile) 的速度, 作为磁盘的上限
+    - 中断后继续导出的结果与一次导出的结果相同
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_export.py --images 100000
+"""
+import os
+import time
+import shutil
+import filecmp
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from qtpy.QtGui import QImage, QColor
+
+from deep_learning_tool.data import ProjectStore
+from deep_learning_tool.data.export import DatasetExporter, FORMATS, COPY, HARDLINK, NO_IMAGES
+
+
+def createProject(root : str, count : int, image_size : int):
+    image = QImage(image_size, image_size, QImage.Format.Format_RGB32)
+    image.fill(QColor(40, 120, 200))
+    source = os.path.join(root, "source.png")
+    image.save(source)
+    images_dir = os.path.join(root, "images")
+    os.makedirs(images_dir)
+    store = ProjectStore(os.path.join(root, "project.dlt"))
+    images, annotations = [], {}
+    for image_id in range(count):
+        path = os.path.join(images_dir, f"img{image_id:07d}.png")
+        os.link(source, path)
+        images.append((image_id, path))
+        annotations[image_id] = [(image_id % 5, 10.0, 10.0, 50.0, 60.0, 0), (1, 20.0, 5.0, 30.0, 40.0, 1),
+                                 ((image_id // 7) % 5, 0.0, 0.0, 64.0, 64.0, 0)]
+    store.addImages(images)
+    store.updateImages("width", [(image_size, image_id) for image_id, _ in images])
+    store.updateImages("height", [(image_size, image_id) for image_id, _ in images])
+    store.updateImages("split", [(1 + image_id % 3, image_id) for image_id, _ in images])
+    store.saveAnnotations(annotations)
+    store.close()
+    return [path for _, path in images]
+
+
+def diffFiles(left : str, right : str) -> list:
+    def walk(comparison, prefix=""):
+        result = [prefix + name for name in comparison.diff_files + comparison.left_only + comparison.right_only]
+        for name, sub in comparison.subdirs.items():
+            result += walk(sub, prefix + name + "/")
+        return result
+    return walk(filecmp.dircmp(left, right))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=50000)
+    parser.add_argument("--image-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_export_")
+    try:
+        start = time.perf_counter()
+        paths = createProject(root, args.images, args.image_size)
+        project_path = os.path.join(root, "project.dlt")
+        nbytes = os.path.getsize(paths[0])
+        print(f"{args.images} images of {nbytes} bytes, {args.workers} workers, setup {time.perf_counter() - start:.1f} s")
+
+        for export_format in FORMATS:
+            for image_mode in (NO_IMAGES, HARDLINK, COPY):
+                output_dir = os.path.join(root, f"{export_format}_{image_mode}")
+                exporter = DatasetExporter(project_path, output_dir, export_format, image_mode=image_mode, workers=args.workers)
+                result = exporter.run(resume=False)
+                print(f"{export_format:>5} {image_mode:>9}  {result.elapsed:6.2f} s  {result.exported / result.elapsed:9.0f} images/s"
+                      f"  {result.copied_bytes / result.elapsed / 1024 / 1024:7.1f} MB/s")
+                shutil.rmtree(output_dir)
+
+        # 磁盘的上限: 同样的线程数只复制图像
+        target_dir = os.path.join(root, "copy_only")
+        os.makedirs(target_dir)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.workers) as pool:
+            list(pool.map(lambda path: shutil.copyfile(path, os.path.join(target_dir, os.path.basename(path))), paths))
+        elapsed = time.perf_counter() - start
+        print(f"copy only        {elapsed:6.2f} s  {len(paths) / elapsed:9.0f} images/s  {len(paths) * nbytes / elapsed / 1024 / 1024:7.1f} MB/s")
+        shutil.rmtree(target_dir)
+
+        # 中断后继续
+        for export_format in FORMATS:
+            full = os.path.join(root, f"{export_format}_full")
+            DatasetExporter(project_path, full, export_format, image_mode=NO_IMAGES, workers=args.workers).run(resume=False)
+            resumed = os.path.join(root, f"{export_format}_resumed")
+            calls = [0]
+            def shouldStop():
+                calls[0] += 1
+                return calls[0] > args.images // 3
+            first = DatasetExporter(project_path, resumed, export_format, image_mode=NO_IMAGES, workers=args.workers).run(should_stop=shouldStop)
+            second = DatasetExporter(project_path, resumed, export_format, image_mode=NO_IMAGES, workers=args.workers).run()
+            # YOLO 的 data.yaml 包含导出目录
+            diffs = [name for name in diffFiles(full, resumed) if name != "data.yaml"]
+            print(f"{export_format:>5} resume  first {first.exported} (completed {first.completed}), then {second.exported}, differences {diffs}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""比较图库缩放时重新布局的开销
+
+原实现每次缩放都遍历 scene 中的所有图形项并逐个 setPos,
+GridLayout 只重新计算列数并放置可见范围内的图形项 (与 configs.gallery_virtualized 一样, 只为可见的行创建图形项).
+
+PySide6 6.12 的无返回值的方法会少计 None 的引用计数, Python 3.11 及以前的解释器在减到 0 时崩溃;
+创建每个 GalleryItem 少计两次, 每次 setPos 少计一次. 所以每种情况在子进程中测量, 子进程在 None 的引用计数
+不够下一次重新布局之前停止, 由下一个子进程继续; 创建图形项就会用完引用计数的情况显示为 n/a.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_gallery_layout.py
+"""
+import sys
+import time
+import subprocess
+
+from qtpy.QtCore import Qt
+from qtpy.QtWidgets import QApplication, QGraphicsScene
+
+from deep_learning_tool.widgets.gallery_graphics import GalleryItem
+from deep_learning_tool.widgets.gallery_layout import GridLayout
+
+# 子进程在 None 的引用计数低于该值 (加上下一步的开销) 时停止测量
+NONE_REFS_RESERVE = 2000
+# 可见范围
+VIEW_TOP, VIEW_BOTTOM = 0, 1000
+
+
+def legacyRelayout(scene, width_limit, spacing=5):
+    # GalleryView.updateItemsPos 的原实现
+    current_x, current_y = 0, 0
+    for item in scene.items(Qt.SortOrder.AscendingOrder):
+        if isinstance(item, GalleryItem):
+            item_size = item.boundingRect().size()
+            current_x = 0 if current_x == 0 else current_x + spacing
+            if current_x > 0 and current_x + item_size.width() > width_limit:
+                x = 0
+                y = current_y + item_size.height() + spacing
+                current_y = y
+            else:
+                x = current_x
+                y = current_y
+            item.setPos(x, y)
+            current_x = x + item_size.width()
+
+
+def gridRelayout(layout, items, width_limit, top, bottom):
+    layout.setWidthLimit(width_limit)
+    first, last = layout.visibleRange(top, bottom, len(items), 1)
+    for row in range(first, last):
+        items[row].setPos(*layout.position(row))
+
+
+def widths(repeat):
+    return [2000 + 50 * i for i in range(repeat)]
+
+
+def child(variant : str, count : int, first : int, repeat : int):
+    """测量第 first 到 repeat 次重新布局, 输出 (总时间, 次数)"""
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    layout = GridLayout(*GalleryItem.itemSize(), 5)
+    if variant == "legacy":
+        placed = count
+    else:
+        # 最宽时列数最多, 可见的图形项最多
+        layout.setWidthLimit(max(widths(repeat)))
+        placed = layout.visibleRange(VIEW_TOP, VIEW_BOTTOM, count, 1)[1]
+    elapsed, done = 0.0, 0
+    if sys.getrefcount(None) < NONE_REFS_RESERVE + 2 * placed:
+        print(elapsed, done, flush=True)
+        return app
+    scene = QGraphicsScene()
+    items = []
+    for i in range(placed):
+        item = GalleryItem(f"/data/images/{i:08d}.png")
+        scene.addItem(item)
+        items.append(item)
+    # 网格布局按索引计算位置, 不可见的图像不需要图形项, 只需要图像总数
+    items += [None] * (count - placed)
+    for width in widths(repeat)[first:]:
+        if sys.getrefcount(None) < NONE_REFS_RESERVE + placed:
+            break
+        start = time.perf_counter()
+        if variant == "legacy":
+            legacyRelayout(scene, width)
+        else:
+            gridRelayout(layout, items, width, VIEW_TOP, VIEW_BOTTOM)
+        elapsed += time.perf_counter() - start
+        done += 1
+    print(elapsed, done, flush=True)
+    return app
+
+
+def measure(variant : str, count : int, repeat : int):
+    """每次重新布局的平均时间, 创建图形项时用完 None 的引用计数返回 None
+
+    子进程输出结果后在释放图形项时也可能因 None 的引用计数崩溃, 只检查输出.
+    """
+    elapsed, done = 0.0, 0
+    while done < repeat:
+        output = subprocess.run([sys.executable, __file__, "--child", variant, str(count), str(done), str(repeat)],
+                                capture_output=True, text=True).stdout.split()
+        if len(output) < 2 or int(output[-1]) == 0:
+            return None
+        elapsed += float(output[-2])
+        done += int(output[-1])
+    return elapsed / repeat
+
+
+def main(counts=(1000, 2000, 5000, 20000), repeat=10):
+    for count in counts:
+        legacy, grid = (measure(variant, count, repeat) for variant in ("legacy", "grid"))
+        columns = [f"{name} {'n/a (None refcount exhausted)' if value is None else f'{value * 1000:9.3f} ms'}"
+                   for name, value in (("legacy", legacy), ("grid", grid))]
+        speedup = f"  x{legacy / max(grid, 1e-9):.0f}" if legacy is not None and grid is not None else ""
+        print(f"{count:>8} items  " + "  ".join(columns) + speedup)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 6 and sys.argv[1] == "--child":
+        child(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5]))
+    else:
+        main()
@@ -0,0 +1,83 @@
+"""测量日志调用在热路径中的开销
+
+原来鼠标事件和 deleteItems 中的 LOGGER.debug(f"...{self.items()}...") 在调试日志关闭时也会获取场景中的
+所有图形项并格式化成字符串; 现在使用 %s 参数延迟格式化, 参数开销大的调用先判断 isEnabledFor.
+日志打开时, 原来在调用线程中着色并写入控制台, 现在调用线程只把记录放入队列.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_logging.py
+"""
+import os
+import sys
+import time
+import logging
+
+from qtpy.QtCore import QRectF, QPointF
+from qtpy.QtWidgets import QApplication, QGraphicsScene, QGraphicsRectItem
+
+from deep_learning_tool import LOGGER
+from deep_learning_tool.logger import ColoredFormatter, ColoredLogger
+
+
+def timeit(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main(item_count=2000):
+    app = QApplication.instance() or QApplication(sys.argv)
+    scene = QGraphicsScene()
+    for i in range(item_count):
+        scene.addItem(QGraphicsRectItem(QRectF(i, i, 10, 10)))
+    pos = QPointF(12.5, 40.0)
+    mode, hasMove = "CREATE", True
+
+    # 与 ImageView.mouseReleaseEvent 和 deleteItems 中的调用相同
+    def legacyEvent():
+        LOGGER.debug(f"{mode} hasMove: {hasMove}  {pos} {pos.x()} {pos.y()}")
+        LOGGER.debug(f"items before delete\n{scene.items()}")
+
+    def lazyEvent():
+        LOGGER.debug("%s hasMove: %s  %s %s %s", mode, hasMove, pos, pos.x(), pos.y())
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("items before delete\n%s", scene.items())
+
+    def simpleLegacy():
+        LOGGER.debug(f"{mode} hasMove: {hasMove}  {pos}")
+
+    def simpleLazy():
+        LOGGER.debug("%s hasMove: %s  %s", mode, hasMove, pos)
+
+    LOGGER.setLevel(logging.INFO)
+    print(f"debug disabled ({item_count} items in scene):")
+    for name, func, repeat in (("f-string, small", simpleLegacy, 100000), ("lazy %s, small", simpleLazy, 100000),
+                               ("f-string event", legacyEvent, 100), ("lazy + guard event", lazyEvent, 100000)):
+        print(f"  {name:<20} {timeit(func, repeat) * 1e6:10.3f} us per call")
+
+    # 日志打开时调用线程的开销: 原来的同步输出和现在的队列
+    devnull = open(os.devnull, "w")
+    sync_logger = logging.Logger("sync", logging.DEBUG)
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(ColoredFormatter(ColoredLogger.FORMAT))
+    sync_logger.addHandler(handler)
+    LOGGER.console.setStream(devnull)
+    LOGGER.setLevel(logging.DEBUG)
+    print("debug enabled, caller thread cost per record (bursts of 20 records, as in one mouse event):")
+    for name, logger in (("synchronous console", sync_logger), ("queue listener", LOGGER)):
+        elapsed = 0
+        for _ in range(1000):
+            start = time.perf_counter()
+            for _ in range(20):
+                logger.debug("%s hasMove: %s  %s", mode, hasMove, pos)
+            elapsed += time.perf_counter() - start
+            # 两次事件之间输出线程把队列写完
+            while not LOGGER.queue.empty():
+                time.sleep(0)
+        print(f"  {name:<20} {elapsed / 20000 * 1e6:10.3f} us per call")
+    LOGGER.setLevel(logging.INFO)
+    return app
+
+
+if __name__ == "__main__":
+    main()
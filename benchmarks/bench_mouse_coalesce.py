@@ -0,0 +1,124 @@
+"""测量合并鼠标移动事件的效果
+
+高回报率鼠标每秒可产生上千次移动事件, 原实现每次移动都更新十字线、悬停光标和正在绘制的矩形;
+现在 ImageView 只保存最后一次移动, 每 configs.label_mouse_move_interval 毫秒 (约一帧) 处理一次.
+这里以 1000 Hz 发送移动事件, 比较收到和实际处理的事件数量以及总耗时.
+
+PySide6 6.12 的无返回值的方法会少计 None 的引用计数, Python 3.11 及以前的解释器在减到 0 时崩溃,
+每次处理移动会少计几十次; 所以测量在子进程中进行, 子进程在 None 的引用计数接近 0 之前停止发送, 由下一个子进程继续.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_mouse_coalesce.py
+"""
+import sys
+import time
+import logging
+import subprocess
+
+import numpy as np
+
+from qtpy.QtCore import Qt, QPointF
+from qtpy.QtWidgets import QApplication, QGraphicsPixmapItem
+from qtpy.QtGui import QPixmap, QMouseEvent
+
+from deep_learning_tool import LOGGER
+from deep_learning_tool.data import AnnotationSet
+from deep_learning_tool.widgets.label_graphics import ImageView, LabelScene
+
+# 子进程在 None 的引用计数低于该值时停止测量; 处理一次经过大量矩形的移动最多少计一千多次,
+# 停止后还要处理最后一次合并的移动, 所以保留得比其他测试多
+NONE_REFS_RESERVE = 4000
+
+
+def buildView(interval, box_count=20000, image_size=4000, seed=0):
+    scene = LabelScene()
+    view = ImageView(scene)
+    view.mouse_move_timer.setInterval(interval)
+    view.resize(1280, 960)
+    view.enable_cross_line(True)
+    view.show()
+    label_image = QGraphicsPixmapItem(QPixmap(image_size, image_size * 3 // 4))
+    scene.addItem(label_image)
+    view.setLabelImage(label_image)
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, image_size * 0.7, (box_count, 2))
+    annotations = AnnotationSet()
+    annotations.extend(np.hstack((xy, xy + rng.uniform(10, 200, (box_count, 2)))), rng.integers(0, 20, box_count))
+    view.setAnnotations(annotations)
+    return scene, view
+
+
+def measure(app, view, first, moves, rate):
+    """按回报率发送第 first 到 moves 次移动, 返回 (收到, 处理, 耗时, 发送的次数)"""
+    viewport = view.viewport()
+    for _ in range(20):
+        app.processEvents()
+    # 先处理一次移动, 建立图像和矩形的绘制缓存, 不计入结果
+    pos = QPointF(100 + (first * 7) % 1000, 100 + (first * 3) % 700)
+    app.sendEvent(viewport, QMouseEvent(QMouseEvent.Type.MouseMove, pos, viewport.mapToGlobal(pos),
+                                        Qt.MouseButton.NoButton, Qt.MouseButton.NoButton, Qt.KeyboardModifier.NoModifier))
+    view.flushMouseMove()
+    app.processEvents()
+    view.mouse_moves_received = view.mouse_moves_processed = 0
+    sent = 0
+    start = time.perf_counter()
+    for i in range(first, moves):
+        if sys.getrefcount(None) < NONE_REFS_RESERVE:
+            break
+        # 按回报率发送事件, 提前于预定时间时事件循环在等待中处理定时器和重绘, 落后时直接发送下一次移动
+        # (每次 processEvents 也会少计 None 的引用计数, 所以等待时只调用一次)
+        remaining = sent / rate - (time.perf_counter() - start)
+        if remaining > 0:
+            time.sleep(remaining)
+            app.processEvents()
+        pos = QPointF(100 + (i * 7) % 1000, 100 + (i * 3) % 700)
+        event = QMouseEvent(QMouseEvent.Type.MouseMove, pos, viewport.mapToGlobal(pos),
+                            Qt.MouseButton.NoButton, Qt.MouseButton.NoButton, Qt.KeyboardModifier.NoModifier)
+        app.sendEvent(viewport, event)
+        sent += 1
+    view.flushMouseMove()
+    app.processEvents()
+    elapsed = time.perf_counter() - start
+    received, processed = view.mouseMoveStats()
+    return received, processed, elapsed, sent
+
+
+def child(interval : int, first : int, moves : int, rate : int):
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    LOGGER.setLevel(logging.INFO)
+    scene, view = buildView(interval)
+    print(*measure(app, view, first, moves, rate), flush=True)
+    view.clearRectItems()
+    view.close()
+    scene.clear()
+
+
+def measureInSubprocesses(interval : int, moves : int, rate : int):
+    """一个子进程没有发送完时由下一个子进程继续, 返回 (收到, 处理, 耗时)"""
+    totals = [0, 0, 0.0]
+    sent = 0
+    while sent < moves:
+        output = subprocess.run([sys.executable, __file__, "--child", str(interval), str(sent), str(moves), str(rate)],
+                                capture_output=True, text=True).stdout.split()
+        if len(output) < 4 or int(output[-1]) == 0:
+            raise RuntimeError("no mouse move sent before running out of None references")
+        received, processed, elapsed, count = output[-4:]
+        totals[0] += int(received)
+        totals[1] += int(processed)
+        totals[2] += float(elapsed)
+        sent += int(count)
+    return tuple(totals)
+
+
+def main(duration=2.0, rate=1000):
+    for name, interval in (("every event", 0), ("coalesced", 16)):
+        received, processed, elapsed = measureInSubprocesses(interval, int(duration * rate), rate)
+        # 超过预定时间的部分说明事件处理跟不上鼠标
+        print(f"{name:>12}: received {received:6d}  processed {processed:6d}  "
+              f"elapsed {elapsed:6.2f} s for {duration:.1f} s of {rate} Hz input")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 6 and sys.argv[1] == "--child":
+        child(int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5]))
+    else:
+        main()
@@ -0,0 +1,140 @@
+"""测量导航器对标注视图平移的每帧开销
+
+标注视图放大后用滚动条平移, 每次平移后立即处理重绘, 比较:
+    - 没有导航器
+    - widgets.navigator_widget.NavigatorWidget: 缩略图缩放一次后缓存, 只重绘可见区域矩形的新旧位置
+    - 直接方式: 每次平移都把原图缩放到导航器大小并重绘整个导航器
+
+PySide6 6.12 的无返回值的方法会少计 None 的引用计数, Python 3.11 及以前的解释器在减到 0 时崩溃;
+所以每种情况在子进程中测量, 子进程在 None 的引用计数接近 0 之前停止, 由下一个子进程继续.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_navigator.py
+"""
+import sys
+import time
+import logging
+import subprocess
+
+from qtpy.QtCore import Qt, QSize, QRectF
+from qtpy.QtWidgets import QApplication, QWidget, QHBoxLayout, QGraphicsPixmapItem
+from qtpy.QtGui import QPixmap, QImage, QPainter, QColor
+
+from deep_learning_tool import LOGGER
+from deep_learning_tool.widgets.label_graphics import ImageView, LabelScene
+from deep_learning_tool.widgets.navigator_widget import NavigatorWidget
+
+# 子进程在 None 的引用计数低于该值时停止测量
+NONE_REFS_RESERVE = 2000
+
+
+class FullPixmapNavigator(NavigatorWidget):
+    """每次更新都从原图缩放并重绘整个控件"""
+    def __init__(self, pixmap, parent=None) -> None:
+        super().__init__(parent)
+        self.pixmap = pixmap
+
+    def updateViewRect(self):
+        self.view_rect = self.viewRect()
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.palette().window())
+        painter.drawPixmap(self.target.topLeft(), self.pixmap.scaled(self.target.size().toSize(),
+                                                                     Qt.AspectRatioMode.IgnoreAspectRatio,
+                                                                     Qt.TransformationMode.SmoothTransformation))
+        painter.setPen(self.frame_pen)
+        painter.drawRect(self.view_rect)
+
+
+def build(app, navigator_class, image_size):
+    window = QWidget()
+    layout = QHBoxLayout(window)
+    # 场景没有父对象, 由窗口持有引用
+    window.scene = LabelScene()
+    view = ImageView(window.scene, window)
+    layout.addWidget(view, 1)
+    pixmap = QPixmap(image_size, image_size * 3 // 4)
+    pixmap.fill(QColor(90, 120, 150))
+    navigator = None
+    if navigator_class is NavigatorWidget:
+        navigator = NavigatorWidget(window)
+    elif navigator_class is not None:
+        navigator = navigator_class(pixmap, window)
+    if navigator is not None:
+        navigator.setFixedSize(256, 180)
+        layout.addWidget(navigator)
+        navigator.setView(view)
+    window.resize(1536, 960)
+    window.show()
+    app.processEvents()
+    # 视图有了最终大小后再设置图像, 图像按视图大小缩放
+    label_image = QGraphicsPixmapItem(pixmap)
+    window.scene.addItem(label_image)
+    view.setLabelImage(label_image)
+    view.scale(4, 4)
+    if navigator is not None:
+        navigator.image_path = "bench"
+        navigator.image_rect = QRectF(label_image.boundingRect())
+        overview = pixmap.toImage().scaled(QSize(512, 512), Qt.AspectRatioMode.KeepAspectRatio)
+        navigator.setOverview("bench", overview, pixmap.size())
+    return window, view, navigator
+
+
+def measure(app, view, first, frames):
+    """测量第 first 到 frames 帧, 返回 (总时间, 帧数)"""
+    for _ in range(20):
+        app.processEvents()
+    scroll_bars = (view.horizontalScrollBar(), view.verticalScrollBar())
+    count = 0
+    start = time.perf_counter()
+    for i in range(first, frames):
+        if sys.getrefcount(None) < NONE_REFS_RESERVE:
+            break
+        for scroll_bar in scroll_bars:
+            step = (i * 37) % max(scroll_bar.maximum() - scroll_bar.minimum(), 1)
+            scroll_bar.setValue(scroll_bar.minimum() + step)
+        # 每次平移后立即处理重绘
+        app.processEvents()
+        count += 1
+    return time.perf_counter() - start, count
+
+
+NAVIGATOR_CLASSES = {"none": None, "navigator": NavigatorWidget, "full": FullPixmapNavigator}
+
+
+def child(navigator_name : str, image_size : int, first : int, frames : int):
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    LOGGER.setLevel(logging.INFO)
+    window, view, navigator = build(app, NAVIGATOR_CLASSES[navigator_name], image_size)
+    print(*measure(app, view, first, frames), flush=True)
+    if navigator is not None:
+        navigator.stop()
+    window.close()
+
+
+def measureInSubprocesses(navigator_name : str, image_size : int, frames : int) -> float:
+    """每帧的平均时间, 一个子进程没有测量完时由下一个子进程继续"""
+    elapsed, done = 0.0, 0
+    while done < frames:
+        output = subprocess.run([sys.executable, __file__, "--child", navigator_name, str(image_size), str(done), str(frames)],
+                                capture_output=True, text=True).stdout.split()
+        if len(output) < 2 or int(output[-1]) == 0:
+            raise RuntimeError("no frame measured before running out of None references")
+        elapsed += float(output[-2])
+        done += int(output[-1])
+    return elapsed / frames
+
+
+def main(image_sizes=(2000, 8000), frames=200):
+    for image_size in image_sizes:
+        none, cached, full = (measureInSubprocesses(name, image_size, frames) for name in NAVIGATOR_CLASSES)
+        print(f"{image_size:>6} px  per pan frame: no navigator {none * 1000:7.2f} ms  "
+              f"navigator {cached * 1000:7.2f} ms  full pixmap navigator {full * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 6 and sys.argv[1] == "--child":
+        child(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5]))
+    else:
+        main()
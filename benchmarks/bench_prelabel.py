@@ -0,0 +1,90 @@
+"""批量预标注的吞吐量
+
+合成 N 张 jpg, 用 data.inference.StubDetector (不需要模型) 分别测量:
+    - 逐张解码再检测 (界面线程中直接处理的做法)
+    - data.inference.Prelabeler: 多进程解码并预取批次, 当前线程批量检测, 在不同解码进程数下每秒的图像数
+    - 用 Project.setProposals 把全部结果写入项目的时间
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_prelabel.py --images 2000 --workers 4
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+from qtpy.QtGui import QImage, QColor, QPainter
+
+from deep_learning_tool.data import Project
+from deep_learning_tool.data.loader import decodeInto
+from deep_learning_tool.data.inference import Prelabeler, StubDetector
+
+
+def createImages(root : str, count : int, width : int, height : int) -> list:
+    paths = []
+    for index in range(count):
+        image = QImage(width, height, QImage.Format.Format_RGB32)
+        image.fill(QColor(40, 60, 80))
+        painter = QPainter(image)
+        painter.fillRect(index % (width // 2), index % (height // 2), width // 4, height // 4, QColor(250, 250, 220))
+        painter.end()
+        path = os.path.join(root, f"{index:06d}.jpg")
+        image.save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=2000)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=960)
+    parser.add_argument("--input-size", type=int, default=640)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--commit-images", type=int, default=512)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_prelabel_")
+    try:
+        paths = createImages(root, args.images, args.width, args.height)
+        image_ids = list(range(1, len(paths) + 1))
+        detector = StubDetector("", args.input_size, {})
+        print(f"{len(paths)} jpg images of {args.width}x{args.height}, input {args.input_size}, batch {args.batch_size}")
+
+        image = np.zeros((1, args.input_size, args.input_size, 3), dtype=np.uint8)
+        start = time.perf_counter()
+        for path in paths:
+            image[:] = 0
+            decodeInto(path, image[0])
+            detector.detect(image)
+        elapsed = time.perf_counter() - start
+        print(f"sequential decode + detect     {len(paths) / elapsed:8.1f} images/s")
+
+        results = {}
+        for workers in sorted({1, args.workers}):
+            prelabeler = Prelabeler(detector, image_ids, paths, [0], args.input_size, args.batch_size, workers)
+            written = {}
+            result = prelabeler.run(0, lambda proposals, done: written.update(proposals), commit_images=args.commit_images)
+            # elapsed 包括启动解码进程
+            print(f"prelabeler, {workers} worker(s)       {result.done / result.elapsed:8.1f} images/s, "
+                  f"{result.boxes} proposals, {result.errors} errors")
+            results = written
+
+        project = Project.create(os.path.join(root, "bench.dlt"), "bench", "目标检测")
+        project.addImages(paths)
+        ids = [project.images.id(path) for path in paths]
+        proposals = {image_id : results[index + 1] for index, image_id in enumerate(ids)}
+        start = time.perf_counter()
+        project.setProposals(proposals)
+        project.flush()
+        elapsed = time.perf_counter() - start
+        print(f"setProposals + flush           {elapsed * 1000:8.1f} ms for {len(proposals)} images")
+        project.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
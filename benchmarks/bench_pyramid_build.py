@@ -0,0 +1,121 @@
+"""测量大图瓦片金字塔的生成时间和峰值内存
+
+合成一张解码后超过 Qt 默认 256 MB 分配上限的图像 (默认 9000 x 9000 RGB, 约 324 MB), 保存为 PNG 和 JPEG,
+每种情况在单独的子进程中生成金字塔并报告峰值内存:
+    - whole: 原实现, 整张解码后在内存中生成所有层级 (使用 Qt 的默认上限时读取失败, 这里放宽上限以便对比)
+    - streaming: widgets.pyramid_graphics.PyramidBuildThread, 按条带生成, JPEG 每次只解码一个条带
+
+    python benchmarks/bench_pyramid_build.py --size 9000
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from qtpy.QtCore import Qt, QSize, QCoreApplication
+from qtpy.QtGui import QImage, QImageReader, QPainter, QColor, QLinearGradient
+
+
+def createImage(path : str, size : int):
+    image = QImage(size, size, QImage.Format.Format_RGB32)
+    painter = QPainter(image)
+    gradient = QLinearGradient(0, 0, size, size)
+    gradient.setColorAt(0, QColor(200, 60, 40))
+    gradient.setColorAt(1, QColor(30, 80, 220))
+    painter.fillRect(image.rect(), gradient)
+    for x in range(0, size, 97):
+        painter.fillRect(x, 0, 9, size, QColor(20, 180, 60))
+    painter.end()
+    image.save(path, quality=90) if path.endswith(".jpg") else image.save(path)
+
+
+def buildWhole(pyramid):
+    """原实现: 整张解码, 所有层级在内存中生成后再写入"""
+    from deep_learning_tool.utils import raiseImageAllocationLimit
+    raiseImageAllocationLimit(4096)
+    images = [QImageReader(pyramid.image_path).read()]
+    if images[0].isNull():
+        return False
+    for level in range(1, pyramid.levels):
+        width, height = pyramid.levelSize(level)
+        images.append(images[-1].scaled(width, height, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation))
+    tile_size = pyramid.tile_size
+    for level in reversed(range(pyramid.levels)):
+        image = images[level]
+        os.makedirs(os.path.join(pyramid.cache_dir, str(level)), exist_ok=True)
+        cols, rows = pyramid.tileGrid(level)
+        for row in range(rows):
+            for col in range(cols):
+                image.copy(col * tile_size, row * tile_size, min(tile_size, image.width() - col * tile_size),
+                           min(tile_size, image.height() - row * tile_size)).save(pyramid.tilePath(level, col, row), "PNG")
+        open(pyramid.markerPath(level), "w").close()
+        pyramid.ready_levels.add(level)
+        images[level] = None
+    return True
+
+
+def peakMemory() -> float:
+    """当前进程的峰值内存 (MB); Linux 的 ru_maxrss 会从父进程继承, 优先使用 VmHWM"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(mode : str, image_path : str, cache_root : str):
+    from deep_learning_tool import LOGGER
+    from deep_learning_tool.widgets.pyramid_graphics import TilePyramid, PyramidBuildThread
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+    LOGGER.setLevel("WARNING")
+    size = QImageReader(image_path).size()
+    pyramid = TilePyramid(image_path, size, cache_root, 512)
+    start = time.perf_counter()
+    if mode == "whole":
+        buildWhole(pyramid)
+    else:
+        PyramidBuildThread(pyramid).run()
+    elapsed = time.perf_counter() - start
+    peak = peakMemory()
+    print(f"{elapsed:.2f} {peak:.0f} {len(pyramid.ready_levels)}/{pyramid.levels}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=9000)
+    parser.add_argument("--child", nargs=3, default=None)
+    args = parser.parse_args()
+    if args.child is not None:
+        return child(*args.child)
+
+    root = tempfile.mkdtemp(prefix="bench_pyramid_")
+    try:
+        app = QCoreApplication(sys.argv[:1])
+        print(f"{args.size} x {args.size} RGB, {args.size * args.size * 4 / 1024 / 1024:.0f} MB decoded")
+        for suffix in ("png", "jpg"):
+            image_path = os.path.join(root, f"big.{suffix}")
+            createImage(image_path, args.size)
+            # Qt 的默认上限
+            default = QImageReader(image_path).read()
+            print(f"{suffix}: default allocation limit read {'ok' if not default.isNull() else 'failed'}")
+            del default
+            for mode in ("whole", "streaming"):
+                cache_root = os.path.join(root, f"{suffix}_{mode}")
+                output = subprocess.run([sys.executable, __file__, "--child", mode, image_path, cache_root],
+                                        capture_output=True, text=True).stdout.split()
+                elapsed, peak, levels = output[-3:]
+                print(f"  {mode:10s} {float(elapsed):7.2f} s   peak RSS {float(peak):7.0f} MB   levels {levels}")
+                shutil.rmtree(cache_root, ignore_errors=True)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""比较矩形顶点 / 边距离计算的开销
+
+原实现对每个矩形的 4 个顶点调用 distance, 对 4 条边调用 distancetoline (每次新建 3 个 NumPy 数组);
+utils.geometry 对 (N, 4) 数组一次计算所有矩形.
+
+    python benchmarks/bench_rect_geometry.py
+"""
+import time
+import random
+
+import numpy as np
+
+from qtpy.QtCore import QPointF, QRectF
+
+from deep_learning_tool.utils import distance, distancetoline
+from deep_learning_tool.utils import asBoxes, nearestHandles
+
+
+def legacyHandle(rect, pos, epsilon):
+    # RectItem.nearestVertex / nearestEdge 的原实现
+    vertices = [rect.topLeft(), rect.topRight(), rect.bottomRight(), rect.bottomLeft()]
+    min_distance, vertex = float("inf"), -1
+    for i, v in enumerate(vertices):
+        dist = distance(v - pos)
+        if dist <= epsilon and dist < min_distance:
+            min_distance, vertex = dist, i
+    if vertex != -1:
+        return vertex, -1
+    min_distance, edge = float("inf"), -1
+    for i in range(len(vertices)):
+        dist = distancetoline(pos, [vertices[i - 1], vertices[i]])
+        if dist <= epsilon and dist < min_distance:
+            min_distance, edge = dist, i
+    return vertex, edge
+
+
+def timeit(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main(counts=(1, 16, 1000, 10000), epsilon=10):
+    rng = random.Random(0)
+    for count in counts:
+        rects = [QRectF(rng.uniform(0, 4000), rng.uniform(0, 4000), rng.uniform(10, 200), rng.uniform(10, 200)) for _ in range(count)]
+        boxes = asBoxes([(r.left(), r.top(), r.right(), r.bottom()) for r in rects])
+        pos = QPointF(rng.uniform(0, 4000), rng.uniform(0, 4000))
+        repeat = max(1, 20000 // count)
+
+        legacy = timeit(lambda: [legacyHandle(r, pos, epsilon) for r in rects], repeat)
+        batched = timeit(lambda: nearestHandles(boxes, pos.x(), pos.y(), epsilon), repeat)
+        # 单个矩形时包括从 QRectF 构造数组的开销, 与 RectItem.nearestHandle 相同
+        single = timeit(lambda: [nearestHandles(asBoxes((r.left(), r.top(), r.right(), r.bottom())), pos.x(), pos.y(), epsilon) for r in rects[:1]], repeat)
+
+        expected = np.array([legacyHandle(r, pos, epsilon) for r in rects]).T
+        assert (np.stack(nearestHandles(boxes, pos.x(), pos.y(), epsilon)) == expected).all()
+        print(f"{count:>8} boxes  legacy {legacy * 1e6:10.1f} us  batched {batched * 1e6:8.1f} us  x{legacy / max(batched, 1e-9):.1f}"
+              f"  (single box from QRectF {single * 1e6:.1f} us)")
+
+
+if __name__ == "__main__":
+    main()
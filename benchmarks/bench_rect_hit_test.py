@@ -0,0 +1,99 @@
+"""比较标注视图中点击检测的开销
+
+原实现用 QGraphicsView.items(pos) 查询当前位置下的所有图形项 (包括图像和十字线),
+再用数量减 2 估算矩形个数; 现在 ImageView.rectItemsAt 只查询 LabelScene.rect_index.
+
+PySide6 6.12 的无返回值的方法会少计 None 的引用计数, Python 3.11 及以前的解释器在减到 0 时崩溃;
+创建每个 RectItem 和每次查询都会少计几次, 所以每种情况在子进程中测量, 子进程在 None 的引用计数接近 0 之前停止,
+由下一个子进程继续; 创建矩形就会用完引用计数的情况显示为 n/a.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_rect_hit_test.py
+"""
+import sys
+import logging
+import time
+import random
+import subprocess
+
+from qtpy.QtCore import QRectF, QPoint
+from qtpy.QtWidgets import QApplication, QGraphicsItem, QGraphicsPixmapItem
+
+from qtpy.QtGui import QPixmap
+
+from deep_learning_tool import LOGGER
+from deep_learning_tool.widgets.label_graphics import ImageView, LabelScene, RectItem
+
+# 子进程在 None 的引用计数低于该值时停止测量
+NONE_REFS_RESERVE = 2000
+
+
+def buildView(count, image_size=8000, seed=0):
+    scene = LabelScene()
+    view = ImageView(scene)
+    view.resize(1280, 960)
+    label_image = QGraphicsPixmapItem(QPixmap(image_size, image_size))
+    scene.addItem(label_image)
+    view.setLabelImage(label_image)
+    rng = random.Random(seed)
+    for _ in range(count):
+        x = rng.uniform(0, image_size - 200)
+        y = rng.uniform(0, image_size - 200)
+        rect = RectItem(QRectF(x, y, rng.uniform(10, 200), rng.uniform(10, 200)), view.label_image)
+        rect.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable, True)
+        rect.updateIndex()
+    return scene, view
+
+
+def child(count : int, first : int, samples : int):
+    """测量第 first 到 samples 个点, 输出 (items 总时间, rectItemsAt 总时间, 点数)"""
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    LOGGER.setLevel(logging.INFO)
+    scene, view = buildView(count)
+    rng = random.Random(1)
+    points = [QPoint(rng.randrange(0, 1280), rng.randrange(0, 960)) for _ in range(samples)]
+    legacy = indexed = 0.0
+    done = 0
+    for pos in points[first:]:
+        if sys.getrefcount(None) < NONE_REFS_RESERVE:
+            break
+        start = time.perf_counter()
+        view.items(pos)
+        legacy += time.perf_counter() - start
+        start = time.perf_counter()
+        view.rectItemsAt(pos)
+        indexed += time.perf_counter() - start
+        done += 1
+    print(legacy, indexed, done, flush=True)
+
+
+def measure(count : int, samples : int):
+    """(items, rectItemsAt) 每次的平均时间, 创建矩形时用完 None 的引用计数返回 None"""
+    legacy = indexed = 0.0
+    done = 0
+    while done < samples:
+        output = subprocess.run([sys.executable, __file__, "--child", str(count), str(done), str(samples)],
+                                capture_output=True, text=True).stdout.split()
+        # 子进程输出结果后在释放图形项时也可能崩溃, 只检查输出
+        if len(output) < 3 or int(output[-1]) == 0:
+            return None
+        legacy += float(output[-3])
+        indexed += float(output[-2])
+        done += int(output[-1])
+    return legacy / samples, indexed / samples
+
+
+def main(counts=(1000, 4000, 10000), samples=2000):
+    for count in counts:
+        result = measure(count, samples)
+        if result is None:
+            print(f"{count:>8} rects  n/a (None refcount exhausted while creating items)")
+            continue
+        legacy, indexed = result
+        print(f"{count:>8} rects  items(pos) {legacy * 1e6:9.1f} us  rectItemsAt {indexed * 1e6:9.1f} us  x{legacy / max(indexed, 1e-9):.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        child(int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]))
+    else:
+        main()
@@ -0,0 +1,99 @@
+"""检查页查询的速度
+
+合成 N 张图像的项目 (每张平均 --boxes 个框), 分别测量:
+    - data.review.ReviewIndex 从项目文件建立按图像的汇总的时间
+    - 各种过滤条件的查询时间, 与直接对项目文件的 SQL 查询对比 (重叠的框没有对应的 SQL)
+    - 修改一张图像后增量更新汇总的时间
+
+    python benchmarks/bench_review_query.py --images 200000 --boxes 5
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from deep_learning_tool.data import Project
+from deep_learning_tool.data.review import ReviewIndex, ReviewQuery
+
+
+def createProject(root : str, count : int, boxes_per_image : float, class_count : int, seed : int = 0) -> Project:
+    rng = np.random.default_rng(seed)
+    project = Project.create(os.path.join(root, "bench.dlt"), "bench", "目标检测")
+    project.addImages([f"/images/{index:08d}.jpg" for index in range(count)])
+    project.flush()
+    counts = rng.poisson(boxes_per_image, size=count)
+    total = int(counts.sum())
+    xy = rng.uniform(0, 1200, size=(total, 2))
+    wh = rng.lognormal(3.5, 0.8, size=(total, 2))
+    classes = rng.integers(1, class_count + 1, size=total)
+    flags = (rng.random(total) < 0.1).astype(np.int64) * 2
+    rows = np.c_[classes, xy, xy + wh, flags].tolist()
+    image_ids = np.repeat(project.images.ids(), counts).tolist()
+    with project.store.connection:
+        project.store.connection.executemany(
+            "INSERT INTO annotations (image_id, class_id, x1, y1, x2, y2, flags) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(image_id, *row) for image_id, row in zip(image_ids, rows)])
+    return project
+
+
+def timed(function, repeat : int = 5):
+    result = function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=200000)
+    parser.add_argument("--boxes", type=float, default=5)
+    parser.add_argument("--classes", type=int, default=20)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_review_")
+    try:
+        project = createProject(root, args.images, args.boxes, args.classes)
+        print(f"{len(project.images)} images, {project.store.annotationCount()} boxes, {args.classes} classes")
+
+        start = time.perf_counter()
+        index = ReviewIndex.fromProject(project)
+        print(f"build index                      {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+        connection = project.store.connection
+        queries = [
+            ("class 3, at least 2 boxes", ReviewQuery(class_id=3, min_class_count=2),
+             ("SELECT image_id FROM annotations WHERE class_id = ? GROUP BY image_id HAVING COUNT(*) >= ?", (3, 2))),
+            ("boxes smaller than 16 px", ReviewQuery(max_box_size=16),
+             ("SELECT DISTINCT image_id FROM annotations WHERE (x2 - x1) * (y2 - y1) < ?", (16 * 16,))),
+            ("proposals", ReviewQuery(proposals=True),
+             ("SELECT DISTINCT image_id FROM annotations WHERE flags & 2 != 0", ())),
+            ("overlapping boxes, IoU >= 0.5", ReviewQuery(min_iou=0.5), None),
+            ("class 3 + small + overlapping", ReviewQuery(class_id=3, max_box_size=32, min_iou=0.1), None),
+        ]
+        for name, query, sql in queries:
+            rows, elapsed = timed(lambda: index.query(query))
+            line = f"{name:32s} {elapsed:9.2f} ms  {len(rows):8d} images"
+            if sql is not None:
+                result, sql_elapsed = timed(lambda: connection.execute(*sql).fetchall(), repeat=1)
+                assert len(result) == len(rows)
+                line += f"   sqlite {sql_elapsed:9.1f} ms"
+            print(line)
+
+        # 修改一张图像后的增量更新
+        path = project.images.pathAt(len(project.images) // 2)
+        annotations = project.annotations(path)
+        annotations.extend([[0, 0, 4, 4], [1, 1, 5, 5]], 1)
+        start = time.perf_counter()
+        index.sync(project)
+        print(f"incremental update of one image  {(time.perf_counter() - start) * 1000:9.2f} ms")
+        project.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
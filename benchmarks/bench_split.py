@@ -0,0 +1,72 @@
+"""数据集拆分的耗时和各集合中类别的比例
+
+合成 N 张图像 (类别按 Zipf 分布, 部分类别很稀有), 分别用随机、按类别分层、按组 (以及按组并分层) 拆分,
+检查相同 seed 结果相同, 并输出每个集合的图像比例和最稀有类别在各集合中的比例.
+
+    python benchmarks/bench_split.py --images 1000000
+"""
+import time
+import argparse
+
+import numpy as np
+
+from deep_learning_tool.data import split as data_split
+
+
+def syntheticDataset(count, class_count, group_size, seed=0):
+    rng = np.random.default_rng(seed)
+    # 每张图像 0~3 个框, 类别概率按 1 / (k + 1) ** 1.5 递减
+    probability = 1 / np.arange(1, class_count + 1) ** 1.5
+    probability /= probability.sum()
+    histograms = np.zeros((count, class_count), dtype=np.int32)
+    for _ in range(3):
+        has_box = rng.random(count) < 0.6
+        classes = rng.choice(class_count, size=count, p=probability)
+        rows = np.flatnonzero(has_box)
+        np.add.at(histograms, (rows, classes[rows]), 1)
+    groups = rng.integers(0, max(1, count // group_size), size=count)
+    return histograms, groups
+
+
+def timeit(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=1_000_000)
+    parser.add_argument("--classes", type=int, default=20)
+    parser.add_argument("--group-size", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    ratios = (70, 20, 10)
+    histograms, groups = syntheticDataset(args.images, args.classes, args.group_size)
+    rare = int(np.argmin((histograms > 0).sum(axis=0)))
+    print(f"{args.images} images, {args.classes} classes, {len(np.unique(groups))} groups, "
+          f"rarest class {rare} in {(histograms[:, rare] > 0).sum()} images")
+
+    cases = (
+        ("random", lambda seed: data_split.randomSplit(args.images, ratios, seed)),
+        ("stratified", lambda seed: data_split.stratifiedSplit(histograms, ratios, seed)),
+        ("group", lambda seed: data_split.groupSplit(groups, ratios, seed)),
+        ("group+stratified", lambda seed: data_split.groupSplit(groups, ratios, seed, histograms)),
+    )
+    rare_images = histograms[:, rare] > 0
+    for name, func in cases:
+        elapsed, splits = timeit(lambda: func(0), args.repeat)
+        assert (func(0) == splits).all(), f"{name} is not deterministic"
+        assert (func(1) != splits).any(), f"{name} ignores seed"
+        counts = data_split.splitCounts(splits)[data_split.TRAIN:] / len(splits)
+        rare_counts = data_split.splitCounts(splits[rare_images])[data_split.TRAIN:] / max(rare_images.sum(), 1)
+        print(f"{name:>18}  {elapsed * 1000:8.1f} ms  images {np.round(counts * 100, 2).tolist()} %"
+              f"  rarest class {np.round(rare_counts * 100, 2).tolist()} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""启动导入时间的回归测试
+
+用 deep_learning_tool.profiling 在子进程中启动程序, 检查启动时没有导入只在部分功能中使用的重量级模块
+(NumPy 等), 并且从进程开始到第一次绘制不超过预算. 超出时返回非 0, 可以在 CI 中运行.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_startup_imports.py [--budget-ms 1500]
+"""
+import os
+import sys
+import argparse
+import tempfile
+
+from deep_learning_tool import profiling
+
+# 启动时不应导入的模块, 打开标注页、拆分和导出等功能时才需要
+LAZY_MODULES = ("numpy",)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget-ms", type=float, default=1500, help="进程开始到第一次绘制的预算")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as folder:
+        project_path = os.path.join(folder, "bench.dlt")
+        first_paints = []
+        for _ in range(args.repeat):
+            records, phases = profiling.profileStartup(project_path)
+            phases = dict(phases)
+            first_paints.append(phases["first paint"])
+            package = sum(record.self_us for record in records if record.module.split(".")[0] == "deep_learning_tool")
+            print(f"imports {len(records):4d} modules {sum(record.self_us for record in records) / 1000:7.1f} ms"
+                  f"  (deep_learning_tool {package / 1000:5.1f} ms)  import app {phases['import app'] - phases['QApplication']:6.1f} ms"
+                  f"  first paint {phases['first paint']:7.1f} ms")
+    loaded = sorted({record.module for record in records if record.module.split(".")[0] in LAZY_MODULES})
+    if loaded:
+        failures.append(f"imported at startup: {', '.join(loaded[:5])}{' ...' if len(loaded) > 5 else ''}")
+    best = min(first_paints)
+    if best > args.budget_ms:
+        failures.append(f"first paint {best:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+    for failure in failures:
+        print("FAIL:", failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""测量主窗口从创建到第一次绘制的时间
+
+MainWindow 的标签页在第一次切换到时才创建, 启动时只创建当前的图库页, 标注页 (及其停靠窗口、
+标注视图和瓦片金字塔模块) 等其余页面都不创建. 这里比较启动时创建全部标签页和按需创建的耗时,
+每种方式在独立的进程中运行, 以包括模块导入的时间.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_startup_tabs.py
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+import subprocess
+
+
+def run(eager : bool, project_path : str):
+    start = time.perf_counter()
+    from qtpy.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    from deep_learning_tool import LOGGER
+    LOGGER.setLevel(logging.INFO)
+    from deep_learning_tool.app import MainWindow
+    imported = time.perf_counter()
+    win = MainWindow(project_path)
+    if eager:
+        # 原实现在构造函数中创建所有页面
+        for name in win.tab_names:
+            win.page(name)
+    created = time.perf_counter()
+    win.show()
+    # grab 会立即完成一次绘制
+    win.grab()
+    painted = time.perf_counter()
+    modules = sum(1 for name in sys.modules if name.startswith("deep_learning_tool"))
+    print(f"{'eager' if eager else 'lazy':>6}: import {(imported - start) * 1000:7.1f} ms  construct {(created - imported) * 1000:7.1f} ms"
+          f"  first paint {(painted - start) * 1000:7.1f} ms  tabs created {len(win.tab_pages)}  package modules {modules}")
+    win.close()
+    app.processEvents()
+
+
+def main(repeat=3):
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (root, env.get("PYTHONPATH"))))
+    with tempfile.TemporaryDirectory() as folder:
+        project_path = os.path.join(folder, "bench.dlt")
+        for _ in range(repeat):
+            for mode in ("eager", "lazy"):
+                subprocess.run([sys.executable, __file__, mode, project_path], env=env, check=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        run(sys.argv[1] == "eager", sys.argv[2])
+        sys.stdout.flush()
+        os._exit(0)
+    main()
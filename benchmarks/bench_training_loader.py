@@ -0,0 +1,99 @@
+"""训练数据管线的吞吐量
+
+合成 N 张 jpg, 分别测量:
+    - data.loader.SharedBatchLoader (多进程解码, 共享内存传递批次) 在不同解码进程数下每秒的图像数
+    - 同样的进程数用 multiprocessing.Pool 解码并通过 pickle 返回批次的速度, 作为对照
+    - 用 data.training.LinearTrainer 训练时等待数据的比例
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_training_loader.py --images 2000 --workers 4
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+
+import numpy as np
+from qtpy.QtGui import QImage, QColor, QPainter
+
+from deep_learning_tool.data.loader import SharedBatchLoader, decodeInto
+from deep_learning_tool.data.training import LinearTrainer
+
+
+def createImages(root : str, count : int, width : int, height : int) -> list:
+    paths = []
+    for index in range(count):
+        image = QImage(width, height, QImage.Format.Format_RGB32)
+        image.fill(QColor(index * 7 % 255, 120, 200))
+        painter = QPainter(image)
+        painter.fillRect(index % (width // 2), index % (height // 2), width // 4, height // 4, QColor(250, 250, 20))
+        painter.end()
+        path = os.path.join(root, f"{index:06d}.jpg")
+        image.save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def _decodeBatch(args):
+    paths, image_size = args
+    images = np.zeros((len(paths), image_size, image_size, 3), dtype=np.uint8)
+    for row, path in enumerate(paths):
+        decodeInto(path, images[row])
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=2000)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=960)
+    parser.add_argument("--image-size", type=int, default=320)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--prefetch", type=int, default=4)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_training_")
+    try:
+        paths = createImages(root, args.images, args.width, args.height)
+        boxes = [[(index % 3, 10, 10, 200, 200)] for index in range(len(paths))]
+        print(f"{len(paths)} jpg images of {args.width}x{args.height}, decoded to {args.image_size}, batch {args.batch_size}")
+
+        for workers in sorted({1, args.workers}):
+            loader = SharedBatchLoader(paths, boxes, args.image_size, args.batch_size, workers, args.prefetch)
+            try:
+                # 第一轮包括启动解码进程, 测量第二轮
+                for _ in loader.epoch(0):
+                    pass
+                start = time.perf_counter()
+                for _ in loader.epoch(1):
+                    pass
+                elapsed = time.perf_counter() - start
+                print(f"shared memory, {workers} worker(s)   {len(paths) / elapsed:8.1f} images/s")
+
+                trainer = LinearTrainer(3, args.image_size, {})
+                stall = loader.stall_seconds
+                start = time.perf_counter()
+                for batch in loader.epoch(2):
+                    trainer.step(batch.images, batch.targets, batch.counts)
+                elapsed = time.perf_counter() - start
+                print(f"  + linear trainer            {len(paths) / elapsed:8.1f} images/s, "
+                      f"waiting for data {(loader.stall_seconds - stall) / elapsed * 100:5.1f}%")
+            finally:
+                loader.close()
+
+            batches = [(paths[i:i + args.batch_size], args.image_size) for i in range(0, len(paths), args.batch_size)]
+            with multiprocessing.get_context("spawn").Pool(workers) as pool:
+                list(pool.imap(_decodeBatch, batches[:workers]))
+                start = time.perf_counter()
+                for _ in pool.imap(_decodeBatch, batches):
+                    pass
+                elapsed = time.perf_counter() - start
+            print(f"pickled batches, {workers} worker(s) {len(paths) / elapsed:8.1f} images/s")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
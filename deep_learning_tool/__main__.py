@@ -1,16 +1,38 @@
 import sys
+import argparse
 
-from qtpy import QtWidgets
-from .app import MainWindow
 from deep_learning_tool import __appname__, __version__, LOGGER
+from deep_learning_tool import configs
+from deep_learning_tool.logger import setLogLevel
 
 
 def main():
-    LOGGER.info(f"welcome to {__appname__}")
-    app = QtWidgets.QApplication(sys.argv)
+    parser = argparse.ArgumentParser(prog="deep_learning_tool")
+    parser.add_argument("project", nargs="?", default=None, help="项目文件, 不存在时创建")
+    parser.add_argument("--log-level", default=None, help="日志级别 (debug, info, warning, error)")
+    parser.add_argument("--log-file", default=configs.log_file, help="日志文件, 为空时只输出到控制台")
+    parser.add_argument("--profile-startup", action="store_true", help="显示每个模块的导入时间和启动到显示主窗口的时间后退出")
+    args, qt_args = parser.parse_known_args()
+
+    if args.log_level is not None:
+        setLogLevel(args.log_level)
+    if args.profile_startup:
+        from deep_learning_tool import profiling
+        sys.exit(profiling.main(args.project))
+
+    # 解析参数后再导入 Qt 和主窗口
+    from qtpy import QtWidgets
+    from .app import MainWindow
+    from .utils import raiseImageAllocationLimit
+
+    if args.log_file:
+        LOGGER.setLogFile(args.log_file)
+    LOGGER.info("welcome to %s", __appname__)
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
     app.setApplicationName(__appname__)
     app.setApplicationVersion(__version__)
-    win = MainWindow()
+    raiseImageAllocationLimit(configs.image_allocation_limit)
+    win = MainWindow(args.project)
 
     win.show()
     win.raise_()
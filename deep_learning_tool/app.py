@@ -1,23 +1,38 @@
+import os
+import time
+import typing
 import functools
 
-from qtpy.QtCore import Qt
+from qtpy.QtCore import Qt, QTimer
 from qtpy.QtCore import Signal, Slot
 from qtpy.QtWidgets import QMainWindow, QWidget, QTabWidget, QToolBar, QAction
 from qtpy.QtWidgets import QGridLayout
 
 from deep_learning_tool import __appname__
 from deep_learning_tool import LOGGER
+from deep_learning_tool import configs
 from deep_learning_tool import utils
 # from deep_learning_tool.widgets import ToolBar
-from deep_learning_tool.widgets import GalleryWindow, LabelWindow
 from deep_learning_tool.data import Project
 
 class MainWindow(QMainWindow):
-    def __init__(self, parent: QWidget | None = None, flags: Qt.WindowFlags | Qt.WindowType = Qt.WindowType.Window) -> None:
+    # 任意页面修改了图像所在的集合, 已创建的页面据此更新
+    splitsChanged = Signal()
+    # 这些图像 id 的标注被其他页面修改, 标注页据此刷新
+    annotationsChanged = Signal(list)
+
+    def __init__(self, project_path : str | None = None, parent: QWidget | None = None, flags: Qt.WindowFlags | Qt.WindowType = Qt.WindowType.Window) -> None:
         super().__init__()
         self.resize(1600, 1000)
 
-        self.project = Project("示例项目", "目标检测")
+        if project_path is None:
+            project_path = configs.default_project_path
+            os.makedirs(os.path.dirname(project_path), exist_ok=True)
+        project_name = os.path.splitext(os.path.basename(project_path))[0]
+        self.project = Project.create(project_path, project_name, "目标检测")
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.timeout.connect(self.project.flush)
+        self.autosave_timer.start(configs.autosave_interval)
 
         self.tab_widget = QTabWidget(self)
         self.tab_widget.tabBar().hide()
@@ -25,29 +40,20 @@ class MainWindow(QMainWindow):
         layout = QGridLayout()
         layout.setContentsMargins(0,0,0,0)
         self.tab_widget.setLayout(layout)
-        
-        self.project_window = QWidget(self)
-        self.gallery_window = GalleryWindow(self)
-        self.gallery_window.setProject(self.project)
-        self.label_window = LabelWindow(self)
-        self.label_window.setProject(self.project)
-        self.review_window = QWidget(self)
-        self.split_window = QWidget(self)
-        self.training_window = QWidget(self)
-        self.evaluation_window = QWidget(self)
-        self.export_window = QWidget(self)
-
-
-        self.gallery_window.galleryItemDoubleClicked.connect(self.setLabelImage)
-
-        self.tab_widget.addTab(self.project_window, '项目')
-        self.tab_widget.addTab(self.gallery_window, '图库')
-        self.tab_widget.addTab(self.label_window, '标注')
-        self.tab_widget.addTab(self.review_window, '检查')
-        self.tab_widget.addTab(self.split_window, '拆分')
-        self.tab_widget.addTab(self.training_window, '训练')
-        self.tab_widget.addTab(self.evaluation_window, '评估')
-        self.tab_widget.addTab(self.export_window, '导出')
+
+        # 标签页在第一次切换到时才由工厂函数创建, 之前只占用一个空的 QWidget
+        self.tab_names = []
+        self.tab_titles = {}
+        self.tab_factories = {}
+        self.tab_pages = {}
+        self.registerTab("project", "项目", self.createProjectWindow)
+        self.registerTab("gallery", "图库", self.createGalleryWindow)
+        self.registerTab("label", "标注", self.createLabelWindow)
+        self.registerTab("review", "检查", self.createReviewWindow)
+        self.registerTab("split", "拆分", self.createSplitWindow)
+        self.registerTab("training", "训练", self.createTrainingWindow)
+        self.registerTab("evaluation", "评估", self.createEvaluationWindow)
+        self.registerTab("export", "导出", self.createExportWindow)
 
         self.actions = utils.struct(
             menu=(),
@@ -57,18 +63,28 @@ class MainWindow(QMainWindow):
         self.tools = self.toolbar("工具")
         self.createTools()
 
-        self.setCurrentTab(self.gallery_window, self.actions.tools[1])
+        self.setCurrentTab("gallery")
+
+        LOGGER.debug("%d", self.tab_widget.currentIndex())
+
+    def closeEvent(self, event) -> None:
+        self.autosave_timer.stop()
+        self.project.close()
+        return super().closeEvent(event)
 
-        LOGGER.debug(f"{self.tab_widget.currentIndex()}")
+    @property
+    def gallery_window(self):
+        return self.page("gallery")
+
+    @property
+    def label_window(self):
+        return self.page("label")
 
     @Slot(str)
     def setLabelImage(self, image_path):
         # 要先切换widget显示，后面的view的fitInView才正常
-        self.setCurrentTab(self.label_window, self.actions.tools[2])
-        if self.label_window.label_image is None:
-            self.label_window.initLabelImage()
-        else:
-            self.label_window.setLabelImage(image_path)
+        self.setCurrentTab("label")
+        self.label_window.setLabelImage(image_path)
 
     def toolbar(self, title, actions=None):
         toolbar = QToolBar(title, self)
@@ -78,112 +94,123 @@ class MainWindow(QMainWindow):
         self.addToolBar(Qt.ToolBarArea.TopToolBarArea, toolbar)
         return toolbar
 
-    
+
     def createTools(self):
         action = functools.partial(utils.newAction, self)
-        project = action(
-            self.tr("项目"),
-            lambda: self.setCurrentTab(self.project_window, project),
-            shortcut=None,
-            icon=None,
-            tip=None,
-            enabled=True,
-            checkable=True,
-        )
-
-        gallery = action(
-            self.tr("图库"),
-            lambda: self.setCurrentTab(self.gallery_window, gallery),
-            shortcut=None,
-            icon=None,
-            tip=None,
-            enabled=True,
-            checkable=True,
-        )
-
-        label = action(
-            self.tr("标注"),
-            lambda: self.setCurrentTab(self.label_window, label),
-            shortcut=None,
-            icon=None,
-            tip=None,
-            enabled=True,
-            checkable=True,
-        )
-
-        review = action(
-            self.tr("检查"),
-            lambda: self.setCurrentTab(self.review_window, review),
-            shortcut=None,
-            icon=None,
-            tip=None,
-            enabled=True,
-            checkable=True,
-        )
-
-        split = action(
-            self.tr("拆分"),
-            lambda: self.setCurrentTab(self.split_window, split),
-            shortcut=None,
-            icon=None,
-            tip=None,
-            enabled=True,
-            checkable=True,
-        )
-
-        training = action(
-            self.tr("训练"),
-            lambda: self.setCurrentTab(self.training_window, training),
-            shortcut=None,
-            icon=None,
-            tip=None,
-            enabled=True,
-            checkable=True,
-        )
-
-        evaluation = action(
-            self.tr("评估"),
-            lambda: self.setCurrentTab(self.evaluation_window, evaluation),
-            shortcut=None,
-            icon=None,
-            tip=None,
-            enabled=True,
-            checkable=True,
-        )
-
-        export = action(
-            self.tr("导出"),
-            lambda: self.setCurrentTab(self.export_window, export),
-            shortcut=None,
-            icon=None,
-            tip=None,
-            enabled=True,
-            checkable=True,
-        )
-
-
-        self.actions.tools = (
-            project,
-            gallery,
-            label,
-            review,
-            split,
-            training,
-            evaluation,
-            export,
-        )
+        tools = []
+        for name in self.tab_names:
+            tools.append(action(
+                self.tr(self.tab_titles[name]),
+                lambda checked=False, name=name: self.setCurrentTab(name),
+                shortcut=None,
+                icon=None,
+                tip=None,
+                enabled=True,
+                checkable=True,
+            ))
+        self.actions.tools = tuple(tools)
 
         self.tools.addActions(self.actions.tools)
 
-    
-    def setCurrentTab(self, widget : QWidget, action : QAction = None):
-        LOGGER.debug(f"set tab {widget.__class__}")
+
+    def registerTab(self, name : str, title : str, factory : typing.Callable[[], QWidget]):
+        """注册一个标签页, factory 在第一次切换到该页时调用并返回页面
+        """
+        self.tab_names.append(name)
+        self.tab_titles[name] = title
+        self.tab_factories[name] = factory
+        self.tab_widget.addTab(QWidget(self), title)
+
+    def isTabCreated(self, name : str) -> bool:
+        return name in self.tab_pages
+
+    def page(self, name : str) -> QWidget:
+        """标签页, 还没有创建时创建并替换占位的 QWidget
+        """
+        widget = self.tab_pages.get(name)
+        if widget is None:
+            start = time.perf_counter()
+            widget = self.tab_factories[name]()
+            self.tab_pages[name] = widget
+            index = self.tab_names.index(name)
+            current = self.tab_widget.currentIndex()
+            placeholder = self.tab_widget.widget(index)
+            self.tab_widget.blockSignals(True)
+            self.tab_widget.removeTab(index)
+            self.tab_widget.insertTab(index, widget, self.tab_titles[name])
+            self.tab_widget.setCurrentIndex(current)
+            self.tab_widget.blockSignals(False)
+            placeholder.deleteLater()
+            LOGGER.debug("create tab %s in %.1f ms", name, (time.perf_counter() - start) * 1000)
+        return widget
+
+    def setCurrentTab(self, name : str):
+        LOGGER.debug("set tab %s", name)
+        widget = self.page(name)
         index = self.tab_widget.indexOf(widget)
         if index != self.tab_widget.currentIndex():
             self.tab_widget.setCurrentIndex(index)
-        if action != None:
+        action = self.actions.tools[self.tab_names.index(name)] if self.actions.tools else None
+        if action is not None:
             for tool in self.actions.tools:
                 if tool != action:
                     tool.setChecked(False)
             if not action.isChecked():
                 action.setChecked(True)
+
+
+    # 标签页工厂, 较重的页面在这里才导入对应的模块
+    def createProjectWindow(self) -> QWidget:
+        return QWidget(self)
+
+    def createGalleryWindow(self) -> QWidget:
+        from deep_learning_tool.widgets.gallery_window import GalleryWindow
+        gallery_window = GalleryWindow(self)
+        gallery_window.setProject(self.project)
+        gallery_window.galleryItemDoubleClicked.connect(self.setLabelImage)
+        gallery_window.proposalsWritten.connect(self.annotationsChanged)
+        self.splitsChanged.connect(gallery_window.refreshSplits)
+        return gallery_window
+
+    def createLabelWindow(self) -> QWidget:
+        from deep_learning_tool.widgets.label_window import LabelWindow
+        label_window = LabelWindow(self)
+        label_window.setProject(self.project)
+        label_window.splitsChanged.connect(self.splitsChanged)
+        self.splitsChanged.connect(label_window.refreshSplits)
+        self.annotationsChanged.connect(label_window.refreshAnnotations)
+        return label_window
+
+    def createReviewWindow(self) -> QWidget:
+        from deep_learning_tool.widgets.review_window import ReviewWindow
+        review_window = ReviewWindow(self)
+        review_window.setProject(self.project)
+        review_window.reviewItemDoubleClicked.connect(self.setLabelImage)
+        self.annotationsChanged.connect(review_window.invalidate)
+        return review_window
+
+    def createSplitWindow(self) -> QWidget:
+        from deep_learning_tool.widgets.split_window import SplitWindow
+        split_window = SplitWindow(self)
+        split_window.setProject(self.project)
+        split_window.splitsChanged.connect(self.splitsChanged)
+        self.splitsChanged.connect(split_window.updateSummary)
+        return split_window
+
+    def createTrainingWindow(self) -> QWidget:
+        from deep_learning_tool.widgets.training_window import TrainingWindow
+        training_window = TrainingWindow(self)
+        training_window.setProject(self.project)
+        return training_window
+
+    def createEvaluationWindow(self) -> QWidget:
+        from deep_learning_tool.widgets.evaluation_window import EvaluationWindow
+        evaluation_window = EvaluationWindow(self)
+        evaluation_window.setProject(self.project)
+        return evaluation_window
+
+    def createExportWindow(self) -> QWidget:
+        from deep_learning_tool.widgets.export_window import ExportWindow
+        export_window = ExportWindow(self)
+        export_window.setProject(self.project)
+        return export_window
@@ -1 +1,117 @@
+import os
+
 image_suffixs_filter = "Image Files (*.png *.jpg *.bmp *.jpeg)"
+image_suffixs = (".png", ".jpg", ".bmp", ".jpeg")
+
+# 缩略图
+thumbnail_size = 512
+thumbnail_cache_root = os.path.join(os.path.expanduser("~"), ".deep_learning_tool", "thumbnails")
+thumbnail_cache_max_bytes = 2 * 1024 * 1024 * 1024
+
+# 图库
+gallery_virtualized = True
+# 虚拟图库在内存中保留的缩略图数量
+gallery_max_thumbnails = 512
+
+# 大图瓦片金字塔
+# 像素数不小于该值的图像使用瓦片金字塔显示
+tiled_image_min_pixels = 4096 * 4096
+pyramid_tile_size = 512
+pyramid_cache_root = os.path.join(os.path.expanduser("~"), ".deep_learning_tool", "pyramids")
+# 内存中瓦片 LRU 缓存的大小
+tile_cache_max_bytes = 512 * 1024 * 1024
+# 生成金字塔时每次读取的原图条带的大小上限
+pyramid_band_bytes = 64 * 1024 * 1024
+# 解码图像的内存上限 (MB), Qt 6 默认 256 MB, 16k x 16k 的 RGB 图像解码后为 1 GB; 0 表示不限制
+image_allocation_limit = 4096
+
+# 标注时预读前后的图像
+label_prefetch_next = 3
+label_prefetch_prev = 1
+label_prefetch_max_bytes = 1024 * 1024 * 1024
+
+# 标注视图中未选中的矩形由一个图形项批量绘制, 只有选中或鼠标悬停的矩形创建 RectItem
+label_batch_render = True
+# 合并鼠标移动事件, 每个间隔 (毫秒, 约一帧) 只处理最后一次移动; 0 表示不合并
+label_mouse_move_interval = 16
+# 导航器的高度
+navigator_height = 180
+
+# 拆分: 训练、验证、测试的默认比例 (%) 和随机种子
+split_ratios = (70, 20, 10)
+split_seed = 0
+# 按组拆分时从文件名提取组名 (例如产品序列号) 的默认正则表达式, 使用第一个捕获组
+split_group_pattern = r"^([^_]+)_"
+
+# 导出
+# coco / yolo / voc
+export_format = "coco"
+# copy / hardlink / none, 硬链接失败时 (例如跨文件系统) 改为复制
+export_image_mode = "hardlink"
+export_root = os.path.join(os.path.expanduser("~"), ".deep_learning_tool", "exports")
+# 复制图像和写标注文件的线程数
+export_workers = min(32, (os.cpu_count() or 1) + 4)
+# 每导出多少张图像写一次检查点并更新进度
+export_batch_size = 512
+
+# 评估
+# 计算图像块的进程数, 1 表示在评估线程中计算
+evaluation_workers = os.cpu_count() or 1
+# 每张图像只使用分数最高的检测框
+evaluation_max_detections = 100
+# 混淆矩阵的 IoU 阈值和分数阈值
+evaluation_confusion_iou = 0.5
+evaluation_confusion_score = 0.25
+# 每块的图像数, 也是进度更新的粒度
+evaluation_chunk_images = 2048
+
+# 训练
+# data.training.TRAINERS 中的名称或 "模块:类名"
+training_trainer = "linear"
+training_root = os.path.join(os.path.expanduser("~"), ".deep_learning_tool", "training")
+training_epochs = 10
+training_batch_size = 32
+# 图像按长边缩放到该尺寸
+training_image_size = 320
+training_learning_rate = 0.01
+# 解码进程数和共享内存中预取的批次数
+training_workers = max(1, (os.cpu_count() or 1) - 1)
+training_prefetch = 4
+# 训练指标发送到界面的间隔 (秒)
+training_metrics_interval = 0.5
+
+# 预标注
+# data.inference.DETECTORS 中的名称或 "模块:类名"
+prelabel_detector = "onnx"
+prelabel_model_path = ""
+# 模型的输入尺寸, 图像按长边缩放到该尺寸
+prelabel_input_size = 640
+prelabel_batch_size = 8
+# 解码进程数和共享内存中预取的批次数
+prelabel_workers = max(1, (os.cpu_count() or 1) - 1)
+prelabel_prefetch = 4
+prelabel_score_threshold = 0.25
+prelabel_max_detections = 100
+# 每处理多少张图像写入一次项目并保存检查点
+prelabel_commit_images = 512
+
+# 检查
+# "框小于 N px" 的默认 N, 即面积小于 N * N
+review_small_box_size = 16
+# "重叠的框" 的默认 IoU 阈值
+review_overlap_iou = 0.5
+
+# 导入目录时每批加入项目的图像数量
+import_batch_size = 1024
+
+# 日志
+# 默认级别, 环境变量 DEEP_LEARNING_TOOL_LOG_LEVEL 或命令行 --log-level 可以修改
+log_level = "INFO"
+log_file = os.path.join(os.path.expanduser("~"), ".deep_learning_tool", "logs", "deep_learning_tool.log")
+log_file_max_bytes = 10 * 1024 * 1024
+log_file_backup_count = 3
+
+# 项目
+default_project_path = os.path.join(os.path.expanduser("~"), ".deep_learning_tool", "示例项目.dlt")
+# 自动保存间隔 (毫秒)
+autosave_interval = 5000
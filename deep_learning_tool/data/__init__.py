@@ -1 +1,21 @@
-from .project import Project
\ No newline at end of file
+from .project import Project
+from .thumbnail_cache import ThumbnailCache
+from .image_registry import ImageRegistry
+from .project_store import ProjectStore
+from .spatial_index import GridIndex
+
+# 依赖 NumPy 的模块在第一次使用时才导入
+_LAZY_IMPORTS = {
+    "AnnotationSet" : ".annotations",
+    "AnnotationDiff" : ".annotations",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        import importlib
+        module = importlib.import_module(_LAZY_IMPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
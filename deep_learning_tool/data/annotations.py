@@ -0,0 +1,300 @@
+import typing
+from collections import namedtuple
+
+import numpy as np
+
+
+class AnnotationDiff(namedtuple("AnnotationDiff", ["removed", "added"])):
+    """一次修改删除和添加的行, 每一项是 列名 -> NumPy 数组 (包括 id 列)
+
+    修改已有的框记录为删除旧行并添加 id 相同的新行, 撤销时交换 removed 和 added 即可.
+    """
+    def inverted(self) -> "AnnotationDiff":
+        return AnnotationDiff(self.added, self.removed)
+
+    def isEmpty(self) -> bool:
+        return len(self.removed["id"]) == 0 and len(self.added["id"]) == 0
+
+    def removedIds(self) -> np.ndarray:
+        return self.removed["id"]
+
+    def addedIds(self) -> np.ndarray:
+        return self.added["id"]
+
+
+class AnnotationSet(object):
+    """一张图像的矩形框标注, 按列 (struct of arrays) 保存
+
+    每个框有一个在该图像中不会改变的 id, 行按 id 升序排列. 所有修改都以 AnnotationDiff 的形式应用并记录到撤销栈,
+    缩放、裁剪到图像范围、按类别过滤等批量操作都是对整列的 NumPy 运算.
+    """
+    COLUMNS = {
+        "id": np.int64,
+        "x1": np.float64,
+        "y1": np.float64,
+        "x2": np.float64,
+        "y2": np.float64,
+        "class_id": np.int32,
+        "flags": np.uint8,
+    }
+    BOX_COLUMNS = ("x1", "y1", "x2", "y2")
+
+    # flags
+    DIFFICULT = 1
+    # 模型生成的候选框, 尚未人工确认
+    PROPOSAL = 2
+
+    def __init__(self, image_id : int = -1, max_history : int = 100) -> None:
+        self.image_id = image_id
+        self.max_history = max_history
+        self._columns = {name : np.empty(0, dtype) for name, dtype in self.COLUMNS.items()}
+        self._next_id = 0
+        self._undo_stack = []
+        self._redo_stack = []
+        # 上次保存后是否有修改
+        self.dirty = False
+        # 每次修改加 1, 用于判断缓存是否过期
+        self.version = 0
+
+    @classmethod
+    def fromRows(cls, rows, image_id : int = -1) -> "AnnotationSet":
+        """从 ProjectStore.loadAnnotations 的行 (class_id, x1, y1, x2, y2, flags) 创建, 不记录撤销
+        """
+        annotations = cls(image_id)
+        if len(rows) > 0:
+            data = np.asarray(rows, dtype=np.float64).reshape(-1, 6)
+            annotations._insert(annotations._newRows(data[:, 1:5], data[:, 0], data[:, 5]))
+        return annotations
+
+    def toRows(self) -> list:
+        """转换为 ProjectStore.saveAnnotations 的行 (class_id, x1, y1, x2, y2, flags)
+        """
+        columns = self._columns
+        return list(zip(columns["class_id"].tolist(), columns["x1"].tolist(), columns["y1"].tolist(),
+                        columns["x2"].tolist(), columns["y2"].tolist(), columns["flags"].tolist()))
+
+    def __len__(self):
+        return len(self._columns["id"])
+
+    def column(self, name : str) -> np.ndarray:
+        """只读的列
+        """
+        data = self._columns[name].view()
+        data.flags.writeable = False
+        return data
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.column("id")
+
+    def boxes(self, rows=None) -> np.ndarray:
+        """(N, 4) 的 x1, y1, x2, y2, 可直接用于 utils.geometry
+        """
+        boxes = np.stack([self._columns[name] for name in self.BOX_COLUMNS], axis=1)
+        return boxes if rows is None else boxes[rows]
+
+    def rowsOf(self, ids) -> np.ndarray:
+        """id 对应的行号, 不存在的 id 为 -1
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        data = self._columns["id"]
+        rows = np.searchsorted(data, ids)
+        found = np.zeros(len(ids), dtype=bool)
+        valid = rows < len(data)
+        found[valid] = data[rows[valid]] == ids[valid]
+        return np.where(found, rows, -1)
+
+    def row(self, annotation_id : int) -> int:
+        return int(self.rowsOf(annotation_id)[0])
+
+    def box(self, annotation_id : int) -> typing.Optional[typing.Tuple[float, float, float, float]]:
+        row = self.row(annotation_id)
+        if row < 0:
+            return None
+        return tuple(float(self._columns[name][row]) for name in self.BOX_COLUMNS)
+
+    def classMask(self, class_ids) -> np.ndarray:
+        return np.isin(self._columns["class_id"], np.asarray(class_ids).reshape(-1))
+
+    def filterByClass(self, class_ids) -> "AnnotationSet":
+        """只包含指定类别的副本 (id 不变), 不修改当前标注
+        """
+        annotations = AnnotationSet(self.image_id)
+        annotations._insert(self._take(self.classMask(class_ids)))
+        annotations._next_id = self._next_id
+        return annotations
+
+    def classHistogram(self, class_count : int = 0) -> np.ndarray:
+        return np.bincount(self._columns["class_id"], minlength=class_count)
+
+    # 修改
+    def add(self, box, class_id : int = 0, flags : int = 0) -> int:
+        return int(self.extend([box], class_id, flags)[0])
+
+    def extend(self, boxes, class_ids=0, flags=0) -> np.ndarray:
+        """批量添加框
+
+        Returns:
+            np.ndarray: 新框的 id
+        """
+        added = self._newRows(np.asarray(boxes, dtype=np.float64).reshape(-1, 4), class_ids, flags)
+        self.apply(AnnotationDiff(self._emptyRows(), added))
+        return added["id"]
+
+    def update(self, ids, boxes=None, class_ids=None, flags=None) -> AnnotationDiff:
+        """修改已有的框, 未给出的列保持不变, 值没有变化的行不记录
+        """
+        rows = self.rowsOf(ids)
+        valid = rows >= 0
+
+        def pick(values, ndim):
+            # 每行一个值时去掉不存在的 id 对应的值, 否则广播到所有行
+            values = np.asarray(values)
+            if values.ndim == ndim and len(values) == len(valid):
+                return values[valid]
+            return values
+
+        rows = rows[valid]
+        before = self._take(rows)
+        after = {name : data.copy() for name, data in before.items()}
+        if boxes is not None:
+            boxes = pick(np.asarray(boxes, dtype=np.float64).reshape(-1, 4), 2)
+            for i, name in enumerate(self.BOX_COLUMNS):
+                after[name][:] = boxes[:, i]
+        if class_ids is not None:
+            after["class_id"][:] = pick(class_ids, 1)
+        if flags is not None:
+            after["flags"][:] = pick(flags, 1)
+        changed = np.zeros(len(rows), dtype=bool)
+        for name in self.COLUMNS:
+            changed |= before[name] != after[name]
+        diff = AnnotationDiff(self._select(before, changed), self._select(after, changed))
+        self.apply(diff)
+        return diff
+
+    def remove(self, ids) -> AnnotationDiff:
+        rows = self.rowsOf(ids)
+        diff = AnnotationDiff(self._take(rows[rows >= 0]), self._emptyRows())
+        self.apply(diff)
+        return diff
+
+    def replaceProposals(self, boxes, class_ids=0) -> AnnotationDiff:
+        """把所有候选框替换为新的候选框, 作为一个撤销步骤
+        """
+        proposal = (self._columns["flags"] & self.PROPOSAL) != 0
+        added = self._newRows(np.asarray(boxes, dtype=np.float64).reshape(-1, 4), class_ids, self.PROPOSAL)
+        diff = AnnotationDiff(self._take(np.flatnonzero(proposal)), added)
+        self.apply(diff)
+        return diff
+
+    def clear(self) -> AnnotationDiff:
+        diff = AnnotationDiff(self._take(slice(None)), self._emptyRows())
+        self.apply(diff)
+        return diff
+
+    def scale(self, sx : float, sy : float = None) -> AnnotationDiff:
+        """缩放所有框, 例如图像被缩放后同步标注
+        """
+        sy = sx if sy is None else sy
+        boxes = self.boxes() * np.array((sx, sy, sx, sy))
+        return self.update(self._columns["id"], boxes)
+
+    def clip(self, width : float, height : float, remove_empty : bool = True) -> AnnotationDiff:
+        """把所有框裁剪到图像范围内, remove_empty 时删除裁剪后面积为 0 的框
+        """
+        boxes = self.boxes()
+        clipped = np.clip(boxes, 0, np.array((width, height, width, height)))
+        empty = (clipped[:, 2] <= clipped[:, 0]) | (clipped[:, 3] <= clipped[:, 1])
+        if not remove_empty:
+            empty[:] = False
+        keep = ~empty
+        before = self._take(slice(None))
+        after = self._select(before, keep)
+        for i, name in enumerate(self.BOX_COLUMNS):
+            after[name] = clipped[keep, i]
+        changed = empty.copy()
+        changed[keep] = (boxes[keep] != clipped[keep]).any(axis=1)
+        diff = AnnotationDiff(self._select(before, changed), self._select(after, changed[keep]))
+        self.apply(diff)
+        return diff
+
+    # 撤销
+    def apply(self, diff : AnnotationDiff, record : bool = True):
+        """应用修改, record 时记录到撤销栈并清空重做栈
+        """
+        if diff.isEmpty():
+            return
+        self._delete(diff.removedIds())
+        self._insert(diff.added)
+        if len(diff.added["id"]) > 0:
+            self._next_id = max(self._next_id, int(diff.added["id"].max()) + 1)
+        self.dirty = True
+        self.version += 1
+        if record:
+            self._undo_stack.append(diff)
+            if len(self._undo_stack) > self.max_history:
+                del self._undo_stack[0]
+            self._redo_stack.clear()
+
+    def canUndo(self) -> bool:
+        return len(self._undo_stack) > 0
+
+    def canRedo(self) -> bool:
+        return len(self._redo_stack) > 0
+
+    def undo(self) -> typing.Optional[AnnotationDiff]:
+        """撤销上一次修改
+
+        Returns:
+            AnnotationDiff: 实际应用的修改, 用于更新界面; 没有可撤销的修改返回 None
+        """
+        if not self.canUndo():
+            return None
+        diff = self._undo_stack.pop()
+        self.apply(diff.inverted(), record=False)
+        self._redo_stack.append(diff)
+        return diff.inverted()
+
+    def redo(self) -> typing.Optional[AnnotationDiff]:
+        if not self.canRedo():
+            return None
+        diff = self._redo_stack.pop()
+        self.apply(diff, record=False)
+        self._undo_stack.append(diff)
+        return diff
+
+    # 内部按列操作
+    def _emptyRows(self) -> dict:
+        return {name : np.empty(0, dtype) for name, dtype in self.COLUMNS.items()}
+
+    def _newRows(self, boxes : np.ndarray, class_ids, flags) -> dict:
+        count = len(boxes)
+        rows = {"id" : np.arange(self._next_id, self._next_id + count, dtype=np.int64)}
+        self._next_id += count
+        for i, name in enumerate(self.BOX_COLUMNS):
+            rows[name] = boxes[:, i].astype(np.float64)
+        rows["class_id"] = np.broadcast_to(np.asarray(class_ids), (count,)).astype(np.int32)
+        rows["flags"] = np.broadcast_to(np.asarray(flags), (count,)).astype(np.uint8)
+        return rows
+
+    def _take(self, rows) -> dict:
+        return {name : data[rows].copy() for name, data in self._columns.items()}
+
+    @staticmethod
+    def _select(rows : dict, mask) -> dict:
+        return {name : data[mask] for name, data in rows.items()}
+
+    def _delete(self, ids : np.ndarray):
+        if len(ids) == 0:
+            return
+        keep = ~np.isin(self._columns["id"], ids)
+        for name, data in self._columns.items():
+            self._columns[name] = data[keep]
+
+    def _insert(self, rows : dict):
+        if len(rows["id"]) == 0:
+            return
+        columns = {name : np.concatenate((self._columns[name], rows[name].astype(dtype)))
+                   for name, dtype in self.COLUMNS.items()}
+        order = np.argsort(columns["id"], kind="stable")
+        self._columns = {name : data[order] for name, data in columns.items()}
@@ -0,0 +1,408 @@
+"""目标检测评估
+
+项目中的标注为真值, 导入的预测文件为检测结果, 计算 COCO 风格的 mAP@[.5:.95]、每个类别的 PR 曲线和混淆矩阵.
+
+图像按块处理: 每块中按 (图像, 类别) 用 searchsorted 展开所有同类的 (检测框, 真值) 对, 用 utils.geometry.boxIou
+逐对计算 IoU, 不填充成稠密的 (图像, 检测框, 真值) 数组; 贪心匹配按检测框在图像中的名次 (分数从高到低) 循环,
+每次对所有图像和 IoU 阈值同时计算, 没有对单个框的 Python 循环. 图像块可以由进程池并行处理.
+PR 曲线按类别对所有检测框排序后用累计和计算, 按 COCO 的方法在 101 个召回率上插值.
+
+预测文件:
+    - .csv / .txt: 每行 image_id, class_id, x1, y1, x2, y2, score, 可以有一行表头; image_id 和 class_id 与项目中的相同
+    - .json: COCO 的结果格式 [{"image_id", "category_id", "bbox": [x, y, w, h], "score"}, ...],
+      category_id 与导出的 COCO 相同, 即项目中出现的类别 id 升序排列后的下标加 1
+
+结果按 预测文件内容的哈希 + 真值和参数的哈希 缓存在项目的缓存目录中.
+"""
+import os
+import json
+import time
+import hashlib
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from deep_learning_tool.utils.geometry import boxIou
+
+
+# COCO 的 IoU 阈值 0.5:0.95 和 101 个召回率
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+RECALL_THRESHOLDS = np.linspace(0.0, 1.0, 101)
+
+# 与 AnnotationSet 的 flags 一致: 困难的真值不计入召回, 匹配到它的检测框不计为误检; 候选框不作为真值
+DIFFICULT = 1
+PROPOSAL = 2
+
+# 每块的 (检测框, 真值) 对不超过该值, 限制 IoU 等中间数组的内存
+CHUNK_PAIRS = 4 * 1024 * 1024
+
+
+class Detections(namedtuple("Detections", ["image_id", "class_id", "boxes", "scores", "flags"])):
+    """按列保存的框, 真值的 scores 为 None
+
+    image_id, class_id, flags: (N,) int64; boxes: (N, 4) x1, y1, x2, y2; scores: (N,) float64
+    """
+    def take(self, index) -> "Detections":
+        return Detections(self.image_id[index], self.class_id[index], self.boxes[index],
+                          None if self.scores is None else self.scores[index], self.flags[index])
+
+
+class EvaluationResult(namedtuple("EvaluationResult", [
+        "class_ids", "iou_thresholds", "recall_thresholds", "precision", "ap", "recall",
+        "gt_counts", "detection_counts", "confusion", "confusion_iou", "confusion_score", "image_count", "elapsed"])):
+    """评估结果
+
+    precision: (T, R, C) 每个 IoU 阈值、召回率、类别的插值精度, 没有真值的类别为 -1
+    ap: (T, C) 每个 IoU 阈值每个类别的 AP, 没有真值的类别为 -1
+    recall: (T, C) 最大召回率
+    confusion: (C + 1, C + 1) 行为真值类别, 列为预测类别, 最后一行 / 列为背景 (漏检 / 误检)
+    """
+    FIELDS_ARRAY = ("class_ids", "iou_thresholds", "recall_thresholds", "precision", "ap", "recall",
+                    "gt_counts", "detection_counts", "confusion")
+
+    def valid(self) -> np.ndarray:
+        """有真值的类别
+        """
+        return self.gt_counts > 0
+
+    def classAp(self, iou : float = None) -> np.ndarray:
+        """每个类别的 AP, iou 为 None 时为 0.5:0.95 的平均, 没有真值的类别为 nan
+        """
+        ap = self.ap if iou is None else self.ap[np.isclose(self.iou_thresholds, iou)]
+        count = (ap >= 0).sum(axis=0)
+        return np.where(count > 0, np.where(ap >= 0, ap, 0).sum(axis=0) / np.maximum(count, 1), np.nan)
+
+    def mAP(self, iou : float = None) -> float:
+        ap = self.classAp(iou)
+        valid = np.isfinite(ap)
+        return float(ap[valid].mean()) if valid.any() else float("nan")
+
+    def save(self, path : str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as file:
+            np.savez(file, **{name : getattr(self, name) for name in self.FIELDS_ARRAY},
+                     scalars=np.array([self.confusion_iou, self.confusion_score, self.image_count, self.elapsed]))
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path : str) -> "EvaluationResult":
+        with np.load(path) as data:
+            arrays = {name : data[name] for name in cls.FIELDS_ARRAY}
+            confusion_iou, confusion_score, image_count, elapsed = data["scalars"].tolist()
+        return cls(confusion_iou=confusion_iou, confusion_score=confusion_score, image_count=int(image_count),
+                   elapsed=elapsed, **arrays)
+
+
+def fileHash(path : str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def loadPredictions(path : str, class_ids=None) -> Detections:
+    """读取预测文件, 格式见模块说明
+
+    Args:
+        class_ids: 项目中出现的类别 id 升序, 用于把 COCO 的 category_id 转换为类别 id; None 时 category_id 即类别 id
+    """
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as file:
+            items = json.load(file)
+        image_id = np.array([item["image_id"] for item in items], dtype=np.int64)
+        category_id = np.array([item["category_id"] for item in items], dtype=np.int64)
+        boxes = np.array([item["bbox"] for item in items], dtype=np.float64).reshape(-1, 4)
+        scores = np.array([item.get("score", 1.0) for item in items], dtype=np.float64)
+        boxes[:, 2:] += boxes[:, :2]
+        if class_ids is not None:
+            class_ids = np.asarray(class_ids, dtype=np.int64)
+            valid = (category_id >= 1) & (category_id <= len(class_ids))
+            image_id, boxes, scores = image_id[valid], boxes[valid], scores[valid]
+            category_id = class_ids[category_id[valid] - 1]
+    else:
+        with open(path, "r", encoding="utf-8") as file:
+            first = file.readline()
+        header = any(c.isalpha() for c in first)
+        data = np.loadtxt(path, delimiter=",", skiprows=1 if header else 0, ndmin=2, dtype=np.float64)
+        if data.shape[0] > 0 and data.shape[1] < 7:
+            raise ValueError(f"{path}: expected columns image_id, class_id, x1, y1, x2, y2, score")
+        data = data.reshape(-1, data.shape[1] if data.shape[0] > 0 else 7)
+        image_id, category_id = data[:, 0].astype(np.int64), data[:, 1].astype(np.int64)
+        boxes, scores = np.ascontiguousarray(data[:, 2:6]), data[:, 6].copy()
+    return Detections(image_id, category_id, boxes, scores, np.zeros(len(image_id), dtype=np.int64))
+
+
+def _pairs(det_keys : np.ndarray, gt_keys : np.ndarray):
+    """键相同的所有 (检测框, 真值) 对, gt_keys 为升序
+
+    Returns:
+        (np.ndarray, np.ndarray): 检测框的行和真值的行, 按检测框、真值的行升序
+    """
+    first = np.searchsorted(gt_keys, det_keys, side="left")
+    counts = np.searchsorted(gt_keys, det_keys, side="right") - first
+    det_rows = np.repeat(np.arange(len(det_keys)), counts)
+    gt_rows = np.arange(len(det_rows)) - np.repeat(np.cumsum(counts) - counts - first, counts)
+    return det_rows, gt_rows
+
+
+def _greedyMatch(det_rows : np.ndarray, gt_rows : np.ndarray, values : np.ndarray, det_rank : np.ndarray,
+                 thresholds : np.ndarray, det_count : int, gt_count : int) -> np.ndarray:
+    """按检测框的名次贪心匹配: 每个检测框匹配 IoU 不小于阈值、尚未匹配的真值中 IoU 最大的 (相同时取行小的)
+
+    只有 IoU 不小于最小阈值的对可能匹配, 把它们按 (名次, 检测框, IoU 降序) 排列, 每个名次对这些对和所有阈值同时计算,
+    每个检测框取第一个可用的对. 同一名次的检测框属于不同的图像, 不会争夺同一个真值.
+
+    Args:
+        det_rows, gt_rows, values: 可以匹配的 (检测框, 真值) 对和它们的 IoU, 同一检测框的对按真值的行升序
+        det_rank: (det_count,) 检测框在图像中的名次
+        thresholds: (T,)
+
+    Returns:
+        np.ndarray: (T, det_count) 匹配的真值行, 没有匹配为 -1
+    """
+    limits = np.minimum(np.asarray(thresholds, dtype=np.float64), 1 - 1e-10)
+    matched = np.full((len(limits), det_count), -1, dtype=np.int64)
+    keep = values >= limits.min()
+    det_rows, gt_rows, values = det_rows[keep], gt_rows[keep], values[keep]
+    if len(det_rows) == 0:
+        return matched
+    ranks = det_rank[det_rows]
+    order = np.lexsort((-values, det_rows, ranks))
+    det_rows, gt_rows, values, ranks = det_rows[order], gt_rows[order], values[order], ranks[order]
+    taken = np.zeros((gt_count, len(limits)), dtype=bool)
+    bounds = np.searchsorted(ranks, np.arange(int(ranks[-1]) + 2))
+    for rank in range(len(bounds) - 1):
+        first, last = bounds[rank], bounds[rank + 1]
+        if first == last:
+            continue
+        pair_dets, pair_gts = det_rows[first:last], gt_rows[first:last]
+        ok = (values[first:last, None] >= limits) & ~taken[pair_gts]
+        # 按检测框分段取第一个可用的对
+        starts = np.flatnonzero(np.concatenate([[True], pair_dets[1:] != pair_dets[:-1]]))
+        winners = np.minimum.reduceat(np.where(ok, np.arange(last - first)[:, None], last - first), starts, axis=0)
+        segments, columns = np.nonzero(winners < last - first)
+        pairs = winners[segments, columns]
+        matched[columns, pair_dets[pairs]] = pair_gts[pairs]
+        taken[pair_gts[pairs], columns] = True
+    return matched
+
+
+def evaluateChunk(gt : Detections, detections : Detections, image_count : int, iou_thresholds : np.ndarray,
+                  class_count : int, confusion_iou : float, confusion_score : float):
+    """评估一块图像, 可以在子进程中运行
+
+    gt 和 detections 的 image_id 为块内的图像下标 (0 ~ image_count - 1), class_id 为类别下标,
+    gt 按图像排列, detections 按 (图像, 分数降序) 排列.
+
+    Returns:
+        tuple: 每个检测框的 tp (T, N) 和 ignored (T, N), 每个类别的真值数 (C,), 混淆矩阵 (C + 1, C + 1)
+    """
+    det_count, gt_count = len(detections.image_id), len(gt.image_id)
+    ignore_gt = (gt.flags & DIFFICULT) != 0
+    counts = np.bincount(detections.image_id, minlength=image_count)
+    det_rank = np.arange(det_count) - (np.cumsum(counts) - counts)[detections.image_id]
+
+    # 同一图像同一类别的对, 先匹配普通真值, 没有匹配的检测框再看是否与困难真值重叠
+    gt_keys = gt.image_id * class_count + gt.class_id
+    gt_order = np.argsort(gt_keys, kind="stable")
+    det_rows, gt_rows = _pairs(detections.image_id * class_count + detections.class_id, gt_keys[gt_order])
+    gt_rows = gt_order[gt_rows]
+    values = boxIou(detections.boxes[det_rows], gt.boxes[gt_rows], aligned=True)
+    normal = ~ignore_gt[gt_rows]
+    matched = _greedyMatch(det_rows[normal], gt_rows[normal], values[normal], det_rank, iou_thresholds, det_count, gt_count)
+    tp = matched >= 0
+    if ignore_gt.any():
+        best = np.full(det_count, -1.0)
+        np.maximum.at(best, det_rows[~normal], values[~normal])
+        ignored = ~tp & (best[None, :] >= np.minimum(iou_thresholds, 1 - 1e-10)[:, None])
+    else:
+        ignored = np.zeros_like(tp)
+
+    gt_counts = np.bincount(gt.class_id[~ignore_gt], minlength=class_count)
+
+    # 混淆矩阵: 不区分类别按 IoU 匹配分数不低于 confusion_score 的检测框
+    confident = np.flatnonzero(detections.scores >= confusion_score)
+    det_rows, gt_rows = _pairs(detections.image_id[confident], gt.image_id)
+    det_rows = confident[det_rows]
+    values = boxIou(detections.boxes[det_rows], gt.boxes[gt_rows], aligned=True)
+    normal = ~ignore_gt[gt_rows]
+    matched = _greedyMatch(det_rows[normal], gt_rows[normal], values[normal], det_rank, [confusion_iou], det_count, gt_count)[0]
+    background = class_count
+    confusion = np.zeros((class_count + 1, class_count + 1), dtype=np.int64)
+    hits = np.flatnonzero(matched >= 0)
+    np.add.at(confusion, (gt.class_id[matched[hits]], detections.class_id[hits]), 1)
+    false_positives = np.zeros(det_count, dtype=bool)
+    false_positives[confident] = True
+    false_positives[hits] = False
+    # 与困难真值重叠的检测框不计为误检
+    false_positives[det_rows[~normal & (values >= confusion_iou)]] = False
+    confusion[background] += np.bincount(detections.class_id[false_positives], minlength=class_count + 1)
+    missed = ~ignore_gt
+    missed[matched[hits]] = False
+    confusion[:, background] += np.bincount(gt.class_id[missed], minlength=class_count + 1)
+    return tp, ignored, gt_counts, confusion
+
+
+def _chunks(gt_counts : np.ndarray, detection_counts : np.ndarray, chunk_images : int, chunk_pairs : int) -> list:
+    """划分图像块, 每块最多 chunk_images 张图像、chunk_pairs 个 (检测框, 真值) 对 (单张图像超过时单独成块)
+    """
+    pairs = np.cumsum(gt_counts * detection_counts)
+    chunks = []
+    start, count = 0, len(gt_counts)
+    while start < count:
+        base = pairs[start - 1] if start > 0 else 0
+        end = min(count, start + chunk_images, int(np.searchsorted(pairs, base + chunk_pairs, side="right")))
+        end = max(end, start + 1)
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+def _precisionRecall(tp : np.ndarray, ignored : np.ndarray, scores : np.ndarray, classes : np.ndarray,
+                     gt_counts : np.ndarray, recall_thresholds : np.ndarray):
+    """每个类别按分数降序累计 tp / fp, 在 recall_thresholds 上插值
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): precision (T, R, C), ap (T, C), recall (T, C)
+    """
+    thresholds_count, class_count = tp.shape[0], len(gt_counts)
+    precision = -np.ones((thresholds_count, len(recall_thresholds), class_count))
+    ap = -np.ones((thresholds_count, class_count))
+    recall = -np.ones((thresholds_count, class_count))
+    # 按类别、分数降序排列后每个类别是连续的一段
+    order = np.lexsort((-scores, classes))
+    bounds = np.searchsorted(classes[order], np.arange(class_count + 1))
+    tp = tp[:, order]
+    keep = ~ignored[:, order]
+    true_positives = tp & keep
+    false_positives = ~tp & keep
+    for class_index in range(class_count):
+        positives = gt_counts[class_index]
+        if positives == 0:
+            continue
+        rows = slice(bounds[class_index], bounds[class_index + 1])
+        tps = np.cumsum(true_positives[:, rows], axis=1, dtype=np.float64)
+        fps = np.cumsum(false_positives[:, rows], axis=1, dtype=np.float64)
+        if tps.shape[1] == 0:
+            precision[:, :, class_index] = 0
+            ap[:, class_index] = 0
+            recall[:, class_index] = 0
+            continue
+        rc = tps / positives
+        pr = tps / np.maximum(tps + fps, np.finfo(np.float64).eps)
+        # 精度包络: 每个位置之后的最大精度
+        pr = np.maximum.accumulate(pr[:, ::-1], axis=1)[:, ::-1]
+        length = tps.shape[1]
+        for t in range(thresholds_count):
+            index = np.searchsorted(rc[t], recall_thresholds, side="left")
+            precision[t, :, class_index] = np.where(index < length, pr[t, np.minimum(index, length - 1)], 0)
+        ap[:, class_index] = precision[:, :, class_index].mean(axis=1)
+        recall[:, class_index] = rc[:, -1]
+    return precision, ap, recall
+
+
+def evaluate(gt : Detections, detections : Detections, image_ids, iou_thresholds=IOU_THRESHOLDS,
+             recall_thresholds=RECALL_THRESHOLDS, max_detections : int = 100, confusion_iou : float = 0.5,
+             confusion_score : float = 0.25, workers : int = 1, chunk_images : int = 2048, progress=None) -> EvaluationResult:
+    """在 image_ids 中的图像上评估检测结果
+
+    Args:
+        gt (Detections): 真值, 候选框 (PROPOSAL) 会被忽略
+        detections (Detections): 检测结果, 不在 image_ids 中的图像会被忽略
+        max_detections (int): 每张图像只使用分数最高的检测框
+        workers (int): 进程数, 为 1 或只有一块时在当前进程中计算
+        progress: 每完成一块调用 progress(完成的块数, 总块数)
+    """
+    start = time.perf_counter()
+    image_ids = np.unique(np.asarray(image_ids, dtype=np.int64))
+    iou_thresholds = np.asarray(iou_thresholds, dtype=np.float64)
+    recall_thresholds = np.asarray(recall_thresholds, dtype=np.float64)
+    gt = gt.take(np.isin(gt.image_id, image_ids) & ((gt.flags & PROPOSAL) == 0))
+    detections = detections.take(np.isin(detections.image_id, image_ids))
+
+    class_ids = np.union1d(gt.class_id, detections.class_id)
+    class_count = len(class_ids)
+    gt_index = np.searchsorted(image_ids, gt.image_id)
+    det_index = np.searchsorted(image_ids, detections.image_id)
+    gt = Detections(gt_index, np.searchsorted(class_ids, gt.class_id), gt.boxes, None, gt.flags).take(
+        np.argsort(gt_index, kind="stable"))
+    # 按图像、分数降序排列, 每张图像保留 max_detections 个
+    order = np.lexsort((-detections.scores, det_index))
+    detections = Detections(det_index, np.searchsorted(class_ids, detections.class_id), detections.boxes,
+                            detections.scores, detections.flags).take(order)
+    if max_detections > 0 and len(detections.image_id) > 0:
+        counts = np.bincount(detections.image_id, minlength=len(image_ids))
+        rank = np.arange(len(detections.image_id)) - (np.cumsum(counts) - counts)[detections.image_id]
+        detections = detections.take(rank < max_detections)
+
+    gt_per_image = np.bincount(gt.image_id, minlength=len(image_ids))
+    det_per_image = np.bincount(detections.image_id, minlength=len(image_ids))
+    gt_bounds = np.concatenate([[0], np.cumsum(gt_per_image)])
+    det_bounds = np.concatenate([[0], np.cumsum(det_per_image)])
+    tasks = []
+    for first, last in _chunks(gt_per_image, det_per_image, chunk_images, CHUNK_PAIRS):
+        chunk_gt = gt.take(slice(gt_bounds[first], gt_bounds[last]))
+        chunk_det = detections.take(slice(det_bounds[first], det_bounds[last]))
+        chunk_gt = chunk_gt._replace(image_id=chunk_gt.image_id - first)
+        chunk_det = chunk_det._replace(image_id=chunk_det.image_id - first)
+        tasks.append((chunk_gt, chunk_det, last - first, iou_thresholds, class_count, confusion_iou, confusion_score))
+
+    results = []
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            results.append(evaluateChunk(*task))
+            if progress is not None:
+                progress(len(results), len(tasks))
+    else:
+        # 界面进程中有其他线程, 使用 spawn 而不是 fork
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(min(workers, len(tasks)), mp_context=context) as pool:
+            for result in pool.map(evaluateChunk, *zip(*tasks)):
+                results.append(result)
+                if progress is not None:
+                    progress(len(results), len(tasks))
+
+    thresholds_count = len(iou_thresholds)
+    tp = np.concatenate([result[0] for result in results], axis=1) if results else np.zeros((thresholds_count, 0), dtype=bool)
+    ignored = np.concatenate([result[1] for result in results], axis=1) if results else np.zeros((thresholds_count, 0), dtype=bool)
+    gt_counts = np.sum([result[2] for result in results], axis=0) if results else np.zeros(class_count, dtype=np.int64)
+    confusion = np.sum([result[3] for result in results], axis=0) if results else np.zeros((class_count + 1, class_count + 1), dtype=np.int64)
+    precision, ap, recall = _precisionRecall(tp, ignored, detections.scores, detections.class_id, gt_counts, recall_thresholds)
+    return EvaluationResult(class_ids, iou_thresholds, recall_thresholds, precision, ap, recall, gt_counts,
+                            np.bincount(detections.class_id, minlength=class_count), confusion, confusion_iou,
+                            confusion_score, len(image_ids), time.perf_counter() - start)
+
+
+class EvaluationCache(object):
+    """评估结果的磁盘缓存
+
+    key 由预测文件内容的哈希和真值、图像、参数的哈希组成, 预测文件或标注改变后不会命中旧的结果.
+    """
+    def __init__(self, cache_dir : str) -> None:
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def key(prediction_hash : str, gt : Detections, image_ids, **params) -> str:
+        digest = hashlib.sha1()
+        for array in (np.asarray(image_ids, dtype=np.int64), gt.image_id, gt.class_id, gt.boxes, gt.flags):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        digest.update(json.dumps({name : np.asarray(value).tolist() for name, value in sorted(params.items())}).encode("utf-8"))
+        return f"{prediction_hash[:20]}_{digest.hexdigest()[:20]}"
+
+    def path(self, key : str) -> str:
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def load(self, key : str):
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return EvaluationResult.load(path)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, key : str, result : EvaluationResult):
+        result.save(self.path(key))
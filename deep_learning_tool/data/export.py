@@ -0,0 +1,500 @@
+"""导出数据集 (COCO / YOLO / Pascal VOC)
+
+DatasetExporter 使用自己的 ProjectStore 连接按图像 id 顺序流式读取图像和标注, 可以在后台线程中运行:
+    - 复制 / 硬链接图像、读取没有记录的图像尺寸、写每张图像的标注文件由线程池并行完成
+    - COCO 的 json 和图像列表按条目追加到 .part 文件, 全部完成后再拼接, 不会在内存中生成整个数据集
+    - 每处理 batch_size 张图像写一次检查点 (已完成的最大图像 id 和各 .part 文件的长度),
+      中断后从检查点继续: .part 文件截断到检查点的长度, 之后的图像重新导出, 已复制的图像不会重复复制
+
+导出的图像文件名为 ``<图像 id>_<原文件名>``, 不同目录中的同名图像不会冲突, 标注文件与图像同名.
+"""
+import os
+import json
+import time
+import shutil
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
+
+from qtpy.QtGui import QImageReader
+
+from .project_store import ProjectStore
+
+
+COCO = "coco"
+YOLO = "yolo"
+VOC = "voc"
+FORMATS = (COCO, YOLO, VOC)
+
+COPY = "copy"
+HARDLINK = "hardlink"
+# 不导出图像, 标注引用原图像路径
+NO_IMAGES = "none"
+IMAGE_MODES = (COPY, HARDLINK, NO_IMAGES)
+
+# 导出目录中每个集合的名称, 键与 ProjectStore.SPLITS 一致
+SPLIT_DIRS = {0: "unassigned", 1: "train", 2: "val", 3: "test"}
+
+# 与 AnnotationSet 的 flags 一致, 这里不导入 AnnotationSet 以免加载 NumPy
+DIFFICULT = 1
+PROPOSAL = 2
+
+STATE_FILE = ".export_state.json"
+
+# done 包括之前中断的导出已完成的图像, 速度只统计本次导出
+ExportProgress = namedtuple("ExportProgress", ["done", "total", "images_per_second", "bytes_per_second"])
+ExportResult = namedtuple("ExportResult", ["completed", "exported", "missing", "copied_bytes", "elapsed"])
+# 线程池中导出一张图像的结果
+ExportedImage = namedtuple("ExportedImage", ["file_name", "width", "height", "copied_bytes"])
+
+
+def exportName(image_id : int, image_path : str) -> str:
+    return f"{image_id}_{os.path.basename(image_path)}"
+
+
+class PartFile(object):
+    """只追加的文本文件, size 用于检查点, 继续导出时截断到检查点记录的长度
+    """
+    def __init__(self, path : str, size : int = 0) -> None:
+        self.path = path
+        self.size = size
+        with open(path, "ab") as file:
+            file.truncate(size)
+        self.file = open(path, "ab", buffering=1 << 20)
+
+    def write(self, text : str):
+        data = text.encode("utf-8")
+        self.file.write(data)
+        self.size += len(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class DatasetWriter(object):
+    """一种格式的导出
+
+    labelFiles 在线程池中写每张图像独立的文件, write 在导出线程中按图像 id 顺序追加到 .part 文件,
+    finish 在全部图像导出后生成最终的文件.
+    """
+    def __init__(self, output_dir : str, class_ids, class_names : dict, image_mode : str, splits, state : dict) -> None:
+        self.output_dir = output_dir
+        self.class_ids = list(class_ids)
+        self.class_names = [class_names.get(class_id, f"class_{class_id}") for class_id in self.class_ids]
+        # 项目中的类别 id -> 导出的类别下标 (连续, 从 0 开始)
+        self.class_index = {class_id : index for index, class_id in enumerate(self.class_ids)}
+        self.image_mode = image_mode
+        self.splits = tuple(splits)
+        self.state = state
+        self._parts = {}
+        # 继续导出时先把所有 .part 文件截断到检查点的长度, 之后不再写入的集合也不会留下中断前多写的内容
+        for name in list(state["parts"]):
+            self.part(name)
+
+    def imageDir(self, split : int) -> str:
+        """导出图像的目录, 相对于 output_dir
+        """
+        return os.path.join("images", SPLIT_DIRS[split])
+
+    def makeDirs(self):
+        for split in self.splits:
+            os.makedirs(os.path.join(self.output_dir, self.imageDir(split)), exist_ok=True)
+
+    def part(self, name : str) -> PartFile:
+        """name 为相对于 output_dir 的路径, 第一次使用时按检查点记录的长度打开
+        """
+        part = self._parts.get(name)
+        if part is None:
+            path = os.path.join(self.output_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            part = PartFile(path, self.state["parts"].get(name, 0))
+            self._parts[name] = part
+        return part
+
+    def flush(self):
+        for name, part in self._parts.items():
+            part.flush()
+            self.state["parts"][name] = part.size
+
+    def close(self):
+        for part in self._parts.values():
+            part.close()
+        self._parts = {}
+
+    def finishPart(self, name : str, final_name : str = None):
+        """把 .part 文件改为最终的文件名, 默认去掉 .part 后缀
+        """
+        self.part(name).close()
+        self._parts.pop(name)
+        if final_name is None:
+            final_name = name[:-len(".part")]
+        os.replace(os.path.join(self.output_dir, name), os.path.join(self.output_dir, final_name))
+        self.state["parts"].pop(name, None)
+
+    def labelFiles(self, record, exported : ExportedImage):
+        pass
+
+    def write(self, record, exported : ExportedImage):
+        pass
+
+    def finish(self):
+        pass
+
+    def labelStem(self, record) -> str:
+        return os.path.splitext(exportName(record[0], record[1]))[0]
+
+    def splitParts(self, template : str) -> list:
+        """检查点中每个集合的 .part 文件, 按集合排列
+
+        Args:
+            template (str): 例如 "{}.txt.part", {} 为集合名
+        """
+        names = (template.format(SPLIT_DIRS[split]) for split in self.splits)
+        return [name for name in names if name in self.state["parts"]]
+
+
+class CocoWriter(DatasetWriter):
+    """annotations/instances_<集合>.json, 图像在 images/<集合>/ 中
+
+    类别 id 为导出的类别下标加 1, bbox 为 [x, y, width, height].
+    """
+    def write(self, record, exported : ExportedImage):
+        image_id, _, _, _, split, boxes = record
+        name = os.path.join("annotations", f"instances_{SPLIT_DIRS[split]}")
+        images = self.part(name + ".images.part")
+        images.write(("" if images.size == 0 else ",\n") +
+                     f'{{"id":{image_id},"file_name":{json.dumps(exported.file_name, ensure_ascii=False)},'
+                     f'"width":{exported.width},"height":{exported.height}}}')
+        if len(boxes) == 0:
+            return
+        annotations = self.part(name + ".annotations.part")
+        annotation_id = self.state["annotation_id"]
+        lines = []
+        for class_id, x1, y1, x2, y2, flags in boxes:
+            x, y = min(x1, x2), min(y1, y2)
+            w, h = abs(x2 - x1), abs(y2 - y1)
+            lines.append(f'{{"id":{annotation_id},"image_id":{image_id},"category_id":{self.class_index[class_id] + 1},'
+                         f'"bbox":[{x:.2f},{y:.2f},{w:.2f},{h:.2f}],"area":{w * h:.2f},"iscrowd":0}}')
+            annotation_id += 1
+        self.state["annotation_id"] = annotation_id
+        annotations.write(("" if annotations.size == 0 else ",\n") + ",\n".join(lines))
+
+    def finish(self):
+        categories = json.dumps([{"id": index + 1, "name": name, "supercategory": ""}
+                                 for index, name in enumerate(self.class_names)], ensure_ascii=False)
+        for images_name in self.splitParts(os.path.join("annotations", "instances_{}.images.part")):
+            prefix = images_name[:-len(".images.part")]
+            annotations_name = prefix + ".annotations.part"
+            self.flush()
+            path = os.path.join(self.output_dir, prefix + ".json")
+            with open(path + ".tmp", "wb") as file:
+                file.write(f'{{"info":{{"description":"deep_learning_tool export"}},"licenses":[],"categories":{categories},"images":[\n'.encode("utf-8"))
+                with open(os.path.join(self.output_dir, images_name), "rb") as part:
+                    shutil.copyfileobj(part, file, 1 << 20)
+                file.write(b'\n],"annotations":[\n')
+                if annotations_name in self.state["parts"]:
+                    with open(os.path.join(self.output_dir, annotations_name), "rb") as part:
+                        shutil.copyfileobj(part, file, 1 << 20)
+                file.write(b"\n]}\n")
+            os.replace(path + ".tmp", path)
+            for name in (images_name, annotations_name):
+                part = self._parts.pop(name, None)
+                if part is not None:
+                    part.close()
+                if os.path.exists(os.path.join(self.output_dir, name)):
+                    os.remove(os.path.join(self.output_dir, name))
+                self.state["parts"].pop(name, None)
+
+
+class YoloWriter(DatasetWriter):
+    """labels/<集合>/<图像名>.txt, 每行 "类别下标 cx cy w h" (相对于图像尺寸), 图像在 images/<集合>/ 中
+
+    <集合>.txt 列出每个集合的图像路径, data.yaml 给出类别名; 不导出图像时 data.yaml 引用这些列表.
+    """
+    def makeDirs(self):
+        super().makeDirs()
+        for split in self.splits:
+            os.makedirs(os.path.join(self.output_dir, "labels", SPLIT_DIRS[split]), exist_ok=True)
+
+    def labelFiles(self, record, exported : ExportedImage):
+        _, _, _, _, split, boxes = record
+        width, height = exported.width, exported.height
+        lines = []
+        for class_id, x1, y1, x2, y2, flags in boxes:
+            x1, x2 = max(0.0, min(x1, x2)), min(float(width), max(x1, x2))
+            y1, y2 = max(0.0, min(y1, y2)), min(float(height), max(y1, y2))
+            if x2 <= x1 or y2 <= y1:
+                continue
+            lines.append(f"{self.class_index[class_id]} {(x1 + x2) / 2 / width:.6f} {(y1 + y2) / 2 / height:.6f} "
+                         f"{(x2 - x1) / width:.6f} {(y2 - y1) / height:.6f}\n")
+        path = os.path.join(self.output_dir, "labels", SPLIT_DIRS[split], self.labelStem(record) + ".txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.writelines(lines)
+
+    def write(self, record, exported : ExportedImage):
+        split = record[4]
+        image_path = exported.file_name if self.image_mode == NO_IMAGES else \
+            os.path.join(self.imageDir(split), exported.file_name)
+        self.part(f"{SPLIT_DIRS[split]}.txt.part").write(image_path + "\n")
+
+    def finish(self):
+        lines = [f"path: {json.dumps(os.path.abspath(self.output_dir), ensure_ascii=False)}"]
+        for name in self.splitParts("{}.txt.part"):
+            split_name = name[:-len(".txt.part")]
+            self.finishPart(name)
+            target = f"{split_name}.txt" if self.image_mode == NO_IMAGES else f"images/{split_name}"
+            lines.append(f"{split_name}: {target}")
+        lines.append(f"nc: {len(self.class_names)}")
+        lines.append(f"names: {json.dumps(self.class_names, ensure_ascii=False)}")
+        with open(os.path.join(self.output_dir, "data.yaml"), "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+
+
+class VocWriter(DatasetWriter):
+    """Annotations/<图像名>.xml, 图像在 JPEGImages/ 中, ImageSets/Main/<集合>.txt 列出每个集合的图像名
+    """
+    def imageDir(self, split : int) -> str:
+        return "JPEGImages"
+
+    def makeDirs(self):
+        super().makeDirs()
+        os.makedirs(os.path.join(self.output_dir, "Annotations"), exist_ok=True)
+
+    def labelFiles(self, record, exported : ExportedImage):
+        _, image_path, _, _, _, boxes = record
+        width, height = exported.width, exported.height
+        objects = []
+        for class_id, x1, y1, x2, y2, flags in boxes:
+            xmin, xmax = max(0, round(min(x1, x2))), min(width, round(max(x1, x2)))
+            ymin, ymax = max(0, round(min(y1, y2))), min(height, round(max(y1, y2)))
+            objects.append(
+                f"  <object>\n    <name>{escape(self.class_names[self.class_index[class_id]])}</name>\n"
+                f"    <pose>Unspecified</pose>\n    <truncated>0</truncated>\n    <difficult>{int(bool(flags & DIFFICULT))}</difficult>\n"
+                f"    <bndbox>\n      <xmin>{xmin}</xmin>\n      <ymin>{ymin}</ymin>\n      <xmax>{xmax}</xmax>\n      <ymax>{ymax}</ymax>\n    </bndbox>\n"
+                f"  </object>\n")
+        path = image_path if self.image_mode == NO_IMAGES else \
+            os.path.abspath(os.path.join(self.output_dir, "JPEGImages", exported.file_name))
+        text = (f"<annotation>\n  <folder>JPEGImages</folder>\n  <filename>{escape(os.path.basename(exported.file_name))}</filename>\n"
+                f"  <path>{escape(path)}</path>\n  <size>\n    <width>{width}</width>\n    <height>{height}</height>\n    <depth>3</depth>\n  </size>\n"
+                f"  <segmented>0</segmented>\n{''.join(objects)}</annotation>\n")
+        with open(os.path.join(self.output_dir, "Annotations", self.labelStem(record) + ".xml"), "w", encoding="utf-8") as file:
+            file.write(text)
+
+    def write(self, record, exported : ExportedImage):
+        self.part(os.path.join("ImageSets", "Main", f"{SPLIT_DIRS[record[4]]}.txt.part")).write(self.labelStem(record) + "\n")
+
+    def finish(self):
+        for name in self.splitParts(os.path.join("ImageSets", "Main", "{}.txt.part")):
+            self.finishPart(name)
+
+
+WRITERS = {
+    COCO : CocoWriter,
+    YOLO : YoloWriter,
+    VOC : VocWriter,
+}
+
+
+class DatasetExporter(object):
+    """把项目文件中指定集合的图像和标注导出为 COCO / YOLO / VOC
+
+    run 在调用线程中读取项目文件并写入 .part 文件, 图像的复制和每张图像的标注文件由 workers 个线程完成,
+    同时处理的图像不超过 max_in_flight. 默认不导出尚未确认的候选框 (PROPOSAL).
+    """
+    def __init__(self, project_path : str, output_dir : str, export_format : str = COCO, splits=(1, 2, 3),
+                 image_mode : str = HARDLINK, include_proposals : bool = False, workers : int = 8,
+                 batch_size : int = 512, max_in_flight : int = 0) -> None:
+        if export_format not in FORMATS:
+            raise ValueError(f"unknown export format {export_format}")
+        if image_mode not in IMAGE_MODES:
+            raise ValueError(f"unknown image mode {image_mode}")
+        self.project_path = project_path
+        self.output_dir = output_dir
+        self.export_format = export_format
+        self.splits = tuple(sorted(splits))
+        self.image_mode = image_mode
+        self.include_proposals = include_proposals
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max_in_flight if max_in_flight > 0 else 4 * self.batch_size
+        self._link_failed = False
+
+    @property
+    def state_path(self):
+        return os.path.join(self.output_dir, STATE_FILE)
+
+    def signature(self, class_ids, class_names : dict) -> dict:
+        """检查点只在导出设置和类别都相同时继续使用
+        """
+        return {
+            "project": os.path.abspath(self.project_path),
+            "format": self.export_format,
+            "splits": list(self.splits),
+            "image_mode": self.image_mode,
+            "include_proposals": self.include_proposals,
+            "classes": [[class_id, class_names.get(class_id)] for class_id in class_ids],
+        }
+
+    def loadState(self, signature : dict):
+        """检查点, 不存在、设置不同或 .part 文件比记录的短时返回 None
+        """
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if state.get("signature") != signature:
+            return None
+        for name, size in state["parts"].items():
+            path = os.path.join(self.output_dir, name)
+            if not os.path.exists(path) or os.path.getsize(path) < size:
+                return None
+        return state
+
+    def saveState(self, state : dict):
+        with open(self.state_path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(state, file, ensure_ascii=False)
+        os.replace(self.state_path + ".tmp", self.state_path)
+
+    def removeParts(self):
+        """删除上一次未完成的导出留下的 .part 文件
+        """
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                parts = json.load(file).get("parts", {})
+        except (OSError, ValueError):
+            return
+        for name in parts:
+            path = os.path.join(self.output_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def copyImage(self, source : str, target : str) -> int:
+        """复制或硬链接图像, 目标已存在且大小相同时跳过
+
+        Returns:
+            int: 复制的字节数, 硬链接和跳过为 0
+        """
+        try:
+            if os.path.getsize(target) == os.path.getsize(source):
+                return 0
+        except OSError:
+            pass
+        if self.image_mode == HARDLINK and not self._link_failed:
+            try:
+                if os.path.lexists(target):
+                    os.remove(target)
+                os.link(source, target)
+                return 0
+            except OSError:
+                # 跨文件系统等不能硬链接时改为复制
+                self._link_failed = True
+        # 先写临时文件再改名, 中断时不会留下不完整的图像
+        shutil.copyfile(source, target + ".tmp")
+        os.replace(target + ".tmp", target)
+        return os.path.getsize(target)
+
+    def exportImage(self, writer : DatasetWriter, record) -> ExportedImage:
+        """在线程池中导出一张图像, 原图不存在或无法读取尺寸时返回 None
+        """
+        image_id, image_path, width, height, split, boxes = record
+        if not os.path.isfile(image_path):
+            return None
+        if width <= 0 or height <= 0:
+            size = QImageReader(image_path).size()
+            if not size.isValid():
+                return None
+            width, height = size.width(), size.height()
+        copied_bytes = 0
+        if self.image_mode == NO_IMAGES:
+            file_name = image_path
+        else:
+            file_name = exportName(image_id, image_path)
+            copied_bytes = self.copyImage(image_path, os.path.join(self.output_dir, writer.imageDir(split), file_name))
+        exported = ExportedImage(file_name, width, height, copied_bytes)
+        writer.labelFiles(record, exported)
+        return exported
+
+    def run(self, resume : bool = True, progress=None, should_stop=None) -> ExportResult:
+        """导出, 可以在后台线程中调用
+
+        Args:
+            resume (bool): 有匹配的检查点时从检查点继续
+            progress: 每个检查点调用 progress(ExportProgress)
+            should_stop: 返回 True 时在下一张图像前停止并保存检查点, 之后可以继续
+
+        Returns:
+            ExportResult: completed 为 False 表示被停止
+        """
+        start = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+        store = ProjectStore(self.project_path)
+        writer = None
+        try:
+            class_ids = store.classIds()
+            class_names = {class_id : name for class_id, name, _ in store.classes()}
+            total = store.imageCount(self.splits)
+            signature = self.signature(class_ids, class_names)
+            state = self.loadState(signature) if resume else None
+            if state is None:
+                self.removeParts()
+                state = {"signature": signature, "last_id": -1, "done": 0, "missing": 0, "annotation_id": 1, "parts": {}}
+            resumed_done = state["done"]
+            writer = WRITERS[self.export_format](self.output_dir, class_ids, class_names, self.image_mode, self.splits, state)
+            writer.makeDirs()
+
+            exported = missing = copied_bytes = 0
+            since_checkpoint = 0
+            stopped = False
+
+            def checkpoint():
+                writer.flush()
+                self.saveState(state)
+                if progress is not None:
+                    elapsed = max(time.perf_counter() - start, 1e-9)
+                    progress(ExportProgress(state["done"], total, (state["done"] - resumed_done) / elapsed, copied_bytes / elapsed))
+
+            def handle(record, future):
+                nonlocal exported, missing, copied_bytes, since_checkpoint
+                result = future.result()
+                if result is None:
+                    missing += 1
+                    state["missing"] += 1
+                else:
+                    writer.write(record, result)
+                    exported += 1
+                    copied_bytes += result.copied_bytes
+                state["last_id"] = record[0]
+                state["done"] += 1
+                since_checkpoint += 1
+                if since_checkpoint >= self.batch_size:
+                    since_checkpoint = 0
+                    checkpoint()
+
+            in_flight = deque()
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="export") as pool:
+                for record in store.iterImageAnnotations(self.splits, state["last_id"]):
+                    if should_stop is not None and should_stop():
+                        stopped = True
+                        break
+                    if not self.include_proposals:
+                        record = record[:5] + ([row for row in record[5] if not row[5] & PROPOSAL],)
+                    in_flight.append((record, pool.submit(self.exportImage, writer, record)))
+                    if len(in_flight) >= self.max_in_flight:
+                        handle(*in_flight.popleft())
+                # 停止时也处理已提交的图像, 检查点保持连续
+                while in_flight:
+                    handle(*in_flight.popleft())
+            checkpoint()
+            if not stopped:
+                writer.finish()
+                writer.close()
+                os.remove(self.state_path)
+            return ExportResult(not stopped, exported, missing, copied_bytes, time.perf_counter() - start)
+        finally:
+            if writer is not None:
+                writer.close()
+            store.close()
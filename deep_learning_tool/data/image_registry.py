@@ -0,0 +1,287 @@
+from array import array
+
+
+class ImageRegistry(object):
+    """项目中图像的紧凑索引
+
+    每张图像有一个不会改变的整数 id 和一个连续的行号 (按加入顺序). 路径拆分为目录和文件名, 
+    目录保存在去重的前缀表中, 文件名以 utf-8 保存在一个 bytearray 中; 路径到 id 的查找只保存路径的哈希. 
+    删除图像时压缩所有列, 行号保持连续且不留墓碑. 
+    每张图像的元数据 (width, height, split, label_state) 按列保存, column() 返回 NumPy 数组用于向量化过滤.
+    """
+    COLUMNS = {
+        "width": "i",
+        "height": "i",
+        "split": "b",
+        "label_state": "b",
+    }
+
+    def __init__(self) -> None:
+        self._dirs = []
+        self._dir_ids = {}
+        self._pool = bytearray()
+        # 按行保存
+        self._row_dir = array("i")
+        self._row_offset = array("q")
+        self._row_length = array("i")
+        self._row_id = array("q")
+        self._columns = {name : array(code) for name, code in self.COLUMNS.items()}
+        # id -> 行号, 删除的 id 为 -1
+        self._id_row = array("q")
+        # hash(path) -> id 或 id 列表 (哈希冲突)
+        self._lookup = {}
+        self._garbage = 0
+
+    def __len__(self):
+        return len(self._row_id)
+
+    def __contains__(self, image_path):
+        return self.id(image_path) >= 0
+
+    def __iter__(self):
+        for row in range(len(self._row_id)):
+            yield self.pathAt(row)
+
+    def get(self, image_path : str, default=None):
+        image_id = self.id(image_path)
+        return default if image_id < 0 else image_id
+
+    def _pathOfRow(self, row : int) -> str:
+        offset = self._row_offset[row]
+        name = self._pool[offset:offset + self._row_length[row]].decode("utf-8")
+        return self._dirs[self._row_dir[row]] + name
+
+    def id(self, image_path : str) -> int:
+        """路径对应的 id, 不存在返回 -1
+        """
+        value = self._lookup.get(hash(image_path))
+        if value is None:
+            return -1
+        candidates = value if isinstance(value, list) else (value,)
+        for image_id in candidates:
+            if self._pathOfRow(self._id_row[image_id]) == image_path:
+                return image_id
+        return -1
+
+    def path(self, image_id : int) -> str:
+        return self._pathOfRow(self._validRow(image_id))
+
+    def row(self, image_id : int) -> int:
+        """id 对应的行号, 不存在返回 -1
+        """
+        if image_id < 0 or image_id >= len(self._id_row):
+            return -1
+        return self._id_row[image_id]
+
+    def _validRow(self, image_id : int) -> int:
+        """id 对应的行号, 不存在或已删除时抛出 KeyError (行号 -1 会索引到最后一行)
+        """
+        row = self.row(image_id)
+        if row < 0:
+            raise KeyError(image_id)
+        return row
+
+    def rowOf(self, image_path : str) -> int:
+        image_id = self.id(image_path)
+        return -1 if image_id < 0 else self._id_row[image_id]
+
+    def idAt(self, row : int) -> int:
+        return self._row_id[row]
+
+    def pathAt(self, row : int) -> str:
+        return self._pathOfRow(row)
+
+    def add(self, image_path : str, image_id : int = -1) -> int:
+        """添加图像, 已经存在时返回原来的 id
+
+        Args:
+            image_path (str): 图像路径
+            image_id (int): 指定 id (从项目文件读取时), < 0 则自动分配
+        """
+        existed = self.id(image_path)
+        if existed >= 0:
+            return existed
+        if image_id < 0:
+            image_id = len(self._id_row)
+        elif image_id < len(self._id_row) and self._id_row[image_id] >= 0:
+            raise ValueError(f"image id {image_id} already exists")
+        else:
+            self._id_row.extend([-1] * (image_id + 1 - len(self._id_row)))
+        # 目录保留结尾的分隔符
+        index = image_path.rfind("/") + 1
+        folder, name = image_path[:index], image_path[index:]
+        dir_id = self._dir_ids.get(folder)
+        if dir_id is None:
+            dir_id = len(self._dirs)
+            self._dirs.append(folder)
+            self._dir_ids[folder] = dir_id
+        encoded = name.encode("utf-8")
+        if image_id == len(self._id_row):
+            self._id_row.append(len(self._row_id))
+        else:
+            self._id_row[image_id] = len(self._row_id)
+        self._row_id.append(image_id)
+        self._row_dir.append(dir_id)
+        self._row_offset.append(len(self._pool))
+        self._row_length.append(len(encoded))
+        self._pool += encoded
+        for column in self._columns.values():
+            column.append(0)
+        key = hash(image_path)
+        value = self._lookup.get(key)
+        if value is None:
+            self._lookup[key] = image_id
+        elif isinstance(value, list):
+            value.append(image_id)
+        else:
+            self._lookup[key] = [value, image_id]
+        return image_id
+
+    def extend(self, images_path) -> list:
+        """批量添加图像, 跳过已经存在的图像
+
+        Returns:
+            list: 新添加图像的路径
+        """
+        added = []
+        for image_path in images_path:
+            count = len(self._row_id)
+            self.add(image_path)
+            if len(self._row_id) > count:
+                added.append(image_path)
+        return added
+
+    def load(self, rows):
+        """从项目文件读取的行添加图像
+
+        Args:
+            rows: (id, path, width, height, split, label_state) 列表
+        """
+        names = tuple(self.COLUMNS.keys())
+        for image_id, image_path, *values in rows:
+            self.add(image_path, image_id)
+            row = len(self._row_id) - 1
+            for name, value in zip(names, values):
+                self._columns[name][row] = value
+
+    def remove(self, image_id : int) -> bool:
+        return self.removeMany([image_id]) > 0
+
+    def removeMany(self, images_id) -> int:
+        """删除图像, 之后的行号前移, 不留墓碑
+
+        Returns:
+            int: 删除的数量
+        """
+        import numpy as np
+
+        rows = [self.row(image_id) for image_id in images_id]
+        rows = np.unique(np.array([row for row in rows if row >= 0], dtype=np.int64))
+        if len(rows) == 0:
+            return 0
+        for row in rows.tolist():
+            image_id = self._row_id[row]
+            key = hash(self._pathOfRow(row))
+            value = self._lookup[key]
+            if isinstance(value, list):
+                value.remove(image_id)
+                if len(value) == 1:
+                    self._lookup[key] = value[0]
+            else:
+                del self._lookup[key]
+            self._id_row[image_id] = -1
+            self._garbage += self._row_length[row]
+
+        keep = np.ones(len(self._row_id), dtype=bool)
+        keep[rows] = False
+
+        def compress(data : array) -> array:
+            values = np.frombuffer(data, dtype=data.typecode)[keep]
+            return array(data.typecode, values.tobytes())
+
+        self._row_dir = compress(self._row_dir)
+        self._row_offset = compress(self._row_offset)
+        self._row_length = compress(self._row_length)
+        self._row_id = compress(self._row_id)
+        self._columns = {name : compress(column) for name, column in self._columns.items()}
+        # 保留下来的行重新编号
+        id_row = np.frombuffer(self._id_row, dtype=np.int64).copy()
+        id_row[np.frombuffer(self._row_id, dtype=np.int64)] = np.arange(len(self._row_id))
+        self._id_row = array("q", id_row.tobytes())
+        if self._garbage > len(self._pool) // 2:
+            self._compactPool()
+        return len(rows)
+
+    def _compactPool(self):
+        pool = bytearray()
+        offsets = array("q")
+        for row in range(len(self._row_id)):
+            offset = self._row_offset[row]
+            offsets.append(len(pool))
+            pool += self._pool[offset:offset + self._row_length[row]]
+        self._pool = pool
+        self._row_offset = offsets
+        self._garbage = 0
+
+    def ids(self):
+        """按行排列的 id
+        """
+        import numpy as np
+        return np.frombuffer(self._row_id, dtype=np.int64).copy()
+
+    def rowsOfIds(self, images_id):
+        """批量查找 id 对应的行号, 不存在的 id 为 -1
+        """
+        import numpy as np
+        images_id = np.asarray(images_id, dtype=np.int64).reshape(-1)
+        id_row = np.frombuffer(self._id_row, dtype=np.int64)
+        valid = (images_id >= 0) & (images_id < len(id_row))
+        rows = np.full(len(images_id), -1, dtype=np.int64)
+        rows[valid] = id_row[images_id[valid]]
+        return rows
+
+    def folderIds(self):
+        """按行排列的目录编号, 同一目录的图像编号相同
+        """
+        import numpy as np
+        return np.frombuffer(self._row_dir, dtype=self._row_dir.typecode).copy()
+
+    def column(self, name : str):
+        """按行排列的元数据列 (拷贝)
+        """
+        import numpy as np
+        data = self._columns[name]
+        return np.frombuffer(data, dtype=data.typecode).copy()
+
+    def setColumn(self, name : str, values):
+        """按行设置整列元数据
+        """
+        import numpy as np
+        data = self._columns[name]
+        values = np.asarray(values, dtype=data.typecode)
+        if len(values) != len(data):
+            raise ValueError(f"column {name} expects {len(data)} values, got {len(values)}")
+        self._columns[name] = array(data.typecode, values.tobytes())
+
+    def value(self, name : str, image_id : int):
+        return self._columns[name][self._validRow(image_id)]
+
+    def setValue(self, name : str, image_id : int, value):
+        self._columns[name][self._validRow(image_id)] = value
+
+    def countValue(self, name : str, value) -> int:
+        """元数据等于 value 的图像数, 不需要 NumPy
+        """
+        return self._columns[name].count(value)
+
+    def rowsWhere(self, name : str, value):
+        """元数据等于 value 的行号
+        """
+        import numpy as np
+        return np.flatnonzero(self.column(name) == value)
+
+    def nbytes(self) -> int:
+        """不含 Python 对象开销的存储大小
+        """
+        arrays = [self._row_dir, self._row_offset, self._row_length, self._row_id, self._id_row, *self._columns.values()]
+        return len(self._pool) + sum(data.itemsize * len(data) for data in arrays) + sum(len(folder) for folder in self._dirs)
@@ -0,0 +1,200 @@
+"""批量推理 / 预标注
+
+用检测器处理项目中的图像, 结果作为候选框 (AnnotationSet.PROPOSAL) 写入项目, 由人工确认或修改.
+
+流水线: data.loader.SharedBatchLoader 在多个进程中解码并缩放图像, 通过共享内存预取批次; 当前线程对已解码的批次
+做预处理和推理 (ONNX Runtime 推理时释放 GIL 并使用多个线程), 同时解码进程准备后面的批次. 结果按图像顺序累积,
+每 commit_images 张图像交给 write 批量写入, write 之后的图像数即检查点, 中断后从检查点继续.
+
+检测器可以替换: DETECTORS 中的名称, 或者 "模块:类名" 形式的任意类. 检测器需要实现
+
+    __init__(model_path, input_size, options)
+    class_names                                     类别名称, 检测结果中的类别下标对应的名称
+    detect(images) -> [(boxes, scores, classes)]    images (B, S, S, 3) uint8 RGB, 框为输入图像上的像素坐标 x1, y1, x2, y2
+"""
+import os
+import ast
+import json
+import time
+import hashlib
+import importlib
+from collections import namedtuple
+
+import numpy as np
+
+from .loader import SharedBatchLoader
+
+
+# 与 AnnotationSet 的 flags 一致
+PROPOSAL = 2
+
+PrelabelProgress = namedtuple("PrelabelProgress", ["done", "total", "images_per_second"])
+PrelabelResult = namedtuple("PrelabelResult", ["done", "total", "boxes", "errors", "elapsed", "completed"])
+
+
+class StubDetector(object):
+    """不需要模型的检测器: 每张图像中亮度高于阈值的像素的外接矩形, 用于测试流水线和没有模型时的演示
+    """
+    def __init__(self, model_path : str, input_size : int, options : dict) -> None:
+        self.class_names = list(options.get("class_names") or ["object"])[:1]
+        self.threshold = float(options.get("brightness_threshold", 200))
+
+    def detect(self, images : np.ndarray) -> list:
+        bright = images.max(axis=3) >= self.threshold
+        rows, columns = bright.any(axis=2), bright.any(axis=1)
+        results = []
+        for row_mask, column_mask in zip(rows, columns):
+            ys, xs = np.flatnonzero(row_mask), np.flatnonzero(column_mask)
+            if len(ys) == 0:
+                results.append((np.empty((0, 4)), np.empty(0), np.empty(0, dtype=np.int64)))
+                continue
+            box = np.array([[xs[0], ys[0], xs[-1] + 1, ys[-1] + 1]], dtype=np.float64)
+            score = np.array([row_mask.mean() * column_mask.mean()]) ** 0.25
+            results.append((box, score, np.zeros(1, dtype=np.int64)))
+        return results
+
+
+class OnnxDetector(object):
+    """ONNX Runtime (CPU) 检测器
+
+    模型约定: 输入 (B, 3, S, S) float32, RGB, 0 ~ 1; 第一个输出为 (B, K, 6) x1, y1, x2, y2, score, class,
+    即包含 NMS 的导出模型, 框为输入图像上的像素坐标. 输入的批量维度固定为 1 时逐张推理.
+    类别名称从模型元数据的 names 读取 (例如 {0: 'person', ...}), 没有时需要在 options 的 class_names 中给出.
+    """
+    def __init__(self, model_path : str, input_size : int, options : dict) -> None:
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise RuntimeError("ONNX 检测器需要 onnxruntime (pip install onnxruntime)") from e
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = int(options.get("threads", 0))
+        self.session = onnxruntime.InferenceSession(model_path, session_options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.single = model_input.shape[0] == 1
+        names = self.session.get_modelmeta().custom_metadata_map.get("names")
+        self.class_names = options.get("class_names") or None
+        if names and self.class_names is None:
+            try:
+                names = ast.literal_eval(names)
+                self.class_names = [names[key] for key in sorted(names)] if isinstance(names, dict) else list(names)
+            except (ValueError, SyntaxError):
+                pass
+        if self.class_names is None:
+            raise ValueError(f"{os.path.basename(model_path)}: no class names in model metadata, set class_names")
+
+    def detect(self, images : np.ndarray) -> list:
+        inputs = np.ascontiguousarray(images.transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        if self.single:
+            outputs = np.concatenate([self.session.run(None, {self.input_name : inputs[i:i + 1]})[0] for i in range(len(inputs))])
+        else:
+            outputs = self.session.run(None, {self.input_name : inputs})[0]
+        return [(output[:, :4].astype(np.float64), output[:, 4].astype(np.float64), output[:, 5].astype(np.int64))
+                for output in outputs.reshape(len(images), -1, 6)]
+
+
+DETECTORS = {
+    "onnx" : OnnxDetector,
+    "stub" : StubDetector,
+}
+
+
+def detectorClass(name : str):
+    """DETECTORS 中的名称或 "模块:类名"
+    """
+    if name in DETECTORS:
+        return DETECTORS[name]
+    module_name, _, class_name = name.partition(":")
+    if not class_name:
+        raise ValueError(f"unknown detector {name!r}, expected one of {sorted(DETECTORS)} or 'module:Class'")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class Prelabeler(object):
+    """对一组图像运行检测器, 结果按图像顺序分批交给 write
+
+    Args:
+        detector: 检测器实例, 见模块说明
+        image_ids, paths: 要处理的图像, 顺序固定, 检查点是已写入的图像数
+        class_ids: 检测结果的类别下标对应的项目类别 id
+    """
+    def __init__(self, detector, image_ids, paths, class_ids, input_size : int = 640, batch_size : int = 8,
+                 workers : int = 1, prefetch : int = 4, score_threshold : float = 0.25, max_detections : int = 100) -> None:
+        self.detector = detector
+        self.image_ids = list(image_ids)
+        self.paths = list(paths)
+        self.class_ids = np.asarray(class_ids, dtype=np.int64)
+        self.input_size = input_size
+        self.batch_size = batch_size
+        self.workers = workers
+        self.prefetch = prefetch
+        self.score_threshold = score_threshold
+        self.max_detections = max_detections
+
+    @staticmethod
+    def signature(detector_name : str, model_path : str, image_ids, **params) -> str:
+        """检查点对应的任务, 模型文件、图像或参数改变后不从旧的检查点继续
+        """
+        digest = hashlib.sha1()
+        model = [detector_name, model_path]
+        if model_path and os.path.isfile(model_path):
+            stat = os.stat(model_path)
+            model += [stat.st_size, stat.st_mtime_ns]
+        digest.update(json.dumps([model, params], sort_keys=True).encode("utf-8"))
+        digest.update(np.asarray(image_ids, dtype=np.int64).tobytes())
+        return digest.hexdigest()
+
+    def proposals(self, outputs : list, scales : np.ndarray) -> list:
+        """把一个批次的检测结果换算为原图坐标的候选框行 (class_id, x1, y1, x2, y2, flags)
+        """
+        rows = []
+        for (boxes, scores, classes), scale in zip(outputs, scales.tolist()):
+            keep = (scores >= self.score_threshold) & (classes >= 0) & (classes < len(self.class_ids))
+            if scale <= 0 or not keep.any():
+                rows.append([])
+                continue
+            order = np.argsort(-scores[keep], kind="stable")[:self.max_detections]
+            boxes = boxes[keep][order] / scale
+            class_ids = self.class_ids[classes[keep][order]]
+            rows.append(list(zip(class_ids.tolist(), boxes[:, 0].tolist(), boxes[:, 1].tolist(),
+                                 boxes[:, 2].tolist(), boxes[:, 3].tolist(), [PROPOSAL] * len(boxes))))
+        return rows
+
+    def run(self, start : int = 0, write=None, progress=None, should_stop=None, commit_images : int = 512) -> PrelabelResult:
+        """从第 start 张图像开始处理
+
+        Args:
+            write: write(proposals, done), proposals 为 image_id -> 行, done 为写入后完成的图像数 (检查点)
+            progress: progress(PrelabelProgress)
+            should_stop: 返回 True 时在当前批次结束后停止
+        """
+        total = len(self.paths)
+        begin = time.perf_counter()
+        done, boxes, errors, completed = start, 0, 0, True
+        pending = {}
+        if start >= total:
+            return PrelabelResult(done, total, 0, 0, 0.0, True)
+        # 不需要标注框, 每张图像留 1 个位置
+        loader = SharedBatchLoader(self.paths[start:], [[]] * (total - start), self.input_size, self.batch_size,
+                                   self.workers, self.prefetch, max_boxes=1, shuffle=False)
+        try:
+            for batch in loader.epoch(0):
+                outputs = self.detector.detect(batch.images)
+                for index, rows in zip(batch.indices.tolist(), self.proposals(outputs, batch.scales)):
+                    pending[self.image_ids[start + index]] = rows
+                    boxes += len(rows)
+                errors += batch.errors
+                done += len(batch.indices)
+                stop = should_stop is not None and should_stop()
+                if len(pending) >= commit_images or done == total or stop:
+                    if write is not None:
+                        write(pending, done)
+                    pending = {}
+                if progress is not None:
+                    progress(PrelabelProgress(done, total, (done - start) / max(time.perf_counter() - begin, 1e-9)))
+                if stop:
+                    completed = done == total
+                    break
+        finally:
+            loader.close()
+        return PrelabelResult(done, total, boxes, errors, time.perf_counter() - begin, completed)
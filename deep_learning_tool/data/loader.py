@@ -0,0 +1,215 @@
+"""流式的批量图像加载
+
+解码在多个子进程中进行, 每个批次写入共享内存中的一个槽 (图像 (B, S, S, 3) uint8 和框 (B, M, 5) float32),
+进程之间只传递槽号和图像下标, 不序列化图像数据. 槽的数量即预取的批次数: 训练使用一个批次时,
+其余的槽已经在后台解码.
+
+图像按长边缩放到 S (不放大) 后放在画布的左上角, 其余部分为 0; 框按同样的比例缩放, 格式为 (类别下标, x1, y1, x2, y2).
+每张图像的缩放比例 (读取失败为 0) 也写入槽中, 推理时用它把检测框换算回原图坐标.
+"""
+import time
+import queue
+import multiprocessing
+from multiprocessing import shared_memory
+from collections import namedtuple
+
+import numpy as np
+
+
+# 一个批次, images 和 targets 是共享内存的视图, 只在取下一个批次之前有效
+Batch = namedtuple("Batch", ["epoch", "index", "indices", "images", "targets", "counts", "scales", "decode_seconds", "errors"])
+
+
+class SharedSlots(object):
+    """固定数量的共享内存槽, 每个槽保存一个批次的图像、框、框数和缩放比例
+    """
+    def __init__(self, slot_count : int, batch_size : int, image_size : int, max_boxes : int, names=None) -> None:
+        self.shapes = ((batch_size, image_size, image_size, 3), (batch_size, max_boxes, 5), (batch_size,), (batch_size,))
+        self.dtypes = (np.uint8, np.float32, np.int32, np.float32)
+        self.nbytes = [int(np.prod(shape)) * np.dtype(dtype).itemsize for shape, dtype in zip(self.shapes, self.dtypes)]
+        self.owner = names is None
+        if self.owner:
+            self.memories = [shared_memory.SharedMemory(create=True, size=sum(self.nbytes)) for _ in range(slot_count)]
+        else:
+            self.memories = [shared_memory.SharedMemory(name=name) for name in names]
+        self.arrays = [self._views(memory) for memory in self.memories]
+
+    def _views(self, memory):
+        views, offset = [], 0
+        for shape, dtype, nbytes in zip(self.shapes, self.dtypes, self.nbytes):
+            views.append(np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=offset))
+            offset += nbytes
+        return views
+
+    def names(self) -> list:
+        return [memory.name for memory in self.memories]
+
+    def close(self):
+        # 先释放视图, 否则 SharedMemory.close 会因为还有导出的缓冲区而失败
+        self.arrays = []
+        for memory in self.memories:
+            try:
+                memory.close()
+            except BufferError:
+                # 调用者还持有最后一个批次的视图, 映射在它们释放后解除
+                pass
+            if self.owner:
+                memory.unlink()
+        self.memories = []
+
+
+def decodeInto(path : str, out : np.ndarray) -> float:
+    """把图像按长边缩放到 out 的尺寸 (不放大) 后写入 out (S, S, 3) 的左上角
+
+    Returns:
+        float: 缩放比例, 读取失败时为 0, out 为全 0
+    """
+    from qtpy.QtGui import QImage
+    from deep_learning_tool.utils.qt import readImage
+    out[:] = 0
+    image, original_size = readImage(path, out.shape[0])
+    if image.isNull() or original_size.width() <= 0:
+        return 0.0
+    image = image.convertToFormat(QImage.Format.Format_RGB888)
+    width, height = min(image.width(), out.shape[1]), min(image.height(), out.shape[0])
+    pixels = np.frombuffer(image.constBits(), dtype=np.uint8, count=image.sizeInBytes()).reshape(image.height(), image.bytesPerLine())
+    out[:height, :width] = pixels[:height, :width * 3].reshape(height, width, 3)
+    return image.width() / original_size.width()
+
+
+def _decodeWorker(slot_names : list, batch_size : int, image_size : int, max_boxes : int,
+                  paths : list, boxes : list, tasks, ready):
+    """解码进程: 从 tasks 取 (槽, 批次, 图像下标), 写入槽后把 (槽, 批次, 解码时间, 失败数) 放入 ready
+    """
+    slots = SharedSlots(len(slot_names), batch_size, image_size, max_boxes, slot_names)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, index, indices = task
+            start = time.perf_counter()
+            images, targets, counts, scales = slots.arrays[slot]
+            errors = 0
+            for row, image_index in enumerate(indices):
+                scale = decodeInto(paths[image_index], images[row])
+                scales[row] = scale
+                image_boxes = boxes[image_index][:max_boxes]
+                counts[row] = len(image_boxes) if scale > 0 else 0
+                if scale > 0:
+                    targets[row, :len(image_boxes), 0] = image_boxes[:, 0]
+                    targets[row, :len(image_boxes), 1:] = image_boxes[:, 1:] * scale
+                else:
+                    errors += 1
+            ready.put((slot, index, time.perf_counter() - start, errors))
+    finally:
+        slots.close()
+
+
+class SharedBatchLoader(object):
+    """多进程解码、共享内存传递、预取的批量加载器
+
+        loader = SharedBatchLoader(paths, boxes, 320, 32, workers=4, prefetch=6)
+        for batch in loader.epoch(0):
+            trainer.step(batch.images, batch.targets, batch.counts)
+        loader.close()
+
+    Args:
+        paths (list): 图像路径
+        boxes (list): 每张图像的框 (K, 5) 类别下标, x1, y1, x2, y2 (原图像素)
+        prefetch (int): 共享内存槽的数量, 即最多同时在解码和等待使用的批次
+    """
+    def __init__(self, paths : list, boxes : list, image_size : int, batch_size : int, workers : int = 1,
+                 prefetch : int = 4, max_boxes : int = 100, shuffle : bool = True, drop_last : bool = False, seed : int = 0) -> None:
+        self.paths = list(paths)
+        self.boxes = [np.asarray(b, dtype=np.float32).reshape(-1, 5) for b in boxes]
+        self.image_size = image_size
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.slots = SharedSlots(max(prefetch, 1), batch_size, image_size, max_boxes)
+        # 使用 spawn: 界面进程中有其他线程
+        context = multiprocessing.get_context("spawn")
+        self.tasks = context.Queue()
+        self.ready = context.Queue()
+        self.workers = [context.Process(target=_decodeWorker, daemon=True, args=(
+            self.slots.names(), batch_size, image_size, max_boxes, self.paths, self.boxes, self.tasks, self.ready))
+            for _ in range(max(workers, 1))]
+        for worker in self.workers:
+            worker.start()
+        # 等待第一个批次的时间 (包括启动解码进程), 和之后等待批次的累计时间, 即训练因为数据没有准备好而停顿的时间
+        self.startup_seconds = None
+        self.stall_seconds = 0.0
+
+    def __len__(self) -> int:
+        if self.drop_last:
+            return len(self.paths) // self.batch_size
+        return (len(self.paths) + self.batch_size - 1) // self.batch_size
+
+    def order(self, epoch : int) -> np.ndarray:
+        if not self.shuffle:
+            return np.arange(len(self.paths))
+        return np.random.default_rng((self.seed, epoch)).permutation(len(self.paths))
+
+    def epoch(self, epoch : int):
+        """按批次顺序产生一轮的 Batch, 上一个批次的槽在取下一个批次时交还给解码进程
+        """
+        order = self.order(epoch)
+        batch_count = len(self)
+        batches = [order[i * self.batch_size:(i + 1) * self.batch_size] for i in range(batch_count)]
+        free = list(range(len(self.slots.memories)))
+        # 已提交还没有解码完的批次 -> 槽, 解码完的批次 -> (槽, 解码时间, 失败数)
+        pending, done = {}, {}
+        submitted = 0
+
+        def submit():
+            nonlocal submitted
+            while free and submitted < batch_count:
+                slot = free.pop()
+                pending[submitted] = slot
+                self.tasks.put((slot, submitted, batches[submitted]))
+                submitted += 1
+
+        def receive():
+            slot, index, decode_seconds, errors = self._get()
+            done[index] = (pending.pop(index), decode_seconds, errors)
+
+        submit()
+        try:
+            for index in range(batch_count):
+                start = time.perf_counter()
+                while index not in done:
+                    receive()
+                if self.startup_seconds is None:
+                    self.startup_seconds = time.perf_counter() - start
+                else:
+                    self.stall_seconds += time.perf_counter() - start
+                slot, decode_seconds, errors = done.pop(index)
+                images, targets, counts, scales = self.slots.arrays[slot]
+                count = len(batches[index])
+                yield Batch(epoch, index, batches[index], images[:count], targets[:count], counts[:count], scales[:count],
+                            decode_seconds, errors)
+                free.append(slot)
+                submit()
+        finally:
+            # 提前结束时等待已提交的批次解码完, 避免下一轮复用还在写入的槽
+            while pending:
+                receive()
+
+    def _get(self):
+        while True:
+            try:
+                return self.ready.get(timeout=1.0)
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self.workers):
+                    raise RuntimeError("decode worker exited unexpectedly")
+
+    def close(self):
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join(5)
+            if worker.is_alive():
+                worker.terminate()
+        self.slots.close()
@@ -1,11 +1,52 @@
+import os
+import re
+import typing
 
-from collections import OrderedDict
+from deep_learning_tool import configs
+from .thumbnail_cache import ThumbnailCache
+from .image_registry import ImageRegistry
+from .project_store import ProjectStore
+
+if typing.TYPE_CHECKING:
+    from .annotations import AnnotationSet
 
 class Project(object):
-    def __init__(self, project_name, project_type) -> None:
-        self.images_path = OrderedDict()
+    def __init__(self, project_name, project_type, cache_dir=None, store : ProjectStore = None) -> None:
+        self.store = store
+        # 有项目文件时在第一次访问时读取
+        self._images = ImageRegistry() if store is None else None
+        # 等待写入项目文件的图像 (id, path)
+        self._pending_images = []
+        # image_id -> AnnotationSet, 第一次访问时从项目文件读取
+        self._annotations = {}
+        # 上次写入项目文件后的 split 列, None 表示没有修改
+        self._saved_splits = None
         self.project_name = project_name
         self.project_type = project_type
+        if cache_dir is None:
+            cache_dir = os.path.join(configs.thumbnail_cache_root, project_name)
+        self.cache_dir = cache_dir
+        self._thumbnail_cache = None
+
+    @classmethod
+    def create(cls, path : str, project_name, project_type):
+        """创建项目文件, 已存在时打开
+        """
+        if os.path.exists(path):
+            return cls.open(path)
+        store = ProjectStore(path)
+        store.setMeta("name", project_name)
+        store.setMeta("type", project_type)
+        return cls(project_name, project_type, path + ".cache", store)
+
+    @classmethod
+    def open(cls, path : str):
+        """打开项目文件, 只读取项目信息, 图像在第一次访问时读取
+        """
+        store = ProjectStore(path)
+        project_name = store.meta("name", os.path.splitext(os.path.basename(path))[0])
+        project_type = store.meta("type", "")
+        return cls(project_name, project_type, path + ".cache", store)
 
     @property
     def name(self):
@@ -15,5 +56,219 @@ class Project(object):
     def type(self):
         return self.project_type
     
-    def addImage(self, img_path : str):
-        self.images_path[img_path] = len(self.images_path) + 1
+    @property
+    def images(self) -> ImageRegistry:
+        if self._images is None:
+            self._images = ImageRegistry()
+            for rows in self.store.iterImages():
+                self._images.load(rows)
+        return self._images
+
+    @property
+    def images_path(self) -> ImageRegistry:
+        return self.images
+
+    @property
+    def thumbnail_cache(self) -> ThumbnailCache:
+        if self._thumbnail_cache is None:
+            self._thumbnail_cache = ThumbnailCache(self.cache_dir, configs.thumbnail_cache_max_bytes)
+        return self._thumbnail_cache
+    
+    def addImage(self, img_path : str) -> int:
+        self.addImages([img_path])
+        return self.images.id(img_path)
+
+    def addImages(self, images_path) -> list:
+        """批量添加图像, 跳过已经在项目中的图像, 在 flush 时写入项目文件
+
+        Returns:
+            list: 新添加的图像
+        """
+        added = self.images.extend(images_path)
+        if self.store is not None:
+            self._pending_images.extend((self._images.id(img_path), img_path) for img_path in added)
+        return added
+
+    def annotations(self, image_path : str) -> "AnnotationSet":
+        """图像的标注, 不在项目中的图像返回不会保存的空标注
+        """
+        # 标注依赖 NumPy, 打开标注页时才导入
+        from .annotations import AnnotationSet
+        image_id = self.images.id(image_path)
+        if image_id < 0:
+            return AnnotationSet()
+        annotations = self._annotations.get(image_id)
+        if annotations is None:
+            rows = self.store.loadAnnotations(image_id) if self.store is not None else []
+            annotations = AnnotationSet.fromRows(rows, image_id)
+            self._annotations[image_id] = annotations
+        return annotations
+
+    def loadedAnnotations(self) -> dict:
+        """已经读取到内存中的标注 image_id -> AnnotationSet, 它们的修改在 flush 前不在项目文件中
+        """
+        return dict(self._annotations)
+
+    def setProposals(self, proposals : dict):
+        """替换图像的候选框 (AnnotationSet.PROPOSAL), 保留已确认的标注
+
+        已读取的图像修改内存中的标注 (可以撤销), 在 flush 时写入; 其余图像在一个事务中直接写入项目文件.
+
+        Args:
+            proposals (dict): image_id -> [(class_id, x1, y1, x2, y2, flags), ...], flags 应包含 PROPOSAL
+        """
+        import numpy as np
+        unloaded = {}
+        for image_id, rows in proposals.items():
+            # 预标注期间删除的图像
+            if self.images.row(image_id) < 0:
+                continue
+            annotations = self._annotations.get(image_id)
+            if annotations is None and self.store is None:
+                annotations = self.annotations(self.images.path(image_id))
+            if annotations is None:
+                unloaded[image_id] = rows
+                continue
+            rows = np.asarray(rows, dtype=np.float64).reshape(-1, 6)
+            annotations.replaceProposals(rows[:, 1:5], rows[:, 0].astype(np.int64))
+        if unloaded and self.store is not None:
+            self.store.replaceProposals(unloaded)
+
+    def classHistograms(self, class_count : int = 0):
+        """每张图像每个类别的框数, 用于拆分和统计
+
+        Returns:
+            np.ndarray: (N, C) int32, 按 images 的行排列, C 至少为 class_count
+        """
+        import numpy as np
+        self.flush()
+        if self.store is not None:
+            counts = np.array(self.store.classCounts(), dtype=np.int64).reshape(-1, 3)
+        else:
+            counts = np.array([(annotations.image_id, class_id, count)
+                               for annotations in self._annotations.values()
+                               for class_id, count in enumerate(annotations.classHistogram()) if count > 0],
+                              dtype=np.int64).reshape(-1, 3)
+        rows = self.images.rowsOfIds(counts[:, 0])
+        valid = (rows >= 0) & (counts[:, 1] >= 0)
+        class_count = max(class_count, int(counts[valid, 1].max()) + 1 if valid.any() else 0)
+        histograms = np.zeros((len(self.images), class_count), dtype=np.int32)
+        histograms[rows[valid], counts[valid, 1]] = counts[valid, 2]
+        return histograms
+
+    def annotationArrays(self, splits=None):
+        """所有图像的标注, 用于评估等批量计算
+
+        Args:
+            splits: 只包括这些集合中的图像, None 为全部图像
+
+        Returns:
+            (np.ndarray, dict): 升序的图像 id; 标注的列 image_id (N,), class_id (N,), boxes (N, 4), flags (N,), 按 image_id 排列
+        """
+        import numpy as np
+        self.flush()
+        image_ids = self.images.ids()
+        if splits is not None:
+            image_ids = image_ids[np.isin(self.images.column("split"), np.asarray(list(splits)))]
+        image_ids = np.sort(image_ids)
+        if self.store is not None:
+            batches = [np.array(rows, dtype=np.float64) for rows in self.store.iterAnnotations()]
+        else:
+            batches = [np.array([(annotations.image_id, *row) for row in annotations.toRows()], dtype=np.float64).reshape(-1, 7)
+                       for annotations in self._annotations.values()]
+        data = np.concatenate(batches).reshape(-1, 7) if batches else np.empty((0, 7))
+        data = data[np.isin(data[:, 0].astype(np.int64), image_ids)]
+        data = data[np.argsort(data[:, 0], kind="stable")]
+        return image_ids, {
+            "image_id": data[:, 0].astype(np.int64),
+            "class_id": data[:, 1].astype(np.int64),
+            "boxes": np.ascontiguousarray(data[:, 2:6]),
+            "flags": data[:, 6].astype(np.int64),
+        }
+
+    def imageGroups(self, pattern : str = None):
+        """拆分时的分组, 同一组的图像分到同一个集合
+
+        Args:
+            pattern (str): 为 None 时按所在目录分组; 否则对文件名使用正则表达式,
+                有捕获组时以第一个捕获组 (例如产品序列号) 分组, 否则以匹配的文本分组, 不匹配的图像单独成组
+
+        Returns:
+            np.ndarray: (N,) int64 组号, 按 images 的行排列
+        """
+        import numpy as np
+        if pattern is None:
+            return self.images.folderIds().astype(np.int64)
+        regex = re.compile(pattern)
+        keys = {}
+        groups = np.empty(len(self.images), dtype=np.int64)
+        for row, image_path in enumerate(self.images):
+            match = regex.search(os.path.basename(image_path))
+            if match is None:
+                key = (image_path,)
+            else:
+                key = match.group(1) if regex.groups > 0 else match.group(0)
+            groups[row] = keys.setdefault(key, len(keys))
+        return groups
+
+    def splits(self):
+        """每张图像所在的集合, 取值见 ProjectStore.SPLITS, 按 images 的行排列
+        """
+        return self.images.column("split")
+
+    def setSplits(self, splits):
+        """设置所有图像的集合, 在 flush 时只写入变化的图像
+        """
+        if self._saved_splits is None:
+            self._saved_splits = self.images.column("split")
+        self.images.setColumn("split", splits)
+
+    def setImageSplit(self, image_path : str, split : int):
+        image_id = self.images.id(image_path)
+        if image_id < 0:
+            return
+        if self._saved_splits is None:
+            self._saved_splits = self.images.column("split")
+        self.images.setValue("split", image_id, split)
+
+    def removeImages(self, images_id):
+        self.flush()
+        for image_id in images_id:
+            self._annotations.pop(image_id, None)
+        self.images.removeMany(images_id)
+        if self.store is not None:
+            self.store.removeImages(images_id)
+
+    def isDirty(self) -> bool:
+        return len(self._pending_images) > 0 or self._saved_splits is not None or any(annotations.dirty for annotations in self._annotations.values())
+
+    def flush(self):
+        """在一个事务中写入未保存的修改
+        """
+        if self.store is None:
+            return
+        if len(self._pending_images) > 0:
+            self.store.addImages(self._pending_images)
+            self._pending_images = []
+        if self._saved_splits is not None:
+            splits = self.images.column("split")
+            saved = self._saved_splits
+            if len(saved) < len(splits):
+                # 之后加入的图像原来都是未分配
+                saved = saved.copy()
+                saved.resize(len(splits))
+            changed = (splits != saved).nonzero()[0]
+            ids = self.images.ids()[changed]
+            self.store.updateImages("split", zip(splits[changed].tolist(), ids.tolist()))
+            self._saved_splits = None
+        dirty = [annotations for annotations in self._annotations.values() if annotations.dirty]
+        if len(dirty) > 0:
+            self.store.saveAnnotations({annotations.image_id : annotations.toRows() for annotations in dirty})
+            for annotations in dirty:
+                annotations.dirty = False
+
+    def close(self):
+        if self.store is not None:
+            self.flush()
+            self.store.close()
+            self.store = None
@@ -0,0 +1,229 @@
+import sqlite3
+
+
+class ProjectStore(object):
+    """SQLite 项目文件
+
+    使用 WAL 模式, 写入时不阻塞读取. 打开时只读取 meta 表, 与项目大小无关; 
+    图像按批读取, 标注按图像读取.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE TABLE IF NOT EXISTS classes (
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL,
+        color INTEGER DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS splits (
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS images (
+        id INTEGER PRIMARY KEY,
+        path TEXT UNIQUE NOT NULL,
+        width INTEGER DEFAULT 0,
+        height INTEGER DEFAULT 0,
+        split INTEGER DEFAULT 0,
+        label_state INTEGER DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS annotations (
+        id INTEGER PRIMARY KEY,
+        image_id INTEGER NOT NULL,
+        class_id INTEGER DEFAULT 0,
+        x1 REAL, y1 REAL, x2 REAL, y2 REAL,
+        flags INTEGER DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS annotations_image ON annotations (image_id);
+    """
+    # split 列的取值
+    SPLITS = ((0, "未分配"), (1, "训练"), (2, "验证"), (3, "测试"))
+    IMAGE_COLUMNS = ("width", "height", "split", "label_state")
+    # 标注 flags 中的候选框位, 与 AnnotationSet.PROPOSAL 一致
+    PROPOSAL = 2
+
+    def __init__(self, path : str) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.executescript(self.SCHEMA)
+            self.connection.executemany("INSERT OR IGNORE INTO splits (id, name) VALUES (?, ?)", self.SPLITS)
+
+    def close(self):
+        self.connection.close()
+
+    def meta(self, key : str, default=None):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def setMeta(self, key : str, value):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def imageCount(self, splits=None) -> int:
+        """图像数, splits 不为 None 时只统计这些集合中的图像
+        """
+        if splits is None:
+            return self.connection.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+        splits = tuple(splits)
+        return self.connection.execute(
+            f"SELECT COUNT(*) FROM images WHERE split IN ({', '.join('?' * len(splits))})", splits).fetchone()[0]
+
+    def iterImages(self, batch_size : int = 10000):
+        """按 id 顺序分批读取图像
+
+        Yields:
+            list: (id, path, width, height, split, label_state)
+        """
+        cursor = self.connection.execute("SELECT id, path, width, height, split, label_state FROM images ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+    def addImages(self, images):
+        """在一个事务中批量写入图像
+
+        Args:
+            images: (id, path) 列表
+        """
+        with self.connection:
+            self.connection.executemany("INSERT OR IGNORE INTO images (id, path) VALUES (?, ?)", images)
+
+    def removeImages(self, images_id):
+        rows = [(image_id,) for image_id in images_id]
+        with self.connection:
+            self.connection.executemany("DELETE FROM annotations WHERE image_id = ?", rows)
+            self.connection.executemany("DELETE FROM images WHERE id = ?", rows)
+
+    def updateImages(self, column : str, values):
+        """批量更新图像的元数据
+
+        Args:
+            column (str): IMAGE_COLUMNS 中的列名
+            values: (value, id) 列表
+        """
+        if column not in self.IMAGE_COLUMNS:
+            raise ValueError(f"unknown image column {column}")
+        with self.connection:
+            self.connection.executemany(f"UPDATE images SET {column} = ? WHERE id = ?", values)
+
+    def classes(self) -> list:
+        return self.connection.execute("SELECT id, name, color FROM classes ORDER BY id").fetchall()
+
+    def addClass(self, name : str, color : int = 0) -> int:
+        with self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO classes (name, color) VALUES (?, ?)", (name, color))
+        return self.connection.execute("SELECT id FROM classes WHERE name = ?", (name,)).fetchone()[0]
+
+    def annotationCount(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM annotations").fetchone()[0]
+
+    def classCounts(self) -> list:
+        """每张图像每个类别的框数
+
+        Returns:
+            list: (image_id, class_id, count)
+        """
+        return self.connection.execute(
+            "SELECT image_id, class_id, COUNT(*) FROM annotations GROUP BY image_id, class_id").fetchall()
+
+    def iterAnnotations(self, batch_size : int = 100000):
+        """按 image_id 顺序分批读取所有标注
+
+        Yields:
+            list: (image_id, class_id, x1, y1, x2, y2, flags)
+        """
+        cursor = self.connection.execute(
+            "SELECT image_id, class_id, x1, y1, x2, y2, flags FROM annotations ORDER BY image_id, id")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+    def classIds(self) -> list:
+        """标注中出现的类别 id, 升序
+        """
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT class_id FROM annotations ORDER BY class_id")]
+
+    def iterImageAnnotations(self, splits, after_id : int = -1, batch_size : int = 10000):
+        """按 id 顺序流式读取指定集合中的图像和它们的标注, 用于导出
+
+        图像和标注各用一个按 image_id 排序的游标分批读取并归并, 内存占用与项目大小无关.
+
+        Args:
+            splits: 集合, 见 SPLITS
+            after_id (int): 只读取 id 大于它的图像, 用于继续中断的导出
+
+        Yields:
+            tuple: (id, path, width, height, split, [(class_id, x1, y1, x2, y2, flags), ...])
+        """
+        splits = tuple(splits)
+        images = self.connection.execute(
+            f"SELECT id, path, width, height, split FROM images WHERE id > ? AND split IN ({', '.join('?' * len(splits))}) ORDER BY id",
+            (after_id, *splits))
+        annotations = self.connection.execute(
+            "SELECT image_id, class_id, x1, y1, x2, y2, flags FROM annotations WHERE image_id > ? ORDER BY image_id, id", (after_id,))
+        pending = []
+        next_annotation = None
+        while True:
+            rows = images.fetchmany(batch_size)
+            if not rows:
+                break
+            for image_id, path, width, height, split in rows:
+                boxes = []
+                while True:
+                    if next_annotation is None:
+                        if not pending:
+                            pending = annotations.fetchmany(batch_size)
+                            if not pending:
+                                break
+                            pending.reverse()
+                        next_annotation = pending.pop()
+                    if next_annotation[0] > image_id:
+                        break
+                    if next_annotation[0] == image_id:
+                        boxes.append(next_annotation[1:])
+                    next_annotation = None
+                yield image_id, path, width, height, split, boxes
+
+    def loadAnnotations(self, image_id : int) -> list:
+        """读取一张图像的标注
+
+        Returns:
+            list: (class_id, x1, y1, x2, y2, flags)
+        """
+        return self.connection.execute(
+            "SELECT class_id, x1, y1, x2, y2, flags FROM annotations WHERE image_id = ? ORDER BY id", (image_id,)).fetchall()
+
+    def replaceProposals(self, proposals : dict):
+        """在一个事务中替换多张图像的候选框, 保留已确认的标注
+
+        Args:
+            proposals (dict): image_id -> [(class_id, x1, y1, x2, y2, flags), ...]
+        """
+        with self.connection:
+            self.connection.executemany("DELETE FROM annotations WHERE image_id = ? AND flags & ? != 0",
+                                        [(image_id, self.PROPOSAL) for image_id in proposals])
+            self.connection.executemany(
+                "INSERT INTO annotations (image_id, class_id, x1, y1, x2, y2, flags) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(image_id, *row) for image_id, rows in proposals.items() for row in rows])
+
+    def saveAnnotations(self, annotations : dict):
+        """在一个事务中替换多张图像的标注
+
+        Args:
+            annotations (dict): image_id -> [(class_id, x1, y1, x2, y2, flags), ...]
+        """
+        with self.connection:
+            for image_id, rows in annotations.items():
+                self.connection.execute("DELETE FROM annotations WHERE image_id = ?", (image_id,))
+                self.connection.executemany(
+                    "INSERT INTO annotations (image_id, class_id, x1, y1, x2, y2, flags) VALUES (?, ?, ?, ?, ?, ?, ?)", 
+                    [(image_id, *row) for row in rows])
@@ -0,0 +1,253 @@
+"""检查页的查询引擎
+
+为项目中的每张图像预先计算标注的汇总: 框数、候选框数、类别直方图、最小框面积和框之间的最大 IoU,
+按 ImageRegistry 的行排列. "有 N 个以上类别 X 的框"、"有小于 N px 的框"、"有重叠的框" 等查询
+都是对这些列的一次 NumPy 比较, 结果直接是图库的行号, 与标注总数无关.
+
+汇总在第一次打开检查页时从项目文件一次读取所有标注并按图像分段计算; 之后只重新计算被修改的图像:
+已读取到内存中的标注按 AnnotationSet.version 判断是否修改, 直接写入项目文件的修改 (例如预标注) 由 invalidate 通知.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from deep_learning_tool.utils.geometry import boxIou
+from .evaluation import _pairs
+
+
+# 与 AnnotationSet 的 flags 一致
+PROPOSAL = 2
+
+# 计算重叠时每块的框对数, 限制中间数组的内存
+CHUNK_PAIRS = 4 * 1024 * 1024
+
+
+class ReviewQuery(namedtuple("ReviewQuery", ["class_id", "min_class_count", "max_box_size", "min_iou", "proposals"],
+                             defaults=(None, 1, None, None, False))):
+    """检查页的过滤条件, 为 None 的条件不使用, 所有条件同时满足
+
+    Args:
+        class_id: 至少有 min_class_count 个该类别的框
+        max_box_size: 有面积小于 max_box_size * max_box_size 的框
+        min_iou: 有两个框的 IoU 不小于 min_iou
+        proposals: 有未确认的候选框
+    """
+    def isEmpty(self) -> bool:
+        return self.class_id is None and self.max_box_size is None and self.min_iou is None and not self.proposals
+
+
+def _aggregate(rows : np.ndarray, class_ids : np.ndarray, boxes : np.ndarray, flags : np.ndarray,
+               row_count : int, class_count : int) -> dict:
+    """按行汇总框, rows 为每个框所在的行, 升序
+
+    Returns:
+        dict: counts, proposals (row_count,) int32; histograms (row_count, class_count) int32;
+            min_area (row_count,) float64, 没有框为 inf; max_iou (row_count,) float32
+    """
+    stats = {
+        "counts": np.bincount(rows, minlength=row_count).astype(np.int32),
+        "proposals": np.bincount(rows[(flags & PROPOSAL) != 0], minlength=row_count).astype(np.int32),
+        "histograms": np.bincount(rows * class_count + class_ids, minlength=row_count * class_count)
+                        .astype(np.int32).reshape(row_count, class_count),
+        "min_area": np.full(row_count, np.inf),
+        "max_iou": np.zeros(row_count, dtype=np.float32),
+    }
+    if len(rows) == 0:
+        return stats
+    # 框按行排列, 每行是连续的一段
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    area = np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+    stats["min_area"][rows[starts]] = np.minimum.reduceat(area, starts)
+
+    # 同一行的框两两计算 IoU, 每块的框对数不超过 CHUNK_PAIRS
+    pair_counts = np.bincount(rows, minlength=row_count)[rows]
+    ends = np.cumsum(pair_counts)
+    first = 0
+    while first < len(rows):
+        last = max(int(np.searchsorted(ends, (ends[first - 1] if first > 0 else 0) + CHUNK_PAIRS, side="right")), first + 1)
+        a, b = _pairs(rows[first:last], rows)
+        a += first
+        keep = a < b
+        a, b = a[keep], b[keep]
+        if len(a) > 0:
+            iou = boxIou(boxes[a], boxes[b], aligned=True).astype(np.float32)
+            # 框对按 a 排列, a 按行排列, 先在块内按行取最大值
+            pair_starts = np.flatnonzero(np.r_[True, rows[a][1:] != rows[a][:-1]])
+            np.maximum.at(stats["max_iou"], rows[a][pair_starts], np.maximum.reduceat(iou, pair_starts))
+        first = last
+    return stats
+
+
+def boxMask(query : ReviewQuery, class_ids : np.ndarray, boxes : np.ndarray, flags : np.ndarray):
+    """一张图像中满足查询中框级别条件的框, 用于在缩略图上突出显示; 查询只有图像级别的条件时返回 None
+    """
+    if query.isEmpty():
+        return None
+    mask = np.ones(len(boxes), dtype=bool)
+    if query.class_id is not None:
+        mask &= class_ids == query.class_id
+    if query.max_box_size is not None:
+        area = np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+        mask &= area < query.max_box_size ** 2
+    if query.min_iou is not None:
+        iou = boxIou(boxes, boxes)
+        np.fill_diagonal(iou, 0)
+        mask &= (iou >= query.min_iou).any(axis=1)
+    if query.proposals:
+        mask &= (flags & PROPOSAL) != 0
+    return mask
+
+
+class ReviewIndex(object):
+    """按图像汇总的标注, 按 ImageRegistry 的行排列, 支持向量化的过滤和单张图像的增量更新
+
+    Args:
+        row_ids: ImageRegistry.ids(), 按行排列的图像 id
+        image_id, class_id, boxes, flags: 所有标注, 按 image_id 排列 (Project.annotationArrays)
+    """
+    COLUMNS = ("counts", "proposals", "min_area", "max_iou")
+
+    def __init__(self, row_ids, image_id, class_id, boxes, flags) -> None:
+        self._setRowIds(row_ids)
+        # 读取时的标注, 按 image_id 排列, 用于在缩略图上绘制
+        self._image_id = np.asarray(image_id, dtype=np.int64)
+        self._class_id = np.asarray(class_id, dtype=np.int64)
+        self._boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self._flags = np.asarray(flags, dtype=np.int64)
+        # 之后修改过的图像 image_id -> (class_id, boxes, flags)
+        self._overrides = {}
+        # 已计算的内存中的标注 image_id -> AnnotationSet.version
+        self._versions = {}
+
+        rows = self.rowsOfIds(self._image_id)
+        valid = rows >= 0
+        rows, class_id, boxes, flags = rows[valid], self._class_id[valid], self._boxes[valid], self._flags[valid]
+        if len(rows) > 1 and (rows[1:] < rows[:-1]).any():
+            order = np.argsort(rows, kind="stable")
+            rows, class_id, boxes, flags = rows[order], class_id[order], boxes[order], flags[order]
+        class_count = int(class_id.max()) + 1 if len(class_id) > 0 else 1
+        self.stats = _aggregate(rows, np.clip(class_id, 0, None), boxes, flags, len(self.row_ids), class_count)
+
+    @classmethod
+    def fromProject(cls, project) -> "ReviewIndex":
+        _, data = project.annotationArrays()
+        index = cls(project.images.ids(), data["image_id"], data["class_id"], data["boxes"], data["flags"])
+        # annotationArrays 之前已经 flush, 内存中的标注与项目文件一致
+        index._versions = {image_id : annotations.version for image_id, annotations in project.loadedAnnotations().items()}
+        return index
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    @property
+    def class_count(self) -> int:
+        return self.stats["histograms"].shape[1]
+
+    def rowsOfIds(self, image_ids) -> np.ndarray:
+        """id 对应的行号, 不存在的 id 为 -1
+        """
+        image_ids = np.asarray(image_ids, dtype=np.int64).reshape(-1)
+        if len(self._sorted_ids) == 0:
+            return np.full(len(image_ids), -1, dtype=np.int64)
+        positions = np.clip(np.searchsorted(self._sorted_ids, image_ids), 0, len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[positions] == image_ids, self._order[positions], -1)
+
+    def _setRowIds(self, row_ids):
+        self.row_ids = np.asarray(row_ids, dtype=np.int64)
+        self._order = np.argsort(self.row_ids, kind="stable")
+        self._sorted_ids = self.row_ids[self._order]
+
+    # 增量更新
+    def sync(self, project):
+        """与项目同步: 图像增删后重新对齐行, 重新计算内存中被修改过的标注
+        """
+        row_ids = project.images.ids()
+        if len(row_ids) != len(self.row_ids) or not np.array_equal(row_ids, self.row_ids):
+            self._realign(row_ids)
+        for image_id, annotations in project.loadedAnnotations().items():
+            if self._versions.get(image_id) != annotations.version:
+                self.update(image_id, annotations.column("class_id"), annotations.boxes(), annotations.column("flags"))
+                self._versions[image_id] = annotations.version
+
+    def invalidate(self, project, image_ids):
+        """这些图像的标注在项目文件中被修改 (例如预标注直接写入), 重新读取并计算
+        """
+        loaded = project.loadedAnnotations()
+        for image_id in image_ids:
+            if image_id in loaded:
+                # 内存中的标注由 sync 按版本更新
+                continue
+            rows = project.store.loadAnnotations(image_id) if project.store is not None else []
+            data = np.asarray(rows, dtype=np.float64).reshape(-1, 6)
+            self.update(image_id, data[:, 0].astype(np.int64), data[:, 1:5], data[:, 5].astype(np.int64))
+
+    def update(self, image_id : int, class_id, boxes, flags):
+        """重新计算一张图像的汇总
+        """
+        row = int(self.rowsOfIds(image_id)[0])
+        class_id = np.asarray(class_id, dtype=np.int64).reshape(-1)
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        flags = np.asarray(flags, dtype=np.int64).reshape(-1)
+        self._overrides[image_id] = (class_id, boxes, flags)
+        if row < 0:
+            return
+        class_count = max(self.class_count, int(class_id.max()) + 1 if len(class_id) > 0 else 0)
+        if class_count > self.class_count:
+            histograms = self.stats["histograms"]
+            self.stats["histograms"] = np.pad(histograms, ((0, 0), (0, class_count - histograms.shape[1])))
+        stats = _aggregate(np.zeros(len(boxes), dtype=np.int64), np.clip(class_id, 0, None), boxes, flags, 1, class_count)
+        for name in self.COLUMNS:
+            self.stats[name][row] = stats[name][0]
+        self.stats["histograms"][row] = stats["histograms"][0]
+
+    def _realign(self, row_ids):
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        old_rows = self.rowsOfIds(row_ids)
+        found = old_rows >= 0
+        stats = {}
+        for name, data in self.stats.items():
+            # 新加入的图像没有标注
+            empty = np.inf if name == "min_area" else 0
+            values = np.full((len(row_ids),) + data.shape[1:], empty, dtype=data.dtype)
+            values[found] = data[old_rows[found]]
+            stats[name] = values
+        self.stats = stats
+        self._setRowIds(row_ids)
+
+    # 查询
+    def query(self, query : ReviewQuery) -> np.ndarray:
+        """满足条件的行号, 升序
+        """
+        stats = self.stats
+        mask = np.ones(len(self.row_ids), dtype=bool)
+        if query.class_id is not None:
+            if 0 <= query.class_id < self.class_count:
+                mask &= stats["histograms"][:, query.class_id] >= max(query.min_class_count, 1)
+            else:
+                mask[:] = False
+        if query.max_box_size is not None:
+            mask &= stats["min_area"] < query.max_box_size ** 2
+        if query.min_iou is not None:
+            mask &= stats["max_iou"] >= query.min_iou
+        if query.proposals:
+            mask &= stats["proposals"] > 0
+        return np.flatnonzero(mask)
+
+    def boxes(self, image_id : int):
+        """一张图像的标注 (class_id, boxes, flags), 修改过的图像为修改后的标注
+        """
+        override = self._overrides.get(image_id)
+        if override is not None:
+            return override
+        first, last = np.searchsorted(self._image_id, [image_id, image_id + 1])
+        return self._class_id[first:last], self._boxes[first:last], self._flags[first:last]
+
+    def summary(self) -> dict:
+        """全部图像的框数和有候选框的图像数, 用于显示
+        """
+        return {
+            "images": len(self.row_ids),
+            "boxes": int(self.stats["counts"].sum()),
+            "empty": int((self.stats["counts"] == 0).sum()),
+            "proposals": int((self.stats["proposals"] > 0).sum()),
+        }
@@ -0,0 +1,115 @@
+
+
+class GridIndex(object):
+    """图像坐标系中的均匀网格空间索引
+
+    每个 key 对应一个矩形 (x1, y1, x2, y2), 插入到它覆盖的所有网格中; 
+    覆盖网格数超过 max_cells 的大矩形单独保存, 查询时逐个判断. 
+    查询结果按插入顺序倒序排列 (后插入的在上层).
+    """
+    def __init__(self, cell_size : float = 256, max_cells : int = 64) -> None:
+        self.cell_size = cell_size
+        self.max_cells = max_cells
+        self._cells = {}
+        # key -> (x1, y1, x2, y2, order)
+        self._rects = {}
+        self._large = set()
+        self._order = 0
+
+    def __len__(self):
+        return len(self._rects)
+
+    def __contains__(self, key):
+        return key in self._rects
+
+    def _cellRange(self, x1, y1, x2, y2):
+        size = self.cell_size
+        return int(x1 // size), int(y1 // size), int(x2 // size), int(y2 // size)
+
+    def insert(self, key, x1 : float, y1 : float, x2 : float, y2 : float):
+        """插入或更新矩形
+        """
+        order = self._order
+        if key in self._rects:
+            order = self._rects[key][4]
+            self.remove(key)
+        else:
+            self._order += 1
+        self._rects[key] = (x1, y1, x2, y2, order)
+        c1, r1, c2, r2 = self._cellRange(x1, y1, x2, y2)
+        if (c2 - c1 + 1) * (r2 - r1 + 1) > self.max_cells:
+            self._large.add(key)
+            return
+        for row in range(r1, r2 + 1):
+            for col in range(c1, c2 + 1):
+                cell = self._cells.get((col, row))
+                if cell is None:
+                    self._cells[(col, row)] = cell = set()
+                cell.add(key)
+
+    def remove(self, key):
+        rect = self._rects.pop(key, None)
+        if rect is None:
+            return
+        if key in self._large:
+            self._large.discard(key)
+            return
+        c1, r1, c2, r2 = self._cellRange(*rect[:4])
+        for row in range(r1, r2 + 1):
+            for col in range(c1, c2 + 1):
+                cell = self._cells.get((col, row))
+                if cell is not None:
+                    cell.discard(key)
+                    if len(cell) == 0:
+                        del self._cells[(col, row)]
+
+    def clear(self):
+        self._cells.clear()
+        self._rects.clear()
+        self._large.clear()
+
+    def rect(self, key):
+        rect = self._rects.get(key)
+        return None if rect is None else rect[:4]
+
+    def _sorted(self, keys):
+        return sorted(keys, key=lambda key: self._rects[key][4], reverse=True)
+
+    def queryPoint(self, x : float, y : float, margin : float = 0) -> list:
+        """包含点 (x, y) 的矩形, 矩形向外扩充 margin
+        """
+        result = set()
+        c1, r1, c2, r2 = self._cellRange(x - margin, y - margin, x + margin, y + margin)
+        for row in range(r1, r2 + 1):
+            for col in range(c1, c2 + 1):
+                cell = self._cells.get((col, row))
+                if cell is not None:
+                    result.update(cell)
+        result.update(self._large)
+        hits = []
+        for key in result:
+            x1, y1, x2, y2, _ = self._rects[key]
+            if x1 - margin <= x <= x2 + margin and y1 - margin <= y <= y2 + margin:
+                hits.append(key)
+        return self._sorted(hits)
+
+    def queryRect(self, x1 : float, y1 : float, x2 : float, y2 : float) -> list:
+        """与矩形相交的矩形
+        """
+        result = set()
+        c1, r1, c2, r2 = self._cellRange(x1, y1, x2, y2)
+        if (c2 - c1 + 1) * (r2 - r1 + 1) > len(self._cells):
+            result.update(self._rects.keys())
+        else:
+            for row in range(r1, r2 + 1):
+                for col in range(c1, c2 + 1):
+                    cell = self._cells.get((col, row))
+                    if cell is not None:
+                        result.update(cell)
+            result.update(self._large)
+        hits = []
+        for key in result:
+            kx1, ky1, kx2, ky2, _ = self._rects[key]
+            if kx1 <= x2 and x1 <= kx2 and ky1 <= y2 and y1 <= ky2:
+                hits.append(key)
+        return self._sorted(hits)
@@ -0,0 +1,180 @@
+"""训练 / 验证 / 测试集拆分
+
+所有方法都对 ImageRegistry 的行 (N 张图像) 进行向量化计算, 返回 (N,) int8 数组, 取值与 ProjectStore.SPLITS 一致,
+可以直接写入 ImageRegistry 的 split 列. 相同的输入和 seed 总是得到相同的结果.
+
+三种方法共用 assignStrata: 图像先分到若干层 (stratum), 每层内随机排列后按权重的累计比例划分,
+    - 随机: 所有图像在同一层
+    - 按类别分层: 每张图像按其包含的最稀有的类别分层, 保证稀有类别在每个集合中都按比例出现
+    - 按组: 同一组 (例如同一产品序列号、同一目录) 的图像作为一个整体分配, 权重为组内图像数
+"""
+import numpy as np
+
+from .project_store import ProjectStore
+
+
+UNASSIGNED, TRAIN, VAL, TEST = (split for split, _ in ProjectStore.SPLITS)
+SPLIT_NAMES = dict(ProjectStore.SPLITS)
+
+RANDOM = "random"
+STRATIFIED = "stratified"
+GROUP = "group"
+METHODS = (RANDOM, STRATIFIED, GROUP)
+
+
+def normalizeRatios(ratios) -> np.ndarray:
+    """训练、验证、测试的比例, 归一化为和为 1
+
+    Args:
+        ratios: 3 个非负数, 例如 (0.7, 0.2, 0.1) 或 (70, 20, 10)
+    """
+    ratios = np.asarray(ratios, dtype=np.float64).reshape(-1)
+    if len(ratios) != 3 or (ratios < 0).any() or ratios.sum() <= 0:
+        raise ValueError(f"invalid split ratios {ratios.tolist()}")
+    return ratios / ratios.sum()
+
+
+def assignStrata(strata : np.ndarray, ratios, seed : int = 0, weights : np.ndarray = None) -> np.ndarray:
+    """每层内随机排列, 按权重累计比例的中点落在哪个区间决定集合
+
+    Args:
+        strata (np.ndarray): (N,) 每个元素所在的层
+        ratios: 训练、验证、测试的比例
+        seed (int): 随机种子
+        weights (np.ndarray): (N,) 每个元素的权重 (例如组内图像数), 默认都为 1
+
+    Returns:
+        np.ndarray: (N,) int8, 取值为 TRAIN / VAL / TEST
+    """
+    strata = np.asarray(strata).reshape(-1)
+    count = len(strata)
+    splits = np.empty(count, dtype=np.int8)
+    if count == 0:
+        return splits
+    weights = np.ones(count) if weights is None else np.asarray(weights, dtype=np.float64).reshape(-1)
+    rng = np.random.default_rng(seed)
+    # 随机排列后按层稳定排序 (小整数使用基数排序), 层内保持随机顺序
+    order = rng.permutation(count)
+    order = order[np.argsort(_compactInts(strata)[order], kind="stable")]
+    sorted_strata = strata[order]
+    sorted_weights = weights[order]
+    first = np.empty(count, dtype=bool)
+    first[0] = True
+    np.not_equal(sorted_strata[1:], sorted_strata[:-1], out=first[1:])
+    starts = np.flatnonzero(first)
+    segment = np.cumsum(first) - 1
+    before = np.cumsum(sorted_weights) - sorted_weights
+    totals = np.add.reduceat(sorted_weights, starts)
+    position = (before - before[starts][segment] + sorted_weights / 2) / totals[segment]
+    bounds = np.cumsum(normalizeRatios(ratios))[:-1]
+    splits[order] = np.searchsorted(bounds, position, side="right") + TRAIN
+    return splits
+
+
+def _compactInts(values : np.ndarray) -> np.ndarray:
+    """转换为能容纳取值范围的最小整数类型, 使 argsort 使用基数排序
+    """
+    values = np.asarray(values)
+    if len(values) == 0 or values.dtype.itemsize <= 2:
+        return values
+    low, high = int(values.min()), int(values.max())
+    for dtype in (np.int8, np.int16):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+def _sumByIndex(index : np.ndarray, values : np.ndarray, size : int) -> np.ndarray:
+    """按 index 把 (N, C) 的行累加到 (size, C), 每列一次 bincount, 比二维的 np.add.at 快得多
+    """
+    values = np.asarray(values)
+    result = np.empty((size, values.shape[1]), dtype=np.int64)
+    for column in range(values.shape[1]):
+        result[:, column] = np.bincount(index, weights=values[:, column], minlength=size)
+    return result
+
+
+def rarestClass(histograms : np.ndarray) -> np.ndarray:
+    """每张图像包含的类别中图像数最少的类别, 没有标注的图像为类别数 C
+
+    Args:
+        histograms (np.ndarray): (N, C) 每张图像每个类别的框数
+
+    Returns:
+        np.ndarray: (N,) int
+    """
+    histograms = np.asarray(histograms)
+    if histograms.ndim != 2:
+        raise ValueError("histograms must be (N, C)")
+    count, class_count = histograms.shape
+    if class_count == 0:
+        return np.zeros(count, dtype=np.int64)
+    present = histograms > 0
+    frequency = present.sum(axis=0)
+    # 类别按图像数从少到多的名次, 不包含的类别为 C, 每行最小的名次即最稀有的类别
+    rank = np.empty(class_count, dtype=np.uint16 if class_count < 65535 else np.int64)
+    ranked = np.argsort(frequency, kind="stable")
+    rank[ranked] = np.arange(class_count)
+    best = np.where(present, rank, class_count).min(axis=1)
+    return np.where(best < class_count, ranked[np.minimum(best, class_count - 1)], class_count)
+
+
+def randomSplit(count : int, ratios, seed : int = 0) -> np.ndarray:
+    return assignStrata(np.zeros(count, dtype=np.int8), ratios, seed)
+
+
+def stratifiedSplit(histograms : np.ndarray, ratios, seed : int = 0) -> np.ndarray:
+    """按每张图像最稀有的类别分层
+    """
+    return assignStrata(rarestClass(histograms), ratios, seed)
+
+
+def groupSplit(groups : np.ndarray, ratios, seed : int = 0, histograms : np.ndarray = None) -> np.ndarray:
+    """同一组的图像分到同一个集合, 按组内图像数加权使各集合的图像数接近比例
+
+    Args:
+        groups (np.ndarray): (N,) 每张图像的组号
+        histograms (np.ndarray): (N, C) 给出时按组的类别直方图中最稀有的类别分层
+    """
+    groups = np.asarray(groups).reshape(-1)
+    keys, inverse, sizes = np.unique(groups, return_inverse=True, return_counts=True)
+    if histograms is None:
+        strata = np.zeros(len(keys), dtype=np.int8)
+    else:
+        strata = rarestClass(_sumByIndex(inverse.reshape(-1), histograms, len(keys)))
+    return assignStrata(strata, ratios, seed, sizes)[inverse]
+
+
+def split(method : str, ratios, seed : int = 0, count : int = None, histograms : np.ndarray = None,
+          groups : np.ndarray = None) -> np.ndarray:
+    """按方法名拆分, 供界面调用
+
+    Args:
+        method (str): RANDOM / STRATIFIED / GROUP
+        count (int): 图像数, 只在 RANDOM 时需要 (其他方法由 histograms / groups 的长度决定)
+    """
+    if method == RANDOM:
+        if count is None:
+            count = len(histograms) if histograms is not None else len(groups)
+        return randomSplit(count, ratios, seed)
+    if method == STRATIFIED:
+        return stratifiedSplit(histograms, ratios, seed)
+    if method == GROUP:
+        return groupSplit(groups, ratios, seed, histograms)
+    raise ValueError(f"unknown split method {method}")
+
+
+def splitCounts(splits : np.ndarray) -> np.ndarray:
+    """每个集合 (包括未分配) 的图像数, 下标为 split 的取值
+    """
+    return np.bincount(np.asarray(splits, dtype=np.int64).reshape(-1), minlength=len(SPLIT_NAMES))
+
+
+def splitClassCounts(splits : np.ndarray, histograms : np.ndarray) -> np.ndarray:
+    """每个集合中每个类别的框数
+
+    Returns:
+        np.ndarray: (len(SPLIT_NAMES), C)
+    """
+    return _sumByIndex(np.asarray(splits, dtype=np.int64).reshape(-1), histograms, len(SPLIT_NAMES))
@@ -0,0 +1,142 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+from qtpy.QtCore import QSize
+from qtpy.QtGui import QImage
+
+
+class ThumbnailCache(object):
+    """磁盘缩略图缓存
+
+    缓存文件名为 ``<key>_<width>x<height>.<ext>``, key 由图像路径、修改时间和文件大小计算, 
+    原图变化后 key 随之变化, 旧的缓存不会再命中, 最终被 LRU 淘汰. 索引在第一次访问时扫描缓存目录建立, 
+    以文件的修改时间作为最近使用时间. 可以在多个线程中同时使用.
+    """
+    def __init__(self, cache_dir : str, max_bytes : int, image_format : str = "JPG", quality : int = 90) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.image_format = image_format
+        self.quality = quality
+        self.suffix = "." + image_format.lower()
+        # key -> (file_path, nbytes, original_size), 按最近使用排序
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(image_path : str):
+        try:
+            st = os.stat(image_path)
+        except OSError:
+            return None
+        text = f"{os.path.abspath(image_path)}|{st.st_mtime_ns}|{st.st_size}"
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def __len__(self):
+        with self._lock:
+            self._loadIndex()
+            return len(self._entries)
+
+    def _loadIndex(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for sub in os.scandir(self.cache_dir):
+                if not sub.is_dir():
+                    continue
+                for entry in os.scandir(sub.path):
+                    name, ext = os.path.splitext(entry.name)
+                    if ext != self.suffix:
+                        continue
+                    key, _, size = name.partition("_")
+                    width, _, height = size.partition("x")
+                    if not width.isdigit() or not height.isdigit():
+                        continue
+                    st = entry.stat()
+                    entries.append((st.st_mtime, key, entry.path, st.st_size, QSize(int(width), int(height))))
+        entries.sort(key=lambda e: e[0])
+        for _, key, file_path, nbytes, original_size in entries:
+            self._entries[key] = (file_path, nbytes, original_size)
+            self._total_bytes += nbytes
+        self._evict()
+
+    def _filePath(self, key : str, original_size : QSize) -> str:
+        name = f"{key}_{original_size.width()}x{original_size.height()}{self.suffix}"
+        return os.path.join(self.cache_dir, key[:2], name)
+
+    def _remove(self, key : str):
+        file_path, nbytes, _ = self._entries.pop(key)
+        self._total_bytes -= nbytes
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 0:
+            self._remove(next(iter(self._entries)))
+
+    def load(self, image_path : str):
+        """读取缓存的缩略图
+
+        Returns:
+            (QImage, QSize) | None: 缩略图和原图尺寸, 未命中返回 None
+        """
+        key = self.key(image_path)
+        if key is None:
+            return None
+        with self._lock:
+            self._loadIndex()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        file_path, _, original_size = entry
+        image = QImage(file_path)
+        if image.isNull():
+            with self._lock:
+                if key in self._entries:
+                    self._remove(key)
+            return None
+        try:
+            # 更新修改时间, 重启后仍能恢复 LRU 顺序
+            os.utime(file_path)
+        except OSError:
+            pass
+        return image, original_size
+
+    def save(self, image_path : str, image : QImage, original_size : QSize) -> bool:
+        key = self.key(image_path)
+        if key is None or image.isNull():
+            return False
+        file_path = self._filePath(key, original_size)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        if not image.save(tmp_path, self.image_format, self.quality):
+            return False
+        os.replace(tmp_path, file_path)
+        nbytes = os.path.getsize(file_path)
+        with self._lock:
+            self._loadIndex()
+            if key in self._entries:
+                self._total_bytes -= self._entries[key][1]
+            self._entries[key] = (file_path, nbytes, original_size)
+            self._entries.move_to_end(key)
+            self._total_bytes += nbytes
+            self._evict()
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._loadIndex()
+            for key in list(self._entries.keys()):
+                self._remove(key)
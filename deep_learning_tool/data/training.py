@@ -0,0 +1,177 @@
+"""本地训练任务
+
+训练在独立的进程 (runTraining) 中运行, 不占用界面进程的 GIL: 它从项目文件读取选中集合的图像和标注,
+用 data.loader.SharedBatchLoader 多进程解码并预取批次, 交给训练器逐批训练. 训练指标 (loss、每秒图像数、
+等待数据的时间) 按固定间隔合并后放入队列, 由界面进程中的线程转发给训练页.
+
+训练器可以替换: TRAINERS 中的名称, 或者 "模块:类名" 形式的任意类. 训练器需要实现
+
+    __init__(class_count, image_size, options)   options 为训练设置 (dict)
+    step(images, targets, counts) -> float       images (B, S, S, 3) uint8, targets (B, M, 5), counts (B,), 返回 loss
+    save(path)                                   保存权重
+
+内置的 linear 训练器是 NumPy 实现的图像级多标签逻辑回归, 只用于在没有 GPU 和深度学习框架时验证数据管线.
+"""
+import os
+import json
+import time
+import importlib
+
+import numpy as np
+
+from .loader import SharedBatchLoader
+
+
+# 与 AnnotationSet 的 flags 一致: 未确认的候选框不参与训练
+PROPOSAL = 2
+
+# 队列中的消息类型
+STARTED = "started"
+STEP = "step"
+EPOCH = "epoch"
+FINISHED = "finished"
+
+
+class LinearTrainer(object):
+    """图像级多标签逻辑回归: 特征为缩小到 feature_size x feature_size 的 RGB, 目标为图像中是否有每个类别
+    """
+    def __init__(self, class_count : int, image_size : int, options : dict) -> None:
+        self.class_count = max(class_count, 1)
+        self.pool = max(image_size // int(options.get("feature_size", 8)), 1)
+        self.feature_count = (image_size // self.pool) ** 2 * 3
+        self.learning_rate = float(options.get("learning_rate", 0.01))
+        rng = np.random.default_rng(int(options.get("seed", 0)))
+        self.weights = rng.normal(0, 0.01, size=(self.feature_count, self.class_count)).astype(np.float32)
+        self.bias = np.zeros(self.class_count, dtype=np.float32)
+
+    def features(self, images : np.ndarray) -> np.ndarray:
+        count, size = images.shape[0], images.shape[1] // self.pool * self.pool
+        pooled = images[:, :size, :size].reshape(count, size // self.pool, self.pool, size // self.pool, self.pool, 3)
+        return (pooled.mean(axis=(2, 4), dtype=np.float32) / 255.0 - 0.5).reshape(count, -1)
+
+    def step(self, images : np.ndarray, targets : np.ndarray, counts : np.ndarray) -> float:
+        x = self.features(images)
+        y = np.zeros((len(x), self.class_count), dtype=np.float32)
+        rows = np.repeat(np.arange(len(x)), counts)
+        columns = targets[np.arange(targets.shape[1])[None, :] < counts[:, None]][:, 0].astype(np.int64)
+        y[rows, np.clip(columns, 0, self.class_count - 1)] = 1
+        logits = x @ self.weights + self.bias
+        p = 1 / (1 + np.exp(-logits))
+        loss = float(np.mean(np.logaddexp(0, logits) - y * logits))
+        gradient = (p - y) / len(x)
+        self.weights -= self.learning_rate * (x.T @ gradient)
+        self.bias -= self.learning_rate * gradient.sum(axis=0)
+        return loss
+
+    def save(self, path : str):
+        with open(path + ".tmp", "wb") as file:
+            np.savez(file, weights=self.weights, bias=self.bias, pool=self.pool)
+        os.replace(path + ".tmp", path)
+
+
+TRAINERS = {
+    "linear" : LinearTrainer,
+}
+
+
+def trainerClass(name : str):
+    """TRAINERS 中的名称或 "模块:类名"
+    """
+    if name in TRAINERS:
+        return TRAINERS[name]
+    module_name, _, class_name = name.partition(":")
+    if not class_name:
+        raise ValueError(f"unknown trainer {name!r}, expected one of {sorted(TRAINERS)} or 'module:Class'")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def loadDataset(project_path : str, splits):
+    """从项目文件读取训练数据
+
+    Returns:
+        (list, list, list): 图像路径, 每张图像的框 (K, 5) 类别下标, x1, y1, x2, y2, 类别 id (类别下标对应的 id)
+    """
+    from .project_store import ProjectStore
+    store = ProjectStore(project_path)
+    try:
+        class_ids = store.classIds()
+        class_index = {class_id : index for index, class_id in enumerate(class_ids)}
+        paths, boxes = [], []
+        for _, path, _, _, _, annotations in store.iterImageAnnotations(splits):
+            paths.append(path)
+            boxes.append([(class_index[class_id], x1, y1, x2, y2)
+                          for class_id, x1, y1, x2, y2, flags in annotations if not flags & PROPOSAL])
+    finally:
+        store.close()
+    return paths, boxes, class_ids
+
+
+def runTraining(settings : dict, messages, stop_event):
+    """训练进程的入口
+
+    Args:
+        settings (dict): project_path, splits, output_dir, trainer, epochs, batch_size, image_size, workers,
+            prefetch, learning_rate, metrics_interval, seed
+        messages: 放入 (类型, dict) 的队列
+        stop_event: 设置后在当前批次结束时保存权重并退出
+    """
+    loader = None
+    try:
+        paths, boxes, class_ids = loadDataset(settings["project_path"], settings["splits"])
+        if not paths:
+            messages.put((FINISHED, {"completed": False, "message": "选中的集合中没有图像"}))
+            return
+        output_dir = settings["output_dir"]
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, "settings.json"), "w", encoding="utf-8") as file:
+            json.dump({**settings, "class_ids": class_ids}, file, ensure_ascii=False, indent=2)
+        trainer = trainerClass(settings["trainer"])(len(class_ids), settings["image_size"], settings)
+        loader = SharedBatchLoader(paths, boxes, settings["image_size"], settings["batch_size"], settings["workers"],
+                                   settings["prefetch"], seed=settings.get("seed", 0))
+        steps_per_epoch = len(loader)
+        total_steps = steps_per_epoch * settings["epochs"]
+        messages.put((STARTED, {"images": len(paths), "classes": len(class_ids), "steps": total_steps}))
+
+        start = time.perf_counter()
+        step = 0
+        # 每个间隔内的 loss 和图像数, 合并后放入队列
+        window_start, window_losses, window_images, window_stall = start, [], 0, loader.stall_seconds
+        stopped = False
+        for epoch in range(settings["epochs"]):
+            epoch_losses = []
+            for batch in loader.epoch(epoch):
+                if step == 0:
+                    # 启动解码进程的时间不计入第一个间隔的速度
+                    window_start += loader.startup_seconds
+                loss = trainer.step(batch.images, batch.targets, batch.counts)
+                step += 1
+                window_losses.append(loss)
+                epoch_losses.append(loss)
+                window_images += len(batch.indices)
+                now = time.perf_counter()
+                if now - window_start >= settings["metrics_interval"] or step == total_steps:
+                    messages.put((STEP, {
+                        "epoch": epoch, "step": step, "steps": total_steps, "loss": float(np.mean(window_losses)),
+                        "images_per_second": window_images / max(now - window_start, 1e-9),
+                        "stall_fraction": (loader.stall_seconds - window_stall) / max(now - window_start, 1e-9),
+                        "elapsed": now - start,
+                    }))
+                    window_start, window_losses, window_images, window_stall = now, [], 0, loader.stall_seconds
+                if stop_event.is_set():
+                    stopped = True
+                    break
+            checkpoint = os.path.join(output_dir, f"epoch_{epoch + 1:03d}.npz" if not stopped else "last.npz")
+            trainer.save(checkpoint)
+            messages.put((EPOCH, {"epoch": epoch, "loss": float(np.mean(epoch_losses)) if epoch_losses else float("nan"),
+                                  "checkpoint": checkpoint, "stall_seconds": loader.stall_seconds}))
+            if stopped:
+                break
+        elapsed = time.perf_counter() - start
+        message = (f"{step} 步, {elapsed:.1f} 秒 (启动 {loader.startup_seconds or 0:.1f} 秒), "
+                   f"等待数据 {loader.stall_seconds:.1f} 秒, 权重保存在 {output_dir}")
+        messages.put((FINISHED, {"completed": not stopped, "message": message}))
+    except Exception as e:
+        messages.put((FINISHED, {"completed": False, "message": f"{type(e).__name__}: {e}"}))
+    finally:
+        if loader is not None:
+            loader.close()
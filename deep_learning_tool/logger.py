@@ -1,6 +1,10 @@
+import os
+import sys
+import queue
+import atexit
 import datetime
 import logging
-import termcolor
+import logging.handlers
 
 COLORS = {
     "WARNING": "yellow",
@@ -11,50 +15,134 @@ COLORS = {
 }
 
 from . import __appname__
+from . import configs
+
+
+def _colorCodes(color, attrs=None):
+    """termcolor 给文本加的前缀和后缀, 每种颜色只计算一次, 格式化时直接拼接
+    """
+    # 第一次需要颜色时才导入
+    import termcolor
+    prefix, suffix = termcolor.colored("\0", color=color, attrs=attrs).split("\0")
+    return prefix, suffix
 
 
 class ColoredFormatter(logging.Formatter):
     def __init__(self, fmt, use_color=True):
         logging.Formatter.__init__(self, fmt)
         self.use_color = use_color
+        # levelname -> (前缀, 后缀, 着色并对齐的级别名)
+        self._level_codes = {}
+        self._time_codes = None
+
+    def levelCodes(self, levelname):
+        codes = self._level_codes.get(levelname)
+        if codes is None:
+            prefix, suffix = _colorCodes(COLORS[levelname], ["bold"])
+            codes = (prefix, suffix, prefix + "{:<7}".format(levelname) + suffix)
+            self._level_codes[levelname] = codes
+        return codes
 
     def format(self, record):
         levelname = record.levelname
+        # 经过队列的记录已经在 _QueueHandler 中格式化了参数
+        message = record.getMessage()
+        asctime = datetime.datetime.fromtimestamp(record.created)
         if self.use_color and levelname in COLORS:
-
-            def colored(text):
-                return termcolor.colored(
-                    text,
-                    color=COLORS[levelname],
-                    attrs={"bold": True},
-                )
-            record.levelname2 = colored("{:<7}".format(record.levelname))
-            record.message2 = colored(record.msg)
-
-            asctime2 = datetime.datetime.fromtimestamp(record.created)
-            record.asctime2 = termcolor.colored(asctime2, color="green")
-            record.pathname2 = record.pathname
-            record.module2 = record.module
-            record.funcName2 = record.funcName
-            record.lineno2 = record.lineno
+            prefix, suffix, record.levelname2 = self.levelCodes(levelname)
+            record.message2 = prefix + message + suffix
+            if self._time_codes is None:
+                self._time_codes = _colorCodes("green")
+            record.asctime2 = f"{self._time_codes[0]}{asctime}{self._time_codes[1]}"
+        else:
+            record.levelname2 = "{:<7}".format(levelname)
+            record.message2 = message
+            record.asctime2 = asctime
+        record.pathname2 = record.pathname
+        record.module2 = record.module
+        record.funcName2 = record.funcName
+        record.lineno2 = record.lineno
         return logging.Formatter.format(self, record)
 
 
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # 参数之后可能被修改, 在调用线程中格式化消息; 不复制记录, 着色和写入在输出线程中完成
+        if record.exc_info or record.stack_info:
+            return super().prepare(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
 class ColoredLogger(logging.Logger):
+    """程序的日志
 
-    FORMAT = "[%(asctime2)s] [%(levelname2)s] [%(pathname2)s, line %(lineno2)s, %(funcName2)s] %(message2)s"
+    记录只在调用线程中放入队列, 格式化、着色和写入控制台 / 文件都在 QueueListener 的线程中完成,
+    不会阻塞界面. 调试日志较多的地方使用 LOGGER.debug("... %s", value) 延迟格式化,
+    参数本身计算开销大时先判断 LOGGER.isEnabledFor(logging.DEBUG).
+    """
 
-    def __init__(self, name):
-        logging.Logger.__init__(self, name, logging.DEBUG)
+    FORMAT = "[%(asctime2)s] [%(levelname2)s] [%(pathname2)s, line %(lineno2)s, %(funcName2)s] %(message2)s"
+    FILE_FORMAT = "[%(asctime)s] [%(levelname)-7s] [%(pathname)s, line %(lineno)d, %(funcName)s] %(message)s"
 
-        color_formatter = ColoredFormatter(self.FORMAT)
+    def __init__(self, name, level=logging.DEBUG):
+        logging.Logger.__init__(self, name, level)
 
-        console = logging.StreamHandler()
-        console.setFormatter(color_formatter)
+        self.console = logging.StreamHandler(sys.stderr)
+        self.console.setFormatter(ColoredFormatter(self.FORMAT))
+        self.file_handler = None
 
-        self.addHandler(console)
+        self.queue = queue.SimpleQueue()
+        self.addHandler(_QueueHandler(self.queue))
+        self.listener = logging.handlers.QueueListener(self.queue, self.console, respect_handler_level=True)
+        self.listener.start()
+        # 退出时输出队列中剩余的记录
+        atexit.register(self.stopListener)
         return
 
-LOGGER =  ColoredLogger(__appname__)
-LOGGER.setLevel(logging.DEBUG)
-
+    def setLevel(self, level):
+        logging.Logger.setLevel(self, level)
+        # LOGGER 不是由 logging.getLogger 创建的, manager 不会清除它的 isEnabledFor 缓存
+        self._cache.clear()
+
+    def setLogFile(self, path : str = None, max_bytes : int = configs.log_file_max_bytes, backup_count : int = configs.log_file_backup_count):
+        """同时写入按大小轮换的日志文件, path 为 None 时只输出到控制台
+        """
+        handlers = [self.console]
+        if self.file_handler is not None:
+            self.file_handler.close()
+            self.file_handler = None
+        if path is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+            self.file_handler.setFormatter(logging.Formatter(self.FILE_FORMAT))
+            handlers.append(self.file_handler)
+        self.stopListener()
+        self.listener.handlers = tuple(handlers)
+        self.listener.start()
+
+    def stopListener(self):
+        # QueueListener.stop 在没有启动时会出错
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+
+def parseLevel(level) -> int:
+    """"debug" / "INFO" / 10 等转换为 logging 的级别
+    """
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).upper())
+    if not isinstance(value, int):
+        raise ValueError(f"unknown log level: {level}")
+    return value
+
+
+def setLogLevel(level):
+    """运行时修改日志级别, 例如 setLogLevel("debug")
+    """
+    LOGGER.setLevel(parseLevel(level))
+
+
+LOGGER =  ColoredLogger(__appname__, parseLevel(os.environ.get("DEEP_LEARNING_TOOL_LOG_LEVEL", configs.log_level)))
@@ -0,0 +1,117 @@
+"""启动时间分析
+
+    python -m deep_learning_tool --profile-startup [project]
+
+在子进程中用 python -X importtime 启动程序, 显示主窗口并处理完第一轮事件 (第一次绘制) 后退出,
+报告每个模块的导入时间和启动各阶段的时间. 本模块只使用标准库, 不影响被测量的导入.
+"""
+import os
+import sys
+import json
+import time
+import typing
+from collections import namedtuple
+
+
+# self_us: 模块自身执行时间, cumulative_us: 包括其导入的模块, depth: 嵌套层数 (0 为顶层导入)
+ImportRecord = namedtuple("ImportRecord", ["module", "self_us", "cumulative_us", "depth"])
+
+# 子进程输出启动阶段时间的行前缀
+_PHASES_PREFIX = "startup phases: "
+
+
+def parseImportTime(text : str) -> typing.List[ImportRecord]:
+    """解析 -X importtime 输出的行, 其他行 (日志等) 忽略
+    """
+    records = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # 表头
+            continue
+        name = fields[2].rstrip()
+        module = name.lstrip()
+        depth = (len(name) - len(module) - 1) // 2
+        records.append(ImportRecord(module, int(fields[0]), int(fields[1]), depth))
+    return records
+
+
+def runStartup(project_path : str = None):
+    """子进程: 按正常启动的顺序创建主窗口, 第一次绘制后输出各阶段时间并退出
+    """
+    phases = []
+    start = time.perf_counter()
+
+    def mark(name):
+        phases.append((name, (time.perf_counter() - start) * 1000))
+
+    from qtpy import QtWidgets
+    mark("import qt")
+    app = QtWidgets.QApplication(sys.argv[:1])
+    mark("QApplication")
+    from deep_learning_tool.app import MainWindow
+    mark("import app")
+    win = MainWindow(project_path)
+    mark("MainWindow()")
+    win.show()
+    mark("show()")
+    app.processEvents()
+    mark("first paint")
+    print(_PHASES_PREFIX + json.dumps(phases), flush=True)
+    win.close()
+    # 不运行 Qt 对象的析构, 直接退出
+    os._exit(0)
+
+
+def profileStartup(project_path : str = None) -> typing.Tuple[typing.List[ImportRecord], typing.List[typing.Tuple[str, float]]]:
+    """在子进程中启动并收集导入时间和阶段时间
+
+    Returns:
+        typing.Tuple: 导入记录 (按导入完成的顺序) 和 (阶段, 距启动的毫秒数)
+    """
+    import subprocess
+    code = f"from deep_learning_tool.profiling import runStartup; runStartup({project_path!r})"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    phases = None
+    for line in result.stdout.splitlines():
+        if line.startswith(_PHASES_PREFIX):
+            phases = [tuple(phase) for phase in json.loads(line[len(_PHASES_PREFIX):])]
+    if phases is None:
+        raise RuntimeError(f"startup failed ({result.returncode}):\n{result.stderr[-2000:]}")
+    return parseImportTime(result.stderr), phases
+
+
+def packageTimes(records : typing.List[ImportRecord]) -> typing.Dict[str, int]:
+    """按顶层包汇总模块自身的导入时间 (微秒)
+    """
+    totals = {}
+    for record in records:
+        package = record.module.split(".")[0]
+        totals[package] = totals.get(package, 0) + record.self_us
+    return totals
+
+
+def formatReport(records : typing.List[ImportRecord], phases, top : int = 25) -> str:
+    lines = ["startup phases (ms since start):"]
+    previous = 0.0
+    for name, elapsed in phases:
+        lines.append(f"  {name:<16} {elapsed:9.1f}  (+{elapsed - previous:.1f})")
+        previous = elapsed
+    total = sum(record.self_us for record in records)
+    lines.append(f"\nimports: {len(records)} modules, {total / 1000:.1f} ms")
+    lines.append("\nby top-level package (self time):")
+    for package, elapsed in sorted(packageTimes(records).items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"  {elapsed / 1000:9.1f} ms  {package}")
+    lines.append("\nslowest modules (cumulative / self):")
+    for record in sorted(records, key=lambda record: -record.cumulative_us)[:top]:
+        lines.append(f"  {record.cumulative_us / 1000:9.1f} ms  {record.self_us / 1000:7.1f} ms  {'  ' * record.depth}{record.module}")
+    return "\n".join(lines)
+
+
+def main(project_path : str = None) -> int:
+    records, phases = profileStartup(project_path)
+    print(formatReport(records, phases))
+    return 0
@@ -1,3 +1,31 @@
 from .qt import struct
 from .qt import newIcon, newPixmap, newAction, addActions
-from .qt import distance, distancetoline
\ No newline at end of file
+from .qt import distance, distancetoline
+from .qt import readImage, raiseImageAllocationLimit, ImageReadThread
+from .importer import FolderImportThread
+
+# 依赖 NumPy 的模块和导出等较少使用的模块在第一次使用时才导入
+_LAZY_IMPORTS = {
+    "asBoxes" : ".geometry",
+    "vertexDistances" : ".geometry",
+    "edgeDistances" : ".geometry",
+    "nearestVertices" : ".geometry",
+    "nearestEdges" : ".geometry",
+    "nearestHandles" : ".geometry",
+    "segmentDistances" : ".geometry",
+    "boxIou" : ".geometry",
+    "DatasetExportThread" : ".exporter",
+    "EvaluationThread" : ".evaluator",
+    "TrainingThread" : ".trainer",
+    "PrelabelThread" : ".prelabeler",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        import importlib
+        module = importlib.import_module(_LAZY_IMPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
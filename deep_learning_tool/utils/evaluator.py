@@ -0,0 +1,50 @@
+import os
+
+from qtpy.QtCore import QThread, Signal
+
+
+class EvaluationThread(QThread):
+    """在后台读取预测文件并运行 data.evaluation.evaluate
+
+    结果按 预测文件哈希 + 真值和参数 缓存在 cache_dir 中, 再次评估相同的预测文件时直接读取.
+    每完成一块图像发送 progress, 结束后发送 evaluationFinished(结果, 说明), 出错时结果为 None.
+    """
+    # 完成的块数, 总块数
+    progress = Signal(int, int)
+    # EvaluationResult 或 None, 说明
+    evaluationFinished = Signal(object, str)
+
+    def __init__(self, prediction_path : str, gt, image_ids, class_ids, cache_dir : str, params : dict, parent=None):
+        """
+        Args:
+            gt (data.evaluation.Detections): 真值, 在主线程中从项目读取
+            class_ids: 项目中出现的类别 id 升序, 用于 COCO 结果的 category_id
+            params (dict): evaluate 的参数 (max_detections, confusion_iou, confusion_score, workers, chunk_images)
+        """
+        super().__init__(parent)
+        self.prediction_path = prediction_path
+        self.gt = gt
+        self.image_ids = image_ids
+        self.class_ids = class_ids
+        self.cache_dir = cache_dir
+        self.params = params
+        self.result = None
+
+    def run(self):
+        from deep_learning_tool.data.evaluation import EvaluationCache, evaluate, fileHash, loadPredictions
+        try:
+            cache = EvaluationCache(self.cache_dir)
+            # 进程数和块大小不影响结果
+            key_params = {name : value for name, value in self.params.items() if name not in ("workers", "chunk_images")}
+            key = cache.key(fileHash(self.prediction_path), self.gt, self.image_ids, **key_params)
+            self.result = cache.load(key)
+            if self.result is not None:
+                self.evaluationFinished.emit(self.result, "缓存")
+                return
+            detections = loadPredictions(self.prediction_path, self.class_ids)
+            self.result = evaluate(self.gt, detections, self.image_ids, progress=self.progress.emit, **self.params)
+            cache.save(key, self.result)
+        except Exception as e:
+            self.evaluationFinished.emit(None, f"{os.path.basename(self.prediction_path)}: {e}")
+            return
+        self.evaluationFinished.emit(self.result, f"{self.result.elapsed:.1f} 秒")
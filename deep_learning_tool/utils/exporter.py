@@ -0,0 +1,40 @@
+from qtpy.QtCore import QThread, Signal
+
+
+class DatasetExportThread(QThread):
+    """在后台运行 data.export.DatasetExporter
+
+    每个检查点发送 progress, 结束 (完成、取消或出错) 后发送 exportFinished.
+    取消后检查点保留在导出目录中, 用相同的设置再次导出时从检查点继续.
+    """
+    # 已完成的图像数, 图像总数, 每秒图像数, 每秒复制的字节数
+    progress = Signal(int, int, float, float)
+    # 是否完成, 说明
+    exportFinished = Signal(bool, str)
+
+    def __init__(self, exporter, resume : bool = True, parent=None):
+        super().__init__(parent)
+        self.exporter = exporter
+        self.resume = resume
+        self._run_flag = True
+        self.result = None
+
+    def run(self):
+        try:
+            self.result = self.exporter.run(self.resume, self._progress, lambda: not self._run_flag)
+        except Exception as e:
+            self.exportFinished.emit(False, str(e))
+            return
+        result = self.result
+        message = f"{result.exported} 张图像, {result.missing} 张缺失, {result.copied_bytes / 1024 / 1024:.1f} MB, {result.elapsed:.1f} 秒"
+        self.exportFinished.emit(result.completed, message)
+
+    def _progress(self, progress):
+        self.progress.emit(progress.done, progress.total, progress.images_per_second, progress.bytes_per_second)
+
+    def cancel(self):
+        self._run_flag = False
+
+    def stop(self):
+        self.cancel()
+        self.wait()
@@ -0,0 +1,153 @@
+"""矩形框的批量几何计算
+
+矩形框统一用连续的 (N, 4) float64 数组 (x1, y1, x2, y2) 表示,
+顶点顺序为 左上、右上、右下、左下, 边的顺序为 左、上、右、下, 与 label_graphics.VertexEdge 一致.
+"""
+import typing
+
+import numpy as np
+
+
+NO_INDEX = -1
+
+# handleDistances 中间数组的列: 顶点 左上、右上、右下、左下; 边 左、上、右、下
+_HANDLE_DX = [0, 2, 2, 0, 0, 4, 2, 4]
+_HANDLE_DY = [1, 1, 3, 3, 5, 1, 5, 3]
+
+
+def asBoxes(boxes) -> np.ndarray:
+    """转换为连续的 (N, 4) float64 数组, 已经是该格式时不复制
+
+    Args:
+        boxes: (N, 4) 或 (4,) 的数组或序列
+
+    Returns:
+        np.ndarray: (N, 4) 数组
+    """
+    return np.ascontiguousarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+
+def vertices(boxes) -> np.ndarray:
+    """矩形框的四个顶点
+
+    Returns:
+        np.ndarray: (N, 4, 2) 数组
+    """
+    boxes = asBoxes(boxes)
+    return np.stack((boxes[:, [0, 2, 2, 0]], boxes[:, [1, 1, 3, 3]]), axis=-1)
+
+
+def handleDistances(boxes, x : float, y : float) -> np.ndarray:
+    """点 (x, y) 到每个矩形框四个顶点和四条边 (线段) 的距离
+
+    矩形的边与坐标轴平行, 到竖直边的距离为 hypot(|x - 边的x|, 点在 y 方向超出矩形的长度), 水平边同理.
+    所有距离由同一个 (N, 6) 的中间数组取出, 单个矩形时也只有十几次 NumPy 调用.
+
+    Returns:
+        np.ndarray: (N, 8) 数组, 前 4 列为顶点, 后 4 列为边
+    """
+    boxes = asBoxes(boxes)
+    point = np.array((x, y))
+    # |x - x1|, |y - y1|, |x - x2|, |y - y2|, 点在 x / y 方向超出矩形的长度 (在范围内为 0)
+    parts = np.empty((len(boxes), 6))
+    np.abs(boxes - np.tile(point, 2), out=parts[:, :4])
+    lo = np.minimum(boxes[:, :2], boxes[:, 2:])
+    hi = np.maximum(boxes[:, :2], boxes[:, 2:])
+    np.maximum(np.maximum(lo - point, point - hi), 0, out=parts[:, 4:])
+    return np.hypot(parts[:, _HANDLE_DX], parts[:, _HANDLE_DY])
+
+
+def vertexDistances(boxes, x : float, y : float) -> np.ndarray:
+    """点 (x, y) 到每个矩形框四个顶点的距离
+
+    Returns:
+        np.ndarray: (N, 4) 数组
+    """
+    return handleDistances(boxes, x, y)[:, :4]
+
+
+def edgeDistances(boxes, x : float, y : float) -> np.ndarray:
+    """点 (x, y) 到每个矩形框四条边的距离
+
+    Returns:
+        np.ndarray: (N, 4) 数组
+    """
+    return handleDistances(boxes, x, y)[:, 4:]
+
+
+def nearestIndices(distances : np.ndarray, epsilon : float) -> np.ndarray:
+    """每行中距离最小且不超过 epsilon 的列, 没有则为 NO_INDEX; 距离相同时取靠前的列
+
+    Args:
+        distances (np.ndarray): (N, K) 距离
+        epsilon (float): 最大距离
+
+    Returns:
+        np.ndarray: (N,) int 数组
+    """
+    return np.where(distances.min(axis=1) <= epsilon, distances.argmin(axis=1), NO_INDEX)
+
+
+def nearestVertices(boxes, x : float, y : float, epsilon : float) -> np.ndarray:
+    return nearestIndices(vertexDistances(boxes, x, y), epsilon)
+
+
+def nearestEdges(boxes, x : float, y : float, epsilon : float) -> np.ndarray:
+    return nearestIndices(edgeDistances(boxes, x, y), epsilon)
+
+
+def nearestHandles(boxes, x : float, y : float, epsilon : float) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """调整大小时的控制点: 优先选择顶点, 不在任何顶点附近时再选择边
+
+    Returns:
+        typing.Tuple[np.ndarray, np.ndarray]: 顶点和边的序号, (N,) int 数组; 选中顶点的矩形边的序号为 NO_INDEX
+    """
+    distances = handleDistances(boxes, x, y)
+    vertex = nearestIndices(distances[:, :4], epsilon)
+    edge = np.where(vertex == NO_INDEX, nearestIndices(distances[:, 4:], epsilon), NO_INDEX)
+    return vertex, edge
+
+
+def segmentDistances(x : float, y : float, p1, p2) -> np.ndarray:
+    """点 (x, y) 到任意线段 p1 -> p2 的距离, distancetoline 的批量版本
+
+    Args:
+        p1: (N, 2) 线段起点
+        p2: (N, 2) 线段终点
+
+    Returns:
+        np.ndarray: (N,) 数组
+    """
+    p1 = np.asarray(p1, dtype=np.float64).reshape(-1, 2)
+    p2 = np.asarray(p2, dtype=np.float64).reshape(-1, 2)
+    d = p2 - p1
+    length2 = np.einsum("ij,ij->i", d, d)
+    t = np.einsum("ij,ij->i", np.array((x, y)) - p1, d)
+    # 线段长度为 0 时取起点
+    t = np.divide(t, length2, out=np.zeros_like(t), where=length2 > 0)
+    t = np.clip(t, 0, 1)
+    return np.hypot(p1[:, 0] + t * d[:, 0] - x, p1[:, 1] + t * d[:, 1] - y)
+
+
+def boxIou(boxes1, boxes2, aligned : bool = False) -> np.ndarray:
+    """两组矩形框两两之间的 IoU, 支持批量维度
+
+    Args:
+        boxes1: (..., N, 4) x1, y1, x2, y2
+        boxes2: (..., M, 4), 批量维度与 boxes1 可以广播
+        aligned: 为 True 时只计算对应行的 IoU, boxes1 和 boxes2 可以广播为同样的 (..., N, 4)
+
+    Returns:
+        np.ndarray: (..., N, M), aligned 时为 (..., N); 面积为 0 的框与任何框的 IoU 都为 0
+    """
+    boxes1 = np.asarray(boxes1, dtype=np.float64)
+    boxes2 = np.asarray(boxes2, dtype=np.float64)
+    a = boxes1 if aligned else boxes1[..., :, None, :]
+    b = boxes2 if aligned else boxes2[..., None, :, :]
+    width = np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0])
+    height = np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1])
+    intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+    area1 = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area2 = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area1 + area2 - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
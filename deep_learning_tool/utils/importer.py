@@ -0,0 +1,76 @@
+import os
+import time
+
+from qtpy.QtCore import QThread, Signal
+
+
+class FolderImportThread(QThread):
+    """在后台递归遍历目录, 分批发送找到的图像路径
+
+    使用 os.scandir 遍历, 不会先生成完整的文件列表. 每找到 batch_size 张图像或距离上次发送超过 
+    interval 秒时发送 batchFound, 同时发送 progress.
+    """
+    # 图像路径列表
+    batchFound = Signal(list)
+    # 已扫描的文件数, 找到的图像数, 每秒扫描的文件数
+    progress = Signal(int, int, float)
+
+    def __init__(self, folder : str, suffixs, parent=None, batch_size : int = 1024, interval : float = 0.2, recursive : bool = True):
+        super().__init__(parent)
+        self.folder = folder
+        self.suffixs = tuple(suffix.lower() for suffix in suffixs)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.recursive = recursive
+        self._run_flag = True
+        self.scanned = 0
+        self.found = 0
+
+    def run(self):
+        start = time.perf_counter()
+        last_emit = start
+        batch = []
+        folders = [self.folder]
+        while folders and self._run_flag:
+            folder = folders.pop()
+            try:
+                entries = os.scandir(folder)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if not self._run_flag:
+                        break
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive:
+                                folders.append(entry.path)
+                            continue
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                    except OSError:
+                        continue
+                    self.scanned += 1
+                    if entry.name.lower().endswith(self.suffixs):
+                        batch.append(entry.path if os.sep == "/" else entry.path.replace(os.sep, "/"))
+                    now = time.perf_counter()
+                    if len(batch) >= self.batch_size or (len(batch) > 0 and now - last_emit >= self.interval):
+                        self.emitBatch(batch, now - start)
+                        batch = []
+                        last_emit = now
+        if batch:
+            self.emitBatch(batch, time.perf_counter() - start)
+        elapsed = time.perf_counter() - start
+        self.progress.emit(self.scanned, self.found, self.scanned / elapsed if elapsed > 0 else 0.0)
+
+    def emitBatch(self, batch : list, elapsed : float):
+        self.found += len(batch)
+        self.batchFound.emit(batch)
+        self.progress.emit(self.scanned, self.found, self.scanned / elapsed if elapsed > 0 else 0.0)
+
+    def cancel(self):
+        self._run_flag = False
+
+    def stop(self):
+        self.cancel()
+        self.wait()
@@ -0,0 +1,46 @@
+from qtpy.QtCore import QThread, Signal
+
+
+class PrelabelThread(QThread):
+    """在后台运行 data.inference.Prelabeler
+
+    解码在 Prelabeler 的进程中, 推理在本线程中. 每批结果通过 proposalsReady 交给界面线程写入项目并保存检查点,
+    写入和检查点都在界面线程中, 取消或退出时未写入的结果在下次继续时重新计算.
+    """
+    # 已完成的图像数, 图像总数, 每秒图像数
+    progress = Signal(int, int, float)
+    # image_id -> [(class_id, x1, y1, x2, y2, flags), ...], 写入后完成的图像数
+    proposalsReady = Signal(object, int)
+    # 是否完成, 说明
+    prelabelFinished = Signal(bool, str)
+
+    def __init__(self, prelabeler, start : int = 0, commit_images : int = 512, parent=None):
+        super().__init__(parent)
+        self.prelabeler = prelabeler
+        self.start_index = start
+        self.commit_images = commit_images
+        self._run_flag = True
+        self.result = None
+
+    def run(self):
+        try:
+            self.result = self.prelabeler.run(self.start_index, self.proposalsReady.emit, self._progress,
+                                              lambda: not self._run_flag, self.commit_images)
+        except Exception as e:
+            self.prelabelFinished.emit(False, f"{type(e).__name__}: {e}")
+            return
+        result = self.result
+        rate = (result.done - self.start_index) / result.elapsed if result.elapsed > 0 else 0.0
+        message = (f"{result.done} / {result.total} 张图像, {result.boxes} 个候选框, {result.errors} 张读取失败, "
+                   f"{result.elapsed:.1f} 秒, {rate:.1f} 张/秒")
+        self.prelabelFinished.emit(result.completed, message)
+
+    def _progress(self, progress):
+        self.progress.emit(progress.done, progress.total, progress.images_per_second)
+
+    def cancel(self):
+        self._run_flag = False
+
+    def stop(self):
+        self.cancel()
+        self.wait()
@@ -1,11 +1,12 @@
 import os
 from math import sqrt
-
-import numpy as np
+from collections import deque
 
 from qtpy.QtWidgets import QAction, QMenu, QPushButton
-from qtpy.QtGui import QIcon, QPixmap
-from qtpy.QtCore import QThread
+from qtpy.QtGui import QIcon, QPixmap, QImage, QImageReader
+from qtpy.QtCore import Qt, QSize, QThread, QThreadPool, QRunnable
+from qtpy.QtCore import QMutex, QMutexLocker, QWaitCondition, QSemaphore
+from qtpy.QtCore import Signal
 
 
 here = os.path.dirname(os.path.abspath(__file__))
@@ -74,19 +75,161 @@ class struct(object):
         self.__dict__.update(kwargs)
 
 
+def raiseImageAllocationLimit(limit : int):
+    """放宽 Qt 解码图像的内存上限 (MB, 全局设置), 只放宽不收紧
+
+    Qt 6 默认拒绝解码后超过 256 MB 的图像, 不支持按区域解码的格式 (PNG 等) 的大图只能整张解码.
+    """
+    current = QImageReader.allocationLimit()
+    if current != 0 and (limit == 0 or limit > current):
+        QImageReader.setAllocationLimit(limit)
+
+
+def readImage(image_path : str, image_size : int = 0):
+    """读取图像, 尽量在解码阶段完成下采样 (jpeg 等格式支持按比例解码)
+
+    Args:
+        image_path (str): 图像路径
+        image_size (int): 长边的最大尺寸, <= 0 则读取原图
+
+    Returns:
+        (QImage, QSize): 读取的图像和原图尺寸, 读取失败时图像为空
+    """
+    reader = QImageReader(image_path)
+    original_size = reader.size()
+    if image_size > 0 and original_size.isValid() and \
+        (original_size.width() > image_size or original_size.height() > image_size):
+        reader.setScaledSize(original_size.scaled(image_size, image_size, Qt.AspectRatioMode.KeepAspectRatio))
+    image = reader.read()
+    if not original_size.isValid():
+        original_size = image.size()
+    return image, original_size
+
+
+class ImageReadTask(QRunnable):
+    def __init__(self, thread, image_path : str, generation : int):
+        super().__init__()
+        self.thread = thread
+        self.image_path = image_path
+        self.generation = generation
+        self.setAutoDelete(True)
+
+    def run(self):
+        try:
+            # 取消后不再解码/发送过期的结果
+            if self.generation != self.thread.generation:
+                return
+            image, original_size = self.thread.read(self.image_path)
+            if self.generation == self.thread.generation:
+                self.thread.imageRead.emit(self.image_path, image, original_size)
+        finally:
+            self.thread.taskDone()
+
+
 class ImageReadThread(QThread):
-    # read signal
-    def __init__(self, parent=None):
+    """后台读取图像, 由线程池解码并下采样为 QImage
+
+    调度线程从队列中取出图像路径提交给线程池, 同时在解码的图像数量不超过 max_in_flight, 
+    以限制内存占用. 每读取一张图像发送 imageRead, 队列中的图像全部读取完成后发送 readFinished.
+    """
+    # image_path, image, original_size
+    imageRead = Signal(str, QImage, QSize)
+    readFinished = Signal()
+
+    def __init__(self, parent=None, image_size : int = 512, max_in_flight : int = 0, cache=None):
         super().__init__(parent=parent)
         self._run_flag = True
+        self.image_size = image_size
+        # 可选的缩略图缓存, 需要提供 load(image_path) 和 save(image_path, image, original_size)
+        self.cache = cache
+        self.generation = 0
+        self._pending = deque()
+        self._in_flight = 0
+        self._mutex = QMutex()
+        self._condition = QWaitCondition()
+        self._pool = QThreadPool(self)
+        if max_in_flight <= 0:
+            max_in_flight = self._pool.maxThreadCount() * 2
+        self.max_in_flight = max_in_flight
+        self._slots = QSemaphore(max_in_flight)
+
+    def read(self, image_path : str):
+        """在线程池中执行, 读取单张图像, 优先从缓存中读取
+        """
+        cache = self.cache
+        if cache is not None:
+            result = cache.load(image_path)
+            if result is not None:
+                return result
+        image, original_size = readImage(image_path, self.image_size)
+        if cache is not None and not image.isNull():
+            cache.save(image_path, image, original_size)
+        return image, original_size
+
+    def addImages(self, images_path):
+        """添加需要读取的图像, 线程未启动时自动启动
+        """
+        with QMutexLocker(self._mutex):
+            self._pending.extend(images_path)
+            self._condition.wakeOne()
+        if not self.isRunning():
+            self._run_flag = True
+            self.start()
+
+    def cancel(self):
+        """取消所有未完成的读取, 已经在解码的图像结果会被丢弃
+        """
+        with QMutexLocker(self._mutex):
+            self._pending.clear()
+            self.generation += 1
+
+    def clearPending(self) -> list:
+        """清空未开始的读取, 正在解码的图像结果仍会发送
+
+        Returns:
+            list: 被清除的图像路径
+        """
+        with QMutexLocker(self._mutex):
+            images_path = list(self._pending)
+            self._pending.clear()
+        return images_path
+
+    def pendingCount(self) -> int:
+        with QMutexLocker(self._mutex):
+            return len(self._pending) + self._in_flight
+
+    def taskDone(self):
+        with QMutexLocker(self._mutex):
+            self._in_flight -= 1
+            finished = self._in_flight == 0 and len(self._pending) == 0
+        self._slots.release()
+        if finished:
+            self.readFinished.emit()
 
     def run(self):
-        # TODO: wait for read image, emit signal after read one image and read finished
-        pass
+        while True:
+            # 限制同时解码的数量
+            self._slots.acquire()
+            self._mutex.lock()
+            while self._run_flag and len(self._pending) == 0:
+                self._condition.wait(self._mutex)
+            if not self._run_flag:
+                self._mutex.unlock()
+                self._slots.release()
+                break
+            image_path = self._pending.popleft()
+            self._in_flight += 1
+            generation = self.generation
+            self._mutex.unlock()
+            self._pool.start(ImageReadTask(self, image_path, generation))
+        self._pool.waitForDone()
 
     def stop(self):
         """Sets run flag to False and waits for thread to finish"""
-        self._run_flag = False
+        self.cancel()
+        with QMutexLocker(self._mutex):
+            self._run_flag = False
+            self._condition.wakeAll()
         self.wait()
 
 
@@ -94,6 +237,8 @@ def distance(p):
     return sqrt(p.x() * p.x() + p.y() * p.y())
 
 def distancetoline(point, line):
+    # 只有这里用到 NumPy, 在调用时才导入, 批量计算使用 utils.geometry
+    import numpy as np
     p1, p2 = line
     p1 = np.array([p1.x(), p1.y()])
     p2 = np.array([p2.x(), p2.y()])
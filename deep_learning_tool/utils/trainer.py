@@ -0,0 +1,63 @@
+import queue
+import multiprocessing
+
+from qtpy.QtCore import QThread, Signal
+
+
+class TrainingThread(QThread):
+    """启动训练进程 (data.training.runTraining) 并把它的消息转发为信号
+
+    训练和解码都在子进程中, 本线程只阻塞在消息队列上, 不占用界面线程.
+    stop 通知训练进程在当前批次结束时保存权重并退出.
+    """
+    # 开始: 图像数, 类别数, 总步数
+    trainingStarted = Signal(int, int, int)
+    # 每个指标间隔一次: dict (epoch, step, steps, loss, images_per_second, stall_fraction, elapsed)
+    metrics = Signal(dict)
+    # 每轮结束: dict (epoch, loss, checkpoint, stall_seconds)
+    epochFinished = Signal(dict)
+    # 是否完成, 说明
+    trainingFinished = Signal(bool, str)
+
+    def __init__(self, settings : dict, parent=None):
+        super().__init__(parent)
+        self.settings = settings
+        # 界面进程中有其他线程, 使用 spawn 而不是 fork
+        self.context = multiprocessing.get_context("spawn")
+        self.messages = self.context.Queue()
+        self.stop_event = self.context.Event()
+        self.process = None
+
+    def run(self):
+        from deep_learning_tool.data import training
+        # 训练进程会启动解码进程, 不能是 daemon
+        self.process = self.context.Process(target=training.runTraining, args=(self.settings, self.messages, self.stop_event))
+        self.process.start()
+        finished = None
+        while finished is None:
+            try:
+                kind, values = self.messages.get(timeout=0.5)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    finished = (False, f"训练进程退出, 返回值 {self.process.exitcode}")
+                continue
+            if kind == training.STARTED:
+                self.trainingStarted.emit(values["images"], values["classes"], values["steps"])
+            elif kind == training.STEP:
+                self.metrics.emit(values)
+            elif kind == training.EPOCH:
+                self.epochFinished.emit(values)
+            elif kind == training.FINISHED:
+                finished = (values["completed"], values["message"])
+        self.process.join(10)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.trainingFinished.emit(*finished)
+
+    def cancel(self):
+        self.stop_event.set()
+
+    def stop(self):
+        self.cancel()
+        self.wait()
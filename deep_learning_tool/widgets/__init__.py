@@ -1,4 +1,25 @@
 # from .tool_bar import ToolBar
 
-from .gallery_window import GalleryWindow
-from .label_window import LabelWindow
\ No newline at end of file
+# 页面在第一次使用时才导入, 启动时不加载标注视图和瓦片金字塔等模块
+_LAZY_IMPORTS = {
+    "GalleryWindow" : ".gallery_window",
+    "LabelWindow" : ".label_window",
+    "SplitWindow" : ".split_window",
+    "ExportWindow" : ".export_window",
+    "TrainingWindow" : ".training_window",
+    "EvaluationWindow" : ".evaluation_window",
+    "ReviewWindow" : ".review_window",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        import importlib
+        module = importlib.import_module(_LAZY_IMPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = list(_LAZY_IMPORTS)
@@ -0,0 +1,294 @@
+import os
+
+from qtpy.QtCore import Qt, Slot, QPointF, QRectF, QCoreApplication
+from qtpy.QtGui import QPainter, QPen, QColor, QPolygonF
+from qtpy.QtWidgets import QMainWindow, QWidget, QDockWidget, QLabel, QPushButton, QLineEdit
+from qtpy.QtWidgets import QComboBox, QSpinBox, QProgressBar, QFileDialog, QTableWidget, QTableWidgetItem, QSplitter
+from qtpy.QtWidgets import QFormLayout, QHBoxLayout, QVBoxLayout, QSizePolicy, QHeaderView
+
+from deep_learning_tool import LOGGER
+from deep_learning_tool import configs
+from deep_learning_tool.data import Project, ProjectStore
+from deep_learning_tool.utils import EvaluationThread
+
+from .widget import ProjectInfo
+
+
+class PrCurveWidget(QWidget):
+    """一个类别在几个 IoU 阈值下的 PR 曲线
+    """
+    CURVES = (
+        (0.5, QColor(40, 160, 60)),
+        (0.75, QColor(40, 110, 210)),
+        (0.95, QColor(210, 80, 40)),
+    )
+    MARGIN = 36
+
+    def __init__(self, parent: QWidget | None = None) -> None:
+        super().__init__(parent)
+        self.result = None
+        self.class_index = -1
+        self.setMinimumSize(240, 200)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+
+    def setCurve(self, result, class_index : int):
+        self.result = result
+        self.class_index = class_index
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.fillRect(self.rect(), self.palette().base())
+        plot = QRectF(self.MARGIN, 8, self.width() - self.MARGIN - 8, self.height() - self.MARGIN - 8)
+        painter.setPen(QPen(self.palette().text().color(), 1))
+        painter.drawRect(plot)
+        painter.drawText(QRectF(plot.left(), plot.bottom() + 4, plot.width(), 16), Qt.AlignmentFlag.AlignCenter, self.tr("召回率"))
+        painter.save()
+        painter.translate(4, plot.center().y())
+        painter.rotate(-90)
+        painter.drawText(QRectF(-plot.height() / 2, 0, plot.height(), 16), Qt.AlignmentFlag.AlignCenter, self.tr("精度"))
+        painter.restore()
+        if self.result is None or not 0 <= self.class_index < len(self.result.class_ids):
+            return
+        recall_thresholds = self.result.recall_thresholds
+        for row, (iou, color) in enumerate(self.CURVES):
+            thresholds = self.result.iou_thresholds
+            index = int(abs(thresholds - iou).argmin())
+            if abs(thresholds[index] - iou) > 1e-6:
+                continue
+            precision = self.result.precision[index, :, self.class_index]
+            if precision[0] < 0:
+                continue
+            polygon = QPolygonF([QPointF(plot.left() + r * plot.width(), plot.bottom() - p * plot.height())
+                                 for r, p in zip(recall_thresholds.tolist(), precision.tolist())])
+            painter.setPen(QPen(color, 2))
+            painter.drawPolyline(polygon)
+            legend = f"IoU {iou:.2f}  AP {self.result.ap[index, self.class_index]:.3f}"
+            painter.drawText(QPointF(plot.right() - painter.fontMetrics().horizontalAdvance(legend) - 6,
+                                     plot.top() + 16 * (row + 1)), legend)
+
+
+class EvaluationWindow(QMainWindow):
+    """评估页: 用项目中的标注作为真值评估导入的预测文件
+
+    显示 mAP@[.5:.95] / mAP50 / mAP75, 每个类别的 AP 和召回率, 选中类别的 PR 曲线和混淆矩阵.
+    评估在后台线程中进行, 图像块由进程池计算, 结果按预测文件的哈希缓存在项目的缓存目录中.
+    """
+    COLUMNS = ("类别", "AP", "AP50", "AP75", "召回率", "真值", "检测")
+    ALL_SPLITS = -1
+
+    def __init__(self, parent: QWidget | None = None, flags: Qt.WindowFlags | Qt.WindowType = Qt.WindowFlags()) -> None:
+        super().__init__(parent, flags)
+        self.project = None
+        self.result = None
+        self.evaluation_thread = None
+        self.createCentralWidget()
+        self.createDockWidgets()
+        self.browse_btn.clicked.connect(self.browsePredictions)
+        self.evaluate_btn.clicked.connect(self.startEvaluation)
+        self.class_table.currentCellChanged.connect(self.showClassCurve)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.waitEvaluation)
+
+    def createCentralWidget(self):
+        widget = QWidget(self)
+        form = QFormLayout()
+
+        predictions_layout = QHBoxLayout()
+        self.predictions_edit = QLineEdit(widget)
+        self.browse_btn = QPushButton(self.tr("浏览"), widget)
+        predictions_layout.addWidget(self.predictions_edit)
+        predictions_layout.addWidget(self.browse_btn)
+        form.addRow(self.tr("预测文件"), predictions_layout)
+
+        self.split_combo = QComboBox(widget)
+        self.split_combo.addItem(self.tr("全部"), self.ALL_SPLITS)
+        for split, name in ProjectStore.SPLITS:
+            self.split_combo.addItem(name, split)
+        form.addRow(self.tr("集合"), self.split_combo)
+
+        self.max_detections_spin = QSpinBox(widget)
+        self.max_detections_spin.setRange(1, 10000)
+        self.max_detections_spin.setValue(configs.evaluation_max_detections)
+        form.addRow(self.tr("每张图像最多检测框"), self.max_detections_spin)
+
+        buttons = QHBoxLayout()
+        self.evaluate_btn = QPushButton(self.tr("评估"), widget)
+        buttons.addWidget(self.evaluate_btn)
+        buttons.addStretch()
+        form.addRow(buttons)
+
+        self.progress_bar = QProgressBar(widget)
+        self.summary_label = QLabel("", widget)
+        self.status_label = QLabel("", widget)
+
+        self.class_table = QTableWidget(0, len(self.COLUMNS), widget)
+        self.class_table.setHorizontalHeaderLabels([self.tr(name) for name in self.COLUMNS])
+        self.class_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.class_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.class_table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
+        self.pr_curve = PrCurveWidget(widget)
+        self.confusion_table = QTableWidget(widget)
+        self.confusion_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.confusion_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+
+        charts = QSplitter(Qt.Orientation.Horizontal, widget)
+        charts.addWidget(self.pr_curve)
+        charts.addWidget(self.confusion_table)
+        results = QSplitter(Qt.Orientation.Vertical, widget)
+        results.addWidget(self.class_table)
+        results.addWidget(charts)
+
+        layout = QVBoxLayout()
+        layout.addLayout(form)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.status_label)
+        layout.addWidget(results, 1)
+        widget.setLayout(layout)
+        self.setCentralWidget(widget)
+
+    def createDockWidgets(self):
+        self.project_dock = QDockWidget(self.tr("项目"), self)
+        self.project_dock.setTitleBarWidget(QWidget(self))
+        self.project_dock.setFeatures(QDockWidget.DockWidgetFeature.NoDockWidgetFeatures)
+        self.project_dock.setFixedHeight(100)
+        self.project_dock.setMinimumWidth(120)
+        self.project_dock.setMaximumWidth(500)
+        self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.project_dock)
+
+    def setProject(self, project : Project):
+        self.waitEvaluation()
+        self.project = project
+        self.project_dock.setWidget(ProjectInfo(project.name, project.type))
+        self.showResult(None)
+
+    @Slot()
+    def browsePredictions(self):
+        path, _ = QFileDialog.getOpenFileName(self, self.tr("选择预测文件"), os.path.dirname(self.predictions_edit.text()),
+                                              self.tr("预测文件 (*.csv *.txt *.json)"))
+        if path != "":
+            self.predictions_edit.setText(path)
+
+    def classNames(self) -> dict:
+        if self.project is None or self.project.store is None:
+            return {}
+        return {class_id : name for class_id, name, _ in self.project.store.classes()}
+
+    @Slot()
+    def startEvaluation(self):
+        if self.project is None or self.evaluation_thread is not None:
+            return
+        path = self.predictions_edit.text().strip()
+        if not os.path.isfile(path):
+            self.status_label.setText(self.tr("请选择预测文件"))
+            return
+        from deep_learning_tool.data.evaluation import Detections
+        split = self.split_combo.currentData()
+        # 真值在主线程读取 (会先保存未写入的标注), 评估线程只做计算
+        image_ids, columns = self.project.annotationArrays(None if split == self.ALL_SPLITS else [split])
+        gt = Detections(columns["image_id"], columns["class_id"], columns["boxes"], None, columns["flags"])
+        if self.project.store is not None:
+            class_ids = self.project.store.classIds()
+        else:
+            class_ids = sorted(set(self.project.annotationArrays()[1]["class_id"].tolist()))
+        params = {
+            "max_detections": self.max_detections_spin.value(),
+            "confusion_iou": configs.evaluation_confusion_iou,
+            "confusion_score": configs.evaluation_confusion_score,
+            "workers": configs.evaluation_workers,
+            "chunk_images": configs.evaluation_chunk_images,
+        }
+        LOGGER.info("evaluate %s on %d images, %d ground truth boxes", path, len(image_ids), len(gt.image_id))
+        self.evaluation_thread = EvaluationThread(path, gt, image_ids, class_ids,
+                                                  os.path.join(self.project.cache_dir, "evaluation"), params, self)
+        self.evaluation_thread.progress.connect(self.evaluationProgress)
+        self.evaluation_thread.evaluationFinished.connect(self.evaluationFinished)
+        self.evaluate_btn.setEnabled(False)
+        self.progress_bar.setRange(0, 0)
+        self.status_label.setText(self.tr("正在评估..."))
+        self.evaluation_thread.start()
+
+    @Slot(int, int)
+    def evaluationProgress(self, done : int, total : int):
+        self.progress_bar.setRange(0, max(total, 1))
+        self.progress_bar.setValue(done)
+
+    @Slot(object, str)
+    def evaluationFinished(self, result, message : str):
+        if result is None:
+            LOGGER.warning("evaluation failed: %s", message)
+            self.status_label.setText(self.tr("评估失败: {}").format(message))
+        else:
+            LOGGER.info("evaluation finished: mAP %.4f, %s", result.mAP(), message)
+            self.status_label.setText(self.tr("{} 张图像, {}").format(result.image_count, message))
+            self.showResult(result)
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(1)
+        self.evaluate_btn.setEnabled(True)
+        if self.evaluation_thread is not None:
+            self.evaluation_thread.wait()
+            self.evaluation_thread = None
+
+    @Slot()
+    def waitEvaluation(self):
+        # 评估不能中途停止, 切换项目或退出时等待它结束
+        if self.evaluation_thread is not None:
+            self.evaluation_thread.wait()
+
+    def showResult(self, result):
+        self.result = result
+        self.class_table.setRowCount(0)
+        self.confusion_table.clear()
+        self.confusion_table.setRowCount(0)
+        self.confusion_table.setColumnCount(0)
+        if result is None:
+            self.summary_label.setText("")
+            self.pr_curve.setCurve(None, -1)
+            return
+        self.summary_label.setText(f"mAP@[.5:.95] {result.mAP():.4f}    mAP50 {result.mAP(0.5):.4f}    mAP75 {result.mAP(0.75):.4f}")
+        class_names = self.classNames()
+        names = [class_names.get(class_id, str(class_id)) for class_id in result.class_ids.tolist()]
+
+        ap, ap50, ap75 = result.classAp(), result.classAp(0.5), result.classAp(0.75)
+        recall = result.recall.max(axis=0)
+        self.class_table.setRowCount(len(names))
+        for row, name in enumerate(names):
+            values = [name]
+            for value in (ap[row], ap50[row], ap75[row], recall[row]):
+                values.append("-" if not value >= 0 else f"{value:.4f}")
+            values += [str(int(result.gt_counts[row])), str(int(result.detection_counts[row]))]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column > 0:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.class_table.setItem(row, column, item)
+
+        labels = names + [self.tr("背景")]
+        self.confusion_table.setRowCount(len(labels))
+        self.confusion_table.setColumnCount(len(labels))
+        self.confusion_table.setVerticalHeaderLabels(labels)
+        self.confusion_table.setHorizontalHeaderLabels(labels)
+        confusion = result.confusion
+        maximum = max(int(confusion.max()), 1) if confusion.size else 1
+        for row in range(len(labels)):
+            for column in range(len(labels)):
+                count = int(confusion[row, column])
+                item = QTableWidgetItem(str(count))
+                item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                if count > 0:
+                    # 正确的为绿色, 错误的为红色, 深浅表示数量
+                    alpha = 40 + int(180 * count / maximum)
+                    item.setBackground(QColor(60, 170, 80, alpha) if row == column else QColor(220, 70, 60, alpha))
+                self.confusion_table.setItem(row, column, item)
+        self.confusion_table.setToolTip(self.tr("行为真值, 列为预测; IoU {:.2f}, 分数 {:.2f}").format(result.confusion_iou, result.confusion_score))
+        if len(names) > 0:
+            self.class_table.setCurrentCell(0, 0)
+        else:
+            self.pr_curve.setCurve(result, -1)
+
+    @Slot(int, int, int, int)
+    def showClassCurve(self, row : int, column : int, previous_row : int, previous_column : int):
+        self.pr_curve.setCurve(self.result, row)
@@ -0,0 +1,188 @@
+import os
+
+from qtpy.QtCore import Qt, Slot, QCoreApplication
+from qtpy.QtWidgets import QMainWindow, QWidget, QDockWidget, QLabel, QPushButton, QCheckBox, QLineEdit
+from qtpy.QtWidgets import QComboBox, QSpinBox, QProgressBar, QFileDialog
+from qtpy.QtWidgets import QFormLayout, QHBoxLayout, QVBoxLayout
+
+from deep_learning_tool import LOGGER
+from deep_learning_tool import configs
+from deep_learning_tool.data import Project, ProjectStore
+from deep_learning_tool.data import export as data_export
+from deep_learning_tool.utils import DatasetExportThread
+
+from .widget import ProjectInfo
+
+
+class ExportWindow(QMainWindow):
+    """导出页: 把项目中选中集合的图像和标注导出为 COCO / YOLO / VOC
+
+    导出在后台线程中进行, 导出前先保存项目. 取消后再次用相同的设置导出到同一目录时从检查点继续.
+    """
+    FORMATS = (
+        (data_export.COCO, "COCO (json)"),
+        (data_export.YOLO, "YOLO (txt)"),
+        (data_export.VOC, "Pascal VOC (xml)"),
+    )
+    IMAGE_MODES = (
+        (data_export.HARDLINK, "硬链接"),
+        (data_export.COPY, "复制"),
+        (data_export.NO_IMAGES, "不导出图像"),
+    )
+
+    def __init__(self, parent: QWidget | None = None, flags: Qt.WindowFlags | Qt.WindowType = Qt.WindowFlags()) -> None:
+        super().__init__(parent, flags)
+        self.project = None
+        self.export_thread = None
+        self.createCentralWidget()
+        self.createDockWidgets()
+        self.browse_btn.clicked.connect(self.browseOutputDir)
+        self.export_btn.clicked.connect(self.startExport)
+        self.cancel_btn.clicked.connect(self.cancelExport)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.cancelExport)
+
+    def createCentralWidget(self):
+        widget = QWidget(self)
+        form = QFormLayout()
+
+        self.format_combo = QComboBox(widget)
+        for export_format, name in self.FORMATS:
+            self.format_combo.addItem(name, export_format)
+        self.format_combo.setCurrentIndex(max(0, self.format_combo.findData(configs.export_format)))
+        form.addRow(self.tr("格式"), self.format_combo)
+
+        output_layout = QHBoxLayout()
+        self.output_edit = QLineEdit(widget)
+        self.browse_btn = QPushButton(self.tr("浏览"), widget)
+        output_layout.addWidget(self.output_edit)
+        output_layout.addWidget(self.browse_btn)
+        form.addRow(self.tr("导出目录"), output_layout)
+
+        splits_layout = QHBoxLayout()
+        self.split_checks = {}
+        for split, name in ProjectStore.SPLITS:
+            check = QCheckBox(name, widget)
+            check.setChecked(split != 0)
+            splits_layout.addWidget(check)
+            self.split_checks[split] = check
+        splits_layout.addStretch()
+        form.addRow(self.tr("集合"), splits_layout)
+
+        self.image_mode_combo = QComboBox(widget)
+        for image_mode, name in self.IMAGE_MODES:
+            self.image_mode_combo.addItem(self.tr(name), image_mode)
+        self.image_mode_combo.setCurrentIndex(max(0, self.image_mode_combo.findData(configs.export_image_mode)))
+        form.addRow(self.tr("图像"), self.image_mode_combo)
+
+        self.workers_spin = QSpinBox(widget)
+        self.workers_spin.setRange(1, 128)
+        self.workers_spin.setValue(configs.export_workers)
+        form.addRow(self.tr("线程数"), self.workers_spin)
+
+        self.proposals_check = QCheckBox(self.tr("包括未确认的候选框"), widget)
+        self.resume_check = QCheckBox(self.tr("从上次中断处继续"), widget)
+        self.resume_check.setChecked(True)
+        form.addRow(self.proposals_check)
+        form.addRow(self.resume_check)
+
+        buttons = QHBoxLayout()
+        self.export_btn = QPushButton(self.tr("导出"), widget)
+        self.cancel_btn = QPushButton(self.tr("取消"), widget)
+        self.cancel_btn.setEnabled(False)
+        buttons.addWidget(self.export_btn)
+        buttons.addWidget(self.cancel_btn)
+        buttons.addStretch()
+        form.addRow(buttons)
+
+        self.progress_bar = QProgressBar(widget)
+        self.status_label = QLabel("", widget)
+
+        layout = QVBoxLayout()
+        layout.addLayout(form)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.status_label)
+        layout.addStretch()
+        widget.setLayout(layout)
+        self.setCentralWidget(widget)
+
+    def createDockWidgets(self):
+        self.project_dock = QDockWidget(self.tr("项目"), self)
+        self.project_dock.setTitleBarWidget(QWidget(self))
+        self.project_dock.setFeatures(QDockWidget.DockWidgetFeature.NoDockWidgetFeatures)
+        self.project_dock.setFixedHeight(100)
+        self.project_dock.setMinimumWidth(120)
+        self.project_dock.setMaximumWidth(500)
+        self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.project_dock)
+
+    def setProject(self, project : Project):
+        self.cancelExport()
+        self.project = project
+        self.project_dock.setWidget(ProjectInfo(project.name, project.type))
+        self.output_edit.setText(os.path.join(configs.export_root, project.name))
+
+    @Slot()
+    def browseOutputDir(self):
+        folder = QFileDialog().getExistingDirectory(self, self.tr("选择导出目录"), self.output_edit.text())
+        if folder != "":
+            self.output_edit.setText(folder)
+
+    def splits(self) -> list:
+        return [split for split, check in self.split_checks.items() if check.isChecked()]
+
+    @Slot()
+    def startExport(self):
+        if self.project is None or self.project.store is None or self.export_thread is not None:
+            return
+        splits = self.splits()
+        output_dir = self.output_edit.text().strip()
+        if len(splits) == 0 or output_dir == "":
+            self.status_label.setText(self.tr("请选择集合和导出目录"))
+            return
+        # 导出线程从项目文件读取, 先写入未保存的图像、拆分和标注
+        self.project.flush()
+        exporter = data_export.DatasetExporter(
+            self.project.store.path, output_dir, self.format_combo.currentData(), splits,
+            self.image_mode_combo.currentData(), self.proposals_check.isChecked(),
+            self.workers_spin.value(), configs.export_batch_size)
+        LOGGER.info("export %s to %s, splits %s", exporter.export_format, output_dir, splits)
+        self.export_thread = DatasetExportThread(exporter, self.resume_check.isChecked(), self)
+        self.export_thread.progress.connect(self.exportProgress)
+        self.export_thread.exportFinished.connect(self.exportFinished)
+        self.export_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.progress_bar.setRange(0, 0)
+        self.status_label.setText(self.tr("正在导出..."))
+        self.export_thread.start()
+
+    @Slot(int, int, float, float)
+    def exportProgress(self, done : int, total : int, images_per_second : float, bytes_per_second : float):
+        self.progress_bar.setRange(0, max(total, 1))
+        self.progress_bar.setValue(done)
+        self.status_label.setText(self.tr("已导出 {} / {} 张图像, {:.0f} 张/秒, {:.1f} MB/秒").format(
+            done, total, images_per_second, bytes_per_second / 1024 / 1024))
+
+    @Slot(bool, str)
+    def exportFinished(self, completed : bool, message : str):
+        if completed:
+            LOGGER.info("export finished: %s", message)
+            self.progress_bar.setRange(0, 1)
+            self.progress_bar.setValue(1)
+            self.status_label.setText(self.tr("导出完成: {}").format(message))
+        else:
+            LOGGER.warning("export stopped: %s", message)
+            if self.progress_bar.maximum() == 0:
+                self.progress_bar.setRange(0, 1)
+            self.status_label.setText(self.tr("导出未完成 (再次导出时继续): {}").format(message))
+        self.export_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        if self.export_thread is not None:
+            self.export_thread.wait()
+            self.export_thread = None
+
+    @Slot()
+    def cancelExport(self):
+        if self.export_thread is not None:
+            # 等待导出线程保存检查点
+            self.export_thread.stop()
@@ -1,17 +1,21 @@
 import os
+from collections import OrderedDict
 
 from qtpy.QtCore import Qt, Signal, Slot
-from qtpy.QtCore import QSize, QRectF, QPointF
+from qtpy.QtCore import QSize, QRectF, QPointF, QCoreApplication
 
 from qtpy.QtWidgets import QWidget, QMenu
 from qtpy.QtWidgets import QGraphicsScene, QGraphicsItem, QGraphicsView, QGraphicsTextItem, QStyleOptionGraphicsItem
 from qtpy.QtWidgets import QGraphicsSceneMouseEvent
 
-from qtpy.QtGui import QPixmap, QPainter, QPainterPath, QColor, QFontMetrics
+from qtpy.QtGui import QPixmap, QImage, QPainter, QPainterPath, QColor, QFontMetrics
 from qtpy.QtGui import QMouseEvent, QResizeEvent, QWheelEvent, QKeyEvent, QContextMenuEvent
 
 from deep_learning_tool import LOGGER
-from deep_learning_tool.utils import newIcon, newAction
+from deep_learning_tool import configs
+from deep_learning_tool.utils import newIcon, newAction, ImageReadThread
+
+from .gallery_layout import GridLayout
 
 
 
@@ -19,6 +23,10 @@ from deep_learning_tool.utils import newIcon, newAction
 class TextItem(QGraphicsTextItem):
     def __init__(self, text, width, parent = None):
         super().__init__(parent)
+        self.setText(text, width)
+        self.setFlags(QGraphicsItem.GraphicsItemFlag.ItemIgnoresParentOpacity)
+
+    def setText(self, text, width):
         self.fname = os.path.basename(text)
         self.fpath = text
         font = QFontMetrics(self.font())
@@ -27,29 +35,55 @@ class TextItem(QGraphicsTextItem):
         self.setToolTip(self.fpath)
         elided_text = font.elidedText(self.fname, Qt.TextElideMode.ElideMiddle, width)
         self.setPlainText(elided_text)
-        self.setFlags(QGraphicsItem.GraphicsItemFlag.ItemIgnoresParentOpacity)
 
 
 class GalleryItem(QGraphicsItem):
+    text_height = 24
+    image_size = 512
+    margin = 5 # LTBR
+
     def __init__(self, image_path : str, parent: QGraphicsItem | None = None) -> None:
         super().__init__(parent)
 
-        self.text_height = 24
-        self.image_size = 512
-        self.margin = 5 # LTBR
-        self.width = self.image_size + self.margin * 2
-        self.height = self.width + self.text_height
+        self.width, self.height = self.itemSize()
         self.image_path = image_path
         self.original_width = 0
         self.original_height = 0
+        # 缩略图由 GalleryView 在后台读取, 读取完成前显示占位图
+        self.pixmap = None
+        # 叠加在缩略图上的矩形 [(QPen, [QRectF, ...]), ...], 原图坐标
+        self.overlay = None
         self.setFlags(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable)
-        self.setPixmap(image_path)
 
         self.text = TextItem(self.image_path, self.image_size, self)
         self.text.setPos(self.margin, self.margin + self.image_size)
         self.text.setZValue(self.zValue() + 1)
         self.text.setTextWidth(self.image_size)
 
+    @classmethod
+    def itemSize(cls):
+        width = cls.image_size + cls.margin * 2
+        return width, width + cls.text_height
+
+    def setImagePath(self, image_path : str):
+        """复用图形项显示另一张图像, 缩略图重置为占位图
+        """
+        if image_path == self.image_path:
+            return
+        self.image_path = image_path
+        self.original_width = 0
+        self.original_height = 0
+        self.pixmap = None
+        self.overlay = None
+        self.text.setText(image_path, self.image_size)
+        self.update()
+
+    def setThumbnail(self, pixmap : QPixmap, original_size : QSize):
+        self.original_width = original_size.width()
+        self.original_height = original_size.height()
+        self.pixmap = pixmap
+        self.update()
+
     def setPixmap(self, image_path : str):
         pixmap = QPixmap(image_path)
         self.original_height = pixmap.height()
@@ -59,6 +93,22 @@ class GalleryItem(QGraphicsItem):
         else:
             self.pixmap = pixmap
 
+    def setImage(self, image : QImage, original_size : QSize):
+        """设置后台读取完成的缩略图
+
+        Args:
+            image (QImage): 下采样后的图像, 为空则保持占位图
+            original_size (QSize): 原图尺寸
+        """
+        if image.isNull():
+            self.original_width = original_size.width()
+            self.original_height = original_size.height()
+            return
+        pixmap = QPixmap.fromImage(image)
+        if pixmap.height() > self.image_size or pixmap.width() > self.image_size:
+            pixmap = pixmap.scaled(QSize(self.image_size, self.image_size), Qt.KeepAspectRatio)
+        self.setThumbnail(pixmap, original_size)
+
     def mousePressEvent(self, event: QGraphicsSceneMouseEvent) -> None:
         if event.button() == Qt.LeftButton:
             super().mousePressEvent(event)
@@ -76,9 +126,22 @@ class GalleryItem(QGraphicsItem):
             path.addRoundedRect(0, 0, self.width, self.height, 10, 10)
             painter.fillPath(path, QColor(0, 200, 0, 100))
 
+        if self.pixmap is None:
+            painter.fillRect(QRectF(self.margin, self.margin, self.image_size, self.image_size), QColor(128, 128, 128, 60))
+            return
         x = (self.width - self.pixmap.width()) / 2
         y = (self.height - self.text_height - self.pixmap.height()) / 2
         painter.drawPixmap(QPointF(x, y), self.pixmap)
+        if self.overlay and self.original_width > 0:
+            painter.save()
+            painter.setClipRect(QRectF(x, y, self.pixmap.width(), self.pixmap.height()))
+            painter.translate(x, y)
+            scale = self.pixmap.width() / self.original_width
+            painter.scale(scale, scale)
+            for pen, rects in self.overlay:
+                painter.setPen(pen)
+                painter.drawRects(rects)
+            painter.restore()
         
     def contains(self, point: QPointF) -> bool:
         return super().contains(point)
@@ -89,22 +152,109 @@ class GalleryItem(QGraphicsItem):
         return path
 
 
+class GalleryModel(object):
+    """图库的紧凑模型, 只保存图像路径和选中的行, 不创建图形项
+
+    设置过滤后只显示 filter_rows (升序的 NumPy 数组) 中的图像, 行号 (row) 指过滤后的位置,
+    baseRow 是在全部图像中的位置. 选中的行也是过滤后的行号.
+    """
+    def __init__(self) -> None:
+        self.images_path = []
+        self.rows = {}
+        self.selected = set()
+        self.filter_rows = None
+
+    def __len__(self):
+        return len(self.images_path) if self.filter_rows is None else len(self.filter_rows)
+
+    def __contains__(self, image_path):
+        return self.row(image_path) >= 0
+
+    def baseRow(self, row : int) -> int:
+        return row if self.filter_rows is None else int(self.filter_rows[row])
+
+    def path(self, row : int) -> str:
+        return self.images_path[self.baseRow(row)]
+
+    def row(self, image_path : str) -> int:
+        base_row = self.rows.get(image_path, -1)
+        if self.filter_rows is None or base_row < 0:
+            return base_row
+        row = int(self.filter_rows.searchsorted(base_row))
+        return row if row < len(self.filter_rows) and self.filter_rows[row] == base_row else -1
+
+    def setFilter(self, rows):
+        """只显示这些行 (全部图像中的位置), None 显示全部
+        """
+        if rows is not None:
+            rows = rows[rows < len(self.images_path)]
+        self.filter_rows = rows
+        self.selected.clear()
+
+    def append(self, images_path):
+        for image_path in images_path:
+            if image_path not in self.rows:
+                self.rows[image_path] = len(self.images_path)
+                self.images_path.append(image_path)
+
+    def clear(self):
+        self.images_path = []
+        self.rows = {}
+        self.selected.clear()
+        self.filter_rows = None
+
+
 class GalleryView(QGraphicsView):
+    """图库视图
+
+    图形项的位置由 GridLayout 根据索引计算, 只放置视口附近的行, 缩放和改变大小的开销与图像数量无关. 
+    virtualized 为 True 时只为可见的行创建 GalleryItem, 滚动时复用图形项, 
+    内存占用与视口大小相关而与图像数量无关; 否则为每张图像创建一个 GalleryItem, 不可见的图形项被隐藏.
+    """
     galleryItemDoubleClicked = Signal(str)
+    # 选中的图像路径
+    prelabelRequested = Signal(list)
 
-    def __init__(self, parent=None) -> None:
+    def __init__(self, parent=None, virtualized : bool = True) -> None:
         super().__init__(parent)
 
         self.setScene(QGraphicsScene(parent))
 
         self.spacing = 5
-        self.current_x = 0
-        self.current_y = 0
         self.setAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop)
         self.setResizeAnchor(QGraphicsView.ViewportAnchor.AnchorViewCenter)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        self.grid_layout = GridLayout(*GalleryItem.itemSize(), self.spacing)
         self.width_limit = self.mapToScene(self.viewport().rect()).boundingRect().width()
+        self.grid_layout.setWidthLimit(self.width_limit)
+
+        self.virtualized = virtualized
+        # 视口上下额外放置的行数
+        self.overscan_rows = 1
+        self.model = GalleryModel()
+        # row -> GalleryItem, 当前放置的图形项
+        self.visible_items = {}
+        self.item_pool = []
+        # 已经提交读取的图像, 避免重复解码
+        self.requested = set()
+        # 最近使用的缩略图, image_path -> (QPixmap, QSize)
+        self.thumbnails = OrderedDict()
+        self.max_thumbnails = configs.gallery_max_thumbnails
+        self.scene().setItemIndexMethod(QGraphicsScene.ItemIndexMethod.NoIndex)
+        self.scene().selectionChanged.connect(self.syncSelection)
+
+        # 非虚拟模式下每一行的图形项
+        self.gallery_items = []
+        self.image_reader = ImageReadThread(self, image_size=configs.thumbnail_size)
+        self.image_reader.imageRead.connect(self.setItemImage)
+        self.image_reader.readFinished.connect(self.readFinished)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.image_reader.stop)
+
+        # image_path -> GalleryItem.overlay, 为 None 时不绘制标注
+        self.overlay_provider = None
 
         self.createContextMenu()
 
@@ -113,11 +263,23 @@ class GalleryView(QGraphicsView):
         self.context_menu = QMenu(self)
         self._open_action = newAction(self, self.tr("打开选中的图像"), slot=None, shortcut=None)
         self._delete_action = newAction(self, self.tr("删除选中的图像"), slot=None, shortcut=None)
+        self._prelabel_action = newAction(self, self.tr("预标注选中的图像"), slot=self._prelabelSelected, shortcut=None)
         self.context_menu.addActions((self._open_action, self._delete_action,))
+        self.context_menu.addSeparator()
+        self.context_menu.addAction(self._prelabel_action)
+
+    @Slot()
+    def _prelabelSelected(self):
+        self.prelabelRequested.emit(self.selectedImages())
 
     def resizeEvent(self, event: QResizeEvent) -> None:
-        self.width_limit = self.mapToScene(self.viewport().rect()).boundingRect().width()
-        return super().resizeEvent(event)
+        super().resizeEvent(event)
+        self.updateLayout()
+    
+    
+    def scrollContentsBy(self, dx: int, dy: int) -> None:
+        super().scrollContentsBy(dx, dy)
+        self.updateVisibleItems()
     
     
     def mousePressEvent(self, event: QMouseEvent) -> None:
@@ -126,11 +288,12 @@ class GalleryView(QGraphicsView):
         if event.button() == Qt.MouseButton.RightButton and event.modifiers() != Qt.KeyboardModifier.ControlModifier:
             if item not in selected_item:
                 self.scene().clearSelection()
+                self.model.selected.clear()
         return super().mousePressEvent(event)
     
     
     def contextMenuEvent(self, event: QContextMenuEvent) -> None:
-        selected_items_count = len(self.scene().selectedItems())
+        selected_items_count = len(self.selectedImages())
         if selected_items_count <= 0:
             super().contextMenuEvent(event)
         else:
@@ -158,9 +321,9 @@ class GalleryView(QGraphicsView):
     def wheelEvent(self, event: QWheelEvent) -> None:
         if event.modifiers() == Qt.KeyboardModifier.ControlModifier:
             new_scale = 1.0 + event.angleDelta().y()  * 0.00125
-            LOGGER.debug(new_scale)
+            LOGGER.debug("%s", new_scale)
             self.scale(new_scale, new_scale)
-            self.updateItemsPos()
+            self.updateLayout()
         else:
             super().wheelEvent(event)
 
@@ -169,32 +332,183 @@ class GalleryView(QGraphicsView):
         return super().keyPressEvent(event)
     
     
-    def addImage(self, item : QGraphicsItem):
-        self.scene().addItem(item)
-        self.updateItemPos(item)
-
-    def updateItemPos(self, item : QGraphicsItem):
-        if isinstance(item, GalleryItem):
-            item_size =  item.boundingRect().size()
-            self.current_x = 0 if self.current_x == 0 else self.current_x + self.spacing
-            if self.current_x > 0 and self.current_x + item_size.width() > self.width_limit:
-                x = 0
-                y = self.current_y + item_size.height() + self.spacing
-                self.current_y = y
+    def addImage(self, image_path : str):
+        self.addImages([image_path])
+
+    def addImages(self, images_path : list):
+        """添加图像到图库, 缩略图在后台读取
+        """
+        first = len(self.model.images_path)
+        self.model.append(images_path)
+        if not self.virtualized:
+            added = self.model.images_path[first:]
+            for image_path in added:
+                item = GalleryItem(image_path)
+                item.hide()
+                self.scene().addItem(item)
+                self.gallery_items.append(item)
+            if len(added) > 0:
+                self.image_reader.addImages(added)
+        self.updateVisibleItems(relayout=True)
+
+    def setFilter(self, rows):
+        """只显示 rows (按加入图库的顺序的位置, 升序) 中的图像, None 显示全部, 开销与可见的图像数相关
+        """
+        for item in self.visible_items.values():
+            self.releaseItem(item)
+        self.visible_items.clear()
+        blocked = self.scene().blockSignals(True)
+        self.scene().clearSelection()
+        self.scene().blockSignals(blocked)
+        self.model.setFilter(rows)
+        self.verticalScrollBar().setValue(0)
+        self.updateVisibleItems(relayout=True)
+
+    def setOverlayProvider(self, provider):
+        """provider(image_path) 返回缩略图上叠加的矩形, 见 GalleryItem.overlay; 只对放置的图形项调用
+        """
+        self.overlay_provider = provider
+        self.refreshOverlays()
+
+    def refreshOverlays(self):
+        for item in self.visible_items.values():
+            item.overlay = self.overlay_provider(item.image_path) if self.overlay_provider is not None else None
+            item.update()
+
+    def selectedImages(self) -> list:
+        return [self.model.path(row) for row in sorted(self.model.selected)]
+
+    @Slot()
+    def syncSelection(self):
+        """图形项会被隐藏或复用, 选中状态保存在模型中
+        """
+        for row, item in self.visible_items.items():
+            if item.isSelected():
+                self.model.selected.add(row)
             else:
-                x = self.current_x
-                y = self.current_y
+                self.model.selected.discard(row)
 
-            item.setPos(x, y)
-            self.current_x = x + item_size.width()
-
-    def reset(self):
-        self.current_x = 0
-        self.current_y = 0
+    def updateLayout(self):
+        """视口宽度或缩放变化后只重新计算列数和可见范围
+        """
         self.width_limit = self.mapToScene(self.viewport().rect()).boundingRect().width()
-
-    def updateItemsPos(self):
-        self.reset()
-        for item in self.scene().items(Qt.SortOrder.AscendingOrder):
-            self.updateItemPos(item)
-        
+        self.grid_layout.setWidthLimit(self.width_limit)
+        self.updateVisibleItems(relayout=True)
+
+    def visibleRange(self):
+        """视口附近需要放置的图像范围 [first, last)
+        """
+        rect = self.mapToScene(self.viewport().rect()).boundingRect()
+        return self.grid_layout.visibleRange(rect.top(), rect.bottom(), len(self.model), self.overscan_rows)
+
+    def acquireItem(self, row : int) -> GalleryItem:
+        if not self.virtualized:
+            item = self.gallery_items[self.model.baseRow(row)]
+            item.show()
+            if self.overlay_provider is not None:
+                item.overlay = self.overlay_provider(item.image_path)
+            return item
+        image_path = self.model.path(row)
+        if len(self.item_pool) > 0:
+            item = self.item_pool.pop()
+            item.setImagePath(image_path)
+            item.show()
+        else:
+            item = GalleryItem(image_path)
+            self.scene().addItem(item)
+        thumbnail = self.thumbnails.get(image_path)
+        if thumbnail is not None:
+            self.thumbnails.move_to_end(image_path)
+            item.setThumbnail(*thumbnail)
+        if self.overlay_provider is not None:
+            item.overlay = self.overlay_provider(image_path)
+        return item
+
+    def releaseItem(self, item : GalleryItem):
+        item.hide()
+        if self.virtualized:
+            self.item_pool.append(item)
+
+    def updateVisibleItems(self, relayout : bool = False):
+        """只放置可见行的图形项, 开销与图像总数无关
+
+        Args:
+            relayout (bool): 列数或图像数量变化后需要重新设置 sceneRect 和图形项位置
+        """
+        if relayout:
+            width, height = self.grid_layout.contentSize(len(self.model))
+            self.scene().setSceneRect(QRectF(0, 0, width, height))
+
+        first, last = self.visibleRange()
+        for row in [row for row in self.visible_items if row < first or row >= last]:
+            self.releaseItem(self.visible_items.pop(row))
+
+        for row in range(first, last):
+            item = self.visible_items.get(row)
+            if item is None:
+                item = self.acquireItem(row)
+                self.visible_items[row] = item
+                # 隐藏或复用的图形项需要恢复选中状态, 避免 syncSelection 修改模型
+                blocked = self.scene().blockSignals(True)
+                item.setSelected(row in self.model.selected)
+                self.scene().blockSignals(blocked)
+            elif not relayout:
+                continue
+            item.setPos(*self.grid_layout.position(row))
+
+        if self.virtualized:
+            self.requestThumbnails(first, last)
+
+    def requestThumbnails(self, first : int, last : int):
+        # 滚动过去的图像不再读取
+        for image_path in self.image_reader.clearPending():
+            self.requested.discard(image_path)
+        missing = []
+        for row in range(first, last):
+            image_path = self.model.path(row)
+            if image_path not in self.requested and image_path not in self.thumbnails:
+                self.requested.add(image_path)
+                missing.append(image_path)
+        if len(missing) > 0:
+            self.image_reader.addImages(missing)
+
+    @Slot(str, QImage, QSize)
+    def setItemImage(self, image_path : str, image : QImage, original_size : QSize):
+        if not self.virtualized:
+            base_row = self.model.rows.get(image_path, -1)
+            if base_row >= 0:
+                self.gallery_items[base_row].setImage(image, original_size)
+            return
+        row = self.model.row(image_path)
+        self.requested.discard(image_path)
+        if image.isNull():
+            return
+        pixmap = QPixmap.fromImage(image)
+        self.thumbnails[image_path] = (pixmap, original_size)
+        self.thumbnails.move_to_end(image_path)
+        while len(self.thumbnails) > self.max_thumbnails:
+            self.thumbnails.popitem(last=False)
+        item = self.visible_items.get(row)
+        if item is not None and item.image_path == image_path:
+            item.setThumbnail(pixmap, original_size)
+
+    @Slot()
+    def readFinished(self):
+        LOGGER.debug("read images finished")
+
+    def setThumbnailCache(self, cache):
+        self.image_reader.cancel()
+        self.image_reader.cache = cache
+
+    def clear(self):
+        """清空图库, 取消未完成的读取
+        """
+        self.image_reader.cancel()
+        self.gallery_items.clear()
+        self.model.clear()
+        self.visible_items.clear()
+        self.item_pool.clear()
+        self.requested.clear()
+        self.thumbnails.clear()
+        self.scene().clear()
+        self.updateLayout()
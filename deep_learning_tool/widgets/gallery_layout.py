@@ -0,0 +1,70 @@
+
+
+class GridLayout(object):
+    """等大小单元格的网格布局, 位置只由索引计算
+
+    列数 = floor((width_limit + spacing) / (item_width + spacing)), 
+    缩放或改变大小时只需要重新计算列数和可见范围, 与图像数量无关.
+    """
+    def __init__(self, item_width : float, item_height : float, spacing : float = 5) -> None:
+        self.item_width = item_width
+        self.item_height = item_height
+        self.spacing = spacing
+        self.width_limit = 0
+        self.columns = 1
+
+    @property
+    def cell_width(self) -> float:
+        return self.item_width + self.spacing
+
+    @property
+    def cell_height(self) -> float:
+        return self.item_height + self.spacing
+
+    def setWidthLimit(self, width_limit : float) -> bool:
+        """设置可用宽度
+
+        Returns:
+            bool: 列数是否改变
+        """
+        self.width_limit = width_limit
+        columns = max(1, int((width_limit + self.spacing) // self.cell_width))
+        changed = columns != self.columns
+        self.columns = columns
+        return changed
+
+    def rowCount(self, count : int) -> int:
+        return (count + self.columns - 1) // self.columns
+
+    def contentSize(self, count : int):
+        """内容的 (宽, 高)
+        """
+        return max(self.width_limit, self.item_width), self.rowCount(count) * self.cell_height
+
+    def position(self, index : int):
+        """索引为 index 的单元格左上角坐标
+        """
+        row, column = divmod(index, self.columns)
+        return column * self.cell_width, row * self.cell_height
+
+    def indexAt(self, x : float, y : float, count : int) -> int:
+        """坐标所在单元格的索引, 不在任何单元格上返回 -1
+        """
+        if x < 0 or y < 0:
+            return -1
+        column, dx = divmod(x, self.cell_width)
+        row, dy = divmod(y, self.cell_height)
+        if column >= self.columns or dx > self.item_width or dy > self.item_height:
+            return -1
+        index = int(row) * self.columns + int(column)
+        return index if index < count else -1
+
+    def visibleRange(self, top : float, bottom : float, count : int, overscan_rows : int = 0):
+        """与 [top, bottom] 相交的单元格索引范围 [first, last)
+        """
+        rows = self.rowCount(count)
+        first_row = max(0, int(top // self.cell_height) - overscan_rows)
+        last_row = min(rows, int(bottom // self.cell_height) + 1 + overscan_rows)
+        first = first_row * self.columns
+        last = min(count, max(first_row, last_row) * self.columns)
+        return first, max(first, last)
@@ -1,17 +1,20 @@
-from qtpy.QtCore import Qt, Signal, Slot
-from qtpy.QtCore import QDir, QDirIterator
+from qtpy.QtCore import Qt, Signal, Slot, QCoreApplication
 
-from qtpy.QtWidgets import QMainWindow, QDockWidget, QWidget
+from qtpy.QtWidgets import QMainWindow, QDockWidget, QWidget, QPushButton
 from qtpy.QtWidgets import QFileDialog, QSizePolicy
 from qtpy.QtWidgets import QGridLayout
 
 from deep_learning_tool.data import Project
+from deep_learning_tool import configs
 from deep_learning_tool.configs import image_suffixs_filter
 from deep_learning_tool import LOGGER
+from deep_learning_tool.utils import FolderImportThread
 
 from .widget import ProjectInfo
 from .gallery_widget import GalleryImageInfo
 from .gallery_graphics import GalleryItem, GalleryView
+from .split_widget import SplitMappingWidget, ALL_SPLITS
+from .prelabel_widget import PrelabelWidget
 
 
 
@@ -20,6 +23,8 @@ from .gallery_graphics import GalleryItem, GalleryView
 class GalleryWindow(QMainWindow):
     
     galleryItemDoubleClicked = Signal(str)
+    # 预标注写入了候选框的图像 id
+    proposalsWritten = Signal(list)
 
     def __init__(self, parent: QWidget | None = None, flags: Qt.WindowFlags | Qt.WindowType = Qt.WindowFlags()) -> None:
         super().__init__(parent, flags)
@@ -33,35 +38,89 @@ class GalleryWindow(QMainWindow):
         self.gallery_view.show()
         self.gallery_view.galleryItemDoubleClicked.connect(self._galleryItemDoubleClicked)
 
+        self.folder_importer = None
+        self.cancel_import_btn = QPushButton(self.tr("取消导入"), self)
+        self.cancel_import_btn.clicked.connect(self.cancelImport)
+        self.cancel_import_btn.hide()
+        self.statusBar().addPermanentWidget(self.cancel_import_btn)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.cancelImport)
+
         self.initSignals()
 
 
     def initSignals(self):
         self.gallery_image_info.add_folder_btn.clicked.connect(self.openFolder)
         self.gallery_image_info.add_image_btn.clicked.connect(self.openImage)
+        self.gallery_view.prelabelRequested.connect(self.prelabelImages)
+        self.prelabel_widget.selected_btn.clicked.connect(lambda: self.prelabelImages(self.gallery_view.selectedImages()))
+        self.prelabel_widget.proposalsWritten.connect(self.proposalsWritten)
+
+    @Slot(list)
+    def prelabelImages(self, images_path : list):
+        self.prelabel_dock.show()
+        self.prelabel_widget.startPrelabel(images_path)
 
     @Slot()
     def openImage(self):
         file_path, _ = QFileDialog().getOpenFileName(self, "选择图片加入项目", "/home",  image_suffixs_filter)
         if file_path != "" and self.project.images_path.get(file_path) is None:
             self.project.addImage(file_path)
-            self.gallery_view.addImage(GalleryItem(file_path))
+            self.gallery_view.addImage(file_path)
             self.gallery_view.update()
 
     @Slot()
     def openFolder(self):
-        filter = ["*.png", "*.jpg", "*.bmp"]
         folder = QFileDialog().getExistingDirectory(self, 
                                                     "选择目录加入项目", 
                                                     "/home", 
                                                     QFileDialog.Option.ShowDirsOnly | QFileDialog.Option.DontResolveSymlinks)
         if folder != "":
-            LOGGER.debug(f"folder: {folder}")
-            for fname in QDirIterator(folder, 
-                                      filter, 
-                                      QDir.Filter.NoDotAndDotDot | QDir.Filter.Files | QDir.Filter.NoSymLinks, 
-                                      QDirIterator.IteratorFlag.Subdirectories):
-                LOGGER.debug(fname)
+            LOGGER.debug("folder: %s", folder)
+            self.importFolder(folder)
+
+    def importFolder(self, folder : str):
+        """在后台遍历目录, 找到的图像分批加入项目和图库
+        """
+        self.cancelImport()
+        self.import_added = 0
+        self.folder_importer = FolderImportThread(folder, configs.image_suffixs, self, batch_size=configs.import_batch_size)
+        self.folder_importer.batchFound.connect(self.importBatch)
+        self.folder_importer.progress.connect(self.importProgress)
+        self.folder_importer.finished.connect(self.importFinished)
+        self.cancel_import_btn.show()
+        self.folder_importer.start()
+
+    @Slot(list)
+    def importBatch(self, images_path : list):
+        added = self.project.addImages(images_path)
+        self.import_added += len(added)
+        if len(added) > 0:
+            self.gallery_view.addImages(added)
+
+    @Slot(int, int, float)
+    def importProgress(self, scanned : int, found : int, rate : float):
+        self.statusBar().showMessage(self.tr("已扫描 {} 个文件, 找到 {} 张图像, 新增 {} 张, {:.0f} 文件/秒").format(scanned, found, self.import_added, rate))
+
+    @Slot()
+    def importFinished(self):
+        self.cancel_import_btn.hide()
+        self.folder_importer = None
+        # 集合的数量和过滤需要遍历所有图像, 导入结束 (或取消) 后更新一次, 不在每批之后更新
+        if self.import_added > 0:
+            self.import_added = 0
+            self.refreshSplits()
+
+    @Slot()
+    def cancelImport(self):
+        if self.folder_importer is not None:
+            # 丢弃已经在事件队列中的结果
+            self.folder_importer.batchFound.disconnect(self.importBatch)
+            self.folder_importer.progress.disconnect(self.importProgress)
+            self.folder_importer.finished.disconnect(self.importFinished)
+            self.folder_importer.stop()
+            self.importFinished()
 
     @Slot(str)
     def _galleryItemDoubleClicked(self, image_path : str) -> None:
@@ -73,13 +132,38 @@ class GalleryWindow(QMainWindow):
         gallery_widget_layout = QGridLayout()
         gallery_widget_layout.setContentsMargins(0,0,0,0)
         gallery_widget.setLayout(gallery_widget_layout)
-        self.gallery_view = GalleryView(gallery_widget)
+        self.gallery_view = GalleryView(gallery_widget, virtualized=configs.gallery_virtualized)
         gallery_widget_layout.addWidget(self.gallery_view)
         self.setCentralWidget(gallery_widget)
 
     def setProject(self, project : Project):
         self.project = project
         self.project_dock.setWidget(ProjectInfo(project.name, project.type))
+        # 切换项目时取消上一个项目未完成的读取
+        self.gallery_view.clear()
+        self.gallery_view.setThumbnailCache(project.thumbnail_cache)
+        # 图库中图像的顺序与项目 ImageRegistry 的行一致, 按集合过滤时直接使用行号
+        self.gallery_view.addImages(list(project.images_path))
+        self.split_filter = ALL_SPLITS
+        self.split_mapping.setCurrentSplit(ALL_SPLITS)
+        self.split_mapping.updateFromProject(project)
+        self.prelabel_widget.setProject(project)
+
+    @Slot(int)
+    def filterBySplit(self, split : int):
+        """只显示一个集合中的图像, ALL_SPLITS 显示全部
+        """
+        self.split_filter = split
+        rows = None if split == ALL_SPLITS else self.project.images.rowsWhere("split", split)
+        self.gallery_view.setFilter(rows)
+
+    @Slot()
+    def refreshSplits(self):
+        """拆分变化或加入图像后更新数量和过滤
+        """
+        self.split_mapping.updateFromProject(self.project)
+        if self.split_filter != ALL_SPLITS:
+            self.filterBySplit(self.split_filter)
 
 
     def createDockWidgets(self):
@@ -113,12 +197,20 @@ class GalleryWindow(QMainWindow):
         # self.select_dock = QDockWidget(self.tr("已选择"), self)
         self.split_mapping_dock = QDockWidget(self.tr("拆分映射"), self)
         self.split_mapping_dock.setFeatures(QDockWidget.NoDockWidgetFeatures)
-        widget = QWidget(self)
-        widget.setSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding)
-        self.split_mapping_dock.setWidget(widget)
+        self.split_filter = ALL_SPLITS
+        self.split_mapping = SplitMappingWidget(show_all=True, parent=self)
+        self.split_mapping.setSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding)
+        self.split_mapping.splitActivated.connect(self.filterBySplit)
+        self.split_mapping_dock.setWidget(self.split_mapping)
         self.split_mapping_dock.setMinimumHeight(100)
         self.split_mapping_dock.setSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding)
         self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.split_mapping_dock)
 
+        self.prelabel_dock = QDockWidget(self.tr("预标注"), self)
+        self.prelabel_dock.setFeatures(QDockWidget.DockWidgetMovable | QDockWidget.DockWidgetClosable)
+        self.prelabel_widget = PrelabelWidget(self)
+        self.prelabel_dock.setWidget(self.prelabel_widget)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.prelabel_dock)
+
         
         
\ No newline at end of file
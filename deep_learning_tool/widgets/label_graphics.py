@@ -1,22 +1,28 @@
 import typing
+import logging
 from typing import Any, Optional
 from enum import Enum
-import PySide6.QtWidgets
+
+import numpy as np
 
 
 from qtpy.QtCore import Signal, Slot
-from qtpy.QtCore import Qt, QLineF, QRectF, QPointF
-from qtpy.QtCore import QEvent
+from qtpy.QtCore import Qt, QLineF, QRectF, QPointF, QRect, QPoint
+from qtpy.QtCore import QEvent, QTimer
 
 from qtpy.QtWidgets import QWidget
-from qtpy.QtWidgets import QGraphicsView, QGraphicsItem, QGraphicsPixmapItem, QGraphicsRectItem, QStyleOptionGraphicsItem
+from qtpy.QtWidgets import QGraphicsScene, QGraphicsView, QGraphicsItem, QGraphicsPixmapItem, QGraphicsRectItem, QStyleOptionGraphicsItem
 from qtpy.QtWidgets import QGraphicsSceneHoverEvent, QGraphicsSceneMouseEvent
 
-from qtpy.QtGui import QPainter, QPen, QPainterPath, QPixmap, QCursor, QPainterPathStroker
-from qtpy.QtGui import QMouseEvent, QResizeEvent, QWheelEvent, QKeyEvent
+from qtpy.QtGui import QPainter, QPen, QColor, QPainterPath, QPixmap, QCursor, QPainterPathStroker
+from qtpy.QtGui import QMouseEvent, QResizeEvent, QWheelEvent, QKeyEvent, QKeySequence
 
 from deep_learning_tool import LOGGER
-from deep_learning_tool.utils import newPixmap, distance, distancetoline
+from deep_learning_tool import configs
+from deep_learning_tool.utils import newPixmap, asBoxes, nearestVertices, nearestEdges, nearestHandles
+from deep_learning_tool.data import GridIndex, AnnotationSet, AnnotationDiff
+
+from .pyramid_graphics import TiledImageItem
 
 
 def qt_graphicsItem_shapeFromPath(path : QPainterPath, pen : QPen) -> QPainterPath:
@@ -38,6 +44,145 @@ def qt_graphicsItem_shapeFromPath(path : QPainterPath, pen : QPen) -> QPainterPa
     return p
 
 
+def imageRectOf(item : QGraphicsItem) -> QRectF | None:
+    """获取图像图形项 (QGraphicsPixmapItem 或 TiledImageItem) 的图像矩形, 其他图形项返回 None
+    """
+    if isinstance(item, QGraphicsPixmapItem):
+        return QRectF(item.pixmap().rect())
+    elif isinstance(item, TiledImageItem):
+        return item.imageRect()
+    return None
+
+
+def rectToBox(rect : QRectF) -> typing.Tuple[float, float, float, float]:
+    return rect.left(), rect.top(), rect.right(), rect.bottom()
+
+
+def boxToRect(box) -> QRectF:
+    return QRectF(QPointF(box[0], box[1]), QPointF(box[2], box[3]))
+
+
+class ClassStyle(object):
+    """每个类别的颜色和缓存的画笔, 绘制时不再每次创建 QPen
+    """
+    # 黄金分割比例间隔的色相, 相邻类别的颜色差别较大
+    HUE_STEP = 0.618033988749895
+
+    def __init__(self) -> None:
+        self._colors = {}
+        self._pens = {}
+
+    def color(self, class_id : int) -> QColor:
+        color = self._colors.get(class_id)
+        if color is None:
+            color = QColor.fromHsvF((class_id * self.HUE_STEP) % 1.0, 0.85, 0.95)
+            self._colors[class_id] = color
+        return color
+
+    def setColor(self, class_id : int, color : QColor):
+        self._colors[class_id] = QColor(color)
+        self._pens = {key : pen for key, pen in self._pens.items() if key[0] != class_id}
+
+    def pen(self, class_id : int, selected : bool = False) -> QPen:
+        key = (class_id, selected)
+        pen = self._pens.get(key)
+        if pen is None:
+            pen = QPen(self.color(class_id))
+            pen.setWidth(1)
+            pen.setCosmetic(True)
+            if selected:
+                pen.setStyle(Qt.PenStyle.DashLine)
+            self._pens[key] = pen
+        return pen
+
+
+class LabelScene(QGraphicsScene):
+    """标注场景, 保存矩形在图像坐标系中的空间索引、视图的缩放比例和类别的颜色
+
+    RectItem 在创建完成、移动和改变大小时更新 rect_index, ImageView 的点击检测只查询 rect_index.
+    有标注时索引的 key 是 annotation_id, 批量绘制的矩形也能被查询到.
+    """
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.rect_index = GridIndex()
+        self.view_scale = 1.0
+        self.class_style = ClassStyle()
+
+
+class RectBatchItem(QGraphicsItem):
+    """在一次 drawRects 中按类别批量绘制一张图像中所有未提升为 RectItem 的矩形
+
+    矩形的 QRectF 在标注修改后 (AnnotationSet.version 变化) 才重新生成, 
+    绘制时用 NumPy 筛选出暴露区域内的矩形, 每个类别设置一次画笔.
+    """
+    def __init__(self, annotations : AnnotationSet, style : ClassStyle, parent : QGraphicsItem) -> None:
+        super().__init__(parent)
+        self.annotations = annotations
+        self.style = style
+        # 已提升为 RectItem 的 annotation_id, 不在这里绘制
+        self.promoted = set()
+        self._version = -1
+        self._ids = np.empty(0, dtype=np.int64)
+        self._boxes = np.empty((0, 4))
+        self._class_ids = np.empty(0, dtype=np.int32)
+        self._rects = []
+        prect = imageRectOf(parent)
+        self._bounding_rect = prect.adjusted(-1, -1, 1, 1) if prect is not None else QRectF()
+        self.setAcceptedMouseButtons(Qt.MouseButton.NoButton)
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption, True)
+        # 在 RectItem 下面
+        self.setZValue(-1)
+        # 按缩放比例缓存绘制结果, 十字线等局部重绘时不再重新 drawRects
+        self.setCacheMode(QGraphicsItem.CacheMode.DeviceCoordinateCache)
+
+    def sync(self):
+        if self._version == self.annotations.version:
+            return
+        self._version = self.annotations.version
+        self._ids = self.annotations.column("id").copy()
+        self._boxes = self.annotations.boxes()
+        self._class_ids = self.annotations.column("class_id").copy()
+        self._rects = [boxToRect(box) for box in self._boxes.tolist()]
+
+    def setPromoted(self, promoted):
+        """只重绘提升或还原的矩形所在的区域
+        """
+        promoted = set(promoted)
+        changed = promoted.symmetric_difference(self.promoted)
+        self.promoted = promoted
+        for annotation_id in changed:
+            box = self.annotations.box(annotation_id)
+            if box is not None:
+                self.update(boxToRect(box).adjusted(-1, -1, 1, 1))
+
+    def boundingRect(self) -> QRectF:
+        return self._bounding_rect
+
+    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: QWidget | None = ...) -> None:
+        self.sync()
+        if len(self._rects) == 0:
+            return
+        exposed = option.exposedRect
+        boxes = self._boxes
+        visible = ((boxes[:, 0] <= exposed.right()) & (boxes[:, 2] >= exposed.left()) & 
+                   (boxes[:, 1] <= exposed.bottom()) & (boxes[:, 3] >= exposed.top()))
+        if len(self.promoted) > 0:
+            visible &= ~np.isin(self._ids, np.fromiter(self.promoted, dtype=np.int64, count=len(self.promoted)))
+        rows = np.flatnonzero(visible)
+        if len(rows) == 0:
+            return
+        class_ids = self._class_ids[rows]
+        order = np.argsort(class_ids, kind="stable")
+        rows, class_ids = rows[order], class_ids[order]
+        starts = np.flatnonzero(np.diff(class_ids, prepend=class_ids[0] - 1))
+        rects = self._rects
+        # 与坐标轴平行的 1 像素边框不需要抗锯齿, 关闭后 drawRects 快很多
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing, False)
+        for start, end in zip(starts.tolist(), starts[1:].tolist() + [len(rows)]):
+            painter.setPen(self.style.pen(int(class_ids[start])))
+            painter.drawRects([rects[row] for row in rows[start:end].tolist()])
+
+
 class VertexEdge(Enum):
     # vertex order
     TOP_LEFT = 0
@@ -60,60 +205,96 @@ class RectItem(QGraphicsRectItem):
 
     def __init__(self, rect: QRectF, parent: typing.Optional[QGraphicsItem] = ...) -> None:
         super().__init__(rect, parent)
+        # 缓存所在的场景, boundingRect 等频繁调用的方法不再调用 scene()
+        self.label_scene = self.scene()
         self.selected_vertex = VertexEdge.NO_VERTEX.value
         self.selected_edge = VertexEdge.NO_EDGE.value
-        LOGGER.debug(f"init item:\n{self}")
+        # 在 AnnotationSet 中的 id, 没有写入标注时为 -1
+        self.annotation_id = -1
+        self.class_id = 0
+        LOGGER.debug("init item:\n%s", self)
 
     def __del__(self):
-        LOGGER.debug(f"del item:\n{self}")
+        LOGGER.debug("del item:\n%s", self)
+
+    def viewScale(self) -> float:
+        scene = getattr(self, "label_scene", None)
+        if isinstance(scene, LabelScene):
+            return scene.view_scale
+        elif scene is None or len(scene.views()) == 0:
+            return 1.0
+        return scene.views()[0].transform().m11()
+
+    def setRect(self, rect : QRectF) -> None:
+        super().setRect(rect)
+        self.updateIndex()
+
+    def indexKey(self):
+        """在空间索引中的 key, 写入标注后为 annotation_id
+        """
+        return self.annotation_id if self.annotation_id >= 0 else self
+
+    def updateIndex(self):
+        """更新矩形在空间索引中的位置, 只有创建完成 (可选中) 的矩形才加入索引
+        """
+        scene = getattr(self, "label_scene", None)
+        if isinstance(scene, LabelScene) and self.flags() & QGraphicsItem.GraphicsItemFlag.ItemIsSelectable:
+            rect = self.mapRectToParent(self.rect())
+            scene.rect_index.insert(self.indexKey(), rect.left(), rect.top(), rect.right(), rect.bottom())
+
+    def removeIndex(self):
+        scene = getattr(self, "label_scene", None)
+        if isinstance(scene, LabelScene):
+            scene.rect_index.remove(self.indexKey())
         
 
     def itemChange(self, change: QGraphicsItem.GraphicsItemChange, value: typing.Union[Any, QPointF]) -> Any:
+        if change == QGraphicsItem.GraphicsItemChange.ItemSceneHasChanged:
+            self.label_scene = value
         # 限制移动不超出 parentItem 的 Pixmap
-        parent = self.parentItem()
-        if parent is not None and isinstance(parent, QGraphicsPixmapItem) and change == QGraphicsItem.GraphicsItemChange.ItemPositionChange:
+        prect = imageRectOf(self.parentItem()) if change == QGraphicsItem.GraphicsItemChange.ItemPositionChange else None
+        if prect is not None:
             new_pos = value
             rect = self.rect()
             pos_on_pixmap = new_pos + rect.topLeft()
-            prect = QRectF(parent.pixmap().rect())
             if not prect.contains(pos_on_pixmap) or not prect.contains(pos_on_pixmap + QPointF(rect.width(), rect.height())):
                 x = min(prect.right() - rect.left() - rect.width(), max(new_pos.x(), prect.left() - rect.left()))
                 y = min(prect.bottom() - rect.top() - rect.height(), max(new_pos.y(), prect.top() - rect.top()))
                 new_pos.setX(x)
                 new_pos.setY(y)
                 return new_pos
+        if change == QGraphicsItem.GraphicsItemChange.ItemPositionHasChanged:
+            self.updateIndex()
         return super().itemChange(change, value)
 
     def Vertices(self):
         rect = self.rect()
         return [rect.topLeft(), rect.topRight(), rect.bottomRight(), rect.bottomLeft()]
     
+    def box(self):
+        """矩形在自身坐标系中的 (1, 4) 数组 (x1, y1, x2, y2)
+        """
+        rect = self.rect()
+        return asBoxes((rect.left(), rect.top(), rect.right(), rect.bottom()))
+
     def nearestVertex(self, pos : QPointF, epsilon : float):
-        min_distance = float("inf")
-        min_i = VertexEdge.NO_VERTEX.value
-        vertices = self.Vertices()
-        for i, vertex in enumerate(vertices):
-            dist = distance(vertex - pos)
-            if dist <= epsilon and dist < min_distance:
-                min_distance = dist
-                min_i = i
-        return min_i
+        return int(nearestVertices(self.box(), pos.x(), pos.y(), epsilon)[0])
     
     def nearestEdge(self, pos : QPointF, epsilon : float):
-        min_distance = float("inf")
-        post_i = VertexEdge.NO_EDGE.value
-        vertices = self.Vertices()
-        for i in range(len(vertices)):
-            line = [vertices[i - 1], vertices[i]]
-            dist = distancetoline(pos, line)
-            if dist <= epsilon and dist < min_distance:
-                min_distance = dist
-                post_i = i
-        return post_i
+        return int(nearestEdges(self.box(), pos.x(), pos.y(), epsilon)[0])
+
+    def nearestHandle(self, pos : QPointF, epsilon : float) -> typing.Tuple[int, int]:
+        """一次计算最近的顶点和边, 靠近顶点时边为 NO_EDGE
+
+        Returns:
+            typing.Tuple[int, int]: (顶点, 边)
+        """
+        vertex, edge = nearestHandles(self.box(), pos.x(), pos.y(), epsilon)
+        return int(vertex[0]), int(edge[0])
     
     def setRectFromParent(self, rect : QRectF):
-        if isinstance(self.parentItem(), QGraphicsPixmapItem):
-            prect = self.parentItem().pixmap().rect()
+        prect = imageRectOf(self.parentItem())
+        if prect is not None:
             self.setRect(self.mapRectFromParent(rect.intersected(prect)))
         else:
             self.setRect(QRectF())
@@ -131,9 +312,10 @@ class RectItem(QGraphicsRectItem):
             self.setRect(QRectF())
 
     def adjustByVertex(self, pos : QPointF):
-        LOGGER.debug(f'\n{self}\n{self.parentItem()}')
-        if isinstance(self.parentItem(), QGraphicsPixmapItem):
-            prect = QRectF(self.parentItem().pixmap().rect())
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("\n%s\n%s", self, self.parentItem())
+        prect = imageRectOf(self.parentItem())
+        if prect is not None:
             min_edge = 10
             x1, x2 = 0, 0
             y1, y2 = 0, 0
@@ -183,8 +365,8 @@ class RectItem(QGraphicsRectItem):
 
 
     def adjustByEdge(self, pos : QPointF) -> QRectF:
-        if isinstance(self.parentItem(), QGraphicsPixmapItem):
-            prect = QRectF(self.parentItem().pixmap().rect())
+        prect = imageRectOf(self.parentItem())
+        if prect is not None:
             min_edge = 10
             x1, x2 = 0, 0
             y1, y2 = 0, 0
@@ -232,22 +414,20 @@ class RectItem(QGraphicsRectItem):
 
     
     def mousePressEvent(self, event: QGraphicsSceneMouseEvent) -> None:
-        LOGGER.debug(f"{event.modifiers()} {event.button()} {event.buttons()}")
+        LOGGER.debug("%s %s %s", event.modifiers(), event.button(), event.buttons())
         if event.modifiers() == Qt.KeyboardModifier.ControlModifier:
             self.setCursor(Qt.CursorShape.ClosedHandCursor)
             return
         if event.button() == Qt.MouseButton.LeftButton:
             if self.isSelected():
-                scale = self.scene().views()[0].transform().m11()    
-                self.selected_vertex = self.nearestVertex(event.pos(), 10 / scale)
-                if self.selected_vertex == VertexEdge.NO_VERTEX.value:
-                    self.selected_edge = self.nearestEdge(event.pos(), 10 / scale)
+                scale = self.viewScale()
+                self.selected_vertex, self.selected_edge = self.nearestHandle(event.pos(), 10 / scale)
             return super().mousePressEvent(event)
         else:
             return super().mousePressEvent(event)
     
     def mouseMoveEvent(self, event: QGraphicsSceneMouseEvent) -> None:
-        # LOGGER.debug(f"{event.modifiers()} {event.button()} {event.buttons()}")
+        # LOGGER.debug("%s %s %s", event.modifiers(), event.button(), event.buttons())
         if event.modifiers() == Qt.KeyboardModifier.ControlModifier:
             self.setCursor(Qt.CursorShape.ClosedHandCursor)
             return
@@ -277,15 +457,15 @@ class RectItem(QGraphicsRectItem):
 
         
     def mouseReleaseEvent(self, event: QGraphicsSceneMouseEvent) -> None:
-        LOGGER.debug(f"{event.modifiers()} {event.button()} {event.buttons()}")
+        LOGGER.debug("%s %s %s", event.modifiers(), event.button(), event.buttons())
         if self.isSelected():
             self.setCursorByPos(event.pos())
         return super().mouseReleaseEvent(event)
     
     
     def setCursorByPos(self, pos):
-        scale = self.scene().views()[0].transform().m11()
-        self.selected_vertex = self.nearestVertex(pos, 10 / scale)
+        scale = self.viewScale()
+        self.selected_vertex, self.selected_edge = self.nearestHandle(pos, 10 / scale)
         if self.selected_vertex != VertexEdge.NO_VERTEX.value:
             if self.selected_vertex == VertexEdge.TOP_LEFT.value or self.selected_vertex == VertexEdge.BOTTOM_RIGHT.value:
                 self.setCursor(Qt.CursorShape.SizeFDiagCursor)
@@ -295,7 +475,6 @@ class RectItem(QGraphicsRectItem):
                 # FIXME:
                 LOGGER.error("FIXME")
         else:
-            self.selected_edge = self.nearestEdge(pos, 10 / scale)
             if self.selected_edge != VertexEdge.NO_EDGE.value:
                 if self.selected_edge == VertexEdge.LEFT.value or self.selected_edge == VertexEdge.RIGHT.value:
                     self.setCursor(Qt.CursorShape.SizeHorCursor)
@@ -309,11 +488,13 @@ class RectItem(QGraphicsRectItem):
         self.update()
 
     def keyPressEvent(self, event: QKeyEvent) -> None:
-        LOGGER.debug(self.cursor().pos())
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("%s", self.cursor().pos())
         return super().keyPressEvent(event)
     
     def keyReleaseEvent(self, event: QKeyEvent) -> None:
-        LOGGER.debug(self.cursor().pos())
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("%s", self.cursor().pos())
         return super().keyReleaseEvent(event)
 
     def hoverMoveEvent(self, event: QGraphicsSceneHoverEvent) -> None:
@@ -336,26 +517,31 @@ class RectItem(QGraphicsRectItem):
         self.setCursor(Qt.CursorShape.ArrowCursor)
     
     def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: QWidget | None = ...) -> None:
-        pen = self.pen()
-        pen.setWidth(1)
-        pen.setCosmetic(True)
-        if self.isSelected():
-            pen.setStyle(Qt.PenStyle.DashLine)
+        scene = self.label_scene
+        if isinstance(scene, LabelScene):
+            pen = scene.class_style.pen(self.class_id, self.isSelected())
+        else:
+            pen = self.pen()
+            pen.setWidth(1)
+            pen.setCosmetic(True)
+            if self.isSelected():
+                pen.setStyle(Qt.PenStyle.DashLine)
         painter.setPen(pen)
         painter.drawRect(self.rect())
         # return super().paint(painter, option, widget)
 
     def boundingRect(self) -> QRectF:
         # 在rect基础上向外扩充 10 个单位
-        scale = self.scene().views()[0].transform().m11()
+        scale = self.viewScale()
         offset = 10 / scale
         return self.rect().adjusted(-offset, -offset, offset, offset)
 
     def shape(self) -> QPainterPath:
-        # 重写以扩充鼠标事件响应范围和碰撞检测范围
+        # 重写以扩充鼠标事件响应范围和碰撞检测范围, boundingRect 已向外扩充 10 个屏幕像素, 
+        # 不再用 QPainterPathStroker 描边
         path = QPainterPath()
         path.addRect(self.boundingRect())
-        return qt_graphicsItem_shapeFromPath(path, self.pen())
+        return path
 
 
 class CrossLineItem(QGraphicsItem):
@@ -423,15 +609,34 @@ class Mode(Enum):
     EDIT = 1
 
 class ImageView(QGraphicsView):
+    # 请求切换到相对当前图像 offset 的图像
+    imageStepRequested = Signal(int)
+
     def __init__(self, scene, parent=None) -> None:
         LOGGER.debug("ImageView")
         super().__init__(scene, parent)
 
-        self.label_rects = []
+        # 当前图像的标注, 矩形从中创建, 修改后写回
+        self.annotations = None
+        # annotation_id -> RectItem
+        self.rect_items = {}
+        self.current_class_id = 0
+        # 批量绘制未选中矩形的图形项
+        self.batch_render = configs.label_batch_render
+        self.batch_item = None
 
         self.p0 = None
         self.drawing_rect = None
 
+        # 合并鼠标移动事件: 只保存最后一次移动, 定时器到时统一更新十字线、悬停光标和正在绘制的矩形
+        self.pending_mouse_move = None
+        self.mouse_move_timer = QTimer(self)
+        self.mouse_move_timer.setSingleShot(True)
+        self.mouse_move_timer.setInterval(configs.label_mouse_move_interval)
+        self.mouse_move_timer.timeout.connect(self.flushMouseMove)
+        self.mouse_moves_received = 0
+        self.mouse_moves_processed = 0
+
         self.hasMove = False
         self.mode = Mode.CREATE
         
@@ -444,7 +649,9 @@ class ImageView(QGraphicsView):
         self.setResizeAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
         self.setTransformationAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
 
-        self.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.FullViewportUpdate)
+        # 十字线在 drawForeground 中绘制, 只重绘变化的区域
+        self.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.SmartViewportUpdate)
+        self.setCacheMode(QGraphicsView.CacheModeFlag.CacheBackground)
 
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
@@ -458,20 +665,69 @@ class ImageView(QGraphicsView):
         self.rects_has_selected_once = set()
 
 
-    def setLabelImage(self, label_image : QGraphicsPixmapItem):
+    def setLabelImage(self, label_image : QGraphicsPixmapItem | TiledImageItem):
         LOGGER.debug("setLabelImage")
         self.label_image = label_image
         # 设置 sceneRect 缩放才正常
         self.scene().setSceneRect(self.label_image.boundingRect().adjusted(-2000,-2000,2000,2000))
         self.label_image.setPos(0,0)
+        if isinstance(self.label_image, QGraphicsPixmapItem):
+            # 按缩放比例缓存缩放后的图像, 局部重绘时不再缩放整张图像; 瓦片图像有自己的瓦片缓存
+            self.label_image.setCacheMode(QGraphicsItem.CacheMode.DeviceCoordinateCache)
         self.fitInView(self.label_image, Qt.AspectRatioMode.KeepAspectRatio)
+        self.updateViewScale()
+
+    def updateViewScale(self):
+        """缩放后同步到场景, RectItem 根据缩放比例计算边框的响应范围
+        """
+        if isinstance(self.scene(), LabelScene):
+            self.scene().view_scale = self.transform().m11()
+
+    def rectItemsAt(self, pos : QPointF) -> typing.List["RectItem"]:
+        """从空间索引中查询视图坐标 pos 下的矩形, 上层的矩形在前
+
+        Args:
+            pos (QPointF): 视图坐标
+
+        Returns:
+            typing.List[RectItem]: 矩形列表
+        """
+        if self.label_image is None or not isinstance(self.scene(), LabelScene):
+            return []
+        rects = []
+        promoted = False
+        for key in self.rectKeysAt(pos):
+            rect = key if isinstance(key, RectItem) else self.rect_items.get(key)
+            if rect is None:
+                # 批量绘制的矩形, 提升为 RectItem 以便选中和编辑
+                rect = self.promoteRect(key, update_batch=False)
+                promoted = True
+            if rect is not None:
+                rects.append(rect)
+        if promoted:
+            self.updateBatch()
+        # 选中的矩形 zValue 更高, 排在前面
+        return sorted(rects, key=lambda rect: rect.zValue(), reverse=True)
+
+    def rectKeysAt(self, pos : QPointF) -> list:
+        """视图坐标 pos 下的矩形在空间索引中的 key (annotation_id 或 RectItem)
+        """
+        if self.label_image is None or not isinstance(self.scene(), LabelScene):
+            return []
+        image_pos = self.label_image.mapFromScene(self.mapToScene(pos))
+        # 与 RectItem.boundingRect 一致, 向外扩充 10 个屏幕像素
+        margin = 10 / self.scene().view_scale
+        return self.scene().rect_index.queryPoint(image_pos.x(), image_pos.y(), margin)
         
 
     def initCrossLine(self):
         self.cross_line_enable = True
-        self.cross_line = CrossLineItem(QLineF(), QLineF())
-        self.cross_line.setZValue(1000)
-        self.scene().addItem(self.cross_line)
+        # 十字线在视口中的位置, 不显示时为 None
+        self.cross_pos = None
+        self.cross_line_pen = QPen()
+        self.cross_line_pen.setWidth(1)
+        self.cross_line_pen.setCosmetic(True)
+        self.cross_line_pen.setStyle(Qt.PenStyle.DashLine)
 
 
     def enable_cross_line(self, enable=True):
@@ -481,7 +737,7 @@ class ImageView(QGraphicsView):
         else:
             self.setMouseTracking(False)
             self.cross_line_enable = False
-            self.cross_line.setCrossLine(QLineF(), QLineF())
+            self.setCrossPos(None)
 
 
     def resizeEvent(self, event: QResizeEvent) -> None:
@@ -496,31 +752,62 @@ class ImageView(QGraphicsView):
 
     @Slot(int)
     def next(self, i):
-        pass
+        self.imageStepRequested.emit(i)
 
 
     @Slot(int)
     def prev(self, i):
-        pass
+        self.imageStepRequested.emit(-i)
 
 
     def clear(self):
         for item in self.scene().items():
             del item
-        self.label_rects = []
+        self.rect_items = {}
 
 
     def drawCrossLine(self, pos):
+        """把十字线移动到场景坐标 pos
+        """
         if self.cross_line_enable:
-            self.current_viewport_rect = self.getCurrentViewRectOnScene()
-            
-            new_line1 = QLineF(QPointF(self.current_viewport_rect.x(), pos.y()), 
-                            QPointF(self.current_viewport_rect.x() + self.current_viewport_rect.width(), pos.y()))
-            
-            new_line2 = QLineF(QPointF(pos.x(), self.current_viewport_rect.y()), 
-                            QPointF(pos.x(), self.current_viewport_rect.y() + self.current_viewport_rect.height()))
-            
-            self.cross_line.setCrossLine(new_line1, new_line2)
+            self.setCrossPos(self.mapFromScene(pos))
+
+    def setCrossPos(self, pos : typing.Optional[QPoint]):
+        """设置十字线在视口中的位置, 只重绘旧位置和新位置上的两条细长区域
+        """
+        if pos == self.cross_pos:
+            return
+        self.updateCrossLine(self.cross_pos)
+        self.cross_pos = pos
+        self.updateCrossLine(pos)
+
+    def updateCrossLine(self, pos : typing.Optional[QPoint]):
+        if pos is None:
+            return
+        viewport = self.viewport()
+        viewport.update(QRect(0, pos.y() - 1, viewport.width(), 3))
+        viewport.update(QRect(pos.x() - 1, 0, 3, viewport.height()))
+
+    def drawForeground(self, painter: QPainter, rect: QRectF) -> None:
+        super().drawForeground(painter, rect)
+        if self.cross_pos is None:
+            return
+        # 在视口坐标中绘制, 不受缩放影响
+        painter.save()
+        painter.resetTransform()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing, False)
+        painter.setPen(self.cross_line_pen)
+        viewport = self.viewport()
+        painter.drawLine(0, self.cross_pos.y(), viewport.width(), self.cross_pos.y())
+        painter.drawLine(self.cross_pos.x(), 0, self.cross_pos.x(), viewport.height())
+        painter.restore()
+
+    def scrollContentsBy(self, dx: int, dy: int) -> None:
+        super().scrollContentsBy(dx, dy)
+        # 滚动时视口中已绘制的十字线随内容移动, 重绘移动后和原来的位置
+        if self.cross_pos is not None:
+            self.updateCrossLine(self.cross_pos + QPoint(dx, dy))
+            self.updateCrossLine(self.cross_pos)
 
     
     def getDrawingRect(self, p0 : QPointF, p1 : QPointF) -> QRectF:
@@ -579,34 +866,201 @@ class ImageView(QGraphicsView):
         if self.drawing_rect is not None:
             rect = self.getIntersectedOfImage(rect)
             self.drawing_rect.setRect(rect)
-            self.drawing_rect.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable, True)
-            self.drawing_rect.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable, True)
-            self.drawing_rect.setFlag(QGraphicsItem.GraphicsItemFlag.ItemSendsGeometryChanges, True)
-            self.drawing_rect.setAcceptHoverEvents(True)
+            if self.annotations is not None:
+                # 先写入标注, 以 annotation_id 加入空间索引
+                annotation_id = self.annotations.add(rectToBox(rect), self.current_class_id)
+                self.drawing_rect.annotation_id = annotation_id
+                self.drawing_rect.class_id = self.current_class_id
+                self.rect_items[annotation_id] = self.drawing_rect
+                self.updateBatch()
+            self.finishRectItem(self.drawing_rect)
             self.drawing_rect = None
         else:
             # FIXME:
             LOGGER.error("FIXME")
 
-    def rectItemSize(self, items_count : int) -> int:
-        size = items_count - 2
-        return size if size >= 0 else 0
-    
+    def finishRectItem(self, item : "RectItem"):
+        """设置绘制完成的矩形的属性, 加入空间索引
+        """
+        item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable, True)
+        item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable, True)
+        item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemSendsGeometryChanges, True)
+        item.setAcceptHoverEvents(True)
+        item.updateIndex()
+
+    def setAnnotations(self, annotations : AnnotationSet):
+        """显示一张图像的标注, 之后创建、移动、改变大小和删除矩形都写回 annotations
+
+        Args:
+            annotations (AnnotationSet): 当前图像的标注
+        """
+        self.clearRectItems()
+        self.annotations = annotations
+        if self.label_image is None:
+            return
+        ids = annotations.ids.tolist()
+        boxes = annotations.boxes().tolist()
+        if self.batch_render:
+            # 只建立空间索引, 矩形在选中或鼠标悬停时才创建 RectItem
+            self.batch_item = RectBatchItem(annotations, self.scene().class_style, self.label_image)
+            rect_index = self.scene().rect_index
+            for annotation_id, box in zip(ids, boxes):
+                rect_index.insert(annotation_id, *box)
+        else:
+            class_ids = annotations.column("class_id").tolist()
+            for annotation_id, box, class_id in zip(ids, boxes, class_ids):
+                self.addRectItem(annotation_id, box, class_id)
+
+    def addRectItem(self, annotation_id : int, box, class_id : int = 0) -> "RectItem":
+        item = RectItem(boxToRect(box), self.label_image)
+        item.annotation_id = annotation_id
+        item.class_id = class_id
+        self.finishRectItem(item)
+        self.rect_items[annotation_id] = item
+        return item
+
+    def promoteRect(self, annotation_id : int, update_batch : bool = True) -> typing.Optional["RectItem"]:
+        """为批量绘制的矩形创建 RectItem
+        """
+        if self.annotations is None:
+            return None
+        row = self.annotations.row(annotation_id)
+        if row < 0:
+            return None
+        item = self.addRectItem(annotation_id, self.annotations.box(annotation_id), int(self.annotations.column("class_id")[row]))
+        if update_batch:
+            self.updateBatch()
+        return item
+
+    def demoteRectItem(self, item : "RectItem", update_batch : bool = True):
+        """删除 RectItem, 矩形重新由 batch_item 绘制, 空间索引中的 annotation_id 保持不变
+        """
+        self.current_select_rects.discard(item)
+        self.rects_has_selected_once.discard(item)
+        self.rect_items.pop(item.annotation_id, None)
+        if item.label_scene is not None:
+            item.label_scene.removeItem(item)
+        if update_batch:
+            self.updateBatch()
+
+    def updateHoveredRects(self, pos : QPointF):
+        """批量绘制时, 提升鼠标下的矩形, 把不再悬停且未选中的 RectItem 还给 batch_item
+        """
+        if self.batch_item is None:
+            return
+        hovered = set(self.rectItemsAt(pos))
+        demoted = False
+        for item in list(self.rect_items.values()):
+            if item not in hovered and not item.isSelected():
+                self.demoteRectItem(item, update_batch=False)
+                demoted = True
+        if demoted:
+            self.updateBatch()
+
+    def updateBatch(self):
+        if self.batch_item is not None:
+            self.batch_item.setPromoted(self.rect_items.keys())
+
+    def removeRectItem(self, item : "RectItem"):
+        self.current_select_rects.discard(item)
+        self.rects_has_selected_once.discard(item)
+        self.rect_items.pop(item.annotation_id, None)
+        item.removeIndex()
+        if item.label_scene is not None:
+            item.label_scene.removeItem(item)
+
+    def clearRectItems(self):
+        """删除所有矩形, 包括切换图像时随图像项保留下来的矩形
+        """
+        items = list(self.rect_items.values())
+        if self.label_image is not None:
+            items.extend(item for item in self.label_image.childItems() if isinstance(item, RectItem) and item is not self.drawing_rect)
+        for item in set(items):
+            self.removeRectItem(item)
+        self.rect_items = {}
+        if self.batch_item is not None:
+            if self.batch_item.scene() is not None:
+                self.batch_item.scene().removeItem(self.batch_item)
+            self.batch_item = None
+        if isinstance(self.scene(), LabelScene):
+            self.scene().rect_index.clear()
+        self.current_select_rects.clear()
+        self.rects_has_selected_once.clear()
+        self.mode = Mode.CREATE
+
+    def commitRectItems(self, items : typing.Iterable["RectItem"]):
+        """把移动或改变大小后的矩形写回标注, 没有变化的矩形不产生修改记录
+        """
+        if self.annotations is None:
+            return
+        items = [item for item in items if isinstance(item, RectItem) and item.annotation_id >= 0]
+        if len(items) == 0:
+            return
+        boxes = [rectToBox(item.mapRectToParent(item.rect())) for item in items]
+        self.annotations.update([item.annotation_id for item in items], boxes)
+        self.updateBatch()
+
+    def applyAnnotationDiff(self, diff : AnnotationDiff):
+        """按照撤销 / 重做的修改更新矩形
+        """
+        added = dict(zip(diff.addedIds().tolist(), zip(*(diff.added[name].tolist() for name in AnnotationSet.BOX_COLUMNS))))
+        removed = dict(zip(diff.removedIds().tolist(), zip(*(diff.removed[name].tolist() for name in AnnotationSet.BOX_COLUMNS))))
+        class_ids = dict(zip(diff.addedIds().tolist(), diff.added["class_id"].tolist()))
+        rect_index = self.scene().rect_index
+        # 批量绘制的矩形的旧位置和新位置, batch_item 使用 DeviceCoordinateCache, 需要使这些区域的缓存失效
+        dirty = []
+        for annotation_id, box in removed.items():
+            item = self.rect_items.get(annotation_id)
+            if item is None:
+                dirty.append(box)
+            if annotation_id in added:
+                continue
+            elif item is not None:
+                self.removeRectItem(item)
+            else:
+                rect_index.remove(annotation_id)
+        for annotation_id, box in added.items():
+            item = self.rect_items.get(annotation_id)
+            if item is not None:
+                item.class_id = class_ids[annotation_id]
+                item.setPos(0, 0)
+                item.setRect(boxToRect(box))
+                item.update()
+            elif self.batch_item is not None:
+                rect_index.insert(annotation_id, *box)
+                dirty.append(box)
+            else:
+                self.addRectItem(annotation_id, box, class_ids[annotation_id])
+        if self.batch_item is not None:
+            for box in dirty:
+                self.batch_item.update(boxToRect(box).adjusted(-1, -1, 1, 1))
+        self.updateBatch()
+
+    def undo(self):
+        if self.annotations is not None:
+            diff = self.annotations.undo()
+            if diff is not None:
+                self.applyAnnotationDiff(diff)
+
+    def redo(self):
+        if self.annotations is not None:
+            diff = self.annotations.redo()
+            if diff is not None:
+                self.applyAnnotationDiff(diff)
+
     def rectItemSizeOnPos(self, pos : QPointF) -> int:
-        items = self.items(pos)
-        items_count = len(items)
-        return self.rectItemSize(items_count)
+        return len(self.rectItemsAt(pos))
 
     
-    def changeSelectedRect(self, items : typing.List[QGraphicsItem], items_count : int):
-        LOGGER.debug(self.current_select_rects)
+    def changeSelectedRect(self, items : typing.List[QGraphicsItem]):
+        LOGGER.debug("%s", self.current_select_rects)
         if len(self.current_select_rects) > 1:
             # FIXME:
             return LOGGER.error("FIXME")
         current_select_rect = self.current_select_rects.pop()
         current_select_rect.setZValue(0)
         current_select_rect.setSelected(False)
-        if len(self.rects_has_selected_once) == self.rectItemSize(items_count):
+        if len(self.rects_has_selected_once) == len(items):
             self.rects_has_selected_once.clear()
             for item in items:
                 if isinstance(item, RectItem) and item != current_select_rect:
@@ -623,19 +1077,19 @@ class ImageView(QGraphicsView):
                     self.current_select_rects.add(item)
                     self.rects_has_selected_once.add(item)
                     break
-        LOGGER.debug(self.current_select_rects)
+        LOGGER.debug("%s", self.current_select_rects)
             
         
-    def selectOneRect(self, items : typing.List[QGraphicsItem], items_count : int, scenePos : QPointF):
+    def selectOneRect(self, items : typing.List[QGraphicsItem], scenePos : QPointF):
         """没按下control, 选中当前位置下的一个矩形, 如果在同一位置有多个rect, 且多次点击, 则在多个rect切换选中
 
         Args:
-            items (typing.List[QGraphicsItem]): 当前位置下的QGraphicsItem
-            items_count (int): items的数量
+            items (typing.List[QGraphicsItem]): 当前位置下的矩形
         """
-        LOGGER.debug(f'items:\n{items}')
-        LOGGER.debug(f'selected:\n{self.scene().selectedItems()}')
-        LOGGER.debug(f'current selected:\n{self.current_select_rects}')
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("items:\n%s", items)
+            LOGGER.debug("selected:\n%s", self.scene().selectedItems())
+            LOGGER.debug("current selected:\n%s", self.current_select_rects)
         if len(self.current_select_rects) <= 0:
             for item in items:
                 if isinstance(item, RectItem):
@@ -647,8 +1101,9 @@ class ImageView(QGraphicsView):
                 LOGGER.error("FIXME")
                 return
         else:
-            self.changeSelectedRect(items, items_count)
-        LOGGER.debug(f"selected items:\n{self.scene().selectedItems()}")
+            self.changeSelectedRect(items)
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("selected items:\n%s", self.scene().selectedItems())
 
 
     def initDrawingRect(self, scenePos : QPointF) -> None:
@@ -656,19 +1111,15 @@ class ImageView(QGraphicsView):
         self.drawing_rect = RectItem(QRectF(self.p0, self.p0), self.label_image)
 
     def hasRectItemOnPos(self, pos : QPointF) -> int:
-        items = self.items(pos)
-        return self.hasRectItem(len(items))
-
-    def hasRectItem(self, items_count : int) -> int:
-        """判断当前位置是否有多少个RectItem, 理论上items由一个pixmap、crossline和若干rect组成
+        """判断当前位置有多少个RectItem
 
         Args:
-            items_count (int): 当前位置下的items的数量
+            pos (QPointF): 视图坐标
 
         Returns:
             int: rect数量, <= 0 则没有矩形
         """
-        return items_count - 2
+        return len(self.rectItemsAt(pos))
     
     def setViewportCursor(self, cursor : typing.Union[QCursor, Qt.CursorShape]):
         self.viewport().setCursor(cursor)
@@ -677,8 +1128,7 @@ class ImageView(QGraphicsView):
         self.viewport().setCursor(Qt.CursorShape.ArrowCursor)
 
     def disableCrossLine(self):
-        if self.cross_line:
-            self.cross_line.setCrossLine(QLineF(), QLineF())
+        self.setCrossPos(None)
 
     def selectRect(self, item : RectItem):
         """选中矩形
@@ -717,7 +1167,7 @@ class ImageView(QGraphicsView):
         Args:
             pos (QPointF): 当前鼠标位置
         """
-        items = self.items(pos)
+        items = self.rectItemsAt(pos)
         self.selectRects(items)
 
         
@@ -767,19 +1217,19 @@ class ImageView(QGraphicsView):
         Returns:
             bool: True 有, False 没有
         """
-        items = self.items(pos)
+        items = self.rectItemsAt(pos)
         return self.hasSelectedRect(items)
         
     
     def clearSelectedRects(self):
         """清除选中
         """
-        LOGGER.debug(self.current_select_rects)
+        LOGGER.debug("%s", self.current_select_rects)
         # 集合不能在遍历时增加/删除元素
         self.unselectRects(list(self.current_select_rects))
         self.current_select_rects.clear()
         self.rects_has_selected_once.clear()
-        LOGGER.debug(self.current_select_rects)
+        LOGGER.debug("%s", self.current_select_rects)
 
 
     def moveBy(self, pos : QPointF):
@@ -794,12 +1244,14 @@ class ImageView(QGraphicsView):
         
 
     def mouseDoubleClickEvent(self, event: QMouseEvent):
+        self.flushMouseMove()
         if event.modifiers() != Qt.KeyboardModifier.ControlModifier:
             return super().mouseDoubleClickEvent(event)
 
 
     def mousePressEvent(self, event: QMouseEvent) -> None:
-        LOGGER.debug(f"{self.mode} {event.modifiers()} {event.button()} {event.buttons()}")
+        LOGGER.debug("%s %s %s %s", self.mode, event.modifiers(), event.button(), event.buttons())
+        self.flushMouseMove()
         pos = event.pos()
         scenePos = self.mapToScene(pos)
         self.hasMove = False
@@ -816,9 +1268,9 @@ class ImageView(QGraphicsView):
                     self.initDrawingRect(scenePos)
                     return
                 elif self.mode == Mode.EDIT:
-                    items = self.items(pos)
+                    items = self.rectItemsAt(pos)
                     items_count = len(items)
-                    if self.hasRectItem(items_count) <= 0:
+                    if items_count <= 0:
                         self.mode = Mode.CREATE
                         self.clearSelectedRects()
                         self.initDrawingRect(scenePos)
@@ -826,12 +1278,10 @@ class ImageView(QGraphicsView):
                     else:
                         selected_items = self.scene().selectedItems()
                         selected_items_count = len(selected_items)
-                        items = self.items(pos)
-                        items_count = len(items)
                         # FIXME:
-                        LOGGER.debug(f"{items_count} items on {pos}")
-                        LOGGER.debug(f"{selected_items_count} selected items on {pos}")
-                        LOGGER.debug(f"{len(self.current_select_rects)} select rects")
+                        LOGGER.debug("%d items on %s", items_count, pos)
+                        LOGGER.debug("%d selected items on %s", selected_items_count, pos)
+                        LOGGER.debug("%d select rects", len(self.current_select_rects))
                         if not self.hasSelectedRect(items):
                             self.mode = Mode.CREATE
                             self.clearSelectedRects()
@@ -839,7 +1289,7 @@ class ImageView(QGraphicsView):
                             return
                         else:
                             if selected_items_count <= 1:
-                                LOGGER.debug(f"event pos {pos} {scenePos}")
+                                LOGGER.debug("event pos %s %s", pos, scenePos)
                                 return super().mousePressEvent(event)
                             else:
                                 return super().mousePressEvent(event)
@@ -859,7 +1309,32 @@ class ImageView(QGraphicsView):
 
 
     def mouseMoveEvent(self, event: QMouseEvent) -> None:
-        # LOGGER.debug(f"{self.mode} {event.modifiers()} {event.button()} {event.buttons()}")
+        self.mouse_moves_received += 1
+        if self.mouse_move_timer.interval() <= 0:
+            return self.processMouseMove(event)
+        # 等待处理的移动被新的位置替换
+        self.pending_mouse_move = event.clone()
+        if not self.mouse_move_timer.isActive():
+            self.mouse_move_timer.start()
+
+    @Slot()
+    def flushMouseMove(self):
+        """立即处理等待中的鼠标移动, 按下、释放鼠标和滚轮前调用, 保证事件顺序
+        """
+        self.mouse_move_timer.stop()
+        event = self.pending_mouse_move
+        if event is not None:
+            self.pending_mouse_move = None
+            self.processMouseMove(event)
+
+    def mouseMoveStats(self) -> typing.Tuple[int, int]:
+        """收到的和实际处理的鼠标移动事件数量
+        """
+        return self.mouse_moves_received, self.mouse_moves_processed
+
+    def processMouseMove(self, event: QMouseEvent) -> None:
+        # LOGGER.debug("%s %s %s %s", self.mode, event.modifiers(), event.button(), event.buttons())
+        self.mouse_moves_processed += 1
         pos = event.pos()
         scenePos = self.mapToScene(pos)
         self.hasMove = True
@@ -879,13 +1354,18 @@ class ImageView(QGraphicsView):
 
             if self.mode == Mode.CREATE and self.drawing_rect is not None:
                 self.drawing_rect.setRect(self.getDrawingRect(self.p0, scenePos))
+            elif event.buttons() == Qt.MouseButton.NoButton:
+                self.updateHoveredRects(pos)
 
         return super().mouseMoveEvent(event)
     
     
     def mouseReleaseEvent(self, event: QMouseEvent) -> None:
-        LOGGER.debug(f"{self.mode} hasMove: {self.hasMove}  {event.modifiers()} {event.button()} {event.buttons()}")
+        self.flushMouseMove()
+        LOGGER.debug("%s hasMove: %s  %s %s %s", self.mode, self.hasMove, event.modifiers(), event.button(), event.buttons())
         super().mouseReleaseEvent(event)
+        if self.hasMove:
+            self.commitRectItems(self.current_select_rects)
         pos = event.pos()
         scenePos = self.mapToScene(pos)
         if event.button() == Qt.MouseButton.LeftButton:
@@ -903,29 +1383,27 @@ class ImageView(QGraphicsView):
                         return
                     else:
                         self.deleteDrawingRect()
-                        items = self.items(pos)
+                        items = self.rectItemsAt(pos)
                         items_count = len(items)
-                        LOGGER.debug(f"{items_count} items on {pos}")
-                        if self.hasRectItem(items_count) > 0:
-                            self.selectOneRect(items, items_count, scenePos)           
+                        LOGGER.debug("%d items on %s", items_count, pos)
+                        if items_count > 0:
+                            self.selectOneRect(items, scenePos)
                             self.setSelectedRectCursorOnPos(pos, scenePos)
                             self.mode = Mode.EDIT
                             return
                         else:
                             return
                 elif self.mode == Mode.EDIT:
-                    items = self.items(pos)
-                    items_count = len(items)
                     if self.hasMove:
                         return 
                     else:
-                        rects_count = self.hasRectItem(items_count)
-                        if rects_count < 1:
+                        items = self.rectItemsAt(pos)
+                        if len(items) < 1:
                             return
                         else:
                             if len(self.current_select_rects) > 1:
                                 self.clearSelectedRects()
-                            return self.selectOneRect(items, items_count, scenePos)
+                            return self.selectOneRect(items, scenePos)
                 else:
                     # FIXME:
                     LOGGER.error("FIXME")
@@ -942,8 +1420,10 @@ class ImageView(QGraphicsView):
     
     
     def wheelEvent(self, event: QWheelEvent) -> None:
+        self.flushMouseMove()
         new_scale = 1.0 + event.angleDelta().y()  * 0.00125
         self.scale(new_scale, new_scale)
+        self.updateViewScale()
         self.update()
         self.drawCrossLine(self.mapToScene(event.pos()))
         return
@@ -951,6 +1431,9 @@ class ImageView(QGraphicsView):
         # return super().wheelEvent(event)
     
     def leaveEvent(self, event: QEvent) -> None:
+        # 离开后不再显示十字线, 丢弃等待中的移动
+        self.mouse_move_timer.stop()
+        self.pending_mouse_move = None
         self.disableCrossLine()
         self.resetViewPortCursor()
         return super().leaveEvent(event)
@@ -961,11 +1444,19 @@ class ImageView(QGraphicsView):
 
     def keyPressEvent(self, event : QEvent) -> None:
         super().keyPressEvent(event)
-        if event.key() == Qt.Key.Key_Delete:
+        if event.matches(QKeySequence.StandardKey.Undo):
+            self.undo()
+        elif event.matches(QKeySequence.StandardKey.Redo):
+            self.redo()
+        elif event.key() == Qt.Key.Key_Delete:
             self.deleteItems()
             LOGGER.debug("delete items")
         elif event.key() == Qt.Key.Key_Control:
             self.setViewportCursor(Qt.CursorShape.OpenHandCursor)
+        elif event.key() == Qt.Key.Key_D:
+            self.next(1)
+        elif event.key() == Qt.Key.Key_A:
+            self.prev(1)
         return
     
     def keyReleaseEvent(self, event : QEvent) -> None:
@@ -976,7 +1467,7 @@ class ImageView(QGraphicsView):
         self.setSelectedRectCursorOnPos(pos, scenePos)
 
     def selectedRectOnPos(self, pos):
-        items = self.items(pos)
+        items = self.rectItemsAt(pos)
         selected_items = self.scene().selectedItems()
         for selected_item in selected_items:
             if isinstance(selected_item, RectItem) and selected_item in items:
@@ -990,12 +1481,17 @@ class ImageView(QGraphicsView):
 
     
     def deleteItems(self):
-        LOGGER.debug(f"items before delete\n{self.items()}")
-        selected_items = self.scene().selectedItems()
-        LOGGER.debug(f"selected_items before delete\n{selected_items}")
+        # self.items() 包括场景中的所有图形项, 只在输出调试日志时获取
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("items before delete\n%s", self.items())
+        selected_items = [item for item in self.scene().selectedItems() if isinstance(item, RectItem)]
+        LOGGER.debug("selected_items before delete\n%s", selected_items)
+        if self.annotations is not None:
+            self.annotations.remove([item.annotation_id for item in selected_items if item.annotation_id >= 0])
         for item in selected_items:
-            self.current_select_rects.remove(item)
-            self.scene().removeItem(item)
+            self.removeRectItem(item)
             del item
+        self.updateBatch()
         self.mode = Mode.CREATE
-        LOGGER.debug(f"items after delete\n{self.items()}")
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("items after delete\n%s", self.items())
@@ -0,0 +1,153 @@
+from collections import OrderedDict
+
+from qtpy.QtCore import Signal, Slot
+from qtpy.QtCore import QObject, QSize, QCoreApplication
+from qtpy.QtGui import QImage, QImageReader
+
+from deep_learning_tool import configs
+from deep_learning_tool.data import ImageRegistry
+from deep_learning_tool.utils import ImageReadThread, readImage
+
+
+class PrefetchReadThread(ImageReadThread):
+    """预读原图, 使用瓦片金字塔显示的大图不预读
+    """
+    def read(self, image_path : str):
+        size = QImageReader(image_path).size()
+        if size.isValid() and size.width() * size.height() >= configs.tiled_image_min_pixels:
+            return QImage(), size
+        return readImage(image_path, 0)
+
+
+class LabelSession(QObject):
+    """标注会话, 按项目中图像的顺序切换图像
+
+    图像的顺序直接使用项目的 ImageRegistry 的行号, 不另外保存路径列表; 当前图像按 id 记录, 
+    加入或删除图像后行号变化也不需要重建索引.
+    在后台预读当前图像之后的 prefetch_next 张和之前的 prefetch_prev 张图像, 
+    解码结果保存在按字节数限制的 LRU 中, 切换到已预读的图像只需要替换 pixmap. 
+    跳转时取消还未开始的过期预读. 每张图像解码完成并进入缓存时发送 imageReady.
+    """
+    # image_path
+    imageReady = Signal(str)
+
+    def __init__(self, parent=None, prefetch_next : int = configs.label_prefetch_next, 
+                 prefetch_prev : int = configs.label_prefetch_prev, 
+                 max_bytes : int = configs.label_prefetch_max_bytes) -> None:
+        super().__init__(parent)
+        self.prefetch_next = prefetch_next
+        self.prefetch_prev = prefetch_prev
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.images = ImageRegistry()
+        self.current_id = -1
+        self._images = OrderedDict()
+        self._requested = set()
+        self.reader = PrefetchReadThread(self, image_size=0, max_in_flight=2)
+        self.reader.imageRead.connect(self.imageRead)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.reader.stop)
+
+    def __len__(self):
+        return len(self.images)
+
+    def setImages(self, images : ImageRegistry):
+        """使用项目的 ImageRegistry (不拷贝), 切换项目时清除当前图像
+        """
+        if images is not self.images:
+            self.images = images
+            self.current_id = -1
+
+    @property
+    def current(self) -> int:
+        """当前图像的行号, 没有当前图像或已被删除时为 -1
+        """
+        return self.images.row(self.current_id)
+
+    def indexOf(self, image_path : str) -> int:
+        return self.images.rowOf(image_path)
+
+    def currentPath(self):
+        row = self.current
+        return self.images.pathAt(row) if row >= 0 else None
+
+    def image(self, image_path : str):
+        """已解码的图像, 未预读完成返回 None
+        """
+        image = self._images.get(image_path)
+        if image is not None:
+            self._images.move_to_end(image_path)
+        return image
+
+    def addImage(self, image_path : str, image : QImage):
+        if image.isNull() or image_path in self._images:
+            return
+        self._images[image_path] = image
+        self.total_bytes += image.sizeInBytes()
+        while self.total_bytes > self.max_bytes and len(self._images) > 1:
+            _, evicted = self._images.popitem(last=False)
+            self.total_bytes -= evicted.sizeInBytes()
+
+    def jump(self, index : int):
+        """跳转到第 index 张图像并预读相邻的图像 (当前图像最先读取)
+
+        Returns:
+            str | None: 图像路径
+        """
+        if index < 0 or index >= len(self.images):
+            return None
+        self.current_id = self.images.idAt(index)
+        self.prefetch()
+        return self.images.pathAt(index)
+
+    def step(self, offset : int):
+        if len(self.images) == 0:
+            return None
+        current = self.current
+        index = min(max(current + offset, 0), len(self.images) - 1)
+        if index == current:
+            return None
+        return self.jump(index)
+
+    def window(self):
+        """按优先级排列的预读范围: 当前、下一张、上一张、下两张...
+        """
+        current = self.current
+        count = len(self.images)
+        rows = [current]
+        for offset in range(1, max(self.prefetch_next, self.prefetch_prev) + 1):
+            if offset <= self.prefetch_next and current + offset < count:
+                rows.append(current + offset)
+            if offset <= self.prefetch_prev and current - offset >= 0:
+                rows.append(current - offset)
+        return [self.images.pathAt(row) for row in rows]
+
+    def prefetch(self):
+        # 取消过期的预读, 正在解码的图像仍会进入缓存
+        for image_path in self.reader.clearPending():
+            self._requested.discard(image_path)
+        if self.current < 0:
+            return
+        missing = []
+        for image_path in self.window():
+            if image_path not in self._images and image_path not in self._requested:
+                self._requested.add(image_path)
+                missing.append(image_path)
+        if len(missing) > 0:
+            self.reader.addImages(missing)
+
+    def request(self, image_path : str):
+        """在后台读取一张图像 (例如不在预读范围内的图像), 已缓存或正在读取时不重复读取
+        """
+        if image_path not in self._images and image_path not in self._requested:
+            self._requested.add(image_path)
+            self.reader.addImages([image_path])
+
+    @Slot(str, QImage, QSize)
+    def imageRead(self, image_path : str, image : QImage, original_size : QSize):
+        self._requested.discard(image_path)
+        if image.isNull():
+            return
+        self.addImage(image_path, image)
+        self.imageReady.emit(image_path)
@@ -1,22 +1,30 @@
-from qtpy.QtCore import Qt
+from qtpy.QtCore import Qt, Signal, Slot, QCoreApplication
 
 from qtpy.QtWidgets import QMainWindow, QWidget, QDockWidget, QListWidget
 from qtpy.QtWidgets import QSizePolicy
-from qtpy.QtWidgets import QGraphicsScene
+from qtpy.QtWidgets import QGraphicsPixmapItem
 from qtpy.QtWidgets import QGridLayout
 
-from qtpy.QtGui import QPixmap
+from qtpy.QtGui import QPixmap, QImageReader
 
 from deep_learning_tool import LOGGER
+from deep_learning_tool import configs
 from deep_learning_tool.data import Project
 
-from .label_graphics import ImageView
+from .label_graphics import ImageView, LabelScene
+from .pyramid_graphics import TilePyramid, TiledImageItem, TileCache, PyramidBuildThread
+from .label_session import LabelSession
 from .widget import ProjectInfo, HLine
+from .split_widget import SplitMappingWidget
+from .navigator_widget import NavigatorWidget
 
 
 
 
 class LabelWindow(QMainWindow):
+    # 当前图像被分到其他集合
+    splitsChanged = Signal()
+
     def __init__(self, parent: QWidget | None = None, flags: Qt.WindowFlags | Qt.WindowType = Qt.WindowFlags()) -> None:
         super().__init__(parent, flags)
         self.init()
@@ -29,23 +37,99 @@ class LabelWindow(QMainWindow):
         self.image_view.enable_cross_line(True)
         
         self.label_image = None
+        self.tile_cache = TileCache(configs.tile_cache_max_bytes, self)
+        self.pyramid_builder = None
+        self.session = LabelSession(self)
+        self.session.imageReady.connect(self.sessionImageReady)
+        # 正在后台解码、显示为占位图的图像
+        self.pending_image_path = None
+        self.image_view.imageStepRequested.connect(self.stepImage)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stopThreads)
         
 
     def initLabelImage(self):
         LOGGER.debug("initLabelImage")
-        if self.label_image is None and len(self.project.images_path) >= 1:
-            image_path, index = next(iter(self.project.images_path.items()))
-            self.label_image = self.scene.addPixmap(QPixmap(image_path))
-            self.image_view.setLabelImage(self.label_image)
+        if self.label_image is None and len(self.project.images) >= 1:
+            self.setLabelImage(self.project.images.pathAt(0))
 
 
     def setLabelImage(self, image_path : str):
         LOGGER.debug("setLabelImage")
-        if self.label_image is not None:
-            self.label_image.setPixmap(QPixmap(image_path))
+        self.stopPyramidBuilder()
+        self.tile_cache.cancel()
+        self.pending_image_path = None
+        # 先跳转, 预读从当前图像开始
+        self.session.jump(self.session.indexOf(image_path))
+        # 已预读的图像只需要替换 pixmap
+        image = self.session.image(image_path)
+        size = image.size() if image is not None else QImageReader(image_path).size()
+        if image is not None:
+            self.setLabelPixmap(QPixmap.fromImage(image))
+        elif size.isValid() and size.width() * size.height() >= configs.tiled_image_min_pixels:
+            # 大图使用瓦片金字塔, 只绘制可见的瓦片
+            pyramid = TilePyramid(image_path, size, configs.pyramid_cache_root, configs.pyramid_tile_size)
+            label_image = TiledImageItem(pyramid, self.tile_cache)
+            if not pyramid.isComplete():
+                self.pyramid_builder = PyramidBuildThread(pyramid, self)
+                self.pyramid_builder.levelReady.connect(label_image.levelReady)
+                self.pyramid_builder.start()
+            self.replaceLabelImage(label_image)
         else:
-            self.label_image = self.scene.addPixmap(QPixmap(image_path))
+            # 不在 GUI 线程中解码, 读取完成前显示同样大小的占位图, 标注和导航器不需要等待
+            placeholder = QPixmap(size) if size.isValid() else QPixmap()
+            placeholder.fill(Qt.GlobalColor.darkGray)
+            self.setLabelPixmap(placeholder)
+            self.pending_image_path = image_path
+            self.session.request(image_path)
         self.image_view.setLabelImage(self.label_image)
+        self.image_view.setAnnotations(self.project.annotations(image_path))
+        self.navigator.setImage(image_path, self.label_image.boundingRect())
+        if image_path in self.project.images:
+            self.split_mapping.setCurrentSplit(self.project.images.value("split", self.project.images.id(image_path)))
+
+
+    @Slot(str)
+    def sessionImageReady(self, image_path : str):
+        if image_path == self.pending_image_path:
+            self.pending_image_path = None
+            self.setLabelPixmap(QPixmap.fromImage(self.session.image(image_path)))
+
+
+    def setLabelPixmap(self, pixmap : QPixmap):
+        if isinstance(self.label_image, QGraphicsPixmapItem):
+            self.label_image.setPixmap(pixmap)
+        else:
+            self.replaceLabelImage(QGraphicsPixmapItem(pixmap))
+
+
+    @Slot(int)
+    def stepImage(self, offset : int):
+        image_path = self.session.step(offset)
+        if image_path is not None:
+            self.setLabelImage(image_path)
+
+
+    def replaceLabelImage(self, label_image):
+        self.scene.addItem(label_image)
+        if self.label_image is not None:
+            for child in self.label_image.childItems():
+                child.setParentItem(label_image)
+            self.scene.removeItem(self.label_image)
+        self.label_image = label_image
+
+
+    def stopPyramidBuilder(self):
+        if self.pyramid_builder is not None:
+            self.pyramid_builder.stop()
+            self.pyramid_builder = None
+
+
+    def stopThreads(self):
+        self.stopPyramidBuilder()
+        self.tile_cache.stop()
+        self.navigator.stop()
         
 
     def createCentralWidget(self):
@@ -54,7 +138,7 @@ class LabelWindow(QMainWindow):
         label_widget_layout = QGridLayout()
         label_widget_layout.setContentsMargins(0,0,0,0)
         label_widget.setLayout(label_widget_layout)
-        self.scene = QGraphicsScene(self)
+        self.scene = LabelScene(self)
         self.image_view = ImageView(self.scene, label_widget)
         self.image_view.show()
         label_widget_layout.addWidget(self.image_view)
@@ -64,6 +148,33 @@ class LabelWindow(QMainWindow):
     def setProject(self, project : Project):
         self.project = project
         self.project_dock.setWidget(ProjectInfo(project.name, project.type))
+        self.session.setImages(project.images_path)
+        self.split_mapping.updateFromProject(project)
+        self.navigator.setThumbnailCache(project.thumbnail_cache)
+
+    @Slot(int)
+    def setCurrentImageSplit(self, split : int):
+        image_path = self.session.currentPath()
+        if image_path is None:
+            return
+        self.project.setImageSplit(image_path, split)
+        self.split_mapping.updateFromProject(self.project)
+        self.splitsChanged.emit()
+
+    @Slot(list)
+    def refreshAnnotations(self, image_ids : list):
+        """其他页面修改了这些图像的标注 (例如预标注写入候选框), 当前图像在其中时重新显示标注
+        """
+        image_path = self.session.currentPath()
+        if image_path is not None and image_path in self.project.images and self.project.images.id(image_path) in set(image_ids):
+            self.image_view.setAnnotations(self.project.annotations(image_path))
+
+    @Slot()
+    def refreshSplits(self):
+        self.split_mapping.updateFromProject(self.project)
+        image_path = self.session.currentPath()
+        if image_path is not None and image_path in self.project.images:
+            self.split_mapping.setCurrentSplit(self.project.images.value("split", self.project.images.id(image_path)))
 
     
     def createDockWidgets(self):
@@ -101,7 +212,9 @@ class LabelWindow(QMainWindow):
 
         self.split_mapping_dock = QDockWidget(self.tr("拆分映射"), self)
         self.split_mapping_dock.setFeatures(QDockWidget.DockWidgetFeature.NoDockWidgetFeatures)
-        self.split_mapping_dock.setWidget(QWidget(self))
+        self.split_mapping = SplitMappingWidget(show_all=False, hint=self.tr("点击集合设置当前图像的拆分"), parent=self)
+        self.split_mapping.splitActivated.connect(self.setCurrentImageSplit)
+        self.split_mapping_dock.setWidget(self.split_mapping)
         self.split_mapping_dock.setMinimumHeight(100)
         self.split_mapping_dock.setSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Minimum)
         self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.split_mapping_dock)
@@ -109,8 +222,10 @@ class LabelWindow(QMainWindow):
 
         self.navigator_dock = QDockWidget(self.tr("导航器"), self)
         self.navigator_dock.setFeatures(QDockWidget.DockWidgetFeature.NoDockWidgetFeatures)
-        self.navigator_dock.setWidget(QWidget(self))
-        self.navigator_dock.setFixedHeight(100)
+        self.navigator = NavigatorWidget(self)
+        self.navigator.setView(self.image_view)
+        self.navigator_dock.setWidget(self.navigator)
+        self.navigator_dock.setFixedHeight(configs.navigator_height)
         self.navigator_dock.setMinimumWidth(100)
         self.navigator_dock.setMaximumWidth(500)
         self.navigator_dock.setSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Minimum)
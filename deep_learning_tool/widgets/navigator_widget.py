@@ -0,0 +1,174 @@
+from qtpy.QtCore import Qt, Slot, QRect, QRectF, QPointF, QSize, QTimer, QCoreApplication
+from qtpy.QtGui import QPixmap, QImage, QPainter, QPen, QColor
+from qtpy.QtGui import QMouseEvent, QPaintEvent, QResizeEvent
+from qtpy.QtWidgets import QWidget, QGraphicsView, QSizePolicy
+
+from deep_learning_tool import configs
+from deep_learning_tool.utils import ImageReadThread
+
+
+class NavigatorWidget(QWidget):
+    """导航器: 显示整张图像的缩略图和标注视图当前可见的区域, 点击或拖动把视图移动到该位置
+
+    缩略图从项目的缩略图缓存读取 (与图库共用, 没有时在后台生成并写入缓存), 不使用标注视图中的原图或瓦片.
+    缩略图按控件大小缩放一次后缓存, 视图平移和缩放时只重绘可见区域矩形的新旧位置;
+    位置变化从视图滚动条的 valueChanged / rangeChanged 得到并合并到一次更新, 不在 ImageView 中增加任何处理.
+    """
+    MARGIN = 4
+
+    def __init__(self, parent: QWidget | None = None) -> None:
+        super().__init__(parent)
+        self.view = None
+        self.image_path = None
+        # 标注视图中的图像尺寸 (场景坐标), 缩略图按它映射
+        self.image_rect = QRectF()
+        self.overview = None
+        # 按控件大小缩放后的缩略图和它在控件中的位置
+        self.scaled = None
+        self.target = QRectF()
+        # 可见区域在控件中的矩形
+        self.view_rect = QRect()
+        self.frame_pen = QPen(QColor(255, 60, 60), 2)
+        self.frame_pen.setJoinStyle(Qt.PenJoinStyle.MiterJoin)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.setMinimumSize(80, 60)
+        self.setCursor(Qt.CursorShape.PointingHandCursor)
+
+        # 一次事件循环中滚动条可能多次变化, 合并为一次更新
+        self.update_timer = QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(0)
+        self.update_timer.timeout.connect(self.updateViewRect)
+
+        self.image_reader = ImageReadThread(self, image_size=configs.thumbnail_size, max_in_flight=1)
+        self.image_reader.imageRead.connect(self.setOverview)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stop)
+
+    def setView(self, view : QGraphicsView):
+        self.view = view
+        for scroll_bar in (view.horizontalScrollBar(), view.verticalScrollBar()):
+            scroll_bar.valueChanged.connect(self.scheduleUpdate)
+            scroll_bar.rangeChanged.connect(self.scheduleUpdate)
+
+    def setThumbnailCache(self, cache):
+        self.image_reader.cancel()
+        self.image_reader.cache = cache
+
+    def setImage(self, image_path : str, image_rect : QRectF):
+        """切换到另一张图像, 缩略图在后台读取, 读取完成前只显示可见区域
+        """
+        self.image_rect = QRectF(image_rect)
+        if image_path != self.image_path:
+            self.image_path = image_path
+            self.overview = None
+            self.scaled = None
+            self.image_reader.cancel()
+            self.image_reader.addImages([image_path])
+        self.updateTarget()
+
+    @Slot(str, QImage, QSize)
+    def setOverview(self, image_path : str, image : QImage, original_size : QSize):
+        if image_path != self.image_path or image.isNull():
+            return
+        self.overview = image
+        self.scaled = None
+        self.updateTarget()
+
+    def updateTarget(self):
+        """按控件大小计算图像的位置并缩放缩略图, 只在换图、读取完成和改变大小时执行
+        """
+        area = QRectF(self.rect()).adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        if self.image_rect.isEmpty() or area.isEmpty():
+            self.target = QRectF()
+        else:
+            scale = min(area.width() / self.image_rect.width(), area.height() / self.image_rect.height())
+            size = self.image_rect.size() * scale
+            self.target = QRectF(area.center().x() - size.width() / 2, area.center().y() - size.height() / 2,
+                                 size.width(), size.height())
+        if self.overview is not None and not self.target.isEmpty():
+            self.scaled = QPixmap.fromImage(self.overview.scaled(self.target.size().toSize(),
+                                                                 Qt.AspectRatioMode.IgnoreAspectRatio,
+                                                                 Qt.TransformationMode.SmoothTransformation))
+        self.view_rect = self.viewRect()
+        self.update()
+
+    @Slot()
+    def scheduleUpdate(self):
+        if not self.update_timer.isActive():
+            self.update_timer.start()
+
+    def viewRect(self) -> QRect:
+        """标注视图的可见区域在控件中的矩形, 图像外的部分裁掉
+        """
+        if self.view is None or self.target.isEmpty():
+            return QRect()
+        visible = self.view.getCurrentViewRectOnScene().intersected(self.image_rect)
+        if visible.isEmpty():
+            return QRect()
+        scale = self.target.width() / self.image_rect.width()
+        rect = QRectF(self.target.left() + (visible.left() - self.image_rect.left()) * scale,
+                      self.target.top() + (visible.top() - self.image_rect.top()) * scale,
+                      visible.width() * scale, visible.height() * scale)
+        return rect.toAlignedRect()
+
+    @Slot()
+    def updateViewRect(self):
+        """只重绘可见区域矩形的旧位置和新位置
+        """
+        if not self.isVisible():
+            # 显示时在 showEvent 中重新计算
+            return
+        rect = self.viewRect()
+        if rect == self.view_rect:
+            return
+        margin = self.frame_pen.width()
+        self.update(self.view_rect.adjusted(-margin, -margin, margin, margin))
+        self.update(rect.adjusted(-margin, -margin, margin, margin))
+        self.view_rect = rect
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        painter = QPainter(self)
+        painter.setClipRegion(event.region())
+        painter.fillRect(self.rect(), self.palette().window())
+        if self.scaled is not None:
+            painter.drawPixmap(self.target.topLeft(), self.scaled)
+        elif not self.target.isEmpty():
+            painter.fillRect(self.target, QColor(128, 128, 128, 60))
+        if not self.view_rect.isEmpty():
+            painter.setPen(self.frame_pen)
+            painter.drawRect(self.view_rect.adjusted(0, 0, -1, -1))
+
+    def resizeEvent(self, event: QResizeEvent) -> None:
+        super().resizeEvent(event)
+        self.updateTarget()
+
+    def showEvent(self, event) -> None:
+        super().showEvent(event)
+        self.view_rect = self.viewRect()
+        self.update()
+
+    def centerViewOn(self, pos : QPointF):
+        """把标注视图的中心移动到控件坐标 pos 对应的图像位置
+        """
+        if self.view is None or self.target.isEmpty():
+            return
+        scale = self.image_rect.width() / self.target.width()
+        x = self.image_rect.left() + (min(max(pos.x(), self.target.left()), self.target.right()) - self.target.left()) * scale
+        y = self.image_rect.top() + (min(max(pos.y(), self.target.top()), self.target.bottom()) - self.target.top()) * scale
+        self.view.centerOn(QPointF(x, y))
+
+    def mousePressEvent(self, event: QMouseEvent) -> None:
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.centerViewOn(QPointF(event.pos()))
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event: QMouseEvent) -> None:
+        if event.buttons() & Qt.MouseButton.LeftButton:
+            self.centerViewOn(QPointF(event.pos()))
+        super().mouseMoveEvent(event)
+
+    @Slot()
+    def stop(self):
+        self.image_reader.stop()
@@ -0,0 +1,208 @@
+import os
+import json
+
+from qtpy.QtCore import Qt, Signal, Slot, QCoreApplication
+from qtpy.QtWidgets import QWidget, QLabel, QPushButton, QCheckBox, QLineEdit, QComboBox, QSpinBox, QDoubleSpinBox
+from qtpy.QtWidgets import QProgressBar, QFileDialog, QFormLayout, QHBoxLayout, QVBoxLayout
+
+from deep_learning_tool import LOGGER
+from deep_learning_tool import configs
+from deep_learning_tool.data import Project
+from deep_learning_tool.utils import PrelabelThread
+
+
+class PrelabelWidget(QWidget):
+    """预标注: 用检测器处理选中的图像或整个项目, 结果作为候选框写入项目
+
+    检测器和流水线见 data.inference. 每写入一批结果就在项目文件中保存检查点,
+    用相同的模型、图像和参数再次开始时从检查点继续.
+    """
+    # 写入了候选框的图像 id, 主窗口据此刷新标注页
+    proposalsWritten = Signal(list)
+
+    STATE_KEY = "prelabel_state"
+
+    def __init__(self, parent: QWidget | None = None, flags: Qt.WindowFlags | Qt.WindowType = Qt.WindowFlags()) -> None:
+        super().__init__(parent, flags)
+        self.project = None
+        self.prelabel_thread = None
+        self.signature = None
+        self.createWidgets()
+        self.browse_btn.clicked.connect(self.browseModel)
+        self.all_btn.clicked.connect(lambda: self.startPrelabel(None))
+        self.stop_btn.clicked.connect(self.cancelPrelabel)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.cancelPrelabel)
+
+    def createWidgets(self):
+        form = QFormLayout()
+        self.detector_combo = QComboBox(self)
+        self.detector_combo.setEditable(True)
+        self.detector_combo.addItems(["onnx", "stub"])
+        self.detector_combo.setCurrentText(configs.prelabel_detector)
+        self.detector_combo.setToolTip(self.tr("内置检测器的名称, 或者 模块:类名"))
+        form.addRow(self.tr("检测器"), self.detector_combo)
+
+        model_layout = QHBoxLayout()
+        self.model_edit = QLineEdit(configs.prelabel_model_path, self)
+        self.browse_btn = QPushButton(self.tr("浏览"), self)
+        model_layout.addWidget(self.model_edit)
+        model_layout.addWidget(self.browse_btn)
+        form.addRow(self.tr("模型"), model_layout)
+
+        self.class_names_edit = QLineEdit(self)
+        self.class_names_edit.setPlaceholderText(self.tr("模型中没有类别名称时填写, 用逗号分隔"))
+        form.addRow(self.tr("类别"), self.class_names_edit)
+
+        self.input_size_spin = QSpinBox(self)
+        self.input_size_spin.setRange(32, 4096)
+        self.input_size_spin.setValue(configs.prelabel_input_size)
+        self.batch_size_spin = QSpinBox(self)
+        self.batch_size_spin.setRange(1, 1024)
+        self.batch_size_spin.setValue(configs.prelabel_batch_size)
+        self.workers_spin = QSpinBox(self)
+        self.workers_spin.setRange(1, 128)
+        self.workers_spin.setValue(configs.prelabel_workers)
+        self.score_spin = QDoubleSpinBox(self)
+        self.score_spin.setRange(0, 1)
+        self.score_spin.setSingleStep(0.05)
+        self.score_spin.setValue(configs.prelabel_score_threshold)
+        form.addRow(self.tr("输入尺寸"), self.input_size_spin)
+        form.addRow(self.tr("批大小"), self.batch_size_spin)
+        form.addRow(self.tr("解码进程数"), self.workers_spin)
+        form.addRow(self.tr("分数阈值"), self.score_spin)
+        self.resume_check = QCheckBox(self.tr("从上次中断处继续"), self)
+        self.resume_check.setChecked(True)
+        form.addRow(self.resume_check)
+
+        buttons = QHBoxLayout()
+        self.selected_btn = QPushButton(self.tr("所选图像"), self)
+        self.all_btn = QPushButton(self.tr("全部图像"), self)
+        self.stop_btn = QPushButton(self.tr("停止"), self)
+        self.stop_btn.setEnabled(False)
+        buttons.addWidget(self.selected_btn)
+        buttons.addWidget(self.all_btn)
+        buttons.addWidget(self.stop_btn)
+
+        self.progress_bar = QProgressBar(self)
+        self.status_label = QLabel("", self)
+        self.status_label.setWordWrap(True)
+
+        layout = QVBoxLayout()
+        layout.addLayout(form)
+        layout.addLayout(buttons)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.status_label)
+        layout.addStretch()
+        self.setLayout(layout)
+
+    def setProject(self, project : Project):
+        self.cancelPrelabel()
+        self.project = project
+
+    @Slot()
+    def browseModel(self):
+        path, _ = QFileDialog.getOpenFileName(self, self.tr("选择模型"), os.path.dirname(self.model_edit.text()),
+                                              self.tr("ONNX 模型 (*.onnx);;所有文件 (*)"))
+        if path != "":
+            self.model_edit.setText(path)
+
+    def loadState(self) -> dict:
+        if self.project is None or self.project.store is None:
+            return {}
+        try:
+            return json.loads(self.project.store.meta(self.STATE_KEY, "{}"))
+        except ValueError:
+            return {}
+
+    def saveState(self, done : int):
+        if self.project is not None and self.project.store is not None:
+            self.project.store.setMeta(self.STATE_KEY, json.dumps({"signature": self.signature, "done": done}))
+
+    def startPrelabel(self, image_paths=None):
+        """处理 image_paths 中的图像, None 为项目中的全部图像
+        """
+        if self.project is None or self.prelabel_thread is not None:
+            return
+        from deep_learning_tool.data.inference import Prelabeler, detectorClass
+        images = self.project.images
+        image_ids = sorted(images.ids().tolist() if image_paths is None else
+                           {image_id for image_id in map(images.id, image_paths) if image_id >= 0})
+        if len(image_ids) == 0:
+            self.status_label.setText(self.tr("没有选中图像"))
+            return
+        detector_name = self.detector_combo.currentText().strip()
+        model_path = self.model_edit.text().strip()
+        class_names = [name.strip() for name in self.class_names_edit.text().split(",") if name.strip()]
+        try:
+            detector = detectorClass(detector_name)(model_path, self.input_size_spin.value(), {"class_names": class_names})
+        except Exception as e:
+            LOGGER.warning("failed to load detector %s: %s", detector_name, e)
+            self.status_label.setText(self.tr("无法加载检测器: {}").format(e))
+            return
+        # 检测器的类别按名称对应到项目的类别, 没有的类别加入项目
+        if self.project.store is not None:
+            class_ids = [self.project.store.addClass(name) for name in detector.class_names]
+        else:
+            class_ids = list(range(len(detector.class_names)))
+        params = {
+            "input_size": self.input_size_spin.value(),
+            "score_threshold": round(self.score_spin.value(), 6),
+            "max_detections": configs.prelabel_max_detections,
+            "class_ids": class_ids,
+        }
+        self.signature = Prelabeler.signature(detector_name, model_path, image_ids, **params)
+        state = self.loadState()
+        start = state.get("done", 0) if self.resume_check.isChecked() and state.get("signature") == self.signature else 0
+        prelabeler = Prelabeler(detector, image_ids, [images.path(image_id) for image_id in image_ids], class_ids,
+                                params["input_size"], self.batch_size_spin.value(), self.workers_spin.value(),
+                                configs.prelabel_prefetch, params["score_threshold"], params["max_detections"])
+        LOGGER.info("prelabel %d images with %s %s, starting at %d", len(image_ids), detector_name, model_path, start)
+        self.prelabel_thread = PrelabelThread(prelabeler, start, configs.prelabel_commit_images, self)
+        self.prelabel_thread.progress.connect(self.prelabelProgress)
+        self.prelabel_thread.proposalsReady.connect(self.writeProposals)
+        self.prelabel_thread.prelabelFinished.connect(self.prelabelFinished)
+        self.selected_btn.setEnabled(False)
+        self.all_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
+        self.progress_bar.setRange(0, len(image_ids))
+        self.progress_bar.setValue(start)
+        self.status_label.setText(self.tr("从第 {} 张开始").format(start) if start > 0 else self.tr("正在启动..."))
+        self.prelabel_thread.start()
+
+    @Slot(object, int)
+    def writeProposals(self, proposals : dict, done : int):
+        # 先写入候选框再保存检查点, 中断时最多重新计算一批
+        self.project.setProposals(proposals)
+        self.project.flush()
+        self.saveState(done)
+        self.proposalsWritten.emit(list(proposals))
+
+    @Slot(int, int, float)
+    def prelabelProgress(self, done : int, total : int, images_per_second : float):
+        self.progress_bar.setRange(0, max(total, 1))
+        self.progress_bar.setValue(done)
+        self.status_label.setText(self.tr("{} / {} 张图像, {:.1f} 张/秒").format(done, total, images_per_second))
+
+    @Slot(bool, str)
+    def prelabelFinished(self, completed : bool, message : str):
+        if completed:
+            # 完成后清除检查点, 再次开始时重新计算
+            self.saveState(0)
+            LOGGER.info("prelabel finished: %s", message)
+            self.status_label.setText(self.tr("预标注完成: {}").format(message))
+        else:
+            LOGGER.warning("prelabel stopped: %s", message)
+            self.status_label.setText(self.tr("预标注未完成 (再次开始时继续): {}").format(message))
+        self.selected_btn.setEnabled(True)
+        self.all_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        if self.prelabel_thread is not None:
+            self.prelabel_thread.wait()
+            self.prelabel_thread = None
+
+    @Slot()
+    def cancelPrelabel(self):
+        if self.prelabel_thread is not None:
+            self.prelabel_thread.stop()
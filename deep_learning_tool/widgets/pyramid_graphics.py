@@ -0,0 +1,390 @@
+import os
+import math
+import hashlib
+from collections import OrderedDict
+
+from qtpy.QtCore import Qt, Signal, Slot
+from qtpy.QtCore import QObject, QThread, QSize, QRect, QRectF
+from qtpy.QtGui import QImage, QImageReader, QImageIOHandler, QPixmap, QPainter
+from qtpy.QtWidgets import QWidget, QGraphicsItem, QGraphicsObject, QStyleOptionGraphicsItem
+
+from deep_learning_tool import LOGGER
+from deep_learning_tool import configs
+from deep_learning_tool.data import ThumbnailCache
+from deep_learning_tool.utils import ImageReadThread, raiseImageAllocationLimit
+
+
+class TilePyramid(object):
+    """磁盘上的多分辨率瓦片金字塔
+
+    level 0 为原图, 每一层边长减半, 最高层不超过一个瓦片. 
+    每一层的瓦片保存为 ``<cache_dir>/<level>/<col>_<row>.png``, 写完一层后创建 ``<level>.done`` 标记.
+    """
+    def __init__(self, image_path : str, image_size : QSize, cache_root : str, tile_size : int = 512) -> None:
+        self.image_path = image_path
+        self.width = image_size.width()
+        self.height = image_size.height()
+        self.tile_size = tile_size
+        key = ThumbnailCache.key(image_path)
+        if key is None:
+            key = hashlib.sha1(os.path.abspath(image_path).encode("utf-8")).hexdigest()
+        self.cache_dir = os.path.join(cache_root, key)
+        self.levels = 1
+        while max(self.width, self.height) > tile_size * (1 << (self.levels - 1)):
+            self.levels += 1
+        self.ready_levels = set(level for level in range(self.levels) if os.path.exists(self.markerPath(level)))
+
+    def isComplete(self) -> bool:
+        return len(self.ready_levels) == self.levels
+
+    def markerPath(self, level : int) -> str:
+        return os.path.join(self.cache_dir, f"{level}.done")
+
+    def tilePath(self, level : int, col : int, row : int) -> str:
+        return os.path.join(self.cache_dir, str(level), f"{col}_{row}.png")
+
+    def levelSize(self, level : int):
+        factor = 1 << level
+        return math.ceil(self.width / factor), math.ceil(self.height / factor)
+
+    def tileGrid(self, level : int):
+        """第 level 层瓦片的 (列数, 行数)
+        """
+        width, height = self.levelSize(level)
+        return math.ceil(width / self.tile_size), math.ceil(height / self.tile_size)
+
+    def tileRect(self, level : int, col : int, row : int) -> QRectF:
+        """瓦片在原图坐标系中的矩形
+        """
+        span = self.tile_size * (1 << level)
+        rect = QRectF(col * span, row * span, span, span)
+        return rect.intersected(QRectF(0, 0, self.width, self.height))
+
+    def levelForScale(self, scale : float) -> int:
+        """与视图缩放比例匹配的层级, 保证屏幕上的一个像素不少于瓦片的一个像素
+        """
+        if scale >= 1 or scale <= 0:
+            return 0
+        return min(self.levels - 1, int(math.floor(math.log2(1 / scale))))
+
+
+def _bandFormat(image : QImage) -> QImage.Format:
+    """条带使用的格式: 灰度图保持灰度, 其他转为 32 位, 保证条带可以直接按字节拼接
+    """
+    if image.format() in (QImage.Format.Format_Grayscale8, QImage.Format.Format_Grayscale16):
+        return image.format()
+    if image.hasAlphaChannel():
+        return QImage.Format.Format_ARGB32
+    if image.isGrayscale():
+        return QImage.Format.Format_Grayscale8
+    return QImage.Format.Format_RGB32
+
+
+def _concatRows(top : QImage | None, bottom : QImage | None) -> QImage | None:
+    """上下拼接两个等宽的图像, 任一为 None 时返回另一个
+    """
+    if top is None:
+        return bottom
+    if bottom is None:
+        return top
+    if bottom.format() != top.format():
+        bottom = bottom.convertToFormat(top.format())
+    image = QImage(top.width(), top.height() + bottom.height(), top.format())
+    bits = image.bits()
+    # 宽度和格式相同, 每行的字节数相同
+    bits[:top.sizeInBytes()] = top.constBits()
+    bits[top.sizeInBytes():top.sizeInBytes() + bottom.sizeInBytes()] = bottom.constBits()
+    return image
+
+
+class PyramidBuildThread(QThread):
+    """后台生成瓦片金字塔, 写完一层发送 levelReady
+
+    原图按行分成条带依次读取, 每个条带写入第 0 层的瓦片后缩小一半传给下一层, 逐层向上;
+    每层只保留不足一行瓦片的行, 不同时持有原图和所有层级.
+    支持按区域解码的格式 (JPEG) 每次只解码一个条带, 整个过程不持有原图.
+    不支持的格式 (PNG, BMP, TIFF) 只能整张解码, 此时按 configs.image_allocation_limit 放宽 Qt 的解码内存上限,
+    从解码后的图像中取条带; 两种情况都先单独生成最粗的一层, 生成其他层级期间视图有图像可以显示.
+    """
+    levelReady = Signal(int)
+
+    def __init__(self, pyramid : TilePyramid, parent=None) -> None:
+        super().__init__(parent)
+        self.pyramid = pyramid
+        self._run_flag = True
+
+    def run(self):
+        pyramid = self.pyramid
+        reader = QImageReader(pyramid.image_path)
+        streaming = reader.supportsOption(QImageIOHandler.ImageOption.ClipRect)
+        image = None
+        if not streaming:
+            raiseImageAllocationLimit(configs.image_allocation_limit)
+            image = reader.read()
+            if image.isNull():
+                LOGGER.error("failed to read %s: %s", pyramid.image_path, reader.errorString())
+                return
+        top_level = pyramid.levels - 1
+        if top_level > 0 and top_level not in pyramid.ready_levels:
+            if not self.writeTopLevel(image):
+                return
+        levels = [level for level in range(pyramid.levels) if level not in pyramid.ready_levels]
+        if len(levels) == 0:
+            return
+        for level in levels:
+            os.makedirs(os.path.join(pyramid.cache_dir, str(level)), exist_ok=True)
+        # 每层未写入的行、未缩小的奇数行和下一个瓦片行号, 只处理到需要的最高层
+        self._last_level = levels[-1]
+        self._buffers = [None] * (self._last_level + 1)
+        self._carry = [None] * (self._last_level + 1)
+        self._tile_rows = [0] * (self._last_level + 1)
+        # 已整张解码时条带只是原图的一部分, 取一行瓦片即可
+        band_height = self.bandHeight() if image is None else pyramid.tile_size
+        band_format = None
+        for top in range(0, pyramid.height, band_height):
+            if not self._run_flag:
+                return
+            height = min(band_height, pyramid.height - top)
+            if image is not None:
+                band = image.copy(0, top, pyramid.width, height)
+            else:
+                band_reader = QImageReader(pyramid.image_path)
+                band_reader.setClipRect(QRect(0, top, pyramid.width, height))
+                band = band_reader.read()
+                if band.isNull():
+                    LOGGER.error("failed to read %s: %s", pyramid.image_path, band_reader.errorString())
+                    return
+            if band_format is None:
+                band_format = _bandFormat(band)
+            if not self.addRows(0, band.convertToFormat(band_format), top + height >= pyramid.height):
+                return
+        image = None
+        for level in reversed(levels):
+            open(pyramid.markerPath(level), "w").close()
+            pyramid.ready_levels.add(level)
+            self.levelReady.emit(level)
+
+    def bandHeight(self) -> int:
+        """每次读取的行数, 瓦片边长的整数倍, 不超过 configs.pyramid_band_bytes
+        """
+        tile_size = self.pyramid.tile_size
+        return max(1, configs.pyramid_band_bytes // (self.pyramid.width * 4 * tile_size)) * tile_size
+
+    def writeTopLevel(self, image : QImage | None) -> bool:
+        """直接把原图缩小到最粗的一层 (一个瓦片) 并写入
+        """
+        pyramid = self.pyramid
+        level = pyramid.levels - 1
+        width, height = pyramid.levelSize(level)
+        if image is not None:
+            top = image.scaled(width, height, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+        else:
+            # 支持按区域解码的格式也支持解码时缩小, 但直接缩小到最粗的一层有明显的锯齿,
+            # 先解码为它的 8 倍大小 (不超过原图) 再平滑缩小
+            factor = min(8, 1 << level)
+            reader = QImageReader(pyramid.image_path)
+            reader.setScaledSize(QSize(min(width * factor, pyramid.width), min(height * factor, pyramid.height)))
+            top = reader.read()
+            if top.isNull():
+                LOGGER.error("failed to read %s: %s", pyramid.image_path, reader.errorString())
+                return False
+            top = top.scaled(width, height, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+        os.makedirs(os.path.join(pyramid.cache_dir, str(level)), exist_ok=True)
+        if not self.writeTileRow(level, 0, top):
+            return False
+        open(pyramid.markerPath(level), "w").close()
+        pyramid.ready_levels.add(level)
+        self.levelReady.emit(level)
+        return True
+
+    def addRows(self, level : int, rows : QImage | None, final : bool) -> bool:
+        """第 level 层新增的行: 凑满一行瓦片就写入, 同时缩小一半传给下一层; final 为最后一批, 写入剩下的行
+
+        条带的行数是瓦片边长的整数倍时直接从条带写入瓦片和缩小, 不复制条带.
+        """
+        pyramid = self.pyramid
+        tile_size = pyramid.tile_size
+        if level not in pyramid.ready_levels:
+            buffered = _concatRows(self._buffers[level], rows)
+            top = 0
+            while buffered is not None and top < buffered.height() and (buffered.height() - top >= tile_size or final):
+                if not self.writeTileRow(level, self._tile_rows[level], buffered, top):
+                    return False
+                self._tile_rows[level] += 1
+                top += tile_size
+            self._buffers[level] = None
+            if buffered is not None and top < buffered.height():
+                self._buffers[level] = buffered.copy(0, top, buffered.width(), buffered.height() - top)
+        if level < self._last_level:
+            pending = _concatRows(self._carry[level], rows)
+            self._carry[level] = None
+            scaled = None
+            if pending is not None:
+                # 每两行缩小为一行, 奇数行留到下一批, 最后一批的奇数行单独成为一行
+                count = pending.height() if final else pending.height() // 2 * 2
+                if count < pending.height():
+                    self._carry[level] = pending.copy(0, count, pending.width(), pending.height() - count)
+                if count > 0:
+                    if count < pending.height():
+                        pending = pending.copy(0, 0, pending.width(), count)
+                    width, _ = pyramid.levelSize(level + 1)
+                    scaled = pending.scaled(width, (count + 1) // 2, Qt.AspectRatioMode.IgnoreAspectRatio,
+                                            Qt.TransformationMode.SmoothTransformation)
+            return self.addRows(level + 1, scaled, final)
+        return True
+
+    def writeTileRow(self, level : int, row : int, image : QImage, top : int = 0) -> bool:
+        """写入第 level 层的一行瓦片, 像素为 image 中从 top 开始的 (最多) tile_size 行
+        """
+        pyramid = self.pyramid
+        tile_size = pyramid.tile_size
+        height = min(tile_size, image.height() - top)
+        cols, _ = pyramid.tileGrid(level)
+        for col in range(cols):
+            if not self._run_flag:
+                return False
+            tile = image.copy(col * tile_size, top, min(tile_size, image.width() - col * tile_size), height)
+            tile_path = pyramid.tilePath(level, col, row)
+            tile.save(tile_path + ".tmp", "PNG")
+            os.replace(tile_path + ".tmp", tile_path)
+        return True
+
+    def stop(self):
+        self._run_flag = False
+        self.wait()
+
+
+class TileCache(QObject):
+    """内存中的瓦片 LRU 缓存, 按字节数限制大小, 未命中的瓦片在后台读取
+    """
+    tileLoaded = Signal(str)
+
+    def __init__(self, max_bytes : int, parent=None) -> None:
+        super().__init__(parent)
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._pixmaps = OrderedDict()
+        self._requested = set()
+        self.loader = ImageReadThread(self, image_size=0)
+        self.loader.imageRead.connect(self.tileRead)
+
+    def tile(self, tile_path : str, request : bool = True):
+        """获取瓦片, 不阻塞
+
+        Returns:
+            QPixmap | None: 未命中时返回 None, request 为 True 时提交后台读取
+        """
+        pixmap = self._pixmaps.get(tile_path)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(tile_path)
+            return pixmap
+        if request and tile_path not in self._requested:
+            self._requested.add(tile_path)
+            self.loader.addImages([tile_path])
+        return None
+
+    def cancel(self):
+        self.loader.cancel()
+        self._requested.clear()
+
+    @Slot(str, QImage, QSize)
+    def tileRead(self, tile_path : str, image : QImage, original_size : QSize):
+        self._requested.discard(tile_path)
+        if image.isNull():
+            return
+        pixmap = QPixmap.fromImage(image)
+        self._pixmaps[tile_path] = pixmap
+        self.total_bytes += pixmap.width() * pixmap.height() * 4
+        while self.total_bytes > self.max_bytes and len(self._pixmaps) > 1:
+            _, evicted = self._pixmaps.popitem(last=False)
+            self.total_bytes -= evicted.width() * evicted.height() * 4
+        self.tileLoaded.emit(tile_path)
+
+    def stop(self):
+        self.loader.stop()
+
+
+class TiledImageItem(QGraphicsObject):
+    """按瓦片绘制的大图图形项
+
+    只绘制与 exposedRect 相交的瓦片, 层级由当前缩放比例决定. 
+    瓦片未读取完成时用已缓存的更粗层级的瓦片代替.
+    """
+    def __init__(self, pyramid : TilePyramid, tile_cache : TileCache, parent : QGraphicsItem | None = None) -> None:
+        super().__init__(parent)
+        self.pyramid = pyramid
+        self.tile_cache = tile_cache
+        # tile_path -> 瓦片矩形, 读取完成后只更新该区域
+        self._pending = {}
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption, True)
+        self.tile_cache.tileLoaded.connect(self.tileLoaded)
+
+    def imageRect(self) -> QRectF:
+        return QRectF(0, 0, self.pyramid.width, self.pyramid.height)
+
+    def boundingRect(self) -> QRectF:
+        return self.imageRect()
+
+    @Slot(int)
+    def levelReady(self, level : int):
+        self.update()
+
+    @Slot(str)
+    def tileLoaded(self, tile_path : str):
+        rect = self._pending.pop(tile_path, None)
+        if rect is not None:
+            self.update(rect)
+
+    def tileRange(self, level : int, rect : QRectF):
+        span = self.pyramid.tile_size * (1 << level)
+        cols, rows = self.pyramid.tileGrid(level)
+        col0 = max(0, int(rect.left() // span))
+        row0 = max(0, int(rect.top() // span))
+        col1 = min(cols - 1, int(rect.right() // span))
+        row1 = min(rows - 1, int(rect.bottom() // span))
+        return col0, row0, col1, row1
+
+    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: QWidget | None = None) -> None:
+        scale = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.pyramid.levelForScale(scale)
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+        col0, row0, col1, row1 = self.tileRange(level, exposed)
+        ready = level in self.pyramid.ready_levels
+        for row in range(row0, row1 + 1):
+            for col in range(col0, col1 + 1):
+                target = self.pyramid.tileRect(level, col, row)
+                pixmap = None
+                if ready:
+                    tile_path = self.pyramid.tilePath(level, col, row)
+                    pixmap = self.tile_cache.tile(tile_path)
+                    if pixmap is None:
+                        self._pending[tile_path] = target
+                if pixmap is not None:
+                    painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+                else:
+                    self.drawFallback(painter, target, level + 1)
+
+    def drawFallback(self, painter : QPainter, target : QRectF, level : int):
+        """用已缓存的粗层级瓦片填充 target, 不提交新的读取
+        """
+        tile_size = self.pyramid.tile_size
+        for fallback in range(level, self.pyramid.levels):
+            if fallback not in self.pyramid.ready_levels:
+                continue
+            span = tile_size * (1 << fallback)
+            col, row = int(target.left() // span), int(target.top() // span)
+            # 只读取最粗的层级, 它只有一个瓦片
+            request = fallback == self.pyramid.levels - 1
+            tile_path = self.pyramid.tilePath(fallback, col, row)
+            pixmap = self.tile_cache.tile(tile_path, request=request)
+            if pixmap is None:
+                if request:
+                    self._pending[tile_path] = self.boundingRect()
+                continue
+            factor = 1 << fallback
+            source = QRectF((target.left() - col * span) / factor, (target.top() - row * span) / factor, 
+                            target.width() / factor, target.height() / factor)
+            painter.drawPixmap(target, pixmap, source)
+            return
@@ -0,0 +1,239 @@
+import time
+
+import numpy as np
+
+from qtpy.QtCore import Qt, Signal, Slot, QRectF
+from qtpy.QtGui import QPen, QColor
+from qtpy.QtWidgets import QMainWindow, QWidget, QDockWidget, QLabel, QCheckBox, QComboBox, QSpinBox, QDoubleSpinBox
+from qtpy.QtWidgets import QFormLayout, QHBoxLayout, QVBoxLayout, QGridLayout, QSizePolicy
+
+from deep_learning_tool import LOGGER
+from deep_learning_tool import configs
+from deep_learning_tool.data import Project
+from deep_learning_tool.data.review import ReviewIndex, ReviewQuery, boxMask
+
+from .widget import ProjectInfo
+from .gallery_graphics import GalleryView
+from .label_graphics import ClassStyle
+
+
+class ReviewFilter(QWidget):
+    """检查页的过滤条件, 任何条件改变时发送 queryChanged
+    """
+    queryChanged = Signal()
+
+    def __init__(self, parent: QWidget | None = None) -> None:
+        super().__init__(parent)
+        form = QFormLayout()
+        class_layout = QHBoxLayout()
+        self.class_combo = QComboBox(self)
+        self.class_count_spin = QSpinBox(self)
+        self.class_count_spin.setRange(1, 10000)
+        self.class_count_spin.setPrefix(self.tr("至少 "))
+        self.class_count_spin.setSuffix(self.tr(" 个"))
+        class_layout.addWidget(self.class_combo, 1)
+        class_layout.addWidget(self.class_count_spin)
+        form.addRow(self.tr("类别"), class_layout)
+
+        self.small_check = QCheckBox(self.tr("有小于"), self)
+        self.small_spin = QSpinBox(self)
+        self.small_spin.setRange(1, 100000)
+        self.small_spin.setValue(configs.review_small_box_size)
+        self.small_spin.setSuffix(self.tr(" px 的框"))
+        self.small_spin.setToolTip(self.tr("框的面积小于 N * N"))
+        form.addRow(self.small_check, self.small_spin)
+
+        self.overlap_check = QCheckBox(self.tr("有重叠的框"), self)
+        self.overlap_spin = QDoubleSpinBox(self)
+        self.overlap_spin.setRange(0.01, 1)
+        self.overlap_spin.setSingleStep(0.05)
+        self.overlap_spin.setValue(configs.review_overlap_iou)
+        self.overlap_spin.setPrefix(self.tr("IoU ≥ "))
+        form.addRow(self.overlap_check, self.overlap_spin)
+
+        self.proposals_check = QCheckBox(self.tr("有未确认的候选框"), self)
+        form.addRow(self.proposals_check)
+
+        self.result_label = QLabel("", self)
+        self.result_label.setWordWrap(True)
+        layout = QVBoxLayout()
+        layout.addLayout(form)
+        layout.addWidget(self.result_label)
+        layout.addStretch()
+        self.setLayout(layout)
+
+        self.class_combo.currentIndexChanged.connect(self._changed)
+        for widget in (self.class_count_spin, self.small_spin, self.overlap_spin):
+            widget.valueChanged.connect(self._changed)
+        for check in (self.small_check, self.overlap_check, self.proposals_check):
+            check.toggled.connect(self._changed)
+
+    @Slot()
+    def _changed(self):
+        self.queryChanged.emit()
+
+    def setClasses(self, classes):
+        """classes: (class_id, name), 保留当前选中的类别
+        """
+        current = self.class_combo.currentData()
+        blocked = self.class_combo.blockSignals(True)
+        self.class_combo.clear()
+        self.class_combo.addItem(self.tr("任意"), None)
+        for class_id, name in classes:
+            self.class_combo.addItem(name, class_id)
+        index = self.class_combo.findData(current)
+        self.class_combo.setCurrentIndex(max(index, 0))
+        self.class_combo.blockSignals(blocked)
+
+    def query(self) -> ReviewQuery:
+        return ReviewQuery(
+            class_id=self.class_combo.currentData(),
+            min_class_count=self.class_count_spin.value(),
+            max_box_size=self.small_spin.value() if self.small_check.isChecked() else None,
+            min_iou=self.overlap_spin.value() if self.overlap_check.isChecked() else None,
+            proposals=self.proposals_check.isChecked(),
+        )
+
+
+class ReviewWindow(QMainWindow):
+    """检查页: 按过滤条件列出图像, 缩略图上绘制标注, 满足条件的框加粗显示
+
+    过滤使用 data.review.ReviewIndex 中按图像预先计算的汇总, 结果是图库的行号, 由虚拟化的 GalleryView 显示,
+    只有可见的缩略图会读取标注和绘制矩形. 双击图像在标注页打开.
+    """
+    reviewItemDoubleClicked = Signal(str)
+
+    def __init__(self, parent: QWidget | None = None, flags: Qt.WindowFlags | Qt.WindowType = Qt.WindowFlags()) -> None:
+        super().__init__(parent, flags)
+        self.project = None
+        self.index = None
+        self.query = ReviewQuery()
+        self.class_style = ClassStyle()
+        self._pens = {}
+        self.createCentralWidget()
+        self.createDockWidgets()
+        self.gallery_view.setOverlayProvider(self.overlay)
+        self.gallery_view.galleryItemDoubleClicked.connect(self.reviewItemDoubleClicked)
+        self.review_filter.queryChanged.connect(self.applyQuery)
+
+    def createCentralWidget(self):
+        review_widget = QWidget(self)
+        layout = QGridLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        review_widget.setLayout(layout)
+        self.gallery_view = GalleryView(review_widget, virtualized=True)
+        layout.addWidget(self.gallery_view)
+        self.setCentralWidget(review_widget)
+
+    def createDockWidgets(self):
+        self.project_dock = QDockWidget(self.tr("项目"), self)
+        self.project_dock.setTitleBarWidget(QWidget(self))
+        self.project_dock.setFeatures(QDockWidget.DockWidgetFeature.NoDockWidgetFeatures)
+        self.project_dock.setFixedHeight(100)
+        self.project_dock.setMinimumWidth(120)
+        self.project_dock.setMaximumWidth(500)
+        self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.project_dock)
+
+        self.filter_dock = QDockWidget(self.tr("过滤"), self)
+        self.filter_dock.setFeatures(QDockWidget.DockWidgetFeature.NoDockWidgetFeatures)
+        self.review_filter = ReviewFilter(self)
+        self.review_filter.setSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding)
+        self.filter_dock.setWidget(self.review_filter)
+        self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.filter_dock)
+
+    def setProject(self, project : Project):
+        self.project = project
+        self.index = None
+        self.project_dock.setWidget(ProjectInfo(project.name, project.type))
+        self.gallery_view.clear()
+        self.gallery_view.setThumbnailCache(project.thumbnail_cache)
+        # 与图库一样, 视图中的行与 ImageRegistry 的行一致
+        self.gallery_view.addImages(list(project.images_path))
+        if self.isVisible():
+            self.refresh()
+
+    def showEvent(self, event) -> None:
+        super().showEvent(event)
+        # 在其他页面的修改 (标注、导入) 在切换到检查页时同步
+        self.refresh()
+
+    @Slot()
+    def refresh(self):
+        """第一次调用时建立索引, 之后只同步被修改的图像, 然后重新过滤
+        """
+        if self.project is None:
+            return
+        start = time.perf_counter()
+        if self.index is None:
+            self.index = ReviewIndex.fromProject(self.project)
+            LOGGER.info("review index of %d images built in %.1f ms", len(self.index), (time.perf_counter() - start) * 1000)
+        else:
+            self.index.sync(self.project)
+        if len(self.gallery_view.model.images_path) != len(self.project.images):
+            self.gallery_view.clear()
+            self.gallery_view.addImages(list(self.project.images_path))
+        self.review_filter.setClasses(self.classes())
+        self.applyQuery()
+
+    def classes(self) -> list:
+        if self.project.store is not None:
+            return [(class_id, name) for class_id, name, _ in self.project.store.classes()]
+        return [(class_id, str(class_id)) for class_id in range(self.index.class_count)]
+
+    @Slot(list)
+    def invalidate(self, image_ids : list):
+        """这些图像的标注在项目文件中被修改, 还没有建立索引时忽略
+        """
+        if self.index is None:
+            return
+        self.index.invalidate(self.project, image_ids)
+        if self.isVisible():
+            self.index.sync(self.project)
+            self.applyQuery()
+
+    @Slot()
+    def applyQuery(self):
+        if self.index is None:
+            return
+        self.query = self.review_filter.query()
+        start = time.perf_counter()
+        rows = None if self.query.isEmpty() else self.index.query(self.query)
+        elapsed = (time.perf_counter() - start) * 1000
+        current = self.gallery_view.model.filter_rows
+        if (rows is None and current is None) or (rows is not None and current is not None and np.array_equal(rows, current)):
+            # 结果没有变化时保留滚动位置和选中, 只更新标注
+            self.gallery_view.refreshOverlays()
+        else:
+            self.gallery_view.setFilter(rows)
+        summary = self.index.summary()
+        matched = summary["images"] if rows is None else len(rows)
+        self.review_filter.result_label.setText(self.tr("{} / {} 张图像 ({:.1f} ms)\n共 {} 个框, {} 张图像没有框, {} 张图像有候选框").format(
+            matched, summary["images"], elapsed, summary["boxes"], summary["empty"], summary["proposals"]))
+
+    def pen(self, class_id : int, highlighted : bool) -> QPen:
+        key = (class_id, highlighted)
+        pen = self._pens.get(key)
+        if pen is None:
+            color = QColor(self.class_style.color(class_id))
+            if highlighted is False:
+                color.setAlpha(110)
+            pen = QPen(color)
+            pen.setWidth(3 if highlighted else 1)
+            pen.setCosmetic(True)
+            self._pens[key] = pen
+        return pen
+
+    def overlay(self, image_path : str):
+        """缩略图上的矩形, 按 (类别, 是否满足条件) 分组, 每组一个画笔; highlighted 为 None 表示没有框级别的条件
+        """
+        if self.index is None:
+            return None
+        class_ids, boxes, flags = self.index.boxes(self.project.images.id(image_path))
+        if len(boxes) == 0:
+            return None
+        mask = boxMask(self.query, class_ids, boxes, flags)
+        groups = {}
+        for row, (class_id, (x1, y1, x2, y2)) in enumerate(zip(class_ids.tolist(), boxes.tolist())):
+            key = (class_id, None if mask is None else bool(mask[row]))
+            groups.setdefault(key, []).append(QRectF(x1, y1, x2 - x1, y2 - y1))
+        return [(self.pen(*key), rects) for key, rects in groups.items()]
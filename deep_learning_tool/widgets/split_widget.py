@@ -0,0 +1,78 @@
+from qtpy.QtCore import Qt, Signal, Slot
+from qtpy.QtWidgets import QWidget, QListWidget, QListWidgetItem, QLabel
+from qtpy.QtWidgets import QVBoxLayout, QSizePolicy
+
+from deep_learning_tool.data import Project, ProjectStore
+
+
+ALL_SPLITS = -1
+
+
+class SplitMappingWidget(QWidget):
+    """拆分映射: 每个集合的图像数
+
+    图库中点击集合只显示该集合的图像 (show_all 时第一行为全部图像); 标注页中点击集合把当前图像分到该集合.
+    """
+    splitActivated = Signal(int)
+
+    def __init__(self, show_all : bool = True, hint : str = "", parent: QWidget | None = None) -> None:
+        super().__init__(parent)
+        self.list_widget = QListWidget(self)
+        self.list_widget.setSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding)
+        self.names = {}
+        if show_all:
+            self.names[ALL_SPLITS] = self.tr("全部")
+        self.names.update(ProjectStore.SPLITS)
+        for split, name in self.names.items():
+            item = QListWidgetItem(name)
+            item.setData(Qt.ItemDataRole.UserRole, split)
+            self.list_widget.addItem(item)
+        self.list_widget.itemClicked.connect(self._itemClicked)
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0,0,0,0)
+        if hint:
+            self.hint = QLabel(hint, self)
+            self.hint.setWordWrap(True)
+            layout.addWidget(self.hint)
+        layout.addWidget(self.list_widget)
+        self.setLayout(layout)
+
+    def itemOf(self, split : int) -> QListWidgetItem:
+        for row in range(self.list_widget.count()):
+            item = self.list_widget.item(row)
+            if item.data(Qt.ItemDataRole.UserRole) == split:
+                return item
+        return None
+
+    def setCounts(self, counts : dict):
+        """counts: split -> 图像数, 可以包括 ALL_SPLITS
+        """
+        for split, name in self.names.items():
+            item = self.itemOf(split)
+            item.setText(f"{name} ({counts.get(split, 0)})")
+
+    def updateFromProject(self, project : Project):
+        images = project.images
+        counts = {split : images.countValue("split", split) for split, _ in ProjectStore.SPLITS}
+        counts[ALL_SPLITS] = len(images)
+        self.setCounts(counts)
+
+    def setCurrentSplit(self, split : int):
+        """只改变选中的行, 不发出 splitActivated
+        """
+        item = self.itemOf(split)
+        blocked = self.list_widget.blockSignals(True)
+        if item is None:
+            self.list_widget.clearSelection()
+        else:
+            self.list_widget.setCurrentItem(item)
+        self.list_widget.blockSignals(blocked)
+
+    def currentSplit(self) -> int:
+        item = self.list_widget.currentItem()
+        return ALL_SPLITS if item is None else item.data(Qt.ItemDataRole.UserRole)
+
+    @Slot(QListWidgetItem)
+    def _itemClicked(self, item : QListWidgetItem):
+        self.splitActivated.emit(item.data(Qt.ItemDataRole.UserRole))
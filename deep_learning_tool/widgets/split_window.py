@@ -0,0 +1,184 @@
+import time
+
+from qtpy.QtCore import Qt, Signal, Slot
+from qtpy.QtWidgets import QMainWindow, QWidget, QDockWidget, QLabel, QPushButton, QCheckBox, QLineEdit
+from qtpy.QtWidgets import QComboBox, QSpinBox, QDoubleSpinBox, QTableWidget, QTableWidgetItem
+from qtpy.QtWidgets import QFormLayout, QHBoxLayout, QVBoxLayout, QSizePolicy
+
+from deep_learning_tool import LOGGER
+from deep_learning_tool import configs
+from deep_learning_tool.data import Project, ProjectStore
+
+from .widget import ProjectInfo
+
+
+class SplitWindow(QMainWindow):
+    """拆分页: 选择方法、比例和随机种子, 把项目中的图像分到训练 / 验证 / 测试集
+
+    拆分由 data.split 对所有图像向量化计算, 结果写入 ImageRegistry 的 split 列, 在保存项目时写入项目文件.
+    """
+    # 主窗口把它转发给所有页面, 包括本页的 updateSummary
+    splitsChanged = Signal()
+
+    METHODS = (
+        ("random", "随机"),
+        ("stratified", "按类别分层"),
+        ("group", "按组"),
+    )
+    GROUP_BY_FOLDER = 0
+    GROUP_BY_PATTERN = 1
+
+    def __init__(self, parent: QWidget | None = None, flags: Qt.WindowFlags | Qt.WindowType = Qt.WindowFlags()) -> None:
+        super().__init__(parent, flags)
+        self.project = None
+        self.createCentralWidget()
+        self.createDockWidgets()
+        self.method_combo.currentIndexChanged.connect(self.updateControls)
+        self.group_combo.currentIndexChanged.connect(self.updateControls)
+        self.split_btn.clicked.connect(self.applySplit)
+        self.clear_btn.clicked.connect(self.clearSplit)
+        self.updateControls()
+
+    def createCentralWidget(self):
+        widget = QWidget(self)
+        form = QFormLayout()
+
+        self.method_combo = QComboBox(widget)
+        for method, name in self.METHODS:
+            self.method_combo.addItem(self.tr(name), method)
+        form.addRow(self.tr("方法"), self.method_combo)
+
+        ratios_layout = QHBoxLayout()
+        self.ratio_spins = []
+        for (split, name), ratio in zip(ProjectStore.SPLITS[1:], configs.split_ratios):
+            spin = QDoubleSpinBox(widget)
+            spin.setRange(0, 100)
+            spin.setDecimals(1)
+            spin.setSuffix(" %")
+            spin.setValue(ratio)
+            ratios_layout.addWidget(QLabel(name, widget))
+            ratios_layout.addWidget(spin)
+            self.ratio_spins.append(spin)
+        form.addRow(self.tr("比例"), ratios_layout)
+
+        self.seed_spin = QSpinBox(widget)
+        self.seed_spin.setRange(0, 2 ** 31 - 1)
+        self.seed_spin.setValue(configs.split_seed)
+        form.addRow(self.tr("随机种子"), self.seed_spin)
+
+        group_layout = QHBoxLayout()
+        self.group_combo = QComboBox(widget)
+        self.group_combo.addItem(self.tr("按目录"), self.GROUP_BY_FOLDER)
+        self.group_combo.addItem(self.tr("按文件名 (正则表达式)"), self.GROUP_BY_PATTERN)
+        self.group_pattern = QLineEdit(configs.split_group_pattern, widget)
+        self.group_stratify = QCheckBox(self.tr("按类别分层"), widget)
+        group_layout.addWidget(self.group_combo)
+        group_layout.addWidget(self.group_pattern)
+        group_layout.addWidget(self.group_stratify)
+        form.addRow(self.tr("分组"), group_layout)
+
+        buttons = QHBoxLayout()
+        self.split_btn = QPushButton(self.tr("拆分"), widget)
+        self.clear_btn = QPushButton(self.tr("全部设为未分配"), widget)
+        buttons.addWidget(self.split_btn)
+        buttons.addWidget(self.clear_btn)
+        buttons.addStretch()
+        form.addRow(buttons)
+
+        self.summary_table = QTableWidget(widget)
+        self.summary_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.summary_table.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.status_label = QLabel("", widget)
+
+        layout = QVBoxLayout()
+        layout.addLayout(form)
+        layout.addWidget(self.summary_table)
+        layout.addWidget(self.status_label)
+        widget.setLayout(layout)
+        self.setCentralWidget(widget)
+
+    def createDockWidgets(self):
+        self.project_dock = QDockWidget(self.tr("项目"), self)
+        self.project_dock.setTitleBarWidget(QWidget(self))
+        self.project_dock.setFeatures(QDockWidget.DockWidgetFeature.NoDockWidgetFeatures)
+        self.project_dock.setFixedHeight(100)
+        self.project_dock.setMinimumWidth(120)
+        self.project_dock.setMaximumWidth(500)
+        self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.project_dock)
+
+    def setProject(self, project : Project):
+        self.project = project
+        self.project_dock.setWidget(ProjectInfo(project.name, project.type))
+        self.updateSummary()
+
+    @Slot()
+    def updateControls(self):
+        group = self.method_combo.currentData() == "group"
+        self.group_combo.setEnabled(group)
+        self.group_stratify.setEnabled(group)
+        self.group_pattern.setEnabled(group and self.group_combo.currentData() == self.GROUP_BY_PATTERN)
+
+    def ratios(self):
+        return [spin.value() for spin in self.ratio_spins]
+
+    @Slot()
+    def applySplit(self):
+        from deep_learning_tool.data import split as data_split
+        if self.project is None or len(self.project.images) == 0:
+            return
+        method = self.method_combo.currentData()
+        start = time.perf_counter()
+        histograms = groups = None
+        try:
+            if method == data_split.STRATIFIED or (method == data_split.GROUP and self.group_stratify.isChecked()):
+                histograms = self.project.classHistograms()
+            if method == data_split.GROUP:
+                pattern = self.group_pattern.text() if self.group_combo.currentData() == self.GROUP_BY_PATTERN else None
+                groups = self.project.imageGroups(pattern)
+            splits = data_split.split(method, self.ratios(), self.seed_spin.value(), len(self.project.images), histograms, groups)
+        except Exception as e:
+            # 比例全为 0 或正则表达式错误
+            LOGGER.warning("split failed: %s", e)
+            self.status_label.setText(self.tr("拆分失败: {}").format(e))
+            return
+        self.project.setSplits(splits)
+        elapsed = time.perf_counter() - start
+        LOGGER.info("split %d images by %s in %.1f ms", len(splits), method, elapsed * 1000)
+        self.status_label.setText(self.tr("已拆分 {} 张图像, 用时 {:.0f} 毫秒").format(len(splits), elapsed * 1000))
+        self.splitsChanged.emit()
+
+    @Slot()
+    def clearSplit(self):
+        import numpy as np
+        from deep_learning_tool.data import split as data_split
+        if self.project is None:
+            return
+        self.project.setSplits(np.full(len(self.project.images), data_split.UNASSIGNED, dtype=np.int8))
+        self.status_label.setText("")
+        self.splitsChanged.emit()
+
+    @Slot()
+    def updateSummary(self):
+        """每个集合的图像数和各类别的框数
+        """
+        from deep_learning_tool.data import split as data_split
+        if self.project is None:
+            return
+        splits = self.project.splits()
+        histograms = self.project.classHistograms()
+        counts = data_split.splitCounts(splits)
+        class_counts = data_split.splitClassCounts(splits, histograms)
+        headers = [self.tr("图像"), self.tr("比例")] + [self.tr("类别 {}").format(class_id) for class_id in range(histograms.shape[1])]
+        table = self.summary_table
+        table.clear()
+        table.setColumnCount(len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setRowCount(len(ProjectStore.SPLITS))
+        table.setVerticalHeaderLabels([name for _, name in ProjectStore.SPLITS])
+        total = max(len(splits), 1)
+        for row, (split, _) in enumerate(ProjectStore.SPLITS):
+            values = [str(counts[split]), f"{counts[split] / total:.1%}"] + [str(count) for count in class_counts[split]]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                table.setItem(row, column, item)
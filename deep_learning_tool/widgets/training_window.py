@@ -0,0 +1,276 @@
+import os
+import time
+
+from qtpy.QtCore import Qt, Slot, QPointF, QRectF, QCoreApplication
+from qtpy.QtGui import QPainter, QPen, QColor, QPolygonF
+from qtpy.QtWidgets import QMainWindow, QWidget, QDockWidget, QLabel, QPushButton, QCheckBox, QLineEdit
+from qtpy.QtWidgets import QComboBox, QSpinBox, QDoubleSpinBox, QProgressBar, QFileDialog, QPlainTextEdit
+from qtpy.QtWidgets import QFormLayout, QHBoxLayout, QVBoxLayout, QSizePolicy
+
+from deep_learning_tool import LOGGER
+from deep_learning_tool import configs
+from deep_learning_tool.data import Project, ProjectStore
+from deep_learning_tool.utils import TrainingThread
+
+from .widget import ProjectInfo
+
+
+class MetricsChart(QWidget):
+    """loss 和每秒图像数随步数的曲线, 两条曲线各自按最大值缩放
+    """
+    SERIES = (
+        ("loss", "loss", QColor(210, 80, 40)),
+        ("images_per_second", "图像/秒", QColor(40, 110, 210)),
+    )
+    MARGIN = 8
+
+    def __init__(self, parent: QWidget | None = None) -> None:
+        super().__init__(parent)
+        self.steps = []
+        self.values = {key : [] for key, _, _ in self.SERIES}
+        self.total_steps = 1
+        self.setMinimumSize(240, 160)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+
+    def clear(self, total_steps : int = 1):
+        self.steps = []
+        self.values = {key : [] for key, _, _ in self.SERIES}
+        self.total_steps = max(total_steps, 1)
+        self.update()
+
+    def append(self, metrics : dict):
+        self.steps.append(metrics["step"])
+        for key, _, _ in self.SERIES:
+            self.values[key].append(metrics[key])
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.fillRect(self.rect(), self.palette().base())
+        plot = QRectF(self.MARGIN, self.MARGIN, self.width() - 2 * self.MARGIN, self.height() - 2 * self.MARGIN)
+        painter.setPen(QPen(self.palette().text().color(), 1))
+        painter.drawRect(plot)
+        for row, (key, name, color) in enumerate(self.SERIES):
+            values = self.values[key]
+            if not values:
+                continue
+            maximum = max(max(values), 1e-9)
+            polygon = QPolygonF([QPointF(plot.left() + step / self.total_steps * plot.width(),
+                                         plot.bottom() - value / maximum * plot.height())
+                                 for step, value in zip(self.steps, values)])
+            painter.setPen(QPen(color, 2))
+            painter.drawPolyline(polygon)
+            legend = f"{name} {values[-1]:.4g} (max {maximum:.4g})"
+            painter.drawText(QPointF(plot.right() - painter.fontMetrics().horizontalAdvance(legend) - 6,
+                                     plot.top() + 16 * (row + 1)), legend)
+
+
+class TrainingWindow(QMainWindow):
+    """训练页: 用选中集合的图像和标注在本地进程中训练
+
+    训练在独立的进程中运行, 解码由多个进程完成并通过共享内存传递批次 (见 data.loader, data.training),
+    loss、每秒图像数和等待数据的比例按固定间隔显示. 停止后当前权重保存为 last.npz.
+    """
+    def __init__(self, parent: QWidget | None = None, flags: Qt.WindowFlags | Qt.WindowType = Qt.WindowFlags()) -> None:
+        super().__init__(parent, flags)
+        self.project = None
+        self.training_thread = None
+        self.createCentralWidget()
+        self.createDockWidgets()
+        self.browse_btn.clicked.connect(self.browseOutputDir)
+        self.start_btn.clicked.connect(self.startTraining)
+        self.stop_btn.clicked.connect(self.stopTraining)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.waitTraining)
+
+    def createCentralWidget(self):
+        from deep_learning_tool.data.training import TRAINERS
+        widget = QWidget(self)
+        form = QFormLayout()
+
+        self.trainer_combo = QComboBox(widget)
+        self.trainer_combo.setEditable(True)
+        self.trainer_combo.addItems(sorted(TRAINERS))
+        self.trainer_combo.setCurrentText(configs.training_trainer)
+        self.trainer_combo.setToolTip(self.tr("内置训练器的名称, 或者 模块:类名"))
+        form.addRow(self.tr("训练器"), self.trainer_combo)
+
+        splits_layout = QHBoxLayout()
+        self.split_checks = {}
+        for split, name in ProjectStore.SPLITS:
+            check = QCheckBox(name, widget)
+            check.setChecked(split == 1)
+            splits_layout.addWidget(check)
+            self.split_checks[split] = check
+        splits_layout.addStretch()
+        form.addRow(self.tr("集合"), splits_layout)
+
+        output_layout = QHBoxLayout()
+        self.output_edit = QLineEdit(widget)
+        self.browse_btn = QPushButton(self.tr("浏览"), widget)
+        output_layout.addWidget(self.output_edit)
+        output_layout.addWidget(self.browse_btn)
+        form.addRow(self.tr("输出目录"), output_layout)
+
+        self.epochs_spin = self.spinBox(widget, 1, 10000, configs.training_epochs)
+        self.batch_size_spin = self.spinBox(widget, 1, 4096, configs.training_batch_size)
+        self.image_size_spin = self.spinBox(widget, 16, 4096, configs.training_image_size)
+        self.workers_spin = self.spinBox(widget, 1, 128, configs.training_workers)
+        self.prefetch_spin = self.spinBox(widget, 1, 64, configs.training_prefetch)
+        self.learning_rate_spin = QDoubleSpinBox(widget)
+        self.learning_rate_spin.setDecimals(5)
+        self.learning_rate_spin.setRange(0.00001, 10)
+        self.learning_rate_spin.setValue(configs.training_learning_rate)
+        form.addRow(self.tr("轮数"), self.epochs_spin)
+        form.addRow(self.tr("批大小"), self.batch_size_spin)
+        form.addRow(self.tr("图像尺寸"), self.image_size_spin)
+        form.addRow(self.tr("解码进程数"), self.workers_spin)
+        form.addRow(self.tr("预取批次"), self.prefetch_spin)
+        form.addRow(self.tr("学习率"), self.learning_rate_spin)
+
+        buttons = QHBoxLayout()
+        self.start_btn = QPushButton(self.tr("开始训练"), widget)
+        self.stop_btn = QPushButton(self.tr("停止"), widget)
+        self.stop_btn.setEnabled(False)
+        buttons.addWidget(self.start_btn)
+        buttons.addWidget(self.stop_btn)
+        buttons.addStretch()
+        form.addRow(buttons)
+
+        self.progress_bar = QProgressBar(widget)
+        self.status_label = QLabel("", widget)
+        self.chart = MetricsChart(widget)
+        self.log_edit = QPlainTextEdit(widget)
+        self.log_edit.setReadOnly(True)
+        self.log_edit.setMaximumBlockCount(1000)
+        self.log_edit.setFixedHeight(120)
+
+        layout = QVBoxLayout()
+        layout.addLayout(form)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.chart, 1)
+        layout.addWidget(self.log_edit)
+        widget.setLayout(layout)
+        self.setCentralWidget(widget)
+
+    def spinBox(self, parent : QWidget, minimum : int, maximum : int, value : int) -> QSpinBox:
+        spin = QSpinBox(parent)
+        spin.setRange(minimum, maximum)
+        spin.setValue(value)
+        return spin
+
+    def createDockWidgets(self):
+        self.project_dock = QDockWidget(self.tr("项目"), self)
+        self.project_dock.setTitleBarWidget(QWidget(self))
+        self.project_dock.setFeatures(QDockWidget.DockWidgetFeature.NoDockWidgetFeatures)
+        self.project_dock.setFixedHeight(100)
+        self.project_dock.setMinimumWidth(120)
+        self.project_dock.setMaximumWidth(500)
+        self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.project_dock)
+
+    def setProject(self, project : Project):
+        self.waitTraining()
+        self.project = project
+        self.project_dock.setWidget(ProjectInfo(project.name, project.type))
+        self.output_edit.setText(os.path.join(configs.training_root, project.name))
+
+    @Slot()
+    def browseOutputDir(self):
+        folder = QFileDialog().getExistingDirectory(self, self.tr("选择输出目录"), self.output_edit.text())
+        if folder != "":
+            self.output_edit.setText(folder)
+
+    def splits(self) -> list:
+        return [split for split, check in self.split_checks.items() if check.isChecked()]
+
+    def settings(self) -> dict:
+        return {
+            "project_path": self.project.store.path,
+            "splits": self.splits(),
+            # 每次训练一个子目录
+            "output_dir": os.path.join(self.output_edit.text().strip(), time.strftime("%Y%m%d_%H%M%S")),
+            "trainer": self.trainer_combo.currentText().strip(),
+            "epochs": self.epochs_spin.value(),
+            "batch_size": self.batch_size_spin.value(),
+            "image_size": self.image_size_spin.value(),
+            "workers": self.workers_spin.value(),
+            "prefetch": self.prefetch_spin.value(),
+            "learning_rate": self.learning_rate_spin.value(),
+            "metrics_interval": configs.training_metrics_interval,
+        }
+
+    @Slot()
+    def startTraining(self):
+        if self.project is None or self.project.store is None or self.training_thread is not None:
+            return
+        if len(self.splits()) == 0 or self.output_edit.text().strip() == "":
+            self.status_label.setText(self.tr("请选择集合和输出目录"))
+            return
+        # 训练进程从项目文件读取, 先写入未保存的图像、拆分和标注
+        self.project.flush()
+        settings = self.settings()
+        LOGGER.info("training %s, splits %s, output %s", settings["trainer"], settings["splits"], settings["output_dir"])
+        self.training_thread = TrainingThread(settings, self)
+        self.training_thread.trainingStarted.connect(self.trainingStarted)
+        self.training_thread.metrics.connect(self.trainingMetrics)
+        self.training_thread.epochFinished.connect(self.epochFinished)
+        self.training_thread.trainingFinished.connect(self.trainingFinished)
+        self.start_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
+        self.progress_bar.setRange(0, 0)
+        self.status_label.setText(self.tr("正在启动训练进程..."))
+        self.chart.clear()
+        self.training_thread.start()
+
+    @Slot(int, int, int)
+    def trainingStarted(self, image_count : int, class_count : int, steps : int):
+        self.progress_bar.setRange(0, max(steps, 1))
+        self.progress_bar.setValue(0)
+        self.chart.clear(steps)
+        self.log_edit.appendPlainText(self.tr("{} 张图像, {} 个类别, {} 步").format(image_count, class_count, steps))
+
+    @Slot(dict)
+    def trainingMetrics(self, metrics : dict):
+        self.progress_bar.setValue(metrics["step"])
+        self.chart.append(metrics)
+        self.status_label.setText(self.tr("第 {} 轮, 第 {} / {} 步, loss {:.4f}, {:.1f} 张/秒, 等待数据 {:.0f}%").format(
+            metrics["epoch"] + 1, metrics["step"], metrics["steps"], metrics["loss"],
+            metrics["images_per_second"], metrics["stall_fraction"] * 100))
+
+    @Slot(dict)
+    def epochFinished(self, values : dict):
+        self.log_edit.appendPlainText(self.tr("第 {} 轮 loss {:.4f}, 保存 {}").format(
+            values["epoch"] + 1, values["loss"], values["checkpoint"]))
+
+    @Slot(bool, str)
+    def trainingFinished(self, completed : bool, message : str):
+        if completed:
+            LOGGER.info("training finished: %s", message)
+            self.status_label.setText(self.tr("训练完成: {}").format(message))
+        else:
+            LOGGER.warning("training stopped: %s", message)
+            self.status_label.setText(self.tr("训练停止: {}").format(message))
+        self.log_edit.appendPlainText(message)
+        if self.progress_bar.maximum() == 0:
+            self.progress_bar.setRange(0, 1)
+        self.start_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        if self.training_thread is not None:
+            self.training_thread.wait()
+            self.training_thread = None
+
+    @Slot()
+    def stopTraining(self):
+        if self.training_thread is not None:
+            self.stop_btn.setEnabled(False)
+            self.status_label.setText(self.tr("正在停止..."))
+            self.training_thread.cancel()
+
+    @Slot()
+    def waitTraining(self):
+        # 切换项目或退出时停止训练并等待权重保存
+        if self.training_thread is not None:
+            self.training_thread.stop()